@@ -0,0 +1,115 @@
+# -*- coding: UTF-8 -*-
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import _ceph
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+def get_default_executor(max_workers = 8):
+    '''
+    获取进程内共享的有界线程池, 首次调用时创建, 所有未指定executor的AsyncCeph对象共用
+    :param max_workers: int, 首次创建时的线程数量
+    :return: concurrent.futures.ThreadPoolExecutor
+    '''
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = ThreadPoolExecutor(max_workers = max_workers)
+        return _default_executor
+
+class AsyncCeph(_ceph.Ceph):
+    '''
+    Ceph的asyncio版本, 方法名称、参数和返回值与Ceph一致, 但均为协程函数, 需要await
+    参数类型检查、ceph_argparse验证和cmd构建与Ceph共用同一份代码, 在事件循环线程中同步完成;
+    只有阻塞的mon_command (以及*_subprocess函数) 被提交到有界线程池执行, 大量并发命令在线程池队列中排队, 不会为每条命令各占一个线程
+    :param executor: concurrent.futures.Executor, 执行阻塞调用的线程池, 不指定时默认使用进程内共享的线程池 (线程数量与连接池大小一致)
+    :param kwargs: 其他传递给Ceph的参数, 如pool、cache
+    '''
+
+    def __init__(self, executor = None, **kwargs):
+        _ceph.Ceph.__init__(self, **kwargs)
+        if executor is None:
+            executor = get_default_executor(max_workers = self.pool.size)
+        self.executor = executor
+
+    def run_ceph_command(self, cmd, inbuf):
+        '''
+        将MON命令提交到线程池执行
+        :return: asyncio.Future, 结果为tuple (int ret, str outbuf, str outs)
+        '''
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self.executor, functools.partial(_ceph.Ceph.run_ceph_command, self, cmd, inbuf))
+
+    async def run_ceph_commands(self, cmds, inbuf = '', max_workers = None):
+        '''
+        并发执行多条MON命令, 并发度受线程池大小限制
+        :param cmds: list, 允许多个, 元素为dict, 与run_ceph_command()的cmd格式一致
+        :param inbuf: str, 所有命令共用的输入缓冲, 默认为 ''
+        :param max_workers: int, 最大并发数, 不指定时默认由线程池大小决定
+        :return: list, 与cmds一一对应且顺序一致, 执行成功的元素为tuple (int ret, str outbuf, str outs), 执行失败的元素为对应的异常对象
+        '''
+        if not isinstance(cmds, list):
+            return TypeError('变量cmds的类型错误, 应为list')
+        for c in cmds:
+            if not isinstance(c, dict) or 'prefix' not in c:
+                return TypeError('变量cmds的元素类型错误, 应为包含prefix的dict')
+        if max_workers is None:
+            return await asyncio.gather(*[self.run_ceph_command(c, inbuf) for c in cmds], return_exceptions = True)
+        if not isinstance(max_workers, int) or max_workers < 1:
+            return TypeError('变量max_workers的类型错误, 应为正整数')
+
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def run_one(cmd):
+            async with semaphore:
+                return await self.run_ceph_command(cmd, inbuf)
+
+        return await asyncio.gather(*[run_one(c) for c in cmds], return_exceptions = True)
+
+    async def _pg_ls_indexed(self, func, args, kwargs):
+        # 指定了pg_index时可能需要先用pg dump刷新索引, 该调用阻塞, 整体放入线程池执行
+        if self.pg_index is None:
+            result = func(self, *args, **kwargs)
+            if isinstance(result, asyncio.Future):
+                result = await result
+            return result
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, self, *args, **kwargs))
+
+    @functools.wraps(_ceph.Ceph.pg_ls_by_osd)
+    async def pg_ls_by_osd(self, *args, **kwargs):
+        return await self._pg_ls_indexed(_ceph.Ceph.pg_ls_by_osd, args, kwargs)
+
+    @functools.wraps(_ceph.Ceph.pg_ls_by_primary)
+    async def pg_ls_by_primary(self, *args, **kwargs):
+        return await self._pg_ls_indexed(_ceph.Ceph.pg_ls_by_primary, args, kwargs)
+
+def _make_async(func):
+    # 普通命令: 在事件循环线程中完成参数验证和cmd构建, 再await线程池中的mon_command
+    @functools.wraps(func)
+    async def method(self, *args, **kwargs):
+        result = func(self, *args, **kwargs)
+        if isinstance(result, asyncio.Future):
+            result = await result
+        return result
+    return method
+
+def _make_async_blocking(func):
+    # *_subprocess函数整体阻塞, 直接放入线程池执行
+    @functools.wraps(func)
+    async def method(self, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, self, *args, **kwargs))
+    return method
+
+for _name, _func in list(vars(_ceph.Ceph).items()):
+    if _name.startswith('_') or not callable(_func) or _name in vars(AsyncCeph):
+        continue
+    if _name.endswith('_subprocess'):
+        setattr(AsyncCeph, _name, _make_async_blocking(_func))
+    else:
+        setattr(AsyncCeph, _name, _make_async(_func))
+del _name, _func
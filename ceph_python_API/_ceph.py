@@ -1,11 +1,17 @@
 # -*- coding: UTF-8 -*-
 import rados
-import ceph_argparse
 import json
+import _command_cache
+import _metrics
+import _pg_index
+import _rados_pool
+import _singleflight
+import _validators
 #import six # 用于变量类型six.string_types
 import os
 import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
 class StatusCodeEnum(Enum):
@@ -48,36 +54,140 @@ class CephError(Exception):
         self.msg = msg
 
 class Ceph():
+    '''
+    Ceph MON命令封装, 所有命令通过连接池借用已连接的集群句柄执行, 执行后归还句柄, 同一个Ceph对象可以多次调用
+    :param pool: _rados_pool.RadosPool, 使用的连接池, 不指定时默认使用进程内共享的默认连接池
+    :param cache: _command_cache.CommandCache, 只读命令的结果缓存, 可在多个Ceph对象间共享, 不指定时默认不缓存
+    :param singleflight: _singleflight.SingleFlight, 用于合并并发的相同只读命令, 不指定时默认使用进程内共享的SingleFlight, 为False时不合并
+    :param pg_index: _pg_index.PGIndex, 指定时pg_ls_by_osd()、pg_ls_by_primary()由该索引返回结果, 不指定时默认向MON发送命令
+    :param acquire_timeout: float, 连接池已满时等待句柄的最长时间, 单位为秒, 超时引发RadosPoolError, 默认为60
+    '''
 
-    def __init__(self):
-        try:
-            self.cluster = rados.Rados(conffile = '')
-        except TypeError as e:
-            print('参数验证错误: {}'.format(e))
-            raise e
-        print('创建了集群句柄')
-
-        try:
-            self.cluster.connect()
-        except Exception as e:
-            print('集群连接错误: {}'.format(e))
-            raise e
-        print('成功连接集群')
+    def __init__(self, pool = None, cache = None, singleflight = None, pg_index = None, acquire_timeout = 60):
+        if pool is None:
+            pool = _rados_pool.get_default_pool()
+        elif not isinstance(pool, _rados_pool.RadosPool):
+            raise TypeError('变量pool的类型错误, 应为RadosPool')
+        self.pool = pool
+
+        if cache is not None and not isinstance(cache, _command_cache.CommandCache):
+            raise TypeError('变量cache的类型错误, 应为CommandCache')
+        self.cache = cache
+
+        if singleflight is None:
+            singleflight = _singleflight.get_default_group()
+        elif singleflight is False:
+            singleflight = None
+        elif not isinstance(singleflight, _singleflight.SingleFlight):
+            raise TypeError('变量singleflight的类型错误, 应为SingleFlight')
+        self.singleflight = singleflight
+
+        if pg_index is not None and not isinstance(pg_index, _pg_index.PGIndex):
+            raise TypeError('变量pg_index的类型错误, 应为PGIndex')
+        self.pg_index = pg_index
+
+        if not isinstance(acquire_timeout, (int, float)) or acquire_timeout <= 0:
+            raise TypeError('变量acquire_timeout的类型错误, 应为正数')
+        self.acquire_timeout = acquire_timeout
 
     def run_ceph_command(self, cmd, inbuf):
+        cmd_json = json.dumps(cmd, sort_keys = True)
+        prefix = cmd['prefix']
+
+        cache_key = None
+        epoch = None
+        if self.cache is not None:
+            if self.cache.cacheable(prefix):
+                cache_key = self.cache.key(cmd_json, inbuf)
+                if self.cache.epoch_bound(prefix):
+                    epoch = self._osdmap_epoch()
+                result = self.cache.get(cache_key, epoch = epoch)
+                if result is not None:
+                    return result
+            elif not _command_cache.is_read_only(prefix):
+                try:
+                    return self._mon_command(cmd, cmd_json, inbuf)
+                finally:
+                    self.cache.invalidate_for(prefix)
+
+        def fetch():
+            result = self._mon_command(cmd, cmd_json, inbuf)
+            if cache_key is not None:
+                self.cache.put(prefix, cache_key, result, epoch = epoch)
+            return result
+
+        # 并发的相同只读命令只发送一次, 所有调用者共享同一个(ret, outbuf, outs)
+        # 默认SingleFlight在进程内共享, 键中包含连接池, 连接不同集群的Ceph对象之间不合并
+        if self.singleflight is not None and _command_cache.is_read_only(prefix):
+            return self.singleflight.do((id(self.pool), cmd_json, inbuf), fetch)
+        return fetch()
+
+    def _osdmap_epoch(self):
+        # 通过osd stat获取当前osdmap epoch, osd stat本身按TTL缓存, 控制探测频率
+        result = Ceph.run_ceph_command(self, {'prefix': 'osd stat', 'format': 'json'}, inbuf = '')
+        return _command_cache.osdmap_epoch(result[1])
+
+    def _mon_command(self, cmd, cmd_json, inbuf):
+        metrics = _metrics.REGISTRY
+        enabled = metrics.enabled # 只读取一次, 执行期间切换enable()/disable()不影响本次命令
+        if enabled:
+            start = time.time()
+        cluster = self.pool.acquire(timeout = self.acquire_timeout)
+        discard = False
+        result = None
         try:
-            result = self.cluster.mon_command(json.dumps(cmd), inbuf = inbuf)
+            result = cluster.mon_command(cmd_json, inbuf = inbuf)
             if result[0] is not 0:
                 print(result)
                 raise CephError(cmd = cmd, msg = os.strerror(abs(result[0])))
             return result
         except rados.Error as e:
+            discard = True # 连接可能已损坏, 不再放回连接池
             raise e
         finally:
-            self._close()
+            self.pool.release(cluster, discard = discard)
+            if enabled:
+                error = result is None or result[0] != 0
+                nbytes = len(result[1]) if result is not None and result[1] is not None else 0
+                metrics.observe(cmd['prefix'], time.time() - start, error = error, nbytes = nbytes)
 
     def _close(self):
-        self.cluster.shutdown()
+        pass # 集群句柄由连接池管理, 无需关闭, 保留该函数以兼容旧的调用
+
+    def run_ceph_commands(self, cmds, inbuf = '', max_workers = None):
+        '''
+        并发执行多条MON命令, 命令之间共享连接池中的集群句柄
+        :param cmds: list, 允许多个, 元素为dict, 与run_ceph_command()的cmd格式一致, 如 {'prefix': 'osd tree', 'format': 'json'}
+        :param inbuf: str, 所有命令共用的输入缓冲, 默认为 ''
+        :param max_workers: int, 最大并发数, 不指定时默认为连接池大小与命令数量中的较小值
+        :return: list, 与cmds一一对应且顺序一致, 执行成功的元素为tuple (int ret, str outbuf, str outs), 执行失败的元素为对应的异常对象 (CephError、rados.Error等)
+        '''
+        if not isinstance(cmds, list):
+            return TypeError('变量cmds的类型错误, 应为list')
+        for c in cmds:
+            if not isinstance(c, dict) or 'prefix' not in c:
+                return TypeError('变量cmds的元素类型错误, 应为包含prefix的dict')
+        if not cmds:
+            return []
+
+        if max_workers is None:
+            max_workers = min(len(cmds), self.pool.size)
+        elif not isinstance(max_workers, int) or max_workers < 1:
+            return TypeError('变量max_workers的类型错误, 应为正整数')
+
+        def run_one(cmd):
+            try:
+                return self.run_ceph_command(cmd, inbuf = inbuf)
+            except Exception as e:
+                return e
+
+        if max_workers == 1:
+            return [run_one(c) for c in cmds]
+        executor = ThreadPoolExecutor(max_workers = max_workers)
+        try:
+            return list(executor.map(run_one, cmds))
+        finally:
+            executor.shutdown(wait = False)
 
     # ceph auth add/caps/get-or-create
 
@@ -403,7 +513,7 @@ class Ceph():
         if epoch is not None:
             if not isinstance(epoch, int):
                 return TypeError('变量epoch的类型错误, 应为int')
-            epoch_validator = ceph_argparse.CephInt(range = '0')
+            epoch_validator = _validators.INT_NON_NEGATIVE
             epoch_validator.valid(str(epoch))
             cmd['epoch'] = epoch
 
@@ -436,7 +546,7 @@ class Ceph():
 
         if not isinstance(_class, str):
            return TypeError('变量_class的类型错误, 应为str')
-        class_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        class_validator = _validators.NAME_STRING
         class_validator.valid(_class)
         cmd['class'] = _class
 
@@ -467,7 +577,7 @@ class Ceph():
 
         if not isinstance(_class, str):
            return TypeError('变量_class的类型错误, 应为str')
-        class_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        class_validator = _validators.NAME_STRING
         class_validator.valid(_class)
         cmd['class'] = _class
 
@@ -487,13 +597,13 @@ class Ceph():
 
         if not isinstance(srcname, str):
             return TypeError('变量srcname的类型错误, 应为str')
-        srcname_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        srcname_validator = _validators.NAME_STRING
         srcname_validator.valid(srcname)
         cmd['srcname'] = srcname
 
         if not isinstance(dstname, str):
             return TypeError('变量dstname的类型错误, 应为str')
-        dstname_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        dstname_validator = _validators.NAME_STRING
         dstname_validator.valid(dstname)
         cmd['dstname'] = dstname
 
@@ -512,7 +622,7 @@ class Ceph():
 
         if not isinstance(_class, str):
            return TypeError('变量_class的类型错误, 应为str')
-        class_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        class_validator = _validators.NAME_STRING
         class_validator.valid(_class)
         cmd['class'] = _class
 
@@ -533,11 +643,12 @@ class Ceph():
 
         if not isinstance(ids, list):
             return TypeError('变量ids的类型错误, 应为list')
-        ids_validator = ceph_argparse.CephOsdName()
-        for s in ids:
-            if not isinstance(s, str):
-                return TypeError('变量ids的元素类型错误, 应为str')
-            ids_validator.valid(s)
+        ids_validator = _validators.OSD_NAME
+        if not ids_validator.valid_all(ids):
+            for s in ids:
+                if not isinstance(s, str):
+                    return TypeError('变量ids的元素类型错误, 应为str')
+                ids_validator.valid(s)
         cmd['ids'] = ids
 
         result = self.run_ceph_command(cmd, inbuf = '')
@@ -555,11 +666,12 @@ class Ceph():
 
         if not isinstance(ids, list):
             return TypeError('变量ids的类型错误, 应为list')
-        ids_validator = ceph_argparse.CephOsdName()
-        for s in ids:
-            if not isinstance(s, str):
-                return TypeError('变量ids的元素类型错误, 应为str')
-            ids_validator.valid(s)
+        ids_validator = _validators.OSD_NAME
+        if not ids_validator.valid_all(ids):
+            for s in ids:
+                if not isinstance(s, str):
+                    return TypeError('变量ids的元素类型错误, 应为str')
+                ids_validator.valid(s)
         cmd['ids'] = ids
 
         result = self.run_ceph_command(cmd, inbuf = '')
@@ -582,11 +694,12 @@ class Ceph():
 
         if not isinstance(ids, list):
             return TypeError('变量ids的类型错误, 应为list')
-        ids_validator = ceph_argparse.CephOsdName()
-        for s in ids:
-            if not isinstance(s, str):
-                return TypeError('变量ids的元素类型错误, 应为str')
-            ids_validator.valid(s)
+        ids_validator = _validators.OSD_NAME
+        if not ids_validator.valid_all(ids):
+            for s in ids:
+                if not isinstance(s, str):
+                    return TypeError('变量ids的元素类型错误, 应为str')
+                ids_validator.valid(s)
         cmd['ids'] = ids
 
         result = self.run_ceph_command(cmd, inbuf = '')
@@ -609,26 +722,26 @@ class Ceph():
 
         if not isinstance(name, str):
            return TypeError('变量class的类型错误, 应为str')
-        name_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        name_validator = _validators.NAME_STRING
         name_validator.valid(name)
         cmd['name'] = name
 
         if not isinstance(root, str):
            return TypeError('变量class的类型错误, 应为str')
-        root_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        root_validator = _validators.NAME_STRING
         root_validator.valid(root)
         cmd['root'] = root
 
         if not isinstance(type, str):
            return TypeError('变量class的类型错误, 应为str')
-        type_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        type_validator = _validators.NAME_STRING
         type_validator.valid(type)
         cmd['type'] = type
 
         if _class is not None:
             if not isinstance(_class, str):
                return TypeError('变量_class的类型错误, 应为str')
-            class_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+            class_validator = _validators.NAME_STRING
             class_validator.valid(_class)
             cmd['class'] = _class
 
@@ -648,7 +761,7 @@ class Ceph():
         if name is not None:
             if not isinstance(name, str):
                 return TypeError('变量name的类型错误, 应为str')
-            name_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+            name_validator = _validators.NAME_STRING
             name_validator.valid(name)
             cmd['name'] = name
 
@@ -691,7 +804,7 @@ class Ceph():
 
         if not isinstance(_class, str):
            return TypeError('变量_class的类型错误, 应为str')
-        class_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        class_validator = _validators.NAME_STRING
         class_validator.valid(_class)
         cmd['class'] = _class
 
@@ -711,13 +824,13 @@ class Ceph():
 
         if not isinstance(srcname, str):
             return TypeError('变量srcname的类型错误, 应为str')
-        srcname_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        srcname_validator = _validators.NAME_STRING
         srcname_validator.valid(srcname)
         cmd['srcname'] = srcname
 
         if not isinstance(dstname, str):
             return TypeError('变量dstname的类型错误, 应为str')
-        dstname_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        dstname_validator = _validators.NAME_STRING
         dstname_validator.valid(dstname)
         cmd['dstname'] = dstname
 
@@ -736,7 +849,7 @@ class Ceph():
 
         if not isinstance(name, str):
            return TypeError('变量class的类型错误, 应为str')
-        name_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        name_validator = _validators.NAME_STRING
         name_validator.valid(name)
         cmd['name'] = name
 
@@ -758,7 +871,7 @@ class Ceph():
 
         if not isinstance(name, str):
             return TypeError('变量name的类型错误, 应为str')
-        name_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        name_validator = _validators.NAME_STRING
         name_validator.valid(name)
         cmd['name'] = name
 
@@ -793,7 +906,7 @@ class Ceph():
 
         if not isinstance(node, str):
             return TypeError('变量node的类型错误, 应为str')
-        node_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        node_validator = _validators.NAME_STRING
         node_validator.valid(node)
         cmd['node'] = node
 
@@ -813,14 +926,14 @@ class Ceph():
 
         if not isinstance(name, str):
             return TypeError('变量name的类型错误, 应为str')
-        name_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        name_validator = _validators.NAME_STRING
         name_validator.valid(name)
         cmd['name'] = name
 
         if ancestor is not None:
             if not isinstance(ancestor, str):
                 return TypeError('变量ancestor的类型错误, 应为str')
-            ancestor_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+            ancestor_validator = _validators.NAME_STRING
             ancestor_validator.valid(ancestor)
             cmd['ancestor'] = ancestor
 
@@ -840,13 +953,13 @@ class Ceph():
 
         if not isinstance(srcname, str):
             return TypeError('变量srcname的类型错误, 应为str')
-        srcname_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        srcname_validator = _validators.NAME_STRING
         srcname_validator.valid(srcname)
         cmd['srcname'] = srcname
 
         if not isinstance(dstname, str):
             return TypeError('变量dstname的类型错误, 应为str')
-        dstname_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        dstname_validator = _validators.NAME_STRING
         dstname_validator.valid(dstname)
         cmd['dstname'] = dstname
 
@@ -866,13 +979,13 @@ class Ceph():
 
         if not isinstance(name, str):
             return TypeError('变量name的类型错误, 应为str')
-        name_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        name_validator = _validators.NAME_STRING
         name_validator.valid(name)
         cmd['name'] = name
 
         if not isinstance(weight, float):
             return TypeError('变量weight的类型错误, 应为float')
-        weight_validator = ceph_argparse.CephFloat(range = '0.0')
+        weight_validator = _validators.FLOAT_NON_NEGATIVE
         weight_validator.valid(weight)
         cmd['weight'] = weight
 
@@ -904,13 +1017,13 @@ class Ceph():
 
         if not isinstance(name, str):
             return TypeError('变量name的类型错误, 应为str')
-        name_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        name_validator = _validators.NAME_STRING
         name_validator.valid(name)
         cmd['name'] = name
 
         if not isinstance(weight, float):
             return TypeError('变量weight的类型错误, 应为float')
-        weight_validator = ceph_argparse.CephFloat(range = '0.0')
+        weight_validator = _validators.FLOAT_NON_NEGATIVE
         weight_validator.valid(weight)
         cmd['weight'] = weight
 
@@ -930,14 +1043,14 @@ class Ceph():
 
         if not isinstance(name, str):
             return TypeError('变量name的类型错误, 应为str')
-        name_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        name_validator = _validators.NAME_STRING
         name_validator.valid(name)
         cmd['name'] = name
 
         if ancestor is not None:
             if not isinstance(ancestor, str):
                 return TypeError('变量ancestor的类型错误, 应为str')
-            ancestor_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+            ancestor_validator = _validators.NAME_STRING
             ancestor_validator.valid(ancestor)
             cmd['ancestor'] = ancestor
 
@@ -1011,11 +1124,12 @@ class Ceph():
 
         if not isinstance(ids, list):
             return TypeError('变量ids的类型错误, 应为list')
-        ids_validator = ceph_argparse.CephOsdName()
-        for s in ids:
-            if not isinstance(s, str):
-                return TypeError('变量ids的元素类型错误, 应为str')
-            ids_validator.valid(s)
+        ids_validator = _validators.OSD_NAME
+        if not ids_validator.valid_all(ids):
+            for s in ids:
+                if not isinstance(s, str):
+                    return TypeError('变量ids的元素类型错误, 应为str')
+                ids_validator.valid(s)
         cmd['ids'] = ids
 
         result = self.run_ceph_command(cmd, inbuf = '')
@@ -1033,11 +1147,12 @@ class Ceph():
 
         if not isinstance(ids, list):
             return TypeError('变量ids的类型错误, 应为list')
-        ids_validator = ceph_argparse.CephOsdName()
-        for s in ids:
-            if not isinstance(s, str):
-                return TypeError('变量ids的元素类型错误, 应为str')
-            ids_validator.valid(s)
+        ids_validator = _validators.OSD_NAME
+        if not ids_validator.valid_all(ids):
+            for s in ids:
+                if not isinstance(s, str):
+                    return TypeError('变量ids的元素类型错误, 应为str')
+                ids_validator.valid(s)
         cmd['ids'] = ids
 
         result = self.run_ceph_command(cmd, inbuf = '')
@@ -1055,11 +1170,12 @@ class Ceph():
 
         if not isinstance(ids, list):
             return TypeError('变量ids的类型错误, 应为list')
-        ids_validator = ceph_argparse.CephOsdName()
-        for s in ids:
-            if not isinstance(s, str):
-                return TypeError('变量ids的元素类型错误, 应为str')
-            ids_validator.valid(s)
+        ids_validator = _validators.OSD_NAME
+        if not ids_validator.valid_all(ids):
+            for s in ids:
+                if not isinstance(s, str):
+                    return TypeError('变量ids的元素类型错误, 应为str')
+                ids_validator.valid(s)
         cmd['ids'] = ids
 
         result = self.run_ceph_command(cmd, inbuf = '')
@@ -1103,7 +1219,7 @@ class Ceph():
 
         if not isinstance(name, str):
             return TypeError('变量name的类型错误, 应为str')
-        name_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        name_validator = _validators.NAME_STRING
         name_validator.valid(name)
         cmd['name'] = name
 
@@ -1134,7 +1250,7 @@ class Ceph():
 
         if not isinstance(name, str):
             return TypeError('变量name的类型错误, 应为str')
-        name_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        name_validator = _validators.NAME_STRING
         name_validator.valid(name)
         cmd['name'] = name
 
@@ -1169,7 +1285,7 @@ class Ceph():
 
         if not isinstance(name, str):
             return TypeError('变量name的类型错误, 应为str')
-        name_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        name_validator = _validators.NAME_STRING
         name_validator.valid(name)
         cmd['name'] = name
 
@@ -1184,7 +1300,7 @@ class Ceph():
         if force is not False:
             if not isinstance(force, bool):
                 return TypeError('变量force的类型错误, 应为bool')
-            force_validator = ceph_argparse.CephBool(strings = '')
+            force_validator = _validators.BOOL
             force_validator.valid(str(force))
             cmd['force'] = force
 
@@ -1197,7 +1313,7 @@ class Ceph():
         '''
         获取二进制的CRUSH map
         :param epoch: int, 满足CephInt(range = '0'), 版本号, 不指定时默认为最新版本
-        :return: tuple, (int ret, str outbuf, str outs), json格式
+        :return: tuple, (int ret, bytes outbuf, str outs), outbuf为二进制数据, 可由_crush_decode.decode_crushmap()解码
         :raise CephError: 执行错误时引发CephError
         :raise rados.Error: RADOS引起的问题描述
         '''
@@ -1206,7 +1322,7 @@ class Ceph():
         if epoch is not None:
             if not isinstance(epoch, int):
                 return TypeError('变量epoch的类型错误, 应为int')
-            epoch_validator = ceph_argparse.CephInt(range = '0')
+            epoch_validator = _validators.INT_NON_NEGATIVE
             epoch_validator.valid(str(epoch))
             cmd['epoch'] = epoch
 
@@ -1217,7 +1333,7 @@ class Ceph():
         '''
         获取二进制的OSD map
         :param epoch: int, 满足CephInt(range = '0'), 版本号, 不指定时默认为最新版本
-        :return: tuple, (int ret, str outbuf, str outs), json格式
+        :return: tuple, (int ret, bytes outbuf, str outs), outbuf为二进制数据, 可由_osdmap_decode.decode_osdmap()解码
         :raise CephError: 执行错误时引发CephError
         :raise rados.Error: RADOS引起的问题描述
         '''
@@ -1226,7 +1342,7 @@ class Ceph():
         if epoch is not None:
             if not isinstance(epoch, int):
                 return TypeError('变量epoch的类型错误, 应为int')
-            epoch_validator = ceph_argparse.CephInt(range = '0')
+            epoch_validator = _validators.INT_NON_NEGATIVE
             epoch_validator.valid(str(epoch))
             cmd['epoch'] = int(epoch)
 
@@ -1260,7 +1376,7 @@ class Ceph():
         if epoch is not None:
             if not isinstance(epoch, int):
                 return TypeError('变量epoch的类型错误, 应为int')
-            epoch_validator = ceph_argparse.CephInt(range = '0')
+            epoch_validator = _validators.INT_NON_NEGATIVE
             epoch_validator.valid(str(epoch))
             cmd['epoch'] = int(epoch)
 
@@ -1285,7 +1401,7 @@ class Ceph():
         if epoch is not None:
             if not isinstance(epoch, int):
                 return TypeError('变量epoch的类型错误, 应为int')
-            epoch_validator = ceph_argparse.CephInt(range = '0')
+            epoch_validator = _validators.INT_NON_NEGATIVE
             epoch_validator.valid(str(epoch))
             cmd['epoch'] = int(epoch)
 
@@ -1329,7 +1445,7 @@ class Ceph():
         if yes_i_really_mean_it is not False:
             if not isinstance(yes_i_really_mean_it, bool):
                 return TypeError('变量yes_i_really_mean_it的类型错误, 应为bool')
-            yes_i_really_mean_it_validator = ceph_argparse.CephBool(strings = '')
+            yes_i_really_mean_it_validator = _validators.BOOL
             yes_i_really_mean_it_validator.valid(str(yes_i_really_mean_it))
             cmd['yes_i_really_mean_it'] = yes_i_really_mean_it
 
@@ -1353,7 +1469,7 @@ class Ceph():
 
         if not isinstance(app, str):
             return TypeError('变量app的类型错误, 应为str')
-        app_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+        app_validator = _validators.NAME_STRING
         app_validator.valid(app)
         cmd['app'] = app
 
@@ -1440,20 +1556,20 @@ class Ceph():
 
         if not isinstance(pg_num, int):
             return TypeError('变量pg_num的类型错误, 应为int')
-        pg_num_validator = ceph_argparse.CephInt(range = '0')
+        pg_num_validator = _validators.INT_NON_NEGATIVE
         pg_num_validator.valid(str(pg_num))
         cmd['pg_num'] = pg_num
 
         if not isinstance(pgp_num, int):
             return TypeError('变量pgp_num的类型错误, 应为int')
-        pgp_num_validator = ceph_argparse.CephInt(range = '0')
+        pgp_num_validator = _validators.INT_NON_NEGATIVE
         pgp_num_validator.valid(str(pgp_num))
         cmd['pgp_num'] = pgp_num
 
         if pool_type is not None:
             if not isinstance(pool_type, str):
                 return TypeError('变量pool_type的类型错误, 应为str')
-            pool_type_validator = ceph_argparse.CephChoices(strings = 'replicated|erasure')
+            pool_type_validator = _validators.POOL_TYPES
             pool_type_validator.valid(pool_type)
             cmd['pool_type'] = pool_type
 
@@ -1461,7 +1577,7 @@ class Ceph():
                 if erasure_code_profile is not None:
                     if not isinstance(erasure_code_profile, str):
                         return TypeError('变量erasure_code_profile的类型错误, 应为str')
-                    erasure_code_profile_validator = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+                    erasure_code_profile_validator = _validators.NAME_STRING
                     erasure_code_profile_validator.valid(erasure_code_profile)
                     cmd['erasure_code_profile'] = erasure_code_profile
 
@@ -1497,7 +1613,7 @@ class Ceph():
         if yes_i_really_really_mean_it is not False:
             if not isinstance(yes_i_really_really_mean_it, bool):
                 return TypeError('变量yes_i_really_really_mean_it的类型错误, 应为bool')
-            yes_i_really_really_mean_it_validator = ceph_argparse.CephBool(strings = '')
+            yes_i_really_really_mean_it_validator = _validators.BOOL
             yes_i_really_really_mean_it_validator.valid(str(yes_i_really_really_mean_it))
             cmd['yes_i_really_really_mean_it'] = yes_i_really_really_mean_it
 
@@ -1522,7 +1638,7 @@ class Ceph():
 
         if not isinstance(var, str):
             return TypeError('变量var的类型错误, 应为str')
-        var_validator = ceph_argparse.CephChoices(strings = 'size|min_size|pg_num|pgp_num|crush_rule|hashpspool|nodelete|nopgchange|nosizechange|write_fadvise_dontneed|noscrub|nodeep-scrub|hit_set_type|hit_set_period|hit_set_count|hit_set_fpp|use_gmt_hitset|target_max_objects|target_max_bytes|cache_target_dirty_ratio|cache_target_dirty_high_ratio|cache_target_full_ratio|cache_min_flush_age|cache_min_evict_age|erasure_code_profile|min_read_recency_for_promote|all|min_write_recency_for_promote|fast_read|hit_set_grade_decay_rate|hit_set_search_last_n|scrub_min_interval|scrub_max_interval|deep_scrub_interval|recovery_priority|recovery_op_priority|scrub_priority|compression_mode|compression_algorithm|compression_required_ratio|compression_max_blob_size|compression_min_blob_size|csum_type|csum_min_block|csum_max_block|allow_ec_overwrites|fingerprint_algorithm|pg_autoscale_mode|pg_autoscale_bias|pg_num_min|target_size_bytes|target_size_ratio')
+        var_validator = _validators.POOL_GET_VARS
         var_validator.valid(var)
         cmd['var'] = var
 
@@ -1543,7 +1659,7 @@ class Ceph():
         if detail is not None:
             if not isinstance(detail, str):
                 return TypeError('变量detail的类型错误, 应为str')
-            detail_validator = ceph_argparse.CephChoices(strings = 'detail')
+            detail_validator = _validators.DETAIL
             detail_validator.valid(detail)
             cmd['detail'] = detail
 
@@ -1596,7 +1712,7 @@ class Ceph():
         if yes_i_really_really_mean_it is not False:
             if not isinstance(yes_i_really_really_mean_it, bool):
                 return TypeError('变量yes_i_really_really_mean_it的类型错误, 应为bool')
-            yes_i_really_really_mean_it_validator = ceph_argparse.CephBool(strings = '')
+            yes_i_really_really_mean_it_validator = _validators.BOOL
             yes_i_really_really_mean_it_validator.valid(str(yes_i_really_really_mean_it))
             cmd['yes_i_really_really_mean_it'] = yes_i_really_really_mean_it
 
@@ -1622,7 +1738,7 @@ class Ceph():
 
         if not isinstance(var, str):
             return TypeError('变量var的类型错误, 应为str')
-        var_validator = ceph_argparse.CephChoices(strings = 'size|min_size|pg_num|pgp_num|pgp_num_actual|crush_rule|hashpspool|nodelete|nopgchange|nosizechange|write_fadvise_dontneed|noscrub|nodeep-scrub|hit_set_type|hit_set_period|hit_set_count|hit_set_fpp|use_gmt_hitset|target_max_bytes|target_max_objects|cache_target_dirty_ratio|cache_target_dirty_high_ratio|cache_target_full_ratio|cache_min_flush_age|cache_min_evict_age|min_read_recency_for_promote|min_write_recency_for_promote|fast_read|hit_set_grade_decay_rate|hit_set_search_last_n|scrub_min_interval|scrub_max_interval|deep_scrub_interval|recovery_priority|recovery_op_priority|scrub_priority|compression_mode|compression_algorithm|compression_required_ratio|compression_max_blob_size|compression_min_blob_size|csum_type|csum_min_block|csum_max_block|allow_ec_overwrites|fingerprint_algorithm|pg_autoscale_mode|pg_autoscale_bias|pg_num_min|target_size_bytes|target_size_ratio')
+        var_validator = _validators.POOL_SET_VARS
         var_validator.valid(var)
         cmd['var'] = var
 
@@ -1666,13 +1782,13 @@ class Ceph():
 
         if not isinstance(id, int):
             return TypeError('变量id的类型错误, 应为int')
-        id_validator = ceph_argparse.CephInt(range = '0')
+        id_validator = _validators.INT_NON_NEGATIVE
         id_validator.valid(str(id))
         cmd['id'] = id
 
         if not isinstance(weight, float):
             return TypeError('变量weight的类型错误, 应为float')
-        weight_validator = ceph_argparse.CephFloat(range = '0.0|1.0')
+        weight_validator = _validators.FLOAT_RATIO
         weight_validator.valid(weight)
         cmd['weight'] = weight
 
@@ -1695,21 +1811,21 @@ class Ceph():
         if oload is not None:
             if not isinstance(oload, int):
                 return TypeError('变量oload的类型错误, 应为int')
-            oload_validator = ceph_argparse.CephInt(range = '100')
+            oload_validator = _validators.INT_OLOAD
             oload_validator.valid(str(oload))
             cmd['oload'] = oload
 
         if max_change is not None:
             if not isinstance(max_change, float):
                 return TypeError('变量max_change的类型错误, 应为float')
-            max_change_validator = ceph_argparse.CephFloat(range = '0.0')
+            max_change_validator = _validators.FLOAT_NON_NEGATIVE
             max_change_validator.valid(max_change)
             cmd['max_change'] = max_change
 
         if max_osds is not None:
             if not isinstance(max_osds, int):
                 return TypeError('变量max_osds的类型错误, 应为int')
-            max_osds_validator = ceph_argparse.CephInt(range = '0')
+            max_osds_validator = _validators.INT_NON_NEGATIVE
             max_osds_validator.valid(str(max_osds))
             cmd['max_osds'] = max_osds
 
@@ -1740,28 +1856,28 @@ class Ceph():
         if oload is not None:
             if not isinstance(oload, int):
                 return TypeError('变量oload的类型错误, 应为int')
-            oload_validator = ceph_argparse.CephInt(range = '100')
+            oload_validator = _validators.INT_OLOAD
             oload_validator.valid(str(oload))
             cmd['oload'] = oload
 
         if max_change is not None:
             if not isinstance(max_change, float):
                 return TypeError('变量max_change的类型错误, 应为float')
-            max_change_validator = ceph_argparse.CephFloat(range = '0.0')
+            max_change_validator = _validators.FLOAT_NON_NEGATIVE
             max_change_validator.valid(max_change)
             cmd['max_change'] = max_change
 
         if max_osds is not None:
             if not isinstance(max_osds, int):
                 return TypeError('变量max_osds的类型错误, 应为int')
-            max_osds_validator = ceph_argparse.CephInt(range = '0')
+            max_osds_validator = _validators.INT_NON_NEGATIVE
             max_osds_validator.valid(str(max_osds))
             cmd['max_osds'] = max_osds
 
         if no_increasing is not False:
             if not isinstance(no_increasing, bool):
                 return TypeError('变量no_increasing的类型错误, 应为bool')
-            no_increasing_validator = ceph_argparse.CephBool(strings = '')
+            no_increasing_validator = _validators.BOOL
             no_increasing_validator.valid(str(no_increasing))
             cmd['no_increasing'] = no_increasing
 
@@ -1784,21 +1900,21 @@ class Ceph():
         if oload is not None:
             if not isinstance(oload, int):
                 return TypeError('变量oload的类型错误, 应为int')
-            oload_validator = ceph_argparse.CephInt(range = '100')
+            oload_validator = _validators.INT_OLOAD
             oload_validator.valid(str(oload))
             cmd['oload'] = oload
 
         if max_change is not None:
             if not isinstance(max_change, float):
                 return TypeError('变量max_change的类型错误, 应为float')
-            max_change_validator = ceph_argparse.CephFloat(range = '0.0')
+            max_change_validator = _validators.FLOAT_NON_NEGATIVE
             max_change_validator.valid(max_change)
             cmd['max_change'] = max_change
 
         if max_osds is not None:
             if not isinstance(max_osds, int):
                 return TypeError('变量max_osds的类型错误, 应为int')
-            max_osds_validator = ceph_argparse.CephInt(range = '0')
+            max_osds_validator = _validators.INT_NON_NEGATIVE
             max_osds_validator.valid(str(max_osds))
             cmd['max_osds'] = max_osds
 
@@ -1829,28 +1945,28 @@ class Ceph():
         if oload is not None:
             if not isinstance(oload, int):
                 return TypeError('变量oload的类型错误, 应为int')
-            oload_validator = ceph_argparse.CephInt(range = '100')
+            oload_validator = _validators.INT_OLOAD
             oload_validator.valid(str(oload))
             cmd['oload'] = oload
 
         if max_change is not None:
             if not isinstance(max_change, float):
                 return TypeError('变量max_change的类型错误, 应为float')
-            max_change_validator = ceph_argparse.CephFloat(range = '0.0')
+            max_change_validator = _validators.FLOAT_NON_NEGATIVE
             max_change_validator.valid(max_change)
             cmd['max_change'] = max_change
 
         if max_osds is not None:
             if not isinstance(max_osds, int):
                 return TypeError('变量max_osds的类型错误, 应为int')
-            max_osds_validator = ceph_argparse.CephInt(range = '0')
+            max_osds_validator = _validators.INT_NON_NEGATIVE
             max_osds_validator.valid(str(max_osds))
             cmd['max_osds'] = max_osds
 
         if no_increasing is not False:
             if not isinstance(no_increasing, bool):
                 return TypeError('变量no_increasing的类型错误, 应为bool')
-            no_increasing_validator = ceph_argparse.CephBool(strings = '')
+            no_increasing_validator = _validators.BOOL
             no_increasing_validator.valid(str(no_increasing))
             cmd['no_increasing'] = no_increasing
 
@@ -1872,7 +1988,7 @@ class Ceph():
 
         if not isinstance(key, str):
             return TypeError('变量key的类型错误, 应为str')
-        key_validator = ceph_argparse.CephChoices(strings = 'full|pause|noup|nodown|noout|noin|nobackfill|norebalance|norecover|noscrub|nodeep-scrub|notieragent|nosnaptrim|pglog_hardlimit')
+        key_validator = _validators.OSD_SET_KEYS
         key_validator.valid(key)
         cmd['key'] = key
 
@@ -1892,7 +2008,7 @@ class Ceph():
 
         if not isinstance(key, str):
             return TypeError('变量key的类型错误, 应为str')
-        key_validator = ceph_argparse.CephChoices(strings = 'full|pause|noup|nodown|noout|noin|nobackfill|norebalance|norecover|noscrub|nodeep-scrub|notieragent|nosnaptrim')
+        key_validator = _validators.OSD_UNSET_KEYS
         key_validator.valid(key)
         cmd['key'] = key
 
@@ -1924,7 +2040,7 @@ class Ceph():
         if force_nonempty is not False:
             if not isinstance(force_nonempty, bool):
                 return TypeError('变量force_nonempty的类型错误, 应为bool')
-            force_nonempty_validator = ceph_argparse.CephBool(strings = '')
+            force_nonempty_validator = _validators.BOOL
             force_nonempty_validator.valid(str(force_nonempty))
             cmd['force_nonempty'] = force_nonempty
 
@@ -1953,7 +2069,7 @@ class Ceph():
 
         if not isinstance(size, int):
             return TypeError('变量size的类型错误, 应为int')
-        size_validator = ceph_argparse.CephInt(range = '0')
+        size_validator = _validators.INT_NON_NEGATIVE
         size_validator.valid(str(size))
         cmd['size'] = size
 
@@ -1974,7 +2090,7 @@ class Ceph():
 
         if not isinstance(mode, str):
             return TypeError('变量mode的类型错误, 应为str')
-        mode_validator = ceph_argparse.CephChoices(strings = 'none|writeback|forward|readonly|readforward|proxy|readproxy')
+        mode_validator = _validators.CACHE_MODES
         mode_validator.valid(mode)
         cmd['mode'] = mode
 
@@ -2116,14 +2232,14 @@ class Ceph():
         if output_method is not None:
             if not isinstance(output_method, str):
                 return TypeError('变量output_method的类型错误, 应为str')
-            output_method_validator = ceph_argparse.CephChoices(strings = 'plain|tree')
+            output_method_validator = _validators.OSD_DF_OUTPUT_METHODS
             output_method_validator.valid(output_method)
             cmd['output_method'] = output_method
 
         if filter_by is not None:
             if not isinstance(filter_by, str):
                 return TypeError('变量filter_by的类型错误, 应为str')
-            filter_by_validator = ceph_argparse.CephChoices(strings = 'class|name')
+            filter_by_validator = _validators.OSD_DF_FILTER_BY
             filter_by_validator.valid(filter_by)
             cmd['filter_by'] = filter_by
 
@@ -2148,7 +2264,7 @@ class Ceph():
         if epoch is not None:
             if not isinstance(epoch, int):
                 return TypeError('变量epoch的类型错误, 应为int')
-            epoch_validator = ceph_argparse.CephInt(range = '0')
+            epoch_validator = _validators.INT_NON_NEGATIVE
             epoch_validator.valid(str(epoch))
             cmd['epoch'] = epoch
 
@@ -2167,7 +2283,7 @@ class Ceph():
 
         if not isinstance(id, int):
             return TypeError('变量id的类型错误, 应为int')
-        id_validator = ceph_argparse.CephInt(range = '0')
+        id_validator = _validators.INT_NON_NEGATIVE
         id_validator.valid(str(id))
         cmd['id'] = id
 
@@ -2216,7 +2332,7 @@ class Ceph():
         if id is not None:
             if not isinstance(id, int):
                 return TypeError('变量id的类型错误, 应为int')
-            id_validator = ceph_argparse.CephInt(range = '0')
+            id_validator = _validators.INT_NON_NEGATIVE
             id_validator.valid(str(id))
             cmd['id'] = id
 
@@ -2248,13 +2364,13 @@ class Ceph():
 
         if not isinstance(id, int):
             return TypeError('变量id的类型错误, 应为int')
-        id_validator = ceph_argparse.CephInt(range = '0')
+        id_validator = _validators.INT_NON_NEGATIVE
         id_validator.valid(str(id))
         cmd['id'] = id
 
         if not isinstance(weight, float):
             return TypeError('变量weight的类型错误, 应为float')
-        weight_validator = ceph_argparse.CephFloat(range = '0.0|1.0')
+        weight_validator = _validators.FLOAT_RATIO
         weight_validator.valid(weight)
         cmd['weight'] = weight
 
@@ -2275,21 +2391,21 @@ class Ceph():
 
         if not isinstance(id, str):
             return TypeError('变量id的类型错误, 应为str')
-        id_validator = ceph_argparse.CephOsdName()
+        id_validator = _validators.OSD_NAME
         id_validator.valid(id)
         cmd['id'] = id # 为啥OSD是要大写才行？？？？OMG！
 
         if force is not False:
             if not isinstance(force, bool):
                 return TypeError('变量force的类型错误, 应为bool')
-            force_validator = ceph_argparse.CephBool(strings = '')
+            force_validator = _validators.BOOL
             force_validator.valid(str(force))
             cmd['force'] = force
 
         if yes_i_really_mean_it is not False:
             if not isinstance(yes_i_really_mean_it, bool):
                 return TypeError('变量yes_i_really_mean_it的类型错误, 应为bool')
-            yes_i_really_mean_it_validator = ceph_argparse.CephBool(strings = '')
+            yes_i_really_mean_it_validator = _validators.BOOL
             yes_i_really_mean_it_validator.valid(str(yes_i_really_mean_it))
             cmd['yes_i_really_mean_it'] = yes_i_really_mean_it
 
@@ -2310,28 +2426,25 @@ class Ceph():
 
             if not isinstance(id, str):
                 return TypeError('变量id的类型错误, 应为str')
-            id_validator = ceph_argparse.CephOsdName()
+            id_validator = _validators.OSD_NAME
             id_validator.valid(id)
             cmd.append(id)
 
             if force is not False:
                 if not isinstance(force, bool):
                     return TypeError('变量force的类型错误, 应为bool')
-                force_validator = ceph_argparse.CephBool(strings = '')
+                force_validator = _validators.BOOL
                 force_validator.valid(str(force))
                 cmd.append('--force')
 
             if yes_i_really_mean_it is not False:
                 if not isinstance(yes_i_really_mean_it, bool):
                     return TypeError('变量yes_i_really_mean_it的类型错误, 应为bool')
-                yes_i_really_mean_it_validator = ceph_argparse.CephBool(strings = '')
+                yes_i_really_mean_it_validator = _validators.BOOL
                 yes_i_really_mean_it_validator.valid(str(yes_i_really_mean_it))
                 cmd.append('--yes_i_really_mean_it')
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -2350,11 +2463,12 @@ class Ceph():
 
         if not isinstance(ids, list):
             return TypeError('变量ids的类型错误, 应为list')
-        ids_validator = ceph_argparse.CephOsdName()
-        for s in ids:
-            if not isinstance(s, str):
-                return TypeError('变量ids的元素类型错误, 应为str')
-            ids_validator.valid(s)
+        ids_validator = _validators.OSD_NAME
+        if not ids_validator.valid_all(ids):
+            for s in ids:
+                if not isinstance(s, str):
+                    return TypeError('变量ids的元素类型错误, 应为str')
+                ids_validator.valid(s)
         cmd['ids'] = ids
 
         result = self.run_ceph_command(cmd, inbuf = '')
@@ -2385,7 +2499,7 @@ class Ceph():
         if epoch is not None:
             if not isinstance(epoch, int):
                 return TypeError('变量epoch的类型错误, 应为int')
-            epoch_validator = ceph_argparse.CephInt(range = '0')
+            epoch_validator = _validators.INT_NON_NEGATIVE
             epoch_validator.valid(str(epoch))
             cmd['epoch'] = epoch
 
@@ -2418,7 +2532,7 @@ class Ceph():
 
         if not isinstance(pgid, str):
             return TypeError('变量pgid的类型错误, 应为str')
-        pgid_validator = ceph_argparse.CephPgid()
+        pgid_validator = _validators.PGID
         pgid_validator.valid(pgid)
         cmd['pgid'] = pgid
 
@@ -2437,7 +2551,7 @@ class Ceph():
 
         if not isinstance(pgid, str):
             return TypeError('变量pgid的类型错误, 应为str')
-        pgid_validator = ceph_argparse.CephPgid()
+        pgid_validator = _validators.PGID
         pgid_validator.valid(pgid)
         cmd['pgid'] = pgid
 
@@ -2456,7 +2570,7 @@ class Ceph():
 
         if not isinstance(pgid, str):
             return TypeError('变量pgid的类型错误, 应为str')
-        pgid_validator = ceph_argparse.CephPgid()
+        pgid_validator = _validators.PGID
         pgid_validator.valid(pgid)
         cmd['pgid'] = pgid
 
@@ -2479,9 +2593,10 @@ class Ceph():
         if dumpcontents is not None:
             if not isinstance(dumpcontents, list):
                 return TypeError('变量dumpcontents的类型错误, 应为list')
-            dumpcontents_validator = ceph_argparse.CephChoices(strings = 'all|summary|sum|delta|pools|osds|pgs|pgs_brief')
-            for s in dumpcontents:
-                dumpcontents_validator.valid(s)
+            dumpcontents_validator = _validators.PG_DUMP_CONTENTS
+            if not dumpcontents_validator.valid_all(dumpcontents):
+                for s in dumpcontents:
+                    dumpcontents_validator.valid(s)
             cmd['dumpcontents'] = dumpcontents
 
         result = self.run_ceph_command(cmd, inbuf = '')
@@ -2501,9 +2616,10 @@ class Ceph():
         if dumpcontents is not None:
             if not isinstance(dumpcontents, list):
                 return TypeError('变量dumpcontents的类型错误, 应为list')
-            dumpcontents_validator = ceph_argparse.CephChoices(strings = 'all|summary|sum|pools|osds|pgs')
-            for s in dumpcontents:
-                dumpcontents_validator.valid(s)
+            dumpcontents_validator = _validators.PG_DUMP_JSON_CONTENTS
+            if not dumpcontents_validator.valid_all(dumpcontents):
+                for s in dumpcontents:
+                    dumpcontents_validator.valid(s)
             cmd['dumpcontents'] = dumpcontents
 
         result = self.run_ceph_command(cmd, inbuf = '')
@@ -2535,9 +2651,10 @@ class Ceph():
         if stuckops is not None:
             if not isinstance(stuckops, list):
                 return TypeError('变量stuckops的类型错误, 应为list')
-            stuckops_validator = ceph_argparse.CephChoices(strings = 'inactive|unclean|stale|undersized|degraded')
-            for s in stuckops:
-                stuckops_validator.valid(s)
+            stuckops_validator = _validators.PG_STUCK_OPS
+            if not stuckops_validator.valid_all(stuckops):
+                for s in stuckops:
+                    stuckops_validator.valid(s)
             cmd['stuckops'] = stuckops
 
         result = self.run_ceph_command(cmd, inbuf = '')
@@ -2560,29 +2677,30 @@ class Ceph():
         if pool is not None:
             if not isinstance(pool, int):
                 return TypeError('变量pool的类型错误, 应为int')
-            pool_validator = ceph_argparse.CephInt(range = '')
+            pool_validator = _validators.INT
             pool_validator.valid(str(pool))
             cmd['pool'] = pool
 
         if states is not None:
             if not isinstance(states, list):
                 return TypeError('变量states的类型错误, 应为list')
-            states_validator = ceph_argparse.CephChoices(strings = 'stale|creating|active|activating|clean|recovery_wait|recovery_toofull|recovering|forced_recovery|down|recovery_unfound|backfill_unfound|undersized|degraded|remapped|premerge|scrubbing|deep|inconsistent|peering|repair|backfill_wait|backfilling|forced_backfill|backfill_toofull|incomplete|peered|snaptrim|snaptrim_wait|snaptrim_error')
-            for s in states:
-                states_validator.valid(s)
+            states_validator = _validators.PG_STATES
+            if not states_validator.valid_all(states):
+                for s in states:
+                    states_validator.valid(s)
             cmd['states'] = states
 
         result = self.run_ceph_command(cmd, inbuf = '')
         return result
 
-    def pg_ls_by_osd(self, osd, pool = None, states = None): # 部分完成测试, osd参数不起作用, 输出均为所有OSD的池
+    def pg_ls_by_osd(self, osd, pool = None, states = None): # 部分完成测试
         '''
         列出指定OSD的PG信息
         :param osd: str, 满足CephOsdName(), OSD名称
         :param pool: int, 满足CephInt(range = ''), 存储池ID, 不指定时默认作用于所有存储池
         :param states: list, 允许多个, 满足CephChoices(strings = 'stale|creating|active|activating|clean|recovery_wait|recovery_toofull|recovering|forced_recovery|down|recovery_unfound|backfill_unfound|undersized|degraded|remapped|premerge|scrubbing|deep|inconsistent|peering|repair|backfill_wait|backfilling|forced_backfill|backfill_toofull|incomplete|peered|snaptrim|snaptrim_wait|snaptrim_error')
             指定状态, 不指定时默认作用于所有状态
-        :return: tuple, (int ret, str outbuf, str outs), json格式
+        :return: tuple, (int ret, str outbuf, str outs), json格式, 指定了pg_index时pg_stats中的记录只包含pgid、state、up、up_primary、acting、acting_primary
         :raise CephError: 执行错误时引发CephError
         :raise rados.Error: RADOS引起的问题描述
         '''
@@ -2590,25 +2708,33 @@ class Ceph():
 
         if not isinstance(osd, str):
             return TypeError('变量osd的类型错误, 应为str')
-        osd_validator = ceph_argparse.CephOsdName()
+        osd_validator = _validators.OSD_NAME
         osd_validator.valid(osd)
-        cmd['OSD'] = osd # 为啥OSD是要大写才行？？？？OMG！
+        if osd == '*': # CephOsdName接受 '*', 但该命令需要具体的OSD
+            return ValueError('变量osd的取值错误, 应为具体的OSD名称')
+        cmd['osd'] = osd # MON只识别小写的osd, 大写的OSD会被忽略并返回所有OSD的PG
 
         if pool is not None:
             if not isinstance(pool, int):
                 return TypeError('变量pool的类型错误, 应为int')
-            pool_validator = ceph_argparse.CephInt(range = '')
+            pool_validator = _validators.INT
             pool_validator.valid(str(pool))
             cmd['pool'] = pool
 
         if states is not None:
             if not isinstance(states, list):
                 return TypeError('变量states的类型错误, 应为list')
-            states_validator = ceph_argparse.CephChoices(strings = 'stale|creating|active|activating|clean|recovery_wait|recovery_toofull|recovering|forced_recovery|down|recovery_unfound|backfill_unfound|undersized|degraded|remapped|premerge|scrubbing|deep|inconsistent|peering|repair|backfill_wait|backfilling|forced_backfill|backfill_toofull|incomplete|peered|snaptrim|snaptrim_wait|snaptrim_error')
-            for s in states:
-                states_validator.valid(s)
+            states_validator = _validators.PG_STATES
+            if not states_validator.valid_all(states):
+                for s in states:
+                    states_validator.valid(s)
             cmd['states'] = states
 
+        if self.pg_index is not None:
+            if self.pg_index.stale():
+                self.pg_index.refresh(self)
+            return self.pg_index.pg_ls(osd = osd, pool = cmd.get('pool'), states = cmd.get('states'))
+
         result = self.run_ceph_command(cmd, inbuf = '')
         return result
 
@@ -2631,22 +2757,23 @@ class Ceph():
         if states is not None:
             if not isinstance(states, list):
                 return TypeError('变量states的类型错误, 应为list')
-            states_validator = ceph_argparse.CephChoices(strings = 'stale|creating|active|activating|clean|recovery_wait|recovery_toofull|recovering|forced_recovery|down|recovery_unfound|backfill_unfound|undersized|degraded|remapped|premerge|scrubbing|deep|inconsistent|peering|repair|backfill_wait|backfilling|forced_backfill|backfill_toofull|incomplete|peered|snaptrim|snaptrim_wait|snaptrim_error')
-            for s in states:
-                states_validator.valid(s)
+            states_validator = _validators.PG_STATES
+            if not states_validator.valid_all(states):
+                for s in states:
+                    states_validator.valid(s)
             cmd['states'] = states
 
         result = self.run_ceph_command(cmd, inbuf = '')
         return result
 
-    def pg_ls_by_primary(self, osd, pool = None, states = None): # 部分完成测试, osd参数不起作用, 输出均为所有OSD的池
+    def pg_ls_by_primary(self, osd, pool = None, states = None): # 部分完成测试
         '''
         列出指定primary OSD的PG
         :param osd: str, 满足CephOsdName(), OSD的名称, 格式为 '<id>' 或 'osd.<id>'
         :param pool: int, 满足CephInt(range = ''), 存储池ID, 不指定时默认作用于所有存储池
         :param states: list, 允许多个, 满足CephChoices(strings = 'stale|creating|active|activating|clean|recovery_wait|recovery_toofull|recovering|forced_recovery|down|recovery_unfound|backfill_unfound|undersized|degraded|remapped|premerge|scrubbing|deep|inconsistent|peering|repair|backfill_wait|backfilling|forced_backfill|backfill_toofull|incomplete|peered|snaptrim|snaptrim_wait|snaptrim_error')
             指定状态, 不指定时默认作用于所有状态
-        :return: tuple, (int ret, str outbuf, str outs), json格式
+        :return: tuple, (int ret, str outbuf, str outs), json格式, 指定了pg_index时pg_stats中的记录只包含pgid、state、up、up_primary、acting、acting_primary
         :raise CephError: 执行错误时引发CephError
         :raise rados.Error: RADOS引起的问题描述
         '''
@@ -2654,25 +2781,33 @@ class Ceph():
 
         if not isinstance(osd, str):
             return TypeError('变量osd的类型错误, 应为str')
-        osd_validator = ceph_argparse.CephOsdName()
+        osd_validator = _validators.OSD_NAME
         osd_validator.valid(osd)
-        cmd['OSD'] = osd # 为啥OSD是要大写才行？？？？OMG！
+        if osd == '*': # CephOsdName接受 '*', 但该命令需要具体的OSD
+            return ValueError('变量osd的取值错误, 应为具体的OSD名称')
+        cmd['osd'] = osd # MON只识别小写的osd, 大写的OSD会被忽略并返回所有OSD的PG
 
         if pool is not None:
             if not isinstance(pool, int):
                 return TypeError('变量pool的类型错误, 应为int')
-            pool_validator = ceph_argparse.CephInt(range = '')
+            pool_validator = _validators.INT
             pool_validator.valid(str(pool))
             cmd['pool'] = pool
 
         if states is not None:
             if not isinstance(states, list):
                 return TypeError('变量states的类型错误, 应为list')
-            states_validator = ceph_argparse.CephChoices(strings = 'stale|creating|active|activating|clean|recovery_wait|recovery_toofull|recovering|forced_recovery|down|recovery_unfound|backfill_unfound|undersized|degraded|remapped|premerge|scrubbing|deep|inconsistent|peering|repair|backfill_wait|backfilling|forced_backfill|backfill_toofull|incomplete|peered|snaptrim|snaptrim_wait|snaptrim_error')
-            for s in states:
-                states_validator.valid(s)
+            states_validator = _validators.PG_STATES
+            if not states_validator.valid_all(states):
+                for s in states:
+                    states_validator.valid(s)
             cmd['states'] = states
 
+        if self.pg_index is not None:
+            if self.pg_index.stale():
+                self.pg_index.refresh(self)
+            return self.pg_index.pg_ls(primary = osd, pool = cmd.get('pool'), states = cmd.get('states'))
+
         result = self.run_ceph_command(cmd, inbuf = '')
         return result
 
@@ -2702,7 +2837,7 @@ class Ceph():
 
         if not isinstance(pgid, str):
             return TypeError('变量pgid的类型错误, 应为str')
-        pgid_validator = ceph_argparse.CephPgid()
+        pgid_validator = _validators.PGID
         pgid_validator.valid(pgid)
         cmd['pgid'] = pgid
 
@@ -2721,7 +2856,7 @@ class Ceph():
 
         if not isinstance(pgid, str):
             return TypeError('变量pgid的类型错误, 应为str')
-        pgid_validator = ceph_argparse.CephPgid()
+        pgid_validator = _validators.PGID
         pgid_validator.valid(pgid)
         cmd['pgid'] = pgid
 
@@ -2778,17 +2913,14 @@ class Ceph():
                 return TypeError('变量daemon的类型错误, 应为str')
             daemon_split = daemon.split('.')
             if daemon_split[0] is not 'auth':
-                daemon_validator = ceph_argparse.CephName()
+                daemon_validator = _validators.NAME
                 daemon_validator.valid(daemon)
             cmd.append(daemon)
 
             cmd.append('config')
             cmd.append('show')
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -2809,7 +2941,7 @@ class Ceph():
         if detail is not None:
             if not isinstance(detail, str):
                 return TypeError('变量detail的类型错误, 应为str')
-            detail_validator = ceph_argparse.CephChoices(strings = 'detail')
+            detail_validator = _validators.DETAIL
             detail_validator.valid(detail)
             cmd['detail'] = detail
 
@@ -2830,7 +2962,7 @@ class Ceph():
         if type is not None:
             if not isinstance(type, str):
                 return TypeError('变量type的类型错误, 应为str')
-            type_validator = ceph_argparse.CephChoices(strings = 'all|osd|mon|mds|mgr')
+            type_validator = _validators.NODE_TYPES
             type_validator.valid(type)
             cmd['type'] = type
 
@@ -2873,7 +3005,7 @@ class Ceph():
 
         if not isinstance(target, str):
             return TypeError('变量target的类型错误, 应为str')
-        target_validator = ceph_argparse.CephName()
+        target_validator = _validators.NAME
         target_validator.valid(target)
         cmd['target'] = target
 
@@ -2913,7 +3045,7 @@ class Ceph():
                 return TypeError('变量target的类型错误, 应为str')
             target_split = target.split('.')
             if not target_split[0].isdigit():
-                target_validator = ceph_argparse.CephName()
+                target_validator = _validators.NAME
                 target_validator.valid(target)
             cmd.append(target)
 
@@ -2924,10 +3056,7 @@ class Ceph():
                     return TypeError('变量args的元素类型错误, 应为str')
                 cmd.append(s)
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
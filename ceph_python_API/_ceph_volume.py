@@ -1,6 +1,6 @@
 # -*- coding: UTF-8 -*-
-import ceph_argparse
-import subprocess
+import _validators
+import _metrics
 
 class Ceph_Volume():
 
@@ -23,7 +23,7 @@ class Ceph_Volume():
 
             if not isinstance(objectstore, str):
                 return TypeError('变量objectstore的类型错误, 应为str')
-            objectstore_validator = ceph_argparse.CephChoices(strings = '--filestore|--bluestore')
+            objectstore_validator = _validators.OBJECTSTORES
             objectstore_validator.valid(objectstore)
             cmd.append(objectstore)
 
@@ -39,10 +39,7 @@ class Ceph_Volume():
                     cmd.append('--block.db')
                     cmd.append(db)
 
-            result = ['', '']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -55,10 +52,7 @@ class Ceph_Volume():
         try:
             cmd = ['ceph-volume', 'lvm', 'list']
 
-            result = ['', '']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -85,14 +79,11 @@ class Ceph_Volume():
             if destory is not False:
                 if not isinstance(destory, bool):
                     return TypeError('变量destory的类型错误, 应为bool')
-                destory_validator = ceph_argparse.CephBool(strings = '')
+                destory_validator = _validators.BOOL
                 destory_validator.valid(str(destory))
                 cmd.append('--destroy')
 
-            result = ['', '']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -110,7 +101,7 @@ class Ceph_Volume():
 
             if not isinstance(osd_id, int):
                 return TypeError('变量osd_id的类型错误, 应为int')
-            osd_id_validator = ceph_argparse.CephInt(range = '0')
+            osd_id_validator = _validators.INT_NON_NEGATIVE
             osd_id_validator.valid(str(osd_id))
             cmd.append('--osd-id')
             cmd.append(str(osd_id))
@@ -118,15 +109,12 @@ class Ceph_Volume():
             if osd_fsid is not None:
                 if not isinstance(osd_fsid, str):
                     return TypeError('变量osd_fsid的类型错误, 应为str')
-                path_validator = ceph_argparse.CephString(goodchars = '[A-Fa-f0-9-]')
+                path_validator = _validators.HEX_STRING
                 path_validator.valid(osd_fsid)
                 cmd.append('--osd-fsid')
                 cmd.append(osd_fsid)
 
-            result = ['', '']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -150,7 +138,7 @@ class Ceph_Volume():
 
             if not isinstance(objectstore, str):
                 return TypeError('变量objectstore的类型错误, 应为str')
-            objectstore_validator = ceph_argparse.CephChoices(strings = '--filestore|--bluestore')
+            objectstore_validator = _validators.OBJECTSTORES
             objectstore_validator.valid(objectstore)
             cmd.append(objectstore)
 
@@ -166,10 +154,7 @@ class Ceph_Volume():
                     cmd.append('--block.db')
                     cmd.append(db)
 
-            result = ['', '']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -191,26 +176,23 @@ class Ceph_Volume():
             if all is not False:
                 if not isinstance(all, bool):
                     return TypeError('变量all的类型错误, 应为bool')
-                all_validator = ceph_argparse.CephBool(strings = '')
+                all_validator = _validators.BOOL
                 all_validator.valid(str(all))
                 cmd.append('--all')
             else:
                 if not isinstance(id, int):
                     return TypeError('变量id的类型错误, 应为int')
-                id_validator = ceph_argparse.CephInt(range = '0')
+                id_validator = _validators.INT_NON_NEGATIVE
                 id_validator.valid(str(id))
                 cmd.append(str(id))
 
                 if not isinstance(fsid, str):
                     return TypeError('变量fsid的类型错误, 应为str')
-                path_validator = ceph_argparse.CephString(goodchars = '[A-Fa-f0-9-]')
+                path_validator = _validators.HEX_STRING
                 path_validator.valid(fsid)
                 cmd.append(fsid)
 
-            result = ['', '']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
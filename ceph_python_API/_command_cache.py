@@ -0,0 +1,278 @@
+# -*- coding: UTF-8 -*-
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# 只读的MON命令, 只有这些命令的结果允许被缓存或共享, 其余命令 (会修改集群状态) 一律直接发送给MON
+READ_ONLY_PREFIXES = frozenset([
+    'auth export', 'auth get', 'auth get-key', 'auth list', 'auth ls', 'auth print-key', 'auth print_key',
+    'crash info', 'crash ls',
+    'health',
+    'mon dump', 'mon stat',
+    'node ls',
+    'osd blocked-by',
+    'osd crush class ls', 'osd crush class ls-osd', 'osd crush dump', 'osd crush get-device-class', 'osd crush ls',
+    'osd crush rule dump', 'osd crush rule list', 'osd crush rule ls', 'osd crush rule ls-by-class',
+    'osd df', 'osd dump',
+    'osd erasure-code-profile get', 'osd erasure-code-profile ls',
+    'osd find', 'osd getcrushmap', 'osd getmap', 'osd getmaxosd',
+    'osd ls', 'osd ls-tree', 'osd lspools', 'osd map', 'osd metadata', 'osd perf',
+    'osd pool get', 'osd pool ls', 'osd pool stats',
+    'osd stat', 'osd test-reweight-by-pg', 'osd test-reweight-by-utilization', 'osd tree', 'osd utilization',
+    'pg dump', 'pg dump_json', 'pg dump_pools_json', 'pg dump_stuck', 'pg getmap',
+    'pg ls', 'pg ls-by-osd', 'pg ls-by-pool', 'pg ls-by-primary', 'pg map', 'pg stat',
+    'status', 'version', 'versions',
+])
+
+# 默认缓存的命令及其有效期, 单位为秒, 仪表盘各页面轮询的命令
+DEFAULT_TTLS = {
+    'status': 2,
+    'health': 2,
+    'pg stat': 2,
+    'osd stat': 2,
+    'osd perf': 2,
+    'osd pool stats': 2,
+    'osd df': 5,
+    'pg dump': 5,
+    'osd tree': 10,
+    'osd dump': 10,
+    'osd ls': 10,
+    'osd pool ls': 10,
+    'mon stat': 10,
+    'mon dump': 30,
+    'osd lspools': 30,
+    'osd crush dump': 30,
+    'versions': 60,
+    'version': 60,
+}
+
+# 只在osdmap版本号 (epoch) 变化时才会变化的命令, 其缓存结果一直有效直到epoch变化, 而不是按固定TTL过期
+DEFAULT_EPOCH_PREFIXES = frozenset([
+    'osd dump', 'osd tree', 'osd ls', 'osd ls-tree', 'osd lspools', 'osd getmaxosd', 'osd getmap', 'osd pool ls',
+    'osd crush dump', 'osd crush ls', 'osd crush rule dump', 'osd crush rule ls', 'osd crush rule list', 'osd crush class ls',
+    'osd crush class ls-osd', 'osd getcrushmap', 'osd erasure-code-profile ls', 'osd erasure-code-profile get',
+])
+
+# 会修改集群状态的命令执行后, 除同类命令 (prefix首个单词相同) 外还需要失效的缓存
+SUMMARY_PREFIXES = ('status', 'health')
+
+def is_read_only(prefix):
+    '''
+    判断MON命令是否只读
+    :param prefix: str, 命令的prefix, 如 'osd tree'
+    :return: bool
+    '''
+    return prefix in READ_ONLY_PREFIXES
+
+def osdmap_epoch(outbuf):
+    '''
+    从osd stat的输出中取得osdmap版本号
+    :param outbuf: str/bytes, osd stat的outbuf, json格式
+    :return: int
+    '''
+    stat = json.loads(outbuf)
+    if 'osdmap' in stat: # 旧版本的输出格式
+        stat = stat['osdmap']
+    return stat['epoch']
+
+class CommandCache():
+    '''
+    只读MON命令的TTL读穿透缓存, 以run_ceph_command()发送的序列化cmd和inbuf为键, 按prefix设置有效期, 超过内存上限时按LRU淘汰
+    未在ttls中配置的命令以及所有会修改集群状态的命令不会被缓存, 也不会从缓存中返回
+    :param ttls: dict, prefix -> 有效期 (秒), 与DEFAULT_TTLS合并, 值为None或0时表示不缓存该命令, prefix必须为只读命令
+    :param max_bytes: int, 缓存内容 (outbuf、outs和键) 的估算内存上限, 单位为字节, 默认为64MB
+    :param epoch_prefixes: list, 允许多个, 元素为str, 按osdmap epoch失效的只读命令, 这些命令的结果在epoch变化前一直有效, 不受ttls限制, 不指定时默认为DEFAULT_EPOCH_PREFIXES, 为空时关闭该模式
+    '''
+
+    ENTRY_OVERHEAD = 200 # 每个缓存条目的估算固定开销, 单位为字节
+
+    def __init__(self, ttls = None, max_bytes = 64 * 1024 * 1024, epoch_prefixes = None):
+        if not isinstance(max_bytes, int) or max_bytes < 0:
+            raise TypeError('变量max_bytes的类型错误, 应为非负整数')
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # key -> (过期时间, prefix, result, size, epoch), 末尾为最近使用的条目
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.epoch_invalidations = 0
+
+        if epoch_prefixes is None:
+            epoch_prefixes = DEFAULT_EPOCH_PREFIXES
+        for prefix in epoch_prefixes:
+            if not is_read_only(prefix):
+                raise ValueError('{} 不是只读命令, 不允许缓存'.format(prefix))
+        self.epoch_prefixes = frozenset(epoch_prefixes)
+
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls is not None:
+            if not isinstance(ttls, dict):
+                raise TypeError('变量ttls的类型错误, 应为dict')
+            for prefix, ttl in ttls.items():
+                self.set_ttl(prefix, ttl)
+
+    def set_ttl(self, prefix, ttl):
+        '''
+        设置指定命令的缓存有效期
+        :param prefix: str, 只读命令的prefix
+        :param ttl: float, 有效期, 单位为秒, 为None或0时表示不缓存该命令
+        :raise ValueError: prefix不是只读命令时引发ValueError
+        '''
+        if not is_read_only(prefix):
+            raise ValueError('{} 不是只读命令, 不允许缓存'.format(prefix))
+        if not ttl:
+            self.ttls.pop(prefix, None)
+            self.invalidate([prefix])
+        else:
+            self.ttls[prefix] = ttl
+
+    def cacheable(self, prefix):
+        '''
+        判断命令是否会被缓存
+        :param prefix: str, 命令的prefix
+        :return: bool
+        '''
+        return (prefix in self.ttls or prefix in self.epoch_prefixes) and is_read_only(prefix)
+
+    def epoch_bound(self, prefix):
+        '''
+        判断命令的缓存是否按osdmap epoch失效
+        :param prefix: str, 命令的prefix
+        :return: bool
+        '''
+        return prefix in self.epoch_prefixes
+
+    @staticmethod
+    def key(cmd_json, inbuf):
+        '''
+        生成缓存键
+        :param cmd_json: str, run_ceph_command()发送的序列化cmd
+        :param inbuf: str, 输入缓冲
+        '''
+        return (cmd_json, inbuf)
+
+    @staticmethod
+    def _size(key, result):
+        size = CommandCache.ENTRY_OVERHEAD + len(key[0]) + len(key[1])
+        for s in result[1:]:
+            if s is not None:
+                size += len(s)
+        return size
+
+    def get(self, key, epoch = None):
+        '''
+        读取缓存
+        :param key: 由key()生成的缓存键
+        :param epoch: int, 当前的osdmap epoch, 仅对按epoch失效的命令有效, 与写入时的epoch不一致时视为失效
+        :return: tuple (int ret, str outbuf, str outs), 未命中、已过期或epoch已变化时返回None
+        '''
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= now:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if entry[4] is not None and entry[4] != epoch:
+                self._remove(key)
+                self.epoch_invalidations += 1
+                self.misses += 1
+                return None
+            self._entries[key] = self._entries.pop(key) # 移到末尾, 标记为最近使用
+            self.hits += 1
+            return entry[2]
+
+    def put(self, prefix, key, result, epoch = None):
+        '''
+        写入缓存, 不可缓存的命令以及执行失败的结果会被忽略
+        :param prefix: str, 命令的prefix
+        :param key: 由key()生成的缓存键
+        :param result: tuple (int ret, str outbuf, str outs)
+        :param epoch: int, 执行命令前获取的osdmap epoch, 对按epoch失效的命令必须指定, 为None时按TTL过期
+        '''
+        if not self.cacheable(prefix) or result[0] != 0:
+            return
+        size = self._size(key, result)
+        if size > self.max_bytes:
+            return
+        if epoch is not None and self.epoch_bound(prefix):
+            expires = float('inf')
+        elif prefix in self.ttls:
+            expires = time.time() + self.ttls[prefix]
+            epoch = None
+        else:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires, prefix, result, size, epoch)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        # 调用时须持有self._lock
+        entry = self._entries.pop(key)
+        self._bytes -= entry[3]
+
+    def invalidate(self, prefixes = None):
+        '''
+        使缓存失效
+        :param prefixes: list, 允许多个, 元素为str, 需要失效的命令prefix, 不指定时清空全部缓存
+        :return: int, 失效的条目数量
+        '''
+        with self._lock:
+            if prefixes is None:
+                count = len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+                return count
+            prefixes = set(prefixes)
+            keys = [k for k, entry in self._entries.items() if entry[1] in prefixes]
+            for k in keys:
+                self._remove(k)
+            return len(keys)
+
+    def invalidate_for(self, prefix):
+        '''
+        在会修改集群状态的命令执行后调用, 使受影响的缓存失效: 同类命令 (prefix首个单词相同, 如osd out会失效osd dump、osd tree、osd stat等) 以及status、health
+        :param prefix: str, 已执行命令的prefix
+        :return: int, 失效的条目数量
+        '''
+        if is_read_only(prefix):
+            return 0
+        family = prefix.split(' ', 1)[0] + ' '
+        with self._lock:
+            keys = [k for k, entry in self._entries.items() if entry[1].startswith(family) or entry[1] in SUMMARY_PREFIXES]
+            for k in keys:
+                self._remove(k)
+            return len(keys)
+
+    def stats(self):
+        '''
+        获取缓存统计信息
+        :return: dict, 包括命中数、未命中数、命中率、淘汰数、过期数、epoch变化导致的失效数、条目数量和估算内存占用
+        '''
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': float(self.hits) / total if total else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'epoch_invalidations': self.epoch_invalidations,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
@@ -0,0 +1,702 @@
+# -*- coding: UTF-8 -*-
+'''
+CRUSH算法及Ceph使用的哈希函数的纯Python实现, 与Ceph 14.2.22的src/crush/mapper.c、src/crush/hash.c、src/common/ceph_hash.cc一致
+只支持straw2类型的bucket (Luminous之后的默认类型), 不支持choose_local_fallback_tries大于0的旧版 (argonaut) 参数
+    import _crush
+    crush = _crush.CrushMap.from_crush_dump(outbuf) # Ceph.osd_crush_dump()的outbuf
+    crush.do_rule(0, x = pps, result_max = 3, weights = osd_weights)
+'''
+import json
+
+CRUSH_ITEM_NONE = 0x7fffffff # 没有选出OSD的位置
+CRUSH_ITEM_UNDEF = 0x7ffffffe
+CRUSH_HASH_RJENKINS1 = 0
+CRUSH_HASH_SEED = 1315423911
+BUCKET_ALGS = {1: 'uniform', 2: 'list', 3: 'tree', 4: 'straw', 5: 'straw2'}
+RULE_TYPES = {1: 'replicated', 3: 'erasure'}
+
+_M = 0xffffffff
+
+def _mix(a, b, c):
+    # Bob Jenkins的lookup2哈希的mix, 参数和返回值均为32位无符号整数
+    a = (a - b - c) & _M
+    a ^= c >> 13
+    b = (b - c - a) & _M
+    b ^= (a << 8) & _M
+    c = (c - a - b) & _M
+    c ^= b >> 13
+    a = (a - b - c) & _M
+    a ^= c >> 12
+    b = (b - c - a) & _M
+    b ^= (a << 16) & _M
+    c = (c - a - b) & _M
+    c ^= b >> 5
+    a = (a - b - c) & _M
+    a ^= c >> 3
+    b = (b - c - a) & _M
+    b ^= (a << 10) & _M
+    c = (c - a - b) & _M
+    c ^= b >> 15
+    return a, b, c
+
+def str_hash_rjenkins(data):
+    '''
+    ceph_str_hash_rjenkins, 对象名到PG的哈希 (pg_pool_t的object_hash为2)
+    :param data: bytes/str, str按utf-8编码
+    :return: int, 32位无符号整数
+    '''
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    length = len(data)
+    a = b = 0x9e3779b9
+    c = 0
+    k = 0
+    remaining = length
+    while remaining >= 12:
+        a = (a + int.from_bytes(data[k:k + 4], 'little')) & _M
+        b = (b + int.from_bytes(data[k + 4:k + 8], 'little')) & _M
+        c = (c + int.from_bytes(data[k + 8:k + 12], 'little')) & _M
+        a, b, c = _mix(a, b, c)
+        k += 12
+        remaining -= 12
+    c = (c + length) & _M
+    tail = data[k:]
+    # 最后不足12字节的部分: a取第0-3字节, b取第4-7字节, c取第8-10字节 (c的最低字节保留给长度)
+    a = (a + int.from_bytes(tail[0:4], 'little')) & _M
+    b = (b + int.from_bytes(tail[4:8], 'little')) & _M
+    c = (c + (int.from_bytes(tail[8:11], 'little') << 8)) & _M
+    a, b, c = _mix(a, b, c)
+    return c
+
+def hash32_2(a, b):
+    '''
+    crush_hash32_rjenkins1_2
+    :return: int, 32位无符号整数
+    '''
+    a &= _M
+    b &= _M
+    h = CRUSH_HASH_SEED ^ a ^ b
+    x = 231232
+    y = 1232
+    a, b, h = _mix(a, b, h)
+    x, a, h = _mix(x, a, h)
+    b, y, h = _mix(b, y, h)
+    return h
+
+def hash32_3(a, b, c):
+    '''
+    crush_hash32_rjenkins1_3
+    :return: int, 32位无符号整数
+    '''
+    a &= _M
+    b &= _M
+    c &= _M
+    h = CRUSH_HASH_SEED ^ a ^ b ^ c
+    x = 231232
+    y = 1232
+    a, b, h = _mix(a, b, h)
+    c, x, h = _mix(c, x, h)
+    y, a, h = _mix(y, a, h)
+    b, x, h = _mix(b, x, h)
+    y, c, h = _mix(y, c, h)
+    return h
+
+def stable_mod(x, b, bmask):
+    '''
+    ceph_stable_mod, PG数量不是2的幂时保持映射稳定的取模
+    '''
+    if (x & bmask) < b:
+        return x & bmask
+    return x & (bmask >> 1)
+
+def calc_bits_of(n):
+    '''
+    :return: int, n的有效位数, 即cbits()
+    '''
+    return n.bit_length()
+
+def pg_mask(pg_num):
+    '''
+    :return: int, pg_num_mask (或pgp_num_mask)
+    '''
+    return (1 << calc_bits_of(pg_num - 1)) - 1
+
+# crush_ln()使用的查找表, 与Ceph src/crush/crush_ln_table.h中的__RH_LH_tbl、__LL_tbl逐项相同, 不能按公式重新生成:
+#   RH_LH_tbl[2*k] 为 2^48/(1.0+k/128.0) 向上取整, RH_LH_tbl[2*k+1] 为 2^48*log2(1.0+k/128.0) 向下取整, k = 0..128
+#   LL_tbl[k] 约为 2^48*log2(1.0+k/2^15), k >= 2 的项带有固定偏移 0x147700000, 为保持映射结果一致按原样保留
+_RH_LH_TBL = (
+    0x0001000000000000, 0x0000000000000000, 0x0000fe03f80fe040, 0x000002dfca16dde1,
+    0x0000fc0fc0fc0fc1, 0x000005b9e5a170b4, 0x0000fa232cf25214, 0x0000088e68ea899a,
+    0x0000f83e0f83e0f9, 0x00000b5d69bac77e, 0x0000f6603d980f67, 0x00000e26fd5c8555,
+    0x0000f4898d5f85bc, 0x000010eb389fa29f, 0x0000f2b9d6480f2c, 0x000013aa2fdd27f1,
+    0x0000f0f0f0f0f0f1, 0x00001663f6fac913, 0x0000ef2eb71fc435, 0x00001918a16e4633,
+    0x0000ed7303b5cc0f, 0x00001bc84240adab, 0x0000ebbdb2a5c162, 0x00001e72ec117fa5,
+    0x0000ea0ea0ea0ea1, 0x00002118b119b4f3, 0x0000e865ac7b7604, 0x000023b9a32eaa56,
+    0x0000e6c2b4481cd9, 0x00002655d3c4f15c, 0x0000e525982af70d, 0x000028ed53f307ee,
+    0x0000e38e38e38e39, 0x00002b803473f7ad, 0x0000e1fc780e1fc8, 0x00002e0e85a9de04,
+    0x0000e070381c0e08, 0x0000309857a05e07, 0x0000dee95c4ca038, 0x0000331dba0efce1,
+    0x0000dd67c8a60dd7, 0x0000359ebc5b69d9, 0x0000dbeb61eed19d, 0x0000381b6d9bb29b,
+    0x0000da740da740db, 0x00003a93dc9864b2, 0x0000d901b2036407, 0x00003d0817ce9cd4,
+    0x0000d79435e50d7a, 0x00003f782d7204d0, 0x0000d62b80d62b81, 0x000041e42b6ec0c0,
+    0x0000d4c77b03531e, 0x0000444c1f6b4c2d, 0x0000d3680d3680d4, 0x000046b016ca47c1,
+    0x0000d20d20d20d21, 0x000049101eac381c, 0x0000d0b69fcbd259, 0x00004b6c43f1366a,
+    0x0000cf6474a8819f, 0x00004dc4933a9337, 0x0000ce168a772509, 0x0000501918ec6c11,
+    0x0000cccccccccccd, 0x00005269e12f346e, 0x0000cb8727c065c4, 0x000054b6f7f1325a,
+    0x0000ca4587e6b750, 0x0000570068e7ef5a, 0x0000c907da4e8712, 0x000059463f919dee,
+    0x0000c7ce0c7ce0c8, 0x00005b8887367433, 0x0000c6980c6980c7, 0x00005dc74ae9fbec,
+    0x0000c565c87b5f9e, 0x00006002958c5871, 0x0000c4372f855d83, 0x0000623a71cb82c8,
+    0x0000c30c30c30c31, 0x0000646eea247c5c, 0x0000c1e4bbd595f7, 0x000066a008e4788c,
+    0x0000c0c0c0c0c0c1, 0x000068cdd829fd81, 0x0000bfa02fe80bfb, 0x00006af861e5fc7d,
+    0x0000be82fa0be830, 0x00006d1fafdce20a, 0x0000bd6910470767, 0x00006f43cba79e40,
+    0x0000bc52640bc527, 0x00007164beb4a56d, 0x0000bb3ee721a54e, 0x000073829248e961,
+    0x0000ba2e8ba2e8bb, 0x0000759d4f80cba8, 0x0000b92143fa36f6, 0x000077b4ff5108d9,
+    0x0000b81702e05c0c, 0x000079c9aa879d53, 0x0000b70fbb5a19bf, 0x00007bdb59cca388,
+    0x0000b60b60b60b61, 0x00007dea15a32c1b, 0x0000b509e68a9b95, 0x00007ff5e66a0ffe,
+    0x0000b40b40b40b41, 0x000081fed45cbccb, 0x0000b30f63528918, 0x00008404e793fb81,
+    0x0000b21642c8590c, 0x000086082806b1d5, 0x0000b11fd3b80b12, 0x000088089d8a9e47,
+    0x0000b02c0b02c0b1, 0x00008a064fd50f2a, 0x0000af3addc680b0, 0x00008c01467b94bb,
+    0x0000ae4c415c9883, 0x00008df988f4ae80, 0x0000ad602b580ad7, 0x00008fef1e987409,
+    0x0000ac7691840ac8, 0x000091e20ea1393e, 0x0000ab8f69e2835a, 0x000093d2602c2e5f,
+    0x0000aaaaaaaaaaab, 0x000095c01a39fbd6, 0x0000a9c84a47a080, 0x000097ab43af59f9,
+    0x0000a8e83f5717c1, 0x00009993e355a4e5, 0x0000a80a80a80a81, 0x00009b79ffdb6c8b,
+    0x0000a72f0539782a, 0x00009d5d9fd5010b, 0x0000a655c4392d7c, 0x00009f3ec9bcfb80,
+    0x0000a57eb50295fb, 0x0000a11d83f4c355, 0x0000a4a9cf1d9684, 0x0000a2f9d4c51039,
+    0x0000a3d70a3d70a4, 0x0000a4d3c25e68dc, 0x0000a3065e3fae7d, 0x0000a6ab52d99e76,
+    0x0000a237c32b16d0, 0x0000a8808c384547, 0x0000a16b312ea8fd, 0x0000aa5374652a1c,
+    0x0000a0a0a0a0a0a1, 0x0000ac241134c4e9, 0x00009fd809fd80a0, 0x0000adf26865a8a1,
+    0x00009f1165e72549, 0x0000afbe7fa0f04d, 0x00009e4cad23dd60, 0x0000b1885c7aa982,
+    0x00009d89d89d89d9, 0x0000b35004723c46, 0x00009cc8e160c3fc, 0x0000b5157cf2d078,
+    0x00009c09c09c09c1, 0x0000b6d8cb53b0ca, 0x00009b4c6f9ef03b, 0x0000b899f4d8ab63,
+    0x00009a90e7d95bc7, 0x0000ba58feb2703a, 0x000099d722dabde6, 0x0000bc15edfeed32,
+    0x0000991f1a515886, 0x0000bdd0c7c9a817, 0x00009868c809868d, 0x0000bf89910c1678,
+    0x000097b425ed097c, 0x0000c1404eadf383, 0x000097012e025c05, 0x0000c2f5058593d9,
+    0x0000964fda6c0965, 0x0000c4a7ba58377c, 0x000095a02568095b, 0x0000c65871da59dd,
+    0x000094f2094f2095, 0x0000c80730b00016, 0x0000944580944581, 0x0000c9b3fb6d0559,
+    0x0000939a85c4093a, 0x0000cb5ed69565af, 0x000092f113840498, 0x0000cd07c69d8702,
+    0x0000924924924925, 0x0000ceaecfea8085, 0x000091a2b3c4d5e7, 0x0000d053f6d26089,
+    0x000090fdbc090fdc, 0x0000d1f73f9c70c0, 0x0000905a38633e07, 0x0000d398ae817906,
+    0x00008fb823ee08fc, 0x0000d53847ac00a6, 0x00008f1779d9fdc4, 0x0000d6d60f388e41,
+    0x00008e78356d1409, 0x0000d8720935e643, 0x00008dda5202376a, 0x0000da0c39a54804,
+    0x00008d3dcb08d3dd, 0x0000dba4a47aa996, 0x00008ca29c046515, 0x0000dd3b4d9cf24b,
+    0x00008c08c08c08c1, 0x0000ded038e633f3, 0x00008b70344a139c, 0x0000e0636a23e2ee,
+    0x00008ad8f2fba939, 0x0000e1f4e5170d02, 0x00008a42f870566a, 0x0000e384ad748f0e,
+    0x000089ae4089ae41, 0x0000e512c6e54998, 0x0000891ac73ae982, 0x0000e69f35065448,
+    0x0000888888888889, 0x0000e829fb693044, 0x000087f78087f781, 0x0000e9b31d93f98e,
+    0x00008767ab5f34e5, 0x0000eb3a9f019750, 0x000086d905447a35, 0x0000ecc08321eb30,
+    0x0000864b8a7de6d2, 0x0000ee44cd59ffab, 0x000085bf37612cef, 0x0000efc781043579,
+    0x0000853408534086, 0x0000f148a170700a, 0x000084a9f9c8084b, 0x0000f2c831e44116,
+    0x0000842108421085, 0x0000f446359b1353, 0x0000839930523fbf, 0x0000f5c2afc65447,
+    0x000083126e978d50, 0x0000f73da38d9d4a, 0x0000828cbfbeb9a1, 0x0000f8b7140edbb1,
+    0x0000820820820821, 0x0000fa2f045e7832, 0x000081848da8faf1, 0x0000fba577877d7d,
+    0x0000810204081021, 0x0000fd1a708bbe11, 0x0000808080808081, 0x0000fe8df263f957,
+    0x0000800000000000, 0x0001000000000000,
+)
+
+_LL_TBL = (
+    0x0000000000000000, 0x00000002e2a60a00, 0x000000070cb64ec5, 0x00000009ef50ce67,
+    0x0000000cd1e588fd, 0x0000000fb4747e9c, 0x0000001296fdaf5e, 0x0000001579811b58,
+    0x000000185bfec2a1, 0x0000001b3e76a552, 0x0000001e20e8c380, 0x0000002103551d43,
+    0x00000023e5bbb2b2, 0x00000026c81c83e4, 0x00000029aa7790f0, 0x0000002c8cccd9ed,
+    0x0000002f6f1c5ef2, 0x0000003251662017, 0x0000003533aa1d71, 0x0000003815e8571a,
+    0x0000003af820cd26, 0x0000003dda537fae, 0x00000040bc806ec8, 0x000000439ea79a8c,
+    0x0000004680c90310, 0x0000004962e4a86c, 0x0000004c44fa8ab6, 0x0000004f270aaa06,
+    0x0000005209150672, 0x00000054eb19a013, 0x00000057cd1876fd, 0x0000005aaf118b4a,
+    0x0000005d9104dd0f, 0x0000006072f26c64, 0x0000006354da3960, 0x0000006636bc441a,
+    0x0000006918988ca8, 0x0000006bfa6f1322, 0x0000006edc3fd79f, 0x00000071be0ada35,
+    0x000000749fd01afd, 0x00000077818f9a0c, 0x0000007a6349577a, 0x0000007d44fd535e,
+    0x0000008026ab8dce, 0x00000083085406e3, 0x00000085e9f6beb2, 0x00000088cb93b552,
+    0x0000008bad2aeadc, 0x0000008e8ebc5f65, 0x0000009170481305, 0x0000009451ce05d3,
+    0x00000097334e37e5, 0x0000009a14c8a953, 0x0000009cf63d5a33, 0x0000009fd7ac4a9d,
+    0x000000a2b9157aa8, 0x000000a59a78ea6a, 0x000000a87bd699fb, 0x000000ab5d2e8970,
+    0x000000ae3e80b8e3, 0x000000b11fcd2869, 0x000000b40113d818, 0x000000b6e254c80a,
+    0x000000b9c38ff853, 0x000000bca4c5690c, 0x000000bf85f51a4a, 0x000000c2671f0c26,
+    0x000000c548433eb6, 0x000000c82961b211, 0x000000cb0a7a664d, 0x000000cdeb8d5b82,
+    0x000000d0cc9a91c8, 0x000000d3ada20933, 0x000000d68ea3c1dd, 0x000000d96f9fbbdb,
+    0x000000dc5095f744, 0x000000df31867430, 0x000000e2127132b5, 0x000000e4f35632ea,
+    0x000000e7d43574e6, 0x000000eab50ef8c1, 0x000000ed95e2be90, 0x000000f076b0c66c,
+    0x000000f35779106a, 0x000000f6383b9ca2, 0x000000f918f86b2a, 0x000000fbf9af7c1a,
+    0x000000feda60cf88, 0x00000101bb0c658c, 0x000001049bb23e3c, 0x000001077c5259af,
+    0x0000010a5cecb7fc, 0x0000010d3d81593a, 0x000001101e103d7f, 0x00000112fe9964e4,
+    0x00000115df1ccf7e, 0x00000118bf9a7d64, 0x0000011ba0126ead, 0x0000011e8084a371,
+    0x0000012160f11bc6, 0x000001244157d7c3, 0x0000012721b8d77f, 0x0000012a02141b10,
+    0x0000012ce269a28e, 0x0000012fc2b96e0f, 0x00000132a3037daa, 0x000001358347d177,
+    0x000001386386698c, 0x0000013b43bf45ff, 0x0000013e23f266e9, 0x00000141041fcc5e,
+    0x00000143e4477678, 0x00000146c469654b, 0x00000149a48598f0, 0x0000014c849c117c,
+    0x0000014f64accf08, 0x0000015244b7d1a9, 0x0000015524bd1976, 0x0000015804bca687,
+    0x0000015ae4b678f2, 0x0000015dc4aa90ce, 0x00000160a498ee31, 0x0000016384819134,
+    0x00000166646479ec, 0x000001694441a870, 0x0000016c24191cd7, 0x0000016f03ead738,
+    0x00000171e3b6d7aa, 0x00000174c37d1e44, 0x00000177a33dab1c, 0x0000017a82f87e49,
+    0x0000017d62ad97e2, 0x00000180425cf7fe, 0x0000018322069eb3, 0x0000018601aa8c19,
+    0x00000188e148c046, 0x0000018bc0e13b52, 0x0000018ea073fd52, 0x000001918001065d,
+    0x000001945f88568b, 0x000001973f09edf2, 0x0000019a1e85ccaa, 0x0000019cfdfbf2c8,
+    0x0000019fdd6c6063, 0x000001a2bcd71593, 0x000001a59c3c126e, 0x000001a87b9b570b,
+    0x000001ab5af4e380, 0x000001ae3a48b7e5, 0x000001b11996d450, 0x000001b3f8df38d9,
+    0x000001b6d821e595, 0x000001b9b75eda9b, 0x000001bc96961803, 0x000001bf75c79de3,
+    0x000001c254f36c51, 0x000001c534198365, 0x000001c81339e336, 0x000001caf2548bd9,
+    0x000001cdd1697d67, 0x000001d0b078b7f5, 0x000001d38f823b9a, 0x000001d66e86086d,
+    0x000001d94d841e86, 0x000001dc2c7c7df9, 0x000001df0b6f26df, 0x000001e1ea5c194e,
+    0x000001e4c943555d, 0x000001e7a824db23, 0x000001ea8700aab5, 0x000001ed65d6c42b,
+    0x000001f044a7279d, 0x000001f32371d51f, 0x000001f60236ccca, 0x000001f8e0f60eb3,
+    0x000001fbbfaf9af3, 0x000001fe9e63719e, 0x000002017d1192cc, 0x000002045bb9fe94,
+    0x000002073a5cb50d, 0x0000020a18f9b64d, 0x0000020cf791026a, 0x0000020fd622997c,
+    0x00000212b4ae7b99, 0x000002159334a8d8, 0x0000021871b52150, 0x0000021b502fe517,
+    0x0000021e2ea4f444, 0x000002210d144eee, 0x00000223eb7df52c, 0x00000226c9e1e713,
+    0x00000229a84024bb, 0x0000022c8698ae3b, 0x0000022f64eb83a8, 0x000002324338a51b,
+    0x00000235218012a9, 0x00000237ffc1cc69, 0x0000023addfdd272, 0x0000023dbc3424db,
+    0x000002409a64c3ba, 0x00000243788faf25, 0x0000024656b4e735, 0x0000024934d46bfe,
+    0x0000024c12ee3d98, 0x0000024ef1025c1a, 0x00000251cf10c799, 0x00000254ad19802e,
+    0x000002578b1c85ee, 0x0000025a6919d8f0, 0x0000025d4711794b, 0x0000026025036716,
+    0x0000026302efa266, 0x00000265e0d62b53, 0x00000268beb701f3, 0x0000026b9c92265e,
+    0x0000026e7a6798a9, 0x00000271583758eb, 0x000002743601673b, 0x0000027713c5c3b0,
+    0x00000279f1846e5f, 0x0000027ccf3d6761, 0x0000027facf0aecb, 0x000002828a9e44b3,
+    0x0000028568462932, 0x0000028845e85c5c, 0x0000028b2384de4a, 0x0000028e011baf11,
+    0x00000290deaccec8, 0x00000293bc383d86, 0x0000029699bdfb61, 0x00000299773e086f,
+    0x0000029c54b864c9, 0x0000029f322d1083, 0x000002a20f9c0bb5, 0x000002a4ed055676,
+    0x000002a7ca68f0db, 0x000002aaa7c6dafc, 0x000002ad851f14ef, 0x000002b062719eca,
+    0x000002b33fbe78a5, 0x000002b61d05a296, 0x000002b8fa471cb3, 0x000002bbd782e713,
+    0x000002beb4b901cc, 0x000002c191e96cf6, 0x000002c46f1428a6, 0x000002c74c3934f4,
+    0x000002ca295891f6, 0x000002cd06723fc2, 0x000002cfe3863e6e, 0x000002d2c0948e13,
+    0x000002d59d9d2ec6, 0x000002d87aa0209d, 0x000002db579d63b0, 0x000002de3494f814,
+)
+
+def crush_ln(xin):
+    '''
+    :param xin: int, 0 - 0xffff
+    :return: int, 2^44*log2(xin+1), 定点数
+    '''
+    x = xin + 1
+    iexpon = 15
+    if not x & 0x18000:
+        bits = 16 - (x & 0x1ffff).bit_length()
+        x <<= bits
+        iexpon = 15 - bits
+    index1 = (x >> 8) << 1
+    rh = _RH_LH_TBL[index1 - 256]
+    lh = _RH_LH_TBL[index1 + 1 - 256]
+    xl64 = (x * rh) >> 48
+    result = iexpon << 44
+    lh += _LL_TBL[xl64 & 0xff]
+    lh >>= 48 - 12 - 32
+    return result + lh
+
+_LN = None
+
+def ln_table():
+    '''
+    :return: list, 长度为65536, 第u个元素为crush_ln(u) - 2^48 (不大于0), straw2中用于计算draw
+    '''
+    global _LN
+    if _LN is None:
+        _LN = [crush_ln(u) - 0x1000000000000 for u in range(0x10000)]
+    return _LN
+
+def _div64(a, b):
+    # C语言的有符号整数除法, 向0取整
+    q = abs(a) // abs(b)
+    return q if (a >= 0) == (b > 0) else -q
+
+class Bucket():
+    '''
+    :param id: int, 负数
+    :param type_id: int, bucket类型
+    :param alg: str, 'straw2' 等
+    :param hash: int, 哈希算法, 0为rjenkins1
+    :param items: tuple, 子节点ID
+    :param weights: tuple, 子节点权重, 16.16定点数
+    '''
+
+    def __init__(self, id, type_id, alg, hash, items, weights):
+        self.id = id
+        self.type_id = type_id
+        self.alg = alg
+        self.hash = hash
+        self.items = tuple(items)
+        self.weights = tuple(weights)
+
+class Rule():
+    '''
+    :param steps: list, 元素为tuple (op, arg1, arg2), op与osd crush dump中的名称一致, 如 'take'、'chooseleaf_firstn'、'emit', arg2为类型ID
+    '''
+
+    def __init__(self, rule_id, ruleset, type, min_size, max_size, steps, name = None):
+        self.rule_id = rule_id
+        self.ruleset = ruleset
+        self.type = type
+        self.min_size = min_size
+        self.max_size = max_size
+        self.steps = list(steps)
+        self.name = name
+
+DEFAULT_TUNABLES = {
+    'choose_local_tries': 0,
+    'choose_local_fallback_tries': 0,
+    'choose_total_tries': 50,
+    'chooseleaf_descend_once': 1,
+    'chooseleaf_vary_r': 1,
+    'chooseleaf_stable': 1,
+    'straw_calc_version': 1, # 以下两项不影响straw2的计算, 只在编码时使用
+    'allowed_bucket_algs': 54,
+}
+
+class CrushMap():
+    '''
+    CRUSH map, 可由osd crush dump的json或osd getcrushmap的二进制数据 (_crush_decode) 构造
+    :param buckets: dict, bucket ID -> Bucket
+    :param rules: dict, rule ID -> Rule
+    :param max_devices: int, 最大设备编号 + 1
+    :param tunables: dict, 与DEFAULT_TUNABLES的键一致
+    :param types: dict, 类型ID -> 类型名称
+    :param names: dict, 节点ID -> 名称
+    :param choose_args: dict, choose_args索引 (存储池ID, -1为默认) -> {bucket ID: (ids tuple 或 None, weight_set list 或 None)}, weight_set的每个元素为一个位置的权重tuple
+    :param device_classes: dict, OSD编号 -> 设备类型
+    '''
+
+    def __init__(self, buckets, rules, max_devices, tunables = None, types = None, names = None, choose_args = None, device_classes = None):
+        self.buckets = buckets
+        self.rules = rules
+        self.max_devices = max_devices
+        self.tunables = dict(DEFAULT_TUNABLES)
+        self.tunables.update(tunables or {})
+        self.types = types or {}
+        self.names = names or {}
+        self.choose_args = choose_args or {}
+        self.device_classes = device_classes or {}
+
+    @classmethod
+    def from_crush_dump(cls, outbuf):
+        '''
+        :param outbuf: bytes/str/dict, Ceph.osd_crush_dump()返回的outbuf或其解码结果
+        :return: CrushMap
+        '''
+        data = outbuf
+        if isinstance(data, (bytes, bytearray)):
+            data = data.decode('utf-8')
+        if isinstance(data, str):
+            data = json.loads(data)
+        types = dict((t['type_id'], t['name']) for t in data.get('types', []))
+        type_ids = dict((name, i) for i, name in types.items())
+        names = {}
+        device_classes = {}
+        max_devices = 0
+        for d in data.get('devices', []):
+            names[d['id']] = d['name']
+            if d.get('class'):
+                device_classes[d['id']] = d['class']
+            max_devices = max(max_devices, d['id'] + 1)
+        buckets = {}
+        for b in data.get('buckets', []):
+            names[b['id']] = b['name']
+            buckets[b['id']] = Bucket(b['id'], b['type_id'], b['alg'], 0 if b.get('hash', 'rjenkins1') == 'rjenkins1' else b['hash'],
+                                      [item['id'] for item in b['items']], [item['weight'] for item in b['items']])
+        rules = {}
+        for r in data.get('rules', []):
+            steps = []
+            for s in r['steps']:
+                op = s['op']
+                if op == 'take':
+                    steps.append((op, s['item'], 0))
+                elif op == 'emit' or op == 'noop':
+                    steps.append((op, 0, 0))
+                elif op.startswith('set_'):
+                    steps.append((op, s['num'], 0))
+                else:
+                    steps.append((op, s['num'], type_ids[s['type']]))
+            rule_type = r.get('type', 1)
+            rules[r['rule_id']] = Rule(r['rule_id'], r.get('ruleset', r['rule_id']), rule_type, r.get('min_size', 1), r.get('max_size', 10), steps, name = r.get('rule_name'))
+        tunables = dict((k, v) for k, v in data.get('tunables', {}).items() if k in DEFAULT_TUNABLES)
+        choose_args = {}
+        for index, args in data.get('choose_args', {}).items():
+            per_bucket = {}
+            for arg in args:
+                ids = tuple(arg['ids']) if arg.get('ids') else None
+                weight_set = [tuple(int(round(w * 0x10000)) for w in position) for position in arg['weight_set']] if arg.get('weight_set') else None
+                per_bucket[arg['bucket_id']] = (ids, weight_set)
+            choose_args[int(index)] = per_bucket
+        return cls(buckets, rules, max_devices, tunables = tunables, types = types, names = names, choose_args = choose_args, device_classes = device_classes)
+
+    def find_rule(self, ruleset, type, size):
+        '''
+        :return: int, 存储池使用的rule ID, 没有匹配的rule时返回-1
+        '''
+        rule = self.rules.get(ruleset)
+        if rule is not None and rule.ruleset == ruleset:
+            return rule.rule_id
+        for rule in self.rules.values():
+            if rule.ruleset == ruleset and rule.type == type and rule.min_size <= size <= rule.max_size:
+                return rule.rule_id
+        return -1
+
+    def get_choose_args(self, index):
+        # 先找存储池自己的choose_args, 再找默认的 (-1)
+        args = self.choose_args.get(index)
+        if args is None:
+            args = self.choose_args.get(-1)
+        return args
+
+    def bucket_choose(self, bucket, x, r, args, position):
+        '''
+        bucket_straw2_choose
+        :return: int, 选中的子节点ID
+        '''
+        if bucket.alg != 'straw2':
+            raise ValueError('不支持的bucket类型: {} ({})'.format(bucket.alg, bucket.id))
+        weights = bucket.weights
+        ids = bucket.items
+        if args is not None:
+            arg = args.get(bucket.id)
+            if arg is not None:
+                if arg[1]:
+                    weights = arg[1][min(position, len(arg[1]) - 1)]
+                if arg[0]:
+                    ids = arg[0]
+        ln = ln_table()
+        high = 0
+        high_draw = 0
+        for i in range(len(ids)):
+            if weights[i]:
+                u = hash32_3(x, ids[i], r) & 0xffff
+                draw = _div64(ln[u], weights[i])
+            else:
+                draw = -0x8000000000000000
+            if i == 0 or draw > high_draw:
+                high = i
+                high_draw = draw
+        return bucket.items[high]
+
+    def _type_of(self, item):
+        if item >= 0:
+            return 0
+        return self.buckets[item].type_id
+
+    def is_out(self, weights, item, x):
+        if item >= len(weights):
+            return True
+        w = weights[item]
+        if w >= 0x10000:
+            return False
+        if w == 0:
+            return True
+        return (hash32_2(x, item) & 0xffff) >= w
+
+    def choose_firstn(self, bucket, weights, x, numrep, type, out, outpos, out_size, tries, recurse_tries,
+                      local_retries, local_fallback_retries, recurse_to_leaf, vary_r, stable, out2, parent_r, args):
+        '''
+        crush_choose_firstn, out和out2为list, 原地写入
+        :return: int, 新的outpos
+        '''
+        count = out_size
+        rep = 0 if stable else outpos
+        while rep < numrep and count > 0:
+            ftotal = 0
+            skip_rep = False
+            while True:
+                retry_descent = False
+                in_bucket = bucket
+                flocal = 0
+                while True:
+                    collide = False
+                    retry_bucket = False
+                    r = rep + parent_r + ftotal
+                    reject = False
+                    item = None
+                    if not in_bucket.items:
+                        reject = True
+                    else:
+                        if local_fallback_retries > 0 and flocal >= (len(in_bucket.items) >> 1) and flocal > local_fallback_retries:
+                            raise ValueError('不支持choose_local_fallback_tries (bucket_perm_choose)')
+                        item = self.bucket_choose(in_bucket, x, r, args, outpos)
+                        if item >= self.max_devices:
+                            skip_rep = True
+                            break
+                        itemtype = self._type_of(item)
+                        if itemtype != type:
+                            if item >= 0 or item not in self.buckets:
+                                skip_rep = True
+                                break
+                            in_bucket = self.buckets[item]
+                            retry_bucket = True
+                            continue
+                        for i in range(outpos):
+                            if out[i] == item:
+                                collide = True
+                                break
+                        if not collide and recurse_to_leaf:
+                            if item < 0:
+                                sub_r = r >> (vary_r - 1) if vary_r else 0
+                                if self.choose_firstn(self.buckets[item], weights, x, 1 if stable else outpos + 1, 0, out2, outpos, count,
+                                                      recurse_tries, 0, local_retries, local_fallback_retries, False, vary_r, stable,
+                                                      None, sub_r, args) <= outpos:
+                                    reject = True
+                            else:
+                                out2[outpos] = item
+                        if not reject and not collide and itemtype == 0:
+                            reject = self.is_out(weights, item, x)
+                    if reject or collide:
+                        ftotal += 1
+                        flocal += 1
+                        if collide and flocal <= local_retries:
+                            retry_bucket = True
+                        elif local_fallback_retries > 0 and flocal <= len(in_bucket.items) + local_fallback_retries:
+                            retry_bucket = True
+                        elif ftotal < tries:
+                            retry_descent = True
+                        else:
+                            skip_rep = True
+                    if not retry_bucket:
+                        break
+                if not retry_descent:
+                    break
+            if not skip_rep:
+                out[outpos] = item
+                outpos += 1
+                count -= 1
+            rep += 1
+        return outpos
+
+    def choose_indep(self, bucket, weights, x, left, numrep, type, out, outpos, tries, recurse_tries, recurse_to_leaf, out2, parent_r, args):
+        '''
+        crush_choose_indep, out和out2为list, 原地写入, 没有选出的位置为CRUSH_ITEM_NONE
+        '''
+        endpos = outpos + left
+        for rep in range(outpos, endpos):
+            out[rep] = CRUSH_ITEM_UNDEF
+            if out2 is not None:
+                out2[rep] = CRUSH_ITEM_UNDEF
+        ftotal = 0
+        while left > 0 and ftotal < tries:
+            for rep in range(outpos, endpos):
+                if out[rep] != CRUSH_ITEM_UNDEF:
+                    continue
+                in_bucket = bucket
+                while True:
+                    r = rep + parent_r
+                    if in_bucket.alg == 'uniform' and len(in_bucket.items) % numrep == 0:
+                        r += (numrep + 1) * ftotal
+                    else:
+                        r += numrep * ftotal
+                    if not in_bucket.items:
+                        break
+                    item = self.bucket_choose(in_bucket, x, r, args, outpos)
+                    if item >= self.max_devices:
+                        out[rep] = CRUSH_ITEM_NONE
+                        if out2 is not None:
+                            out2[rep] = CRUSH_ITEM_NONE
+                        left -= 1
+                        break
+                    itemtype = self._type_of(item)
+                    if itemtype != type:
+                        if item >= 0 or item not in self.buckets:
+                            out[rep] = CRUSH_ITEM_NONE
+                            if out2 is not None:
+                                out2[rep] = CRUSH_ITEM_NONE
+                            left -= 1
+                            break
+                        in_bucket = self.buckets[item]
+                        continue
+                    if item in out[outpos:endpos]:
+                        break
+                    if recurse_to_leaf:
+                        if item < 0:
+                            self.choose_indep(self.buckets[item], weights, x, 1, numrep, 0, out2, rep, recurse_tries, 0, False, None, r, args)
+                            if out2[rep] == CRUSH_ITEM_NONE:
+                                break
+                        else:
+                            out2[rep] = item
+                    if itemtype == 0 and self.is_out(weights, item, x):
+                        break
+                    out[rep] = item
+                    left -= 1
+                    break
+            ftotal += 1
+        for rep in range(outpos, endpos):
+            if out[rep] == CRUSH_ITEM_UNDEF:
+                out[rep] = CRUSH_ITEM_NONE
+            if out2 is not None and out2[rep] == CRUSH_ITEM_UNDEF:
+                out2[rep] = CRUSH_ITEM_NONE
+
+    def do_rule(self, ruleno, x, result_max, weights, choose_args_index = -1):
+        '''
+        crush_do_rule
+        :param ruleno: int, rule ID
+        :param x: int, 输入, 对PG为pps
+        :param result_max: int, 最多选出的数量, 通常为存储池的size
+        :param weights: list, 按OSD编号的权重 (reweight), 16.16定点数, 0x10000为in, 0为out
+        :param choose_args_index: int, choose_args索引, 通常为存储池ID
+        :return: list, 选出的OSD编号, indep规则中没有选出的位置为CRUSH_ITEM_NONE
+        '''
+        rule = self.rules[ruleno]
+        args = self.get_choose_args(choose_args_index)
+        t = self.tunables
+        choose_tries = t['choose_total_tries'] + 1
+        choose_leaf_tries = 0
+        local_retries = t['choose_local_tries']
+        local_fallback_retries = t['choose_local_fallback_tries']
+        vary_r = t['chooseleaf_vary_r']
+        stable = t['chooseleaf_stable']
+        result = []
+        w = []
+        for op, arg1, arg2 in rule.steps:
+            if op == 'take':
+                if (0 <= arg1 < self.max_devices) or arg1 in self.buckets:
+                    w = [arg1]
+            elif op == 'set_choose_tries':
+                if arg1 > 0:
+                    choose_tries = arg1
+            elif op == 'set_chooseleaf_tries':
+                if arg1 > 0:
+                    choose_leaf_tries = arg1
+            elif op == 'set_choose_local_tries':
+                if arg1 >= 0:
+                    local_retries = arg1
+            elif op == 'set_choose_local_fallback_tries':
+                if arg1 >= 0:
+                    local_fallback_retries = arg1
+            elif op == 'set_chooseleaf_vary_r':
+                if arg1 >= 0:
+                    vary_r = arg1
+            elif op == 'set_chooseleaf_stable':
+                if arg1 >= 0:
+                    stable = arg1
+            elif op in ('choose_firstn', 'chooseleaf_firstn', 'choose_indep', 'chooseleaf_indep'):
+                if not w:
+                    continue
+                firstn = op.endswith('firstn')
+                recurse_to_leaf = op.startswith('chooseleaf')
+                o = []
+                c = []
+                for item in w:
+                    numrep = arg1
+                    if numrep <= 0:
+                        numrep += result_max
+                        if numrep <= 0:
+                            continue
+                    if item not in self.buckets:
+                        continue
+                    room = result_max - len(o)
+                    if firstn:
+                        if choose_leaf_tries:
+                            recurse_tries = choose_leaf_tries
+                        elif t['chooseleaf_descend_once']:
+                            recurse_tries = 1
+                        else:
+                            recurse_tries = choose_tries
+                        out = [0] * room
+                        out2 = [0] * room
+                        n = self.choose_firstn(self.buckets[item], weights, x, numrep, arg2, out, 0, room, choose_tries, recurse_tries,
+                                               local_retries, local_fallback_retries, recurse_to_leaf, vary_r, stable, out2, 0, args)
+                    else:
+                        n = min(numrep, room)
+                        out = [0] * n
+                        out2 = [0] * n
+                        self.choose_indep(self.buckets[item], weights, x, n, numrep, arg2, out, 0, choose_tries,
+                                          choose_leaf_tries if choose_leaf_tries else 1, recurse_to_leaf, out2, 0, args)
+                    o.extend(out[:n])
+                    c.extend(out2[:n])
+                w = c if recurse_to_leaf else o
+            elif op == 'emit':
+                for item in w:
+                    if len(result) >= result_max:
+                        break
+                    result.append(item)
+                w = []
+        return result
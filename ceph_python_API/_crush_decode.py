@@ -0,0 +1,272 @@
+# -*- coding: UTF-8 -*-
+'''
+osd getcrushmap返回的二进制CRUSH map (CrushWrapper::encode, Ceph 14.2.22) 的纯Python解码, 结果为_crush.CrushMap
+按memoryview上的偏移用struct读取, 同类型的数组 (bucket的子节点、权重) 一次解包, 不生成中间副本
+    import _ceph
+    import _crush_decode
+    ret, outbuf, outs = _ceph.Ceph().osd_getcrushmap()
+    crush = _crush_decode.decode_crushmap(outbuf)
+    crush.do_rule(0, 1234, 3, [0x10000] * crush.max_devices)
+encode_crushmap()按相同格式编码, 供_fake_cluster生成osd getcrushmap的输出
+'''
+import _crush
+from _encoding import DecodeError, Reader, Writer
+
+CRUSH_MAGIC = 0x00010000
+
+BUCKET_UNIFORM = 1
+BUCKET_LIST = 2
+BUCKET_TREE = 3
+BUCKET_STRAW = 4
+BUCKET_STRAW2 = 5
+
+# crush_opcodes
+RULE_OPS = {
+    0: 'noop',
+    1: 'take',
+    2: 'choose_firstn',
+    3: 'choose_indep',
+    4: 'emit',
+    6: 'chooseleaf_firstn',
+    7: 'chooseleaf_indep',
+    8: 'set_choose_tries',
+    9: 'set_chooseleaf_tries',
+    10: 'set_choose_local_tries',
+    11: 'set_choose_local_fallback_tries',
+    12: 'set_chooseleaf_vary_r',
+    13: 'set_chooseleaf_stable',
+}
+RULE_OP_CODES = dict((name, code) for code, name in RULE_OPS.items())
+
+# 数据中没有tunables时 (很旧的CRUSH map) 使用的legacy值
+LEGACY_TUNABLES = {
+    'choose_local_tries': 2,
+    'choose_local_fallback_tries': 5,
+    'choose_total_tries': 19,
+    'chooseleaf_descend_once': 0,
+    'chooseleaf_vary_r': 0,
+    'chooseleaf_stable': 0,
+    'straw_calc_version': 0,
+    'allowed_bucket_algs': (1 << BUCKET_UNIFORM) | (1 << BUCKET_LIST) | (1 << BUCKET_STRAW),
+}
+
+def _int_string_map(r):
+    return dict((r.s32(), r.string()) for _ in range(r.u32()))
+
+def _decode_bucket(r):
+    bucket_id = r.s32()
+    type_id = r.u16()
+    alg = r.u8()
+    hash = r.u8()
+    r.u32() # 总权重, 由子节点权重得出
+    size = r.u32()
+    items = r.array('i', size)
+    if alg == BUCKET_UNIFORM:
+        weights = (r.u32(),) * size
+    elif alg in (BUCKET_LIST, BUCKET_STRAW):
+        weights = r.array('I', 2 * size)[::2] # item_weights与sum_weights/straws交替存放
+    elif alg == BUCKET_TREE:
+        nodes = r.array('I', r.u8())
+        weights = tuple(nodes[((j + 1) << 1) - 1] for j in range(size))
+    elif alg == BUCKET_STRAW2:
+        weights = r.array('I', size)
+    else:
+        raise DecodeError('未知的bucket算法: {} ({})'.format(alg, bucket_id))
+    return _crush.Bucket(bucket_id, type_id, _crush.BUCKET_ALGS[alg], hash, items, weights)
+
+def _decode_rule(r, rule_id):
+    length = r.u32()
+    ruleset, rule_type, min_size, max_size = r.array('B', 4)
+    raw = r.array('i', 3 * length)
+    steps = []
+    for j in range(length):
+        code, arg1, arg2 = raw[3 * j:3 * j + 3]
+        op = RULE_OPS.get(code)
+        if op is None:
+            raise DecodeError('未知的rule步骤: {} (rule {})'.format(code, rule_id))
+        if op in ('choose_firstn', 'choose_indep', 'chooseleaf_firstn', 'chooseleaf_indep'):
+            steps.append((op, arg1, arg2))
+        elif op in ('emit', 'noop'):
+            steps.append((op, 0, 0))
+        else:
+            steps.append((op, arg1, 0))
+    return _crush.Rule(rule_id, ruleset, rule_type, min_size, max_size, steps)
+
+def decode_crushmap(data, reader = None):
+    '''
+    :param data: bytes/memoryview, osd getcrushmap的outbuf, 或osdmap中嵌入的CRUSH map
+    :param reader: _encoding.Reader, 从已有的Reader的当前位置解码 (此时忽略data)
+    :return: _crush.CrushMap
+    :raise DecodeError: 数据格式错误或被截断
+    '''
+    r = reader or Reader(data)
+    magic = r.u32()
+    if magic != CRUSH_MAGIC:
+        raise DecodeError('CRUSH map的magic错误: {:#x}'.format(magic))
+    max_buckets = r.s32()
+    max_rules = r.u32()
+    max_devices = r.s32()
+
+    buckets = {}
+    for _ in range(max_buckets):
+        if r.u32() == 0: # 该位置没有bucket
+            continue
+        bucket = _decode_bucket(r)
+        buckets[bucket.id] = bucket
+    rules = {}
+    for i in range(max_rules):
+        if r.u32() == 0:
+            continue
+        rules[i] = _decode_rule(r, i)
+
+    types = _int_string_map(r)
+    names = _int_string_map(r)
+    for rule_id, name in _int_string_map(r).items():
+        if rule_id in rules:
+            rules[rule_id].name = name
+
+    tunables = dict(LEGACY_TUNABLES)
+    if r.remaining():
+        tunables['choose_local_tries'] = r.u32()
+        tunables['choose_local_fallback_tries'] = r.u32()
+        tunables['choose_total_tries'] = r.u32()
+    if r.remaining():
+        tunables['chooseleaf_descend_once'] = r.u32()
+    if r.remaining():
+        tunables['chooseleaf_vary_r'] = r.u8()
+    if r.remaining():
+        tunables['straw_calc_version'] = r.u8()
+    if r.remaining():
+        tunables['allowed_bucket_algs'] = r.u32()
+    if r.remaining():
+        tunables['chooseleaf_stable'] = r.u8()
+
+    device_classes = {}
+    choose_args = {}
+    if r.remaining():
+        class_map = dict((r.s32(), r.s32()) for _ in range(r.u32()))
+        class_name = _int_string_map(r)
+        for _ in range(r.u32()): # class_bucket, 影子bucket的名称中已包含这些信息
+            r.s32()
+            r.skip(8 * r.u32())
+        device_classes = dict((item, class_name[c]) for item, c in class_map.items() if item >= 0 and c in class_name)
+        for _ in range(r.u32()):
+            index = r.s64()
+            per_bucket = {}
+            for _ in range(r.u32()):
+                bucket_id = -1 - r.u32()
+                weight_set = [r.vector('I') for _ in range(r.u32())]
+                ids = r.vector('i')
+                per_bucket[bucket_id] = (ids or None, weight_set or None)
+            choose_args[index] = per_bucket
+
+    return _crush.CrushMap(buckets, rules, max_devices, tunables = tunables, types = types, names = names, choose_args = choose_args,
+                           device_classes = device_classes)
+
+def encode_crushmap(crush, writer = None):
+    '''
+    按Ceph 14.2.22 (包含luminous的设备类型和choose_args) 的格式编码, 只支持uniform、list和straw2类型的bucket
+    :param crush: _crush.CrushMap
+    :param writer: _encoding.Writer, 追加到已有的Writer
+    :return: bytes, 指定writer时返回None
+    '''
+    w = writer or Writer()
+    alg_codes = dict((name, code) for code, name in _crush.BUCKET_ALGS.items())
+    max_buckets = max([-1 - i for i in crush.buckets] + [-1]) + 1
+    max_rules = max(list(crush.rules) + [-1]) + 1
+    w.u32(CRUSH_MAGIC)
+    w.s32(max_buckets)
+    w.u32(max_rules)
+    w.s32(crush.max_devices)
+
+    for i in range(max_buckets):
+        b = crush.buckets.get(-1 - i)
+        if b is None:
+            w.u32(0)
+            continue
+        alg = alg_codes[b.alg]
+        w.u32(alg)
+        w.s32(b.id)
+        w.u16(b.type_id)
+        w.u8(alg)
+        w.u8(b.hash)
+        w.u32(sum(b.weights) & 0xffffffff)
+        w.u32(len(b.items))
+        w.array('i', b.items)
+        if alg == BUCKET_UNIFORM:
+            w.u32(b.weights[0] if b.weights else 0)
+        elif alg == BUCKET_LIST:
+            total = 0
+            for weight in b.weights:
+                total += weight
+                w.u32(weight)
+                w.u32(total)
+        elif alg == BUCKET_STRAW2:
+            w.array('I', b.weights)
+        else:
+            raise ValueError('不支持编码的bucket类型: {} ({})'.format(b.alg, b.id))
+
+    for i in range(max_rules):
+        rule = crush.rules.get(i)
+        if rule is None:
+            w.u32(0)
+            continue
+        w.u32(1)
+        w.u32(len(rule.steps))
+        w.array('B', (rule.ruleset, rule.type, rule.min_size, rule.max_size))
+        for op, arg1, arg2 in rule.steps:
+            w.array('i', (RULE_OP_CODES[op], arg1, arg2))
+
+    for m in (crush.types, crush.names, dict((i, rule.name) for i, rule in crush.rules.items() if rule.name)):
+        w.u32(len(m))
+        for k in sorted(m):
+            w.s32(k)
+            w.string(m[k])
+
+    t = crush.tunables
+    for key in ('choose_local_tries', 'choose_local_fallback_tries', 'choose_total_tries', 'chooseleaf_descend_once'):
+        w.u32(t[key])
+    w.u8(t['chooseleaf_vary_r'])
+    w.u8(t['straw_calc_version'])
+    w.u32(t['allowed_bucket_algs'])
+    w.u8(t['chooseleaf_stable'])
+
+    class_ids = dict((name, i) for i, name in enumerate(sorted(set(crush.device_classes.values()))))
+    w.u32(len(crush.device_classes))
+    for item in sorted(crush.device_classes):
+        w.s32(item)
+        w.s32(class_ids[crush.device_classes[item]])
+    w.u32(len(class_ids))
+    for name, i in sorted(class_ids.items(), key = lambda x: x[1]):
+        w.s32(i)
+        w.string(name)
+    # 影子bucket (名称为 '<bucket>~<设备类型>') 与原bucket的对应关系
+    ids = dict((name, i) for i, name in crush.names.items())
+    class_bucket = {}
+    for i, name in crush.names.items():
+        if i < 0 and '~' in name:
+            base, device_class = name.split('~', 1)
+            if base in ids and device_class in class_ids:
+                class_bucket.setdefault(ids[base], {})[class_ids[device_class]] = i
+    w.u32(len(class_bucket))
+    for bucket_id in sorted(class_bucket):
+        w.s32(bucket_id)
+        w.u32(len(class_bucket[bucket_id]))
+        for c in sorted(class_bucket[bucket_id]):
+            w.s32(c)
+            w.s32(class_bucket[bucket_id][c])
+
+    w.u32(len(crush.choose_args))
+    for index in sorted(crush.choose_args):
+        per_bucket = crush.choose_args[index]
+        w.s64(index)
+        w.u32(len(per_bucket))
+        for bucket_id in sorted(per_bucket, reverse = True):
+            arg_ids, weight_set = per_bucket[bucket_id]
+            w.u32(-1 - bucket_id)
+            w.u32(len(weight_set or ()))
+            for position in weight_set or ():
+                w.vector('I', position)
+            w.vector('i', arg_ids or ())
+    if writer is None:
+        return w.getvalue()
@@ -0,0 +1,277 @@
+# -*- coding: UTF-8 -*-
+'''
+由osd crush dump或osd tree的输出一次性构建的CRUSH层级索引, 父节点、祖先、子树中的OSD集合和权重均预先计算, 查询为字典查找
+不必为每个节点分别调用osd_find、osd_ls_tree、osd_crush_ls
+    import _ceph
+    import _crush_index
+    indexer = _crush_index.CrushIndexer(_ceph.Ceph())
+    crush = indexer.get() # osdmap epoch不变时返回同一个CrushIndex
+    crush.ancestor('osd.3', 'host') # 'node0'所在的bucket ID
+    crush.location(3) # {'host': 'node0', 'rack': 'rack0', 'root': 'default'}
+    crush.osds_under('rack0', device_class = 'ssd')
+    crush.weight('node0')
+'''
+import json
+import threading
+import time
+import _command_cache
+
+def _load(outbuf):
+    if isinstance(outbuf, (bytes, bytearray)):
+        outbuf = outbuf.decode('utf-8')
+    if isinstance(outbuf, str):
+        return json.loads(outbuf)
+    return outbuf
+
+class CrushIndex():
+    '''
+    CRUSH层级索引, 构建后只读, 可在多个线程间共享
+    节点以ID表示 (OSD为非负数, bucket为负数), 各查询函数的item参数也可以是节点名称, 如 'osd.3'、'node0'
+    权重的单位与osd tree中的crush_weight一致 (通常为TiB), bucket的权重为其子树中所有OSD的权重之和
+    :param nodes: dict, 节点ID -> {'name': str, 'type': str, 'children': list}, OSD的children为空列表
+    :param osd_weights: dict, OSD编号 -> CRUSH权重
+    :param device_classes: dict, OSD编号 -> 设备类型, 如 'hdd'
+    :param epoch: int, 对应的osdmap版本号, 未知时为None
+    '''
+
+    def __init__(self, nodes, osd_weights, device_classes, epoch = None):
+        self.epoch = epoch
+        self.names = dict((i, n['name']) for i, n in nodes.items())
+        self.ids = dict((n['name'], i) for i, n in nodes.items())
+        self.types = dict((i, n['type']) for i, n in nodes.items())
+        self.children = dict((i, tuple(n['children'])) for i, n in nodes.items())
+        self.osd_weights = dict(osd_weights)
+        self.device_classes = dict(device_classes)
+        self.parents = {}
+        for i, children in self.children.items():
+            for child in children:
+                self.parents[child] = i
+        self.roots = tuple(sorted((i for i in nodes if i not in self.parents), reverse = True))
+
+        self.ancestor_chains = {} # 节点ID -> 祖先ID的tuple, 由近及远
+        self.ancestor_types = {} # 节点ID -> {类型: 祖先ID}
+        self.subtree_osds = {} # 节点ID -> 子树中OSD编号的frozenset
+        self.subtree_weights = {} # 节点ID -> 子树权重
+        self.class_osds = {} # (节点ID, 设备类型) -> 子树中该类型OSD编号的frozenset
+        self.class_weights = {} # (节点ID, 设备类型) -> 子树中该类型OSD的权重之和
+        for root in self.roots:
+            self._build(root)
+
+    def _build(self, root):
+        # 先序遍历确定祖先, 后序遍历汇总子树, 用显式栈避免层级较深时递归过深
+        self.ancestor_chains[root] = ()
+        self.ancestor_types[root] = {}
+        stack = [(root, False)]
+        while stack:
+            node, done = stack.pop()
+            if done:
+                self._summarize(node)
+                continue
+            stack.append((node, True))
+            chain = (node,) + self.ancestor_chains[node]
+            types = dict(self.ancestor_types[node])
+            types[self.types[node]] = node
+            for child in self.children.get(node, ()):
+                if child in self.ancestor_chains: # 同一节点出现在多个bucket中时只取第一个
+                    continue
+                self.ancestor_chains[child] = chain
+                self.ancestor_types[child] = types
+                stack.append((child, False))
+
+    def _summarize(self, node):
+        if node >= 0:
+            osds = frozenset([node])
+            weight = self.osd_weights.get(node, 0.0)
+            device_class = self.device_classes.get(node)
+            if device_class is not None:
+                self.class_osds[(node, device_class)] = osds
+                self.class_weights[(node, device_class)] = weight
+        else:
+            osds = set()
+            weight = 0.0
+            by_class = {}
+            for child in self.children.get(node, ()):
+                if child not in self.subtree_osds:
+                    continue
+                osds |= self.subtree_osds[child]
+                weight += self.subtree_weights[child]
+            for osd in osds:
+                device_class = self.device_classes.get(osd)
+                if device_class is not None:
+                    by_class.setdefault(device_class, []).append(osd)
+            for device_class, members in by_class.items():
+                self.class_osds[(node, device_class)] = frozenset(members)
+                self.class_weights[(node, device_class)] = sum(self.osd_weights.get(osd, 0.0) for osd in members)
+            osds = frozenset(osds)
+        self.subtree_osds[node] = osds
+        self.subtree_weights[node] = weight
+
+    @classmethod
+    def from_crush_dump(cls, outbuf, epoch = None):
+        '''
+        :param outbuf: bytes/str/dict, Ceph.osd_crush_dump()返回的outbuf或其解码结果, 名称中含有 ~ 的影子bucket (按设备类型生成) 会被忽略
+        :param epoch: int, 对应的osdmap版本号
+        :return: CrushIndex
+        '''
+        data = _load(outbuf)
+        types = dict((t['type_id'], t['name']) for t in data.get('types', []))
+        nodes = {}
+        weights = {}
+        classes = {}
+        for d in data.get('devices', []):
+            nodes[d['id']] = {'name': d['name'], 'type': types.get(0, 'osd'), 'children': []}
+            if d.get('class'):
+                classes[d['id']] = d['class']
+        for b in data.get('buckets', []):
+            if '~' in b['name']:
+                continue
+            nodes[b['id']] = {'name': b['name'], 'type': b.get('type_name') or types.get(b['type_id']), 'children': [item['id'] for item in b['items']]}
+            for item in b['items']:
+                if item['id'] >= 0:
+                    weights[item['id']] = item['weight'] / float(0x10000)
+        return cls(nodes, weights, classes, epoch = epoch)
+
+    @classmethod
+    def from_osd_tree(cls, outbuf, epoch = None):
+        '''
+        :param outbuf: bytes/str/dict, Ceph.osd_tree()返回的outbuf或其解码结果, stray中的OSD作为没有父节点的节点加入
+        :param epoch: int, 对应的osdmap版本号
+        :return: CrushIndex
+        '''
+        data = _load(outbuf)
+        nodes = {}
+        weights = {}
+        classes = {}
+        for n in data.get('nodes', []) + data.get('stray', []):
+            nodes[n['id']] = {'name': n['name'], 'type': n['type'], 'children': list(reversed(n.get('children', [])))}
+            if n['id'] >= 0:
+                weights[n['id']] = n.get('crush_weight', 0.0)
+                if n.get('device_class'):
+                    classes[n['id']] = n['device_class']
+        return cls(nodes, weights, classes, epoch = epoch)
+
+    def resolve(self, item):
+        '''
+        :param item: int/str, 节点ID或名称
+        :return: int, 节点ID
+        :raise KeyError: 节点不存在
+        '''
+        if isinstance(item, int):
+            if item not in self.names:
+                raise KeyError(item)
+            return item
+        return self.ids[item]
+
+    def name(self, item):
+        return self.names[self.resolve(item)]
+
+    def type(self, item):
+        return self.types[self.resolve(item)]
+
+    def parent(self, item):
+        '''
+        :return: int, 父节点ID, 根节点返回None
+        '''
+        return self.parents.get(self.resolve(item))
+
+    def ancestors(self, item):
+        '''
+        :return: tuple, 祖先节点ID, 由近及远
+        '''
+        return self.ancestor_chains[self.resolve(item)]
+
+    def ancestor(self, item, type):
+        '''
+        :param type: str, 祖先的类型, 如 'host'、'rack'
+        :return: int, 指定类型的祖先节点ID, 不存在时返回None
+        '''
+        return self.ancestor_types[self.resolve(item)].get(type)
+
+    def location(self, item):
+        '''
+        :return: dict, 类型 -> 祖先名称, 与osd find输出中的crush_location格式一致
+        '''
+        return dict((t, self.names[i]) for t, i in self.ancestor_types[self.resolve(item)].items())
+
+    def osds_under(self, item, device_class = None):
+        '''
+        :param item: int/str, 节点ID或名称
+        :param device_class: str, 只包含该设备类型的OSD, 不指定时包含所有OSD
+        :return: frozenset, 子树中的OSD编号
+        '''
+        node = self.resolve(item)
+        if device_class is None:
+            return self.subtree_osds[node]
+        return self.class_osds.get((node, device_class), frozenset())
+
+    def weight(self, item, device_class = None):
+        '''
+        :param item: int/str, 节点ID或名称
+        :param device_class: str, 只计算该设备类型的OSD, 不指定时计算所有OSD
+        :return: float, 子树的CRUSH权重
+        '''
+        node = self.resolve(item)
+        if device_class is None:
+            return self.subtree_weights[node]
+        return self.class_weights.get((node, device_class), 0.0)
+
+    def buckets(self, type = None):
+        '''
+        :param type: str, bucket类型, 如 'host', 不指定时返回所有bucket
+        :return: list, bucket ID
+        '''
+        return [i for i, t in self.types.items() if i < 0 and (type is None or t == type)]
+
+    def classes(self):
+        '''
+        :return: list, 出现过的设备类型, 已排序
+        '''
+        return sorted(set(self.device_classes.values()))
+
+class CrushIndexer():
+    '''
+    按osdmap版本号缓存CrushIndex, 只有epoch变化时才重新获取osd crush dump (或osd tree) 并重建
+    :param ceph: _ceph.Ceph, 用于执行命令
+    :param source: str, 'crush_dump' 或 'osd_tree', 构建索引使用的命令
+    :param check_interval: int/float, 两次检查epoch (osd stat) 的最小间隔, 单位为秒, 默认为0 (每次get()都检查)
+    '''
+
+    def __init__(self, ceph, source = 'crush_dump', check_interval = 0):
+        if source not in ('crush_dump', 'osd_tree'):
+            raise ValueError('变量source的取值错误, 应为crush_dump或osd_tree')
+        self.ceph = ceph
+        self.source = source
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.index = None
+        self.checked = 0.0
+        self.builds = 0 # 重建次数
+
+    def epoch(self):
+        '''
+        :return: int, 当前osdmap版本号
+        '''
+        return _command_cache.osdmap_epoch(self.ceph.osd_stat()[1])
+
+    def get(self):
+        '''
+        :return: CrushIndex, epoch不变时返回同一个对象
+        :raise CephError: 执行错误时引发CephError
+        :raise rados.Error: RADOS引起的问题描述
+        '''
+        with self.lock:
+            index = self.index
+            if index is not None and time.time() - self.checked < self.check_interval:
+                return index
+            epoch = self.epoch()
+            self.checked = time.time()
+            if index is not None and index.epoch == epoch:
+                return index
+            # 先记录epoch再获取输出, 获取期间epoch变化时下一次get()会再次重建
+            if self.source == 'osd_tree':
+                index = CrushIndex.from_osd_tree(self.ceph.osd_tree()[1], epoch = epoch)
+            else:
+                index = CrushIndex.from_crush_dump(self.ceph.osd_crush_dump()[1], epoch = epoch)
+            self.index = index
+            self.builds += 1
+            return index
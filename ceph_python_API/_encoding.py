@@ -0,0 +1,262 @@
+# -*- coding: UTF-8 -*-
+'''
+Ceph二进制编码 (encoding.h, 小端序) 的读写工具, 供_crush_decode和_osdmap_decode使用
+Reader在memoryview上用struct.unpack_from按偏移读取, 不复制底层数据; Writer用于生成相同格式的数据 (_fake_cluster)
+'''
+import struct
+import uuid
+
+_STRUCTS = {}
+
+def _struct(fmt):
+    s = _STRUCTS.get(fmt)
+    if s is None:
+        s = _STRUCTS[fmt] = struct.Struct('<' + fmt)
+    return s
+
+_U8 = _struct('B')
+_U16 = _struct('H')
+_U32 = _struct('I')
+_S32 = _struct('i')
+_U64 = _struct('Q')
+_S64 = _struct('q')
+_F32 = _struct('f')
+_START = _struct('BBI')
+
+class DecodeError(ValueError):
+    '''
+    二进制数据格式错误或被截断
+    '''
+    pass
+
+class Reader():
+    '''
+    :param data: bytes/bytearray/memoryview, 二进制数据
+    :param offset: int, 起始偏移
+    :param end: int, 结束偏移, 不指定时为数据末尾
+    '''
+
+    def __init__(self, data, offset = 0, end = None):
+        self.view = data if isinstance(data, memoryview) else memoryview(data)
+        if self.view.ndim != 1 or self.view.itemsize != 1:
+            self.view = self.view.cast('B')
+        self.pos = offset
+        self.end = len(self.view) if end is None else end
+
+    def remaining(self):
+        return self.end - self.pos
+
+    def _unpack(self, s):
+        pos = self.pos
+        if pos + s.size > self.end:
+            raise DecodeError('数据在偏移{}处被截断, 需要{}字节'.format(pos, s.size))
+        self.pos = pos + s.size
+        return s.unpack_from(self.view, pos)
+
+    def unpack(self, fmt):
+        '''
+        :param fmt: str, struct格式, 不含字节序前缀, 如 'BQIi'
+        :return: tuple
+        '''
+        return self._unpack(_struct(fmt))
+
+    def u8(self):
+        return self._unpack(_U8)[0]
+
+    def u16(self):
+        return self._unpack(_U16)[0]
+
+    def u32(self):
+        return self._unpack(_U32)[0]
+
+    def s32(self):
+        return self._unpack(_S32)[0]
+
+    def u64(self):
+        return self._unpack(_U64)[0]
+
+    def s64(self):
+        return self._unpack(_S64)[0]
+
+    def f32(self):
+        return self._unpack(_F32)[0]
+
+    def array(self, fmt, count):
+        '''
+        一次读取count个相同类型的值
+        :param fmt: str, struct格式字符, 如 'I'、'i'
+        :return: tuple
+        '''
+        if count == 0:
+            return ()
+        return self._unpack(_struct('{}{}'.format(count, fmt)))
+
+    def skip(self, size):
+        if self.pos + size > self.end:
+            raise DecodeError('数据在偏移{}处被截断, 需要{}字节'.format(self.pos, size))
+        self.pos += size
+
+    def bytes(self, size):
+        '''
+        :return: memoryview, 不复制数据
+        '''
+        pos = self.pos
+        self.skip(size)
+        return self.view[pos:pos + size]
+
+    def blob(self):
+        '''
+        bufferlist: u32长度 + 数据
+        :return: memoryview
+        '''
+        return self.bytes(self.u32())
+
+    def string(self):
+        return str(self.blob(), 'utf-8', 'replace')
+
+    def uuid(self):
+        return str(uuid.UUID(bytes = self.bytes(16).tobytes()))
+
+    def utime(self):
+        '''
+        utime_t: u32秒 + u32纳秒
+        :return: float
+        '''
+        sec, nsec = self._unpack(_struct('II'))
+        return sec + nsec / 1e9
+
+    def vector(self, fmt):
+        '''
+        元素为定长数值的vector
+        :return: tuple
+        '''
+        return self.array(fmt, self.u32())
+
+    def string_map(self):
+        return dict((self.string(), self.string()) for _ in range(self.u32()))
+
+    def start(self, compat = None):
+        '''
+        ENCODE_START写入的头部: u8版本 + u8兼容版本 + u32长度
+        :param compat: int, 本解码器支持的最高版本, 数据的兼容版本高于它时引发DecodeError
+        :return: tuple, (int 版本, int 该结构的结束偏移)
+        '''
+        v, c, length = self._unpack(_START)
+        if compat is not None and c > compat:
+            raise DecodeError('不支持的编码版本: {} (兼容版本{})'.format(v, c))
+        end = self.pos + length
+        if end > self.end:
+            raise DecodeError('结构长度{}超出数据末尾'.format(length))
+        return v, end
+
+    def finish(self, end):
+        # 跳过较新版本增加的字段
+        self.pos = end
+
+class Writer():
+    '''
+    按Ceph的编码格式写入, getvalue()返回bytes
+    '''
+
+    def __init__(self):
+        self.buf = bytearray()
+
+    def __len__(self):
+        return len(self.buf)
+
+    def getvalue(self):
+        return bytes(self.buf)
+
+    def _pack(self, s, *values):
+        self.buf += s.pack(*values)
+
+    def pack(self, fmt, *values):
+        self._pack(_struct(fmt), *values)
+
+    def u8(self, v):
+        self._pack(_U8, v)
+
+    def u16(self, v):
+        self._pack(_U16, v)
+
+    def u32(self, v):
+        self._pack(_U32, v)
+
+    def s32(self, v):
+        self._pack(_S32, v)
+
+    def u64(self, v):
+        self._pack(_U64, v)
+
+    def s64(self, v):
+        self._pack(_S64, v)
+
+    def f32(self, v):
+        self._pack(_F32, v)
+
+    def array(self, fmt, values):
+        values = list(values)
+        if values:
+            self._pack(_struct('{}{}'.format(len(values), fmt)), *values)
+
+    def vector(self, fmt, values):
+        values = list(values)
+        self.u32(len(values))
+        self.array(fmt, values)
+
+    def raw(self, data):
+        self.buf += data
+
+    def blob(self, data):
+        self.u32(len(data))
+        self.buf += data
+
+    def string(self, s):
+        self.blob(s.encode('utf-8') if isinstance(s, str) else s)
+
+    def uuid(self, s):
+        self.buf += uuid.UUID(s).bytes if s else bytes(16)
+
+    def utime(self, t):
+        sec = int(t)
+        self._pack(_struct('II'), sec, int(round((t - sec) * 1e9)))
+
+    def string_map(self, m):
+        self.u32(len(m))
+        for k in sorted(m):
+            self.string(k)
+            self.string(m[k])
+
+    def start(self, v, compat):
+        '''
+        :return: int, 头部的偏移, 传给finish()
+        '''
+        offset = len(self.buf)
+        self._pack(_START, v, compat, 0)
+        return offset
+
+    def finish(self, offset):
+        _U32.pack_into(self.buf, offset + 2, len(self.buf) - offset - _START.size)
+
+def _crc32c_table():
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82f63b78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+_CRC32C = _crc32c_table()
+
+def crc32c(crc, data):
+    '''
+    与ceph_crc32c()一致: 以crc为初始值, 不做最终取反, osdmap中的校验和为crc32c(0xffffffff, 数据)
+    :param crc: int, 初始值
+    :param data: bytes/memoryview
+    :return: int
+    '''
+    table = _CRC32C
+    for b in memoryview(data):
+        crc = table[(crc ^ b) & 0xff] ^ (crc >> 8)
+    return crc
@@ -0,0 +1,343 @@
+# -*- coding: UTF-8 -*-
+'''
+内嵌的Prometheus指标接口: 由_poller.Poller在后台刷新status、osd perf、osd df、pg stat和osd pool stats, 每次有新结果时重新生成指标文本并缓存
+HTTP抓取只返回缓存的文本, 不会等待MON
+    import _ceph
+    import _exporter
+    exporter = _exporter.MetricsExporter(_ceph.Ceph(), port = 9284)
+    exporter.start() # http://<host>:9284/metrics
+    exporter.stop()
+标签的基数: 存储池、健康检查项和PG状态的数量有限, 按名称输出;
+OSD数量不超过osd_series_limit时按OSD输出 (标签ceph_daemon), 超过时只输出按device_class聚合的值、固定区间的直方图以及最差的osd_top个OSD,
+因此序列数量不随OSD数量增长
+指标中的速率 (*_per_sec) 为MON统计的近似值, 是gauge; counter只有导出器自身的刷新和抓取次数
+'''
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+import _health_watch
+import _poller
+from _metrics import escape_label
+
+# 名称 -> (刷新间隔 (秒), Ceph的方法名)
+DEFAULT_COMMANDS = {
+    'status': (5, 'status'),
+    'pg_stat': (5, 'pg_stat'),
+    'osd_pool_stats': (5, 'osd_pool_stats'),
+    'osd_perf': (15, 'osd_perf'),
+    'osd_df': (30, 'osd_df'),
+}
+
+HEALTH_VALUES = {'HEALTH_OK': 0, 'HEALTH_WARN': 1, 'HEALTH_ERR': 2}
+
+# 默认监听端口, 9283为mgr prometheus模块的端口, 避免在mgr节点上冲突
+DEFAULT_PORT = 9284
+
+# OSD较多时输出的直方图区间
+UTILIZATION_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95)
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+class _Families():
+    # 按指标名称收集样本, 同一名称的HELP和TYPE只输出一次
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self.order = []
+        self.families = {}
+
+    def add(self, name, kind, help, value, labels = None, suffix = ''):
+        if value is None:
+            return
+        name = '{}_{}'.format(self.namespace, name)
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = (kind, help, [])
+            self.order.append(name)
+        if labels:
+            label = '{' + ','.join('{}="{}"'.format(k, escape_label(str(v))) for k, v in labels) + '}'
+        else:
+            label = ''
+        family[2].append('{}{}{} {}'.format(name, suffix, label, _number(value)))
+
+    def histogram(self, name, help, values, buckets, labels = ()):
+        counts = [0] * len(buckets)
+        for v in values:
+            for i, bound in enumerate(buckets):
+                if v <= bound:
+                    counts[i] += 1
+        for bound, n in zip(buckets, counts):
+            self.add(name, 'histogram', help, n, list(labels) + [('le', _number(bound))], '_bucket')
+        self.add(name, 'histogram', help, len(values), list(labels) + [('le', '+Inf')], '_bucket')
+        self.add(name, 'histogram', help, sum(values), list(labels), '_sum')
+        self.add(name, 'histogram', help, len(values), list(labels), '_count')
+
+    def render(self):
+        lines = []
+        for name in self.order:
+            kind, help, samples = self.families[name]
+            lines.append('# HELP {} {}'.format(name, help))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+def _number(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float) and value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return str(value)
+
+def _status_metrics(f, status):
+    health = status.get('health') or {}
+    f.add('health_status', 'gauge', 'Cluster health: 0=OK, 1=WARN, 2=ERR.', HEALTH_VALUES.get(health.get('status') or health.get('overall_status')))
+    checks = _health_watch.parse_checks(health)[1] # Nautilus的summary中没有count, 与HealthWatcher取相同的数量
+    for name, check in sorted(checks.items()):
+        f.add('health_check', 'gauge', 'Active health checks: 1=WARN, 2=ERR.', HEALTH_VALUES.get(check['severity'], 1), [('check', name)])
+        f.add('health_check_count', 'gauge', 'Number of items reported by a health check.', check['count'], [('check', name)])
+    f.add('mon_quorum_count', 'gauge', 'Number of monitors in quorum.', len(status.get('quorum') or ()))
+    osdmap = status.get('osdmap') or {}
+    osdmap = osdmap.get('osdmap', osdmap)
+    f.add('osdmap_epoch', 'gauge', 'Current osdmap epoch.', osdmap.get('epoch'))
+    f.add('osds', 'gauge', 'Number of OSDs.', osdmap.get('num_osds'))
+    f.add('osds_up', 'gauge', 'Number of OSDs up.', osdmap.get('num_up_osds'))
+    f.add('osds_in', 'gauge', 'Number of OSDs in.', osdmap.get('num_in_osds'))
+    f.add('pgs_remapped', 'gauge', 'Number of remapped PGs.', osdmap.get('num_remapped_pgs'))
+    pgmap = status.get('pgmap') or {}
+    f.add('pools', 'gauge', 'Number of pools.', pgmap.get('num_pools'))
+    f.add('objects', 'gauge', 'Number of objects.', pgmap.get('num_objects'))
+    f.add('data_bytes', 'gauge', 'Stored data in bytes.', pgmap.get('data_bytes'))
+    f.add('cluster_total_bytes', 'gauge', 'Raw capacity in bytes.', pgmap.get('bytes_total'))
+    f.add('cluster_used_bytes', 'gauge', 'Raw used capacity in bytes.', pgmap.get('bytes_used'))
+    f.add('cluster_avail_bytes', 'gauge', 'Raw available capacity in bytes.', pgmap.get('bytes_avail'))
+
+def _pg_stat_metrics(f, pg_stat):
+    if 'pg_summary' in pg_stat: # 较新版本的输出格式
+        pg_stat = dict(pg_stat['pg_summary'], **pg_stat.get('io_sec', {}))
+    f.add('pgs', 'gauge', 'Number of PGs.', pg_stat.get('num_pgs'))
+    # PG状态拆分为单个状态计数, 状态组合的数量不受控制, 单个状态的种类是固定的
+    states = {}
+    for item in pg_stat.get('num_pg_by_state') or ():
+        for state in item['name'].split('+'):
+            states[state] = states.get(state, 0) + item['num']
+    for state in sorted(states):
+        f.add('pg_state', 'gauge', 'Number of PGs in each state.', states[state], [('state', state)])
+    for key in ('read_bytes_sec', 'write_bytes_sec', 'read_op_per_sec', 'write_op_per_sec'):
+        f.add('client_' + key.replace('bytes_sec', 'bytes_per_sec'), 'gauge', 'Cluster client IO rate.', pg_stat.get(key, 0))
+
+def _pool_metrics(f, pool_stats, pool_limit):
+    for pool in sorted(pool_stats, key = lambda p: p.get('pool_id', 0))[:pool_limit]:
+        labels = [('pool_id', pool.get('pool_id')), ('name', pool.get('pool_name'))]
+        io = pool.get('client_io_rate') or {}
+        for key in ('read_bytes_sec', 'write_bytes_sec', 'read_op_per_sec', 'write_op_per_sec'):
+            f.add('pool_' + key.replace('bytes_sec', 'bytes_per_sec'), 'gauge', 'Pool client IO rate.', io.get(key, 0), labels)
+        recovery = pool.get('recovery_rate') or {}
+        f.add('pool_recovering_bytes_per_sec', 'gauge', 'Pool recovery rate.', recovery.get('recovering_bytes_per_sec', 0), labels)
+
+def _osd_df_metrics(f, osd_df, per_osd, osd_top):
+    nodes = [n for n in osd_df.get('nodes') or () if n.get('type', 'osd') == 'osd']
+    summary = osd_df.get('summary') or {}
+    f.add('osd_average_utilization_ratio', 'gauge', 'Average OSD utilization.', summary.get('average_utilization', 0) / 100.0)
+    f.add('osd_utilization_stddev_ratio', 'gauge', 'Standard deviation of OSD utilization.', summary.get('dev', 0) / 100.0)
+    if per_osd:
+        for n in nodes:
+            labels = [('ceph_daemon', n['name']), ('device_class', n.get('device_class', ''))]
+            f.add('osd_utilization_ratio', 'gauge', 'OSD utilization.', n['utilization'] / 100.0, labels)
+            f.add('osd_used_bytes', 'gauge', 'OSD used bytes.', n['kb_used'] * 1024, labels)
+            f.add('osd_size_bytes', 'gauge', 'OSD size in bytes.', n['kb'] * 1024, labels)
+            f.add('osd_pgs', 'gauge', 'Number of PGs on the OSD.', n['pgs'], labels)
+            f.add('osd_up', 'gauge', 'Whether the OSD is up.', n.get('status') == 'up', labels)
+            f.add('osd_reweight', 'gauge', 'OSD reweight.', n['reweight'], labels)
+        return
+    by_class = {}
+    for n in nodes:
+        by_class.setdefault(n.get('device_class', ''), []).append(n)
+    for device_class in sorted(by_class):
+        group = by_class[device_class]
+        labels = [('device_class', device_class)]
+        utils = [n['utilization'] / 100.0 for n in group]
+        f.add('osd_class_count', 'gauge', 'Number of OSDs per device class.', len(group), labels)
+        f.add('osd_class_up', 'gauge', 'Number of OSDs up per device class.', sum(1 for n in group if n.get('status') == 'up'), labels)
+        f.add('osd_class_size_bytes', 'gauge', 'Total OSD size per device class.', sum(n['kb'] for n in group) * 1024, labels)
+        f.add('osd_class_used_bytes', 'gauge', 'Total OSD used bytes per device class.', sum(n['kb_used'] for n in group) * 1024, labels)
+        f.add('osd_class_utilization_max_ratio', 'gauge', 'Highest OSD utilization per device class.', max(utils), labels)
+        f.add('osd_class_utilization_min_ratio', 'gauge', 'Lowest OSD utilization per device class.', min(utils), labels)
+        f.add('osd_class_pgs_max', 'gauge', 'Most PGs on one OSD per device class.', max(n['pgs'] for n in group), labels)
+        f.add('osd_class_pgs_min', 'gauge', 'Fewest PGs on one OSD per device class.', min(n['pgs'] for n in group), labels)
+        f.histogram('osd_class_utilization_ratio', 'Distribution of OSD utilization per device class.', utils, UTILIZATION_BUCKETS, labels)
+    for rank, n in enumerate(sorted(nodes, key = lambda n: -n['utilization'])[:osd_top]):
+        f.add('osd_top_utilization_ratio', 'gauge', 'Most utilized OSDs.', n['utilization'] / 100.0, [('ceph_daemon', n['name']), ('rank', rank)])
+
+def _osd_perf_metrics(f, osd_perf, per_osd, osd_top):
+    infos = [(i['id'], i['perf_stats'].get('commit_latency_ms', 0) / 1000.0, i['perf_stats'].get('apply_latency_ms', 0) / 1000.0)
+             for i in osd_perf.get('osd_perf_infos') or ()]
+    if per_osd:
+        for osd, commit, apply in sorted(infos):
+            labels = [('ceph_daemon', 'osd.{}'.format(osd))]
+            f.add('osd_commit_latency_seconds', 'gauge', 'OSD commit latency.', commit, labels)
+            f.add('osd_apply_latency_seconds', 'gauge', 'OSD apply latency.', apply, labels)
+        return
+    f.histogram('osd_commit_latency_histogram_seconds', 'Distribution of OSD commit latency.', [i[1] for i in infos], LATENCY_BUCKETS)
+    f.histogram('osd_apply_latency_histogram_seconds', 'Distribution of OSD apply latency.', [i[2] for i in infos], LATENCY_BUCKETS)
+    for rank, (osd, commit, _) in enumerate(sorted(infos, key = lambda i: -i[1])[:osd_top]):
+        f.add('osd_top_commit_latency_seconds', 'gauge', 'OSDs with the highest commit latency.', commit, [('ceph_daemon', 'osd.{}'.format(osd)), ('rank', rank)])
+
+def render(snapshot, namespace = 'ceph', osd_series_limit = 200, osd_top = 10, pool_limit = 1000, stats = None):
+    '''
+    把快照中的命令结果转换为Prometheus文本格式
+    :param snapshot: _poller.Snapshot, 包含status、pg_stat、osd_pool_stats、osd_perf、osd_df中的部分或全部
+    :param namespace: str, 指标名称前缀
+    :param osd_series_limit: int, OSD数量不超过该值时按OSD输出, 超过时只输出聚合值、直方图和最差的osd_top个OSD
+    :param osd_top: int, OSD较多时按OSD输出的数量
+    :param pool_limit: int, 最多按存储池输出的数量
+    :param stats: dict, 导出器自身的统计, 名称 -> {'refreshes': int, 'errors': int}
+    :return: str
+    '''
+    f = _Families(namespace)
+    status = snapshot.data('status')
+    if status:
+        _status_metrics(f, status)
+    pg_stat = snapshot.data('pg_stat')
+    if pg_stat:
+        _pg_stat_metrics(f, pg_stat)
+    pool_stats = snapshot.data('osd_pool_stats')
+    if pool_stats:
+        _pool_metrics(f, pool_stats, pool_limit)
+    osd_df = snapshot.data('osd_df')
+    osd_perf = snapshot.data('osd_perf')
+    if osd_perf and 'osdstats' in osd_perf: # Nautilus的输出格式, 须在统计OSD数量之前去掉外层
+        osd_perf = osd_perf['osdstats']
+    num_osds = len((osd_df or {}).get('nodes') or ()) or len((osd_perf or {}).get('osd_perf_infos') or ())
+    per_osd = num_osds <= osd_series_limit
+    if osd_df:
+        _osd_df_metrics(f, osd_df, per_osd, osd_top)
+    if osd_perf:
+        _osd_perf_metrics(f, osd_perf, per_osd, osd_top)
+
+    # 文本被缓存, 输出成功的时间戳而不是陈旧程度, 陈旧程度可在查询时用 time() - 时间戳 得到
+    for name in sorted(snapshot.items):
+        item = snapshot.items[name]
+        labels = [('command', name)]
+        f.add('exporter_last_success_timestamp_seconds', 'gauge', 'Unix time when the command last succeeded.', item.updated, labels)
+        f.add('exporter_command_duration_seconds', 'gauge', 'Duration of the last successful run.', item.duration, labels)
+        f.add('exporter_command_failing', 'gauge', 'Whether the last run of the command failed.', item.error is not None, labels)
+    for name in sorted(stats or ()):
+        f.add('exporter_refreshes_total', 'counter', 'Number of command refreshes.', stats[name]['refreshes'], [('command', name)])
+        f.add('exporter_refresh_errors_total', 'counter', 'Number of failed command refreshes.', stats[name]['errors'], [('command', name)])
+    return f.render()
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        exporter = self.server.exporter
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = exporter.scrape()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class MetricsExporter():
+    '''
+    在Poller的每次发布后重新生成指标文本并缓存, scrape()和HTTP请求只读取缓存
+    :param source: _poller.Poller 或 _ceph.Ceph, 为Ceph时创建内部的Poller; 为Poller时注册其中缺少的命令, 与其他组件共用
+    :param addr: str, HTTP监听地址, 默认为所有地址
+    :param port: int, HTTP监听端口, 默认为DEFAULT_PORT, 为None时不启动HTTP服务, 只通过scrape()获取
+    :param commands: dict, 名称 -> (刷新间隔, Ceph的方法名), 不指定时为DEFAULT_COMMANDS
+    :param kwargs: 传递给render()的参数, 如 osd_series_limit、osd_top、namespace
+    '''
+
+    def __init__(self, source, addr = '', port = DEFAULT_PORT, commands = None, **kwargs):
+        self.owns_poller = not isinstance(source, _poller.Poller)
+        self.poller = _poller.Poller(source, commands = {}) if self.owns_poller else source
+        self.commands = DEFAULT_COMMANDS if commands is None else commands
+        for name, (interval, method) in self.commands.items():
+            if name not in self.poller.commands:
+                self.poller.add(name, interval, method = method)
+        self.addr = addr
+        self.port = port
+        self.options = kwargs
+        self.lock = threading.Lock()
+        self.stats = dict((name, {'refreshes': 0, 'errors': 0}) for name in self.commands)
+        self.scrape_lock = threading.Lock() # HTTP服务的多个线程同时抓取, 与生成指标的lock分开, 抓取不等待render()
+        self.scrapes = 0
+        self.render_errors = 0 # render()引发异常的次数, 此时继续提供上一次的文本
+        self.render_error = None # 最近一次render()的异常, 之后成功时为None
+        self.generation = -1
+        self.text = b''
+        self.server = None
+        self.thread = None
+        self.poller.subscribe(self._on_publish)
+
+    def _on_publish(self, name, snapshot):
+        if name not in self.stats:
+            return
+        with self.lock:
+            self.stats[name]['refreshes'] += 1
+            item = snapshot.get(name)
+            if item is not None and item.error is not None:
+                self.stats[name]['errors'] += 1
+            if snapshot.generation <= self.generation:
+                return
+            try:
+                text = render(snapshot, stats = self.stats, **self.options).encode('utf-8')
+            except Exception as e: # Poller会忽略回调的异常, 在这里记录并通过指标暴露, 下一次发布时重试
+                self.render_errors += 1
+                self.render_error = e
+                return
+            self.render_error = None
+            self.text = text
+            self.generation = snapshot.generation
+
+    def scrape(self):
+        '''
+        :return: bytes, 最近一次生成的指标文本, 在抓取计数上加1, 不执行任何命令; 另外输出抓取次数和生成指标文本失败的次数
+        '''
+        with self.scrape_lock:
+            self.scrapes += 1
+            scrapes = self.scrapes
+            text = self.text
+        f = _Families(self.options.get('namespace', 'ceph'))
+        f.add('exporter_scrapes_total', 'counter', 'Number of scrapes.', scrapes)
+        f.add('exporter_render_errors_total', 'counter', 'Number of failed metric renders; the previous text is served.', self.render_errors)
+        f.add('exporter_render_failing', 'gauge', 'Whether the last metric render failed.', self.render_error is not None)
+        return text + f.render().encode('utf-8')
+
+    def start(self):
+        '''
+        启动内部的Poller (source为Ceph时) 和HTTP服务
+        '''
+        if self.owns_poller:
+            self.poller.start()
+        if self.port is not None and self.server is None:
+            self.server = _ThreadingHTTPServer((self.addr, self.port), _Handler)
+            self.server.exporter = self
+            self.thread = threading.Thread(target = self.server.serve_forever, name = 'ceph-exporter')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def stop(self, timeout = None):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.thread.join(timeout)
+            self.server = None
+        if self.owns_poller:
+            self.poller.stop(timeout)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
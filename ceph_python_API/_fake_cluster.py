@@ -0,0 +1,1151 @@
+# -*- coding: UTF-8 -*-
+import errno
+import json
+import random
+import threading
+import time
+import uuid
+import _crush
+import _crush_decode
+import _osdmap
+import _osdmap_decode
+
+VERSION = 'ceph version 14.2.22 (ca74598065096e6fcbd8433c8779a2be0c889351) nautilus (stable)'
+
+class SyntheticCluster():
+    '''
+    内存中的合成Ceph集群, 供_fake_rados/_fake_rbd使用, 按Ceph 14.2.22的json格式返回各MON命令的输出
+    OSD按 root -> rack -> host -> osd 组织, PG随机但确定地 (由seed决定) 分布在不同主机的up+in的OSD上, osdmap变化 (osd out/in/down、reweight、存储池修改等) 会增加epoch并重新分布PG
+    placement为'crush'时PG的分布改为按osd dump和osd crush dump的输出用CRUSH计算 (_osdmap), 与真实集群一致, 但生成大量PG时较慢
+    :param num_osds: int, OSD数量
+    :param osds_per_host: int, 每台主机的OSD数量
+    :param hosts_per_rack: int, 每个机架的主机数量
+    :param pools: list, 允许多个, 元素为dict {'name': str, 'pg_num': int, 'size': int}, 不指定时默认为一个名为rbd的存储池
+    :param pg_num: int, 不指定pools时默认存储池的PG数量
+    :param size: int, 不指定pools时默认存储池的副本数
+    :param device_classes: list, 允许多个, 元素为str, OSD等级, 按OSD编号轮流分配
+    :param osd_kb: int, 每个OSD的容量, 单位为KB, 默认为4TB
+    :param fill_ratio: float, 平均使用率, 范围为0-1
+    :param degraded_ratio: float, 处于degraded状态的PG比例, 范围为0-1, 用于模拟异常集群
+    :param seed: int, 随机种子, 相同的参数和种子生成完全相同的集群
+    :param placement: str, PG的分布方式, 'random' 或 'crush'
+    '''
+
+    def __init__(self, num_osds = 12, osds_per_host = 4, hosts_per_rack = 4, pools = None, pg_num = 128, size = 3,
+                 device_classes = ('hdd',), osd_kb = 4 * 1024 ** 3, fill_ratio = 0.3, degraded_ratio = 0.0, seed = 0, placement = 'random'):
+        if placement not in ('random', 'crush'):
+            raise ValueError('变量placement的取值错误, 应为random或crush')
+        self.placement = placement
+        self.lock = threading.RLock()
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.fsid = str(uuid.UUID(int = self.rng.getrandbits(128)))
+        self.epoch = 1
+        self.created = '2022-04-01 00:00:00.000000'
+        self.flags = set(['sortbitwise', 'recovery_deletes', 'purged_snapdirs', 'pglog_hardlimit'])
+        self.mons = ['a', 'b', 'c']
+        self.degraded_ratio = degraded_ratio
+        self.crush_version = 1
+        self.auth = {'client.admin': {'key': 'AQAAAAAAAAAAABAAAAAAAAAAAAAAAAAAAAAAAA==', 'caps': {'mds': 'allow *', 'mgr': 'allow *', 'mon': 'allow *', 'osd': 'allow *'}}}
+        self.erasure_code_profiles = {'default': {'k': '2', 'm': '1', 'plugin': 'jerasure', 'technique': 'reed_sol_van'}}
+
+        # CRUSH层级: root default(-1) -> rack -> host -> osd
+        self.hosts = []
+        self.racks = []
+        self.osds = []
+        num_hosts = (num_osds + osds_per_host - 1) // osds_per_host
+        num_racks = (num_hosts + hosts_per_rack - 1) // hosts_per_rack
+        for r in range(num_racks):
+            self.racks.append({'id': -2 - r, 'name': 'rack{}'.format(r), 'hosts': []})
+        for h in range(num_hosts):
+            rack = self.racks[h // hosts_per_rack]
+            host = {'id': -2 - num_racks - h, 'name': 'node{}'.format(h), 'rack': rack['name'], 'osds': []}
+            rack['hosts'].append(h)
+            self.hosts.append(host)
+        for i in range(num_osds):
+            host = self.hosts[i // osds_per_host]
+            host['osds'].append(i)
+            used = int(osd_kb * min(0.95, max(0.0, self.rng.gauss(fill_ratio, fill_ratio * 0.1 + 0.01))))
+            self.osds.append({
+                'id': i,
+                'uuid': str(uuid.UUID(int = self.rng.getrandbits(128))),
+                'host': host['name'],
+                'rack': host['rack'],
+                'device_class': device_classes[i % len(device_classes)],
+                'up': 1,
+                'in': 1,
+                'reweight': 1.0,
+                'crush_weight': round(osd_kb / 1024.0 ** 3, 5),
+                'primary_affinity': 1.0,
+                'kb': osd_kb,
+                'kb_used': used,
+                'commit_latency_ms': self.rng.randint(0, 20),
+                'apply_latency_ms': self.rng.randint(0, 20),
+            })
+
+        self.pools = {}
+        self.pool_max = 0
+        if pools is None:
+            pools = [{'name': 'rbd', 'pg_num': pg_num, 'size': size}]
+        for p in pools:
+            self._create_pool(p['name'], p.get('pg_num', pg_num), p.get('size', size))
+
+        self.rbd = {} # 存储池名称 -> {镜像名称: _fake_rbd.ImageState}, 由_fake_rbd维护
+        self.rbd_ids = {} # 存储池名称 -> {镜像id: _fake_rbd.ImageState}
+        self.rbd_directory_cache = {} # 存储池名称 -> (排序后的键, 排序后的rbd_directory omap), 由_fake_rados维护, _fake_rbd在镜像变化时失效
+        self.objects = {} # 存储池名称 -> {对象名称: (对象大小, 修改时间)}, 非RBD对象
+        self._pg_epoch = None
+        self._pgs = None
+        self._pg_stats = {}
+        self._out_cache = {}
+
+    @classmethod
+    def scaled(cls, num_osds = 3000, num_pgs = 100000, num_pools = 4, osds_per_host = 12, hosts_per_rack = 8, size = 3, seed = 0, **kwargs):
+        '''
+        生成大规模的合成集群, PG总数平均分配到各存储池
+        :param num_osds: int, OSD数量
+        :param num_pgs: int, PG总数
+        :param num_pools: int, 存储池数量
+        :return: SyntheticCluster
+        '''
+        per_pool = max(1, num_pgs // num_pools)
+        pools = [{'name': 'pool{}'.format(i), 'pg_num': per_pool, 'size': size} for i in range(num_pools)]
+        return cls(num_osds = num_osds, osds_per_host = osds_per_host, hosts_per_rack = hosts_per_rack, pools = pools, seed = seed, **kwargs)
+
+    # 状态变化
+
+    def _bump_epoch(self):
+        self.epoch += 1
+        self._out_cache = {}
+
+    def _create_pool(self, name, pg_num, size):
+        self.pool_max += 1
+        pool_id = self.pool_max
+        self.pools[pool_id] = {
+            'pool': pool_id,
+            'pool_name': name,
+            'create_time': self.created,
+            'flags': 1,
+            'flags_names': 'hashpspool',
+            'type': 1,
+            'size': size,
+            'min_size': max(1, size - 1),
+            'crush_rule': 0,
+            'object_hash': 2,
+            'pg_autoscale_mode': 'warn',
+            'pg_num': pg_num,
+            'pg_placement_num': pg_num,
+            'pg_placement_num_target': pg_num,
+            'pg_num_target': pg_num,
+            'pg_num_pending': pg_num,
+            'last_change': str(self.epoch),
+            'auid': 0,
+            'snap_mode': 'selfmanaged',
+            'snap_seq': 0,
+            'snap_epoch': 0,
+            'pool_snaps': [],
+            'removed_snaps': '[]',
+            'quota_max_bytes': 0,
+            'quota_max_objects': 0,
+            'tiers': [],
+            'tier_of': -1,
+            'read_tier': -1,
+            'write_tier': -1,
+            'cache_mode': 'none',
+            'erasure_code_profile': '',
+            'application_metadata': {'rbd': {}},
+        }
+        return pool_id
+
+    def pool_by_name(self, name):
+        for pool in self.pools.values():
+            if pool['pool_name'] == name:
+                return pool
+        return None
+
+    def _osd_ids(self, ids):
+        # 解析 '<id>'、'osd.<id>'、'all'、'any' 格式的OSD名称
+        result = []
+        for s in ids:
+            s = str(s)
+            if s in ('all', 'any'):
+                return [o['id'] for o in self.osds]
+            if s.startswith('osd.'):
+                s = s[4:]
+            result.append(int(s))
+        return result
+
+    # PG分布
+
+    def _candidates(self):
+        # 每台主机上up+in且权重非0的OSD, 按epoch缓存
+        if getattr(self, '_candidates_epoch', None) != self.epoch:
+            hosts = []
+            for host in self.hosts:
+                osds = [i for i in host['osds'] if self.osds[i]['up'] and self.osds[i]['in'] and self.osds[i]['reweight'] > 0]
+                if osds:
+                    hosts.append(osds)
+            self._candidate_hosts = hosts
+            self._candidates_epoch = self.epoch
+        return self._candidate_hosts
+
+    def osdmap(self):
+        '''
+        :return: _osdmap.OSDMap, 由当前epoch的osd dump和osd crush dump构造, 按epoch缓存
+        '''
+        with self.lock:
+            if getattr(self, '_osdmap_epoch', None) != self.epoch:
+                crush = _crush.CrushMap.from_crush_dump(self._cmd_osd_crush_dump({}))
+                self._osdmap_cache = _osdmap.OSDMap.from_osd_dump(self._cmd_osd_dump({}), crush)
+                self._osdmap_epoch = self.epoch
+            return self._osdmap_cache
+
+    def _place(self, pool, ps):
+        if self.placement == 'crush':
+            return self.osdmap().pg_to_up_acting_osds(pool['pool'], ps)[0]
+        # 随机但确定地选择size个不同主机上up+in的OSD
+        hosts = self._candidates()
+        rng = random.Random((self.seed * 1000003 + pool['pool']) * 1000003 + ps)
+        want = min(pool['size'], len(hosts))
+        picked = []
+        chosen = []
+        while len(chosen) < want:
+            h = rng.randrange(len(hosts))
+            if h in picked:
+                continue
+            picked.append(h)
+            osds = hosts[h]
+            chosen.append(osds[rng.randrange(len(osds))])
+        return chosen
+
+    def pgs(self):
+        '''
+        获取当前epoch的PG分布, 每个元素为 (pool_id, ps, up, state)
+        '''
+        with self.lock:
+            if self._pg_epoch == self.epoch:
+                return self._pgs
+            rng = random.Random(self.seed + self.epoch)
+            pgs = []
+            for pool_id in sorted(self.pools):
+                pool = self.pools[pool_id]
+                for ps in range(pool['pg_num']):
+                    up = self._place(pool, ps)
+                    if len(up) < pool['size']:
+                        state = 'active+undersized+degraded'
+                    elif self.degraded_ratio and rng.random() < self.degraded_ratio:
+                        state = 'active+recovery_wait+degraded'
+                    else:
+                        state = 'active+clean'
+                    pgs.append((pool_id, ps, up, state))
+            self._pgs = pgs
+            self._pg_epoch = self.epoch
+            return pgs
+
+    def _pg_sum(self, pool_id, ps):
+        # 每个PG的统计数据只生成一次, 不随epoch变化
+        key = (pool_id, ps)
+        stat = self._pg_stats.get(key)
+        if stat is None:
+            rng = random.Random((self.seed * 7919 + pool_id) * 104729 + ps)
+            objects = rng.randint(0, 4000)
+            stat = (objects, objects * rng.randint(1024 * 1024, 4 * 1024 * 1024), rng.randint(0, 100000), rng.randint(0, 100000))
+            self._pg_stats[key] = stat
+        return stat
+
+    def pg_record(self, pg, brief = False):
+        pool_id, ps, up, state = pg
+        pgid = '{}.{:x}'.format(pool_id, ps)
+        primary = up[0] if up else -1
+        if brief:
+            return {'pgid': pgid, 'state': state, 'up': up, 'up_primary': primary, 'acting': up, 'acting_primary': primary}
+        objects, nbytes, reads, writes = self._pg_sum(pool_id, ps)
+        size = self.pools[pool_id]['size']
+        degraded = objects * (size - len(up)) if 'degraded' in state else 0
+        stamp = '2022-04-22 00:00:00.000000'
+        return {
+            'pgid': pgid,
+            'version': '{}\'{}'.format(self.epoch, writes),
+            'reported_seq': str(writes + reads),
+            'reported_epoch': str(self.epoch),
+            'state': state,
+            'last_fresh': stamp,
+            'last_change': stamp,
+            'last_active': stamp,
+            'last_peered': stamp,
+            'last_clean': stamp,
+            'last_became_active': stamp,
+            'last_became_peered': stamp,
+            'last_unstale': stamp,
+            'last_undegraded': stamp,
+            'last_fullsized': stamp,
+            'mapping_epoch': self.epoch,
+            'log_start': '0\'0',
+            'ondisk_log_start': '0\'0',
+            'created': 1,
+            'last_epoch_clean': self.epoch,
+            'parent': '0.0',
+            'parent_split_bits': 0,
+            'last_scrub': '{}\'{}'.format(self.epoch, writes),
+            'last_scrub_stamp': stamp,
+            'last_deep_scrub': '{}\'{}'.format(self.epoch, writes),
+            'last_deep_scrub_stamp': stamp,
+            'last_clean_scrub_stamp': stamp,
+            'log_size': min(writes, 3000),
+            'ondisk_log_size': min(writes, 3000),
+            'stats_invalid': False,
+            'dirty_stats_invalid': False,
+            'omap_stats_invalid': False,
+            'hitset_stats_invalid': False,
+            'hitset_bytes_stats_invalid': False,
+            'pin_stats_invalid': False,
+            'manifest_stats_invalid': False,
+            'snaptrimq_len': 0,
+            'stat_sum': {
+                'num_bytes': nbytes,
+                'num_objects': objects,
+                'num_object_clones': 0,
+                'num_object_copies': objects * size,
+                'num_objects_missing_on_primary': 0,
+                'num_objects_missing': 0,
+                'num_objects_degraded': degraded,
+                'num_objects_misplaced': 0,
+                'num_objects_unfound': 0,
+                'num_objects_dirty': objects,
+                'num_whiteouts': 0,
+                'num_read': reads,
+                'num_read_kb': reads * 4,
+                'num_write': writes,
+                'num_write_kb': writes * 4,
+                'num_scrub_errors': 0,
+                'num_shallow_scrub_errors': 0,
+                'num_deep_scrub_errors': 0,
+                'num_objects_recovered': 0,
+                'num_bytes_recovered': 0,
+                'num_keys_recovered': 0,
+                'num_objects_omap': 0,
+                'num_objects_hit_set_archive': 0,
+                'num_bytes_hit_set_archive': 0,
+                'num_flush': 0,
+                'num_flush_kb': 0,
+                'num_evict': 0,
+                'num_evict_kb': 0,
+                'num_promote': 0,
+                'num_flush_mode_high': 0,
+                'num_flush_mode_low': 0,
+                'num_evict_mode_some': 0,
+                'num_evict_mode_full': 0,
+                'num_objects_pinned': 0,
+                'num_legacy_snapsets': 0,
+                'num_large_omap_objects': 0,
+                'num_objects_manifest': 0,
+                'num_omap_bytes': 0,
+                'num_omap_keys': 0,
+                'num_objects_repaired': 0,
+            },
+            'up': up,
+            'acting': up,
+            'avail_no_missing': [],
+            'object_location_counts': [],
+            'blocked_by': [],
+            'up_primary': primary,
+            'acting_primary': primary,
+            'purged_snaps': [],
+        }
+
+    def osd_pg_counts(self):
+        counts = [0] * len(self.osds)
+        primaries = [0] * len(self.osds)
+        for pg in self.pgs():
+            for i in pg[2]:
+                counts[i] += 1
+            if pg[2]:
+                primaries[pg[2][0]] += 1
+        return counts, primaries
+
+    # 命令处理
+
+    def handle(self, cmd, inbuf = ''):
+        '''
+        处理一条MON命令
+        :param cmd: dict, 反序列化后的cmd
+        :param inbuf: str, 输入缓冲
+        :return: tuple, (int ret, bytes outbuf, str outs)
+        '''
+        prefix = cmd.get('prefix', '')
+        handler = getattr(self, '_cmd_' + prefix.replace(' ', '_').replace('-', '_'), None)
+        if handler is None:
+            return (-errno.EINVAL, b'', 'command not known: {}'.format(prefix))
+        with self.lock:
+            key = (json.dumps(cmd, sort_keys = True), self.epoch)
+            cached = self._out_cache.get(key)
+            if cached is not None:
+                return cached
+            try:
+                result = handler(cmd)
+            except KeyError as e:
+                return (-errno.ENOENT, b'', '{} does not exist'.format(e))
+            except (ValueError, TypeError) as e:
+                return (-errno.EINVAL, b'', str(e))
+            if not isinstance(result, tuple):
+                out = result if isinstance(result, bytes) else json.dumps(result).encode('utf-8')
+                result = (0, out, '')
+                if getattr(handler, 'read_only', False):
+                    self._out_cache[key] = result
+            return result
+
+    # 只读命令
+
+    def _cmd_status(self, cmd):
+        counts = {}
+        for pg in self.pgs():
+            counts[pg[3]] = counts.get(pg[3], 0) + 1
+        objects = nbytes = 0
+        for pg in self.pgs():
+            o, b, _, _ = self._pg_sum(pg[0], pg[1])
+            objects += o
+            nbytes += b
+        total = sum(o['kb'] for o in self.osds) * 1024
+        used = sum(o['kb_used'] for o in self.osds) * 1024
+        return {
+            'fsid': self.fsid,
+            'health': self._health(False),
+            'election_epoch': 12,
+            'quorum': list(range(len(self.mons))),
+            'quorum_names': self.mons,
+            'quorum_age': 86400,
+            'monmap': self._monmap(),
+            'osdmap': {'osdmap': self._osd_stat()},
+            'pgmap': {
+                'pgs_by_state': [{'state_name': k, 'count': v} for k, v in sorted(counts.items())],
+                'num_pgs': len(self.pgs()),
+                'num_pools': len(self.pools),
+                'num_objects': objects,
+                'data_bytes': nbytes,
+                'bytes_used': used,
+                'bytes_avail': total - used,
+                'bytes_total': total,
+                'read_bytes_sec': 1048576,
+                'write_bytes_sec': 2097152,
+                'read_op_per_sec': 100,
+                'write_op_per_sec': 200,
+            },
+            'fsmap': {'epoch': 1, 'by_rank': [], 'up:standby': 0},
+            'mgrmap': {'epoch': 5, 'active_gid': 4100, 'active_name': self.mons[0], 'available': True, 'num_standbys': len(self.mons) - 1, 'modules': ['iostat', 'restful'], 'services': {}},
+            'servicemap': {'epoch': 1, 'modified': self.created, 'services': {}},
+            'progress_events': {},
+        }
+    _cmd_status.read_only = True
+
+    def _health(self, detail):
+        # 与Nautilus一致, summary中只有message, 没有count
+        checks = {}
+        down = [o for o in self.osds if not o['up']]
+        if down:
+            checks['OSD_DOWN'] = {
+                'severity': 'HEALTH_WARN',
+                'summary': {'message': '{} osds down'.format(len(down))},
+                'detail': [{'message': 'osd.{} ({}) is down'.format(o['id'], 'root=default,rack={},host={}'.format(o['rack'], o['host']))} for o in down],
+            }
+        nearfull = [o for o in self.osds if o['kb_used'] >= o['kb'] * 0.85]
+        if nearfull:
+            checks['OSD_NEARFULL'] = {
+                'severity': 'HEALTH_WARN',
+                'summary': {'message': '{} nearfull osd(s)'.format(len(nearfull))},
+                'detail': [{'message': 'osd.{} is near full'.format(o['id'])} for o in nearfull],
+            }
+        degraded = [pg for pg in self.pgs() if 'degraded' in pg[3]]
+        if degraded:
+            checks['PG_DEGRADED'] = {
+                'severity': 'HEALTH_WARN',
+                'summary': {'message': 'Degraded data redundancy: {} pgs degraded'.format(len(degraded))},
+                'detail': [{'message': 'pg {}.{:x} is {}'.format(pg[0], pg[1], pg[3])} for pg in degraded[:50]],
+            }
+        if 'pause' in self.flags or 'pauserd' in self.flags or 'noout' in self.flags:
+            flags = sorted(self.flags & set(['pauserd', 'pausewr', 'noout']))
+            checks['OSDMAP_FLAGS'] = {
+                'severity': 'HEALTH_WARN',
+                'summary': {'message': '{} flag(s) set'.format(','.join(flags))},
+                'detail': [],
+            }
+        if not detail:
+            for c in checks.values():
+                c.pop('detail', None)
+        status = 'HEALTH_OK'
+        for c in checks.values():
+            if c['severity'] == 'HEALTH_ERR':
+                status = 'HEALTH_ERR'
+            elif status == 'HEALTH_OK':
+                status = c['severity']
+        return {'checks': checks, 'status': status}
+
+    def _cmd_health(self, cmd):
+        return self._health(cmd.get('detail') == 'detail')
+    _cmd_health.read_only = True
+
+    def _monmap(self):
+        return {
+            'epoch': 1,
+            'fsid': self.fsid,
+            'modified': self.created,
+            'created': self.created,
+            'min_mon_release': 14,
+            'min_mon_release_name': 'nautilus',
+            'features': {'persistent': ['kraken', 'luminous', 'mimic', 'osdmap-prune', 'nautilus'], 'optional': []},
+            'mons': [{'rank': i, 'name': m, 'public_addr': '10.0.0.{}:6789/0'.format(i + 1), 'addr': '10.0.0.{}:6789/0'.format(i + 1)} for i, m in enumerate(self.mons)],
+        }
+
+    def _cmd_mon_dump(self, cmd):
+        monmap = self._monmap()
+        monmap['quorum'] = list(range(len(self.mons)))
+        return monmap
+    _cmd_mon_dump.read_only = True
+
+    def _cmd_mon_stat(self, cmd):
+        return {
+            'epoch': 1,
+            'min_mon_release': 14,
+            'min_mon_release_name': 'nautilus',
+            'quorum': [{'rank': i, 'name': m} for i, m in enumerate(self.mons)],
+            'leader': self.mons[0],
+        }
+    _cmd_mon_stat.read_only = True
+
+    def _osd_stat(self):
+        up = sum(1 for o in self.osds if o['up'])
+        num_in = sum(1 for o in self.osds if o['in'])
+        return {'epoch': self.epoch, 'num_osds': len(self.osds), 'num_up_osds': up, 'osd_up_since': 0, 'num_in_osds': num_in, 'osd_in_since': 0, 'num_remapped_pgs': 0}
+
+    def _cmd_osd_stat(self, cmd):
+        return self._osd_stat()
+    _cmd_osd_stat.read_only = True
+
+    def _cmd_osd_ls(self, cmd):
+        return [o['id'] for o in self.osds]
+    _cmd_osd_ls.read_only = True
+
+    def _cmd_osd_getmaxosd(self, cmd):
+        return {'epoch': self.epoch, 'max_osd': len(self.osds)}
+    _cmd_osd_getmaxosd.read_only = True
+
+    def _cmd_osd_lspools(self, cmd):
+        return [{'poolnum': p['pool'], 'poolname': p['pool_name']} for _, p in sorted(self.pools.items())]
+    _cmd_osd_lspools.read_only = True
+
+    def _cmd_osd_pool_ls(self, cmd):
+        if cmd.get('detail') == 'detail':
+            return [p for _, p in sorted(self.pools.items())]
+        return [p['pool_name'] for _, p in sorted(self.pools.items())]
+    _cmd_osd_pool_ls.read_only = True
+
+    def _cmd_osd_pool_get(self, cmd):
+        pool = self.pool_by_name(cmd['pool'])
+        if pool is None:
+            raise KeyError('pool {}'.format(cmd['pool']))
+        var = cmd['var']
+        names = {'pg_num': 'pg_num', 'pgp_num': 'pg_placement_num', 'size': 'size', 'min_size': 'min_size', 'crush_rule': 'crush_rule'}
+        if var == 'all':
+            return dict((k, pool[v]) for k, v in names.items())
+        if var not in names:
+            raise ValueError('unrecognized variable {}'.format(var))
+        return {'pool': pool['pool_name'], 'pool_id': pool['pool'], var: pool[names[var]]}
+    _cmd_osd_pool_get.read_only = True
+
+    def _osd_dump_osds(self):
+        result = []
+        for o in self.osds:
+            addr = '10.0.1.{}:{}/{}'.format(o['id'] // 250 + 1, 6800 + o['id'] % 250, 1000 + o['id'])
+            result.append({
+                'osd': o['id'],
+                'uuid': o['uuid'],
+                'up': o['up'],
+                'in': o['in'],
+                'weight': o['reweight'] if o['in'] else 0.0,
+                'primary_affinity': o['primary_affinity'],
+                'last_clean_begin': 0,
+                'last_clean_end': 0,
+                'up_from': 5,
+                'up_thru': self.epoch,
+                'down_at': 0,
+                'lost_at': 0,
+                'public_addr': addr,
+                'cluster_addr': addr,
+                'heartbeat_back_addr': addr,
+                'heartbeat_front_addr': addr,
+                'state': ['exists', 'up'] if o['up'] else ['exists'],
+            })
+        return result
+
+    def _cmd_osd_dump(self, cmd):
+        if 'epoch' in cmd and cmd['epoch'] != self.epoch:
+            return (-errno.ENOENT, b'', 'there is no map for epoch {}'.format(cmd['epoch']))
+        return {
+            'epoch': self.epoch,
+            'fsid': self.fsid,
+            'created': self.created,
+            'modified': self.created,
+            'last_up_change': self.created,
+            'last_in_change': self.created,
+            'flags': ','.join(sorted(self.flags)),
+            'flags_num': 0,
+            'flags_set': sorted(self.flags),
+            'crush_version': self.crush_version,
+            'full_ratio': 0.95,
+            'backfillfull_ratio': 0.9,
+            'nearfull_ratio': 0.85,
+            'cluster_snapshot': '',
+            'pool_max': self.pool_max,
+            'max_osd': len(self.osds),
+            'require_min_compat_client': 'jewel',
+            'min_compat_client': 'jewel',
+            'require_osd_release': 'nautilus',
+            'pools': [p for _, p in sorted(self.pools.items())],
+            'osds': self._osd_dump_osds(),
+            'osd_xinfo': [],
+            'pg_upmap': [],
+            'pg_upmap_items': [],
+            'pg_temp': [],
+            'primary_temp': [],
+            'blacklist': {},
+            'erasure_code_profiles': self.erasure_code_profiles,
+            'removed_snaps_queue': [],
+            'new_removed_snaps': [],
+            'new_purged_snaps': [],
+            'crush_node_flags': {},
+            'device_class_flags': {},
+        }
+    _cmd_osd_dump.read_only = True
+
+    def _cmd_osd_getmap(self, cmd):
+        # 与osd dump、osd crush dump的内容一致的二进制osdmap
+        if 'epoch' in cmd and cmd['epoch'] != self.epoch:
+            return (-errno.ENOENT, b'', 'there is no map for epoch {}'.format(cmd['epoch']))
+        return _osdmap_decode.encode_osdmap(self._cmd_osd_dump({}), _crush.CrushMap.from_crush_dump(self._cmd_osd_crush_dump({})))
+    _cmd_osd_getmap.read_only = True
+
+    def _cmd_osd_getcrushmap(self, cmd):
+        if 'epoch' in cmd and cmd['epoch'] != self.epoch:
+            return (-errno.ENOENT, b'', 'there is no map for epoch {}'.format(cmd['epoch']))
+        return _crush_decode.encode_crushmap(_crush.CrushMap.from_crush_dump(self._cmd_osd_crush_dump({})))
+    _cmd_osd_getcrushmap.read_only = True
+
+    def _bucket_weight(self, osd_ids):
+        return sum(self.osds[i]['crush_weight'] for i in osd_ids)
+
+    def _cmd_osd_tree(self, cmd):
+        if 'epoch' in cmd and cmd['epoch'] != self.epoch:
+            return (-errno.ENOENT, b'', 'there is no map for epoch {}'.format(cmd['epoch']))
+        nodes = [{'id': -1, 'name': 'default', 'type': 'root', 'type_id': 11, 'children': [r['id'] for r in reversed(self.racks)]}]
+        for r in self.racks:
+            nodes.append({'id': r['id'], 'name': r['name'], 'type': 'rack', 'type_id': 3, 'pool_weights': {}, 'children': [self.hosts[h]['id'] for h in reversed(r['hosts'])]})
+            for h in r['hosts']:
+                host = self.hosts[h]
+                nodes.append({'id': host['id'], 'name': host['name'], 'type': 'host', 'type_id': 1, 'pool_weights': {}, 'children': list(reversed(host['osds']))})
+                for i in host['osds']:
+                    o = self.osds[i]
+                    nodes.append({
+                        'id': i,
+                        'device_class': o['device_class'],
+                        'name': 'osd.{}'.format(i),
+                        'type': 'osd',
+                        'type_id': 0,
+                        'crush_weight': o['crush_weight'],
+                        'depth': 3,
+                        'pool_weights': {},
+                        'exists': 1,
+                        'status': 'up' if o['up'] else 'down',
+                        'reweight': o['reweight'] if o['in'] else 0.0,
+                        'primary_affinity': o['primary_affinity'],
+                    })
+        return {'nodes': nodes, 'stray': []}
+    _cmd_osd_tree.read_only = True
+
+    def _cmd_osd_crush_dump(self, cmd):
+        fixed = lambda w: int(round(w * 0x10000))
+        buckets = [{
+            'id': -1, 'name': 'default', 'type_id': 11, 'type_name': 'root',
+            'weight': sum(fixed(self._bucket_weight(self.hosts[h]['osds'])) for r in self.racks for h in r['hosts']),
+            'alg': 'straw2', 'hash': 'rjenkins1',
+            'items': [{'id': r['id'], 'weight': sum(fixed(self._bucket_weight(self.hosts[h]['osds'])) for h in r['hosts']), 'pos': n} for n, r in enumerate(self.racks)],
+        }]
+        for r in self.racks:
+            buckets.append({
+                'id': r['id'], 'name': r['name'], 'type_id': 3, 'type_name': 'rack',
+                'weight': sum(fixed(self._bucket_weight(self.hosts[h]['osds'])) for h in r['hosts']),
+                'alg': 'straw2', 'hash': 'rjenkins1',
+                'items': [{'id': self.hosts[h]['id'], 'weight': fixed(self._bucket_weight(self.hosts[h]['osds'])), 'pos': n} for n, h in enumerate(r['hosts'])],
+            })
+        for host in self.hosts:
+            buckets.append({
+                'id': host['id'], 'name': host['name'], 'type_id': 1, 'type_name': 'host',
+                'weight': sum(fixed(self.osds[i]['crush_weight']) for i in host['osds']),
+                'alg': 'straw2', 'hash': 'rjenkins1',
+                'items': [{'id': i, 'weight': fixed(self.osds[i]['crush_weight']), 'pos': n} for n, i in enumerate(host['osds'])],
+            })
+        types = ['osd', 'host', 'chassis', 'rack', 'row', 'pdu', 'pod', 'room', 'datacenter', 'zone', 'region', 'root']
+        return {
+            'devices': [{'id': o['id'], 'name': 'osd.{}'.format(o['id']), 'class': o['device_class']} for o in self.osds],
+            'types': [{'type_id': i, 'name': t} for i, t in enumerate(types)],
+            'buckets': buckets,
+            'rules': [{
+                'rule_id': 0, 'rule_name': 'replicated_rule', 'ruleset': 0, 'type': 1, 'min_size': 1, 'max_size': 10,
+                'steps': [{'op': 'take', 'item': -1, 'item_name': 'default'}, {'op': 'chooseleaf_firstn', 'num': 0, 'type': 'host'}, {'op': 'emit'}],
+            }],
+            'tunables': {
+                'choose_local_tries': 0, 'choose_local_fallback_tries': 0, 'choose_total_tries': 50, 'chooseleaf_descend_once': 1,
+                'chooseleaf_vary_r': 1, 'chooseleaf_stable': 1, 'straw_calc_version': 1, 'allowed_bucket_algs': 54, 'profile': 'jewel',
+                'optimal_tunables': 1, 'legacy_tunables': 0, 'minimum_required_version': 'jewel', 'require_feature_tunables': 1,
+                'require_feature_tunables2': 1, 'has_v2_rules': 0, 'require_feature_tunables3': 1, 'has_v3_rules': 0,
+                'has_v4_buckets': 1, 'require_feature_tunables5': 1, 'has_v5_rules': 0,
+            },
+            'choose_args': {},
+        }
+    _cmd_osd_crush_dump.read_only = True
+
+    def _cmd_osd_crush_rule_dump(self, cmd):
+        rules = self._cmd_osd_crush_dump(cmd)['rules']
+        if 'name' in cmd:
+            for r in rules:
+                if r['rule_name'] == cmd['name']:
+                    return r
+            raise KeyError('rule {}'.format(cmd['name']))
+        return rules
+    _cmd_osd_crush_rule_dump.read_only = True
+
+    def _cmd_osd_crush_rule_ls(self, cmd):
+        return ['replicated_rule']
+    _cmd_osd_crush_rule_ls.read_only = True
+    _cmd_osd_crush_rule_list = _cmd_osd_crush_rule_ls
+
+    def _cmd_osd_crush_class_ls(self, cmd):
+        return sorted(set(o['device_class'] for o in self.osds))
+    _cmd_osd_crush_class_ls.read_only = True
+
+    def _cmd_osd_crush_class_ls_osd(self, cmd):
+        return [o['id'] for o in self.osds if o['device_class'] == cmd['class']]
+    _cmd_osd_crush_class_ls_osd.read_only = True
+
+    def _cmd_osd_df(self, cmd):
+        counts, _ = self.osd_pg_counts()
+        total_kb = sum(o['kb'] for o in self.osds)
+        used_kb = sum(o['kb_used'] for o in self.osds)
+        average = 100.0 * used_kb / total_kb if total_kb else 0.0
+        nodes = []
+        for o in self.osds:
+            if cmd.get('filter_by') == 'class' and o['device_class'] != cmd.get('filter'):
+                continue
+            if cmd.get('filter_by') == 'name' and cmd.get('filter') not in (o['host'], o['rack'], 'default', 'osd.{}'.format(o['id'])):
+                continue
+            utilization = 100.0 * o['kb_used'] / o['kb'] if o['kb'] else 0.0
+            nodes.append({
+                'id': o['id'],
+                'device_class': o['device_class'],
+                'name': 'osd.{}'.format(o['id']),
+                'type': 'osd',
+                'type_id': 0,
+                'crush_weight': o['crush_weight'],
+                'depth': 3,
+                'pool_weights': {},
+                'reweight': o['reweight'] if o['in'] else 0.0,
+                'kb': o['kb'],
+                'kb_used': o['kb_used'],
+                'kb_used_data': o['kb_used'] - 1048576 if o['kb_used'] > 1048576 else o['kb_used'],
+                'kb_used_omap': 0,
+                'kb_used_meta': min(o['kb_used'], 1048576),
+                'kb_avail': o['kb'] - o['kb_used'],
+                'utilization': utilization,
+                'var': utilization / average if average else 0.0,
+                'pgs': counts[o['id']],
+                'status': 'up' if o['up'] else 'down',
+            })
+        utils = [n['utilization'] for n in nodes] or [0.0]
+        variance = sum((u - average) ** 2 for u in utils) / len(utils)
+        return {
+            'nodes': nodes,
+            'stray': [],
+            'summary': {
+                'total_kb': total_kb,
+                'total_kb_used': used_kb,
+                'total_kb_used_data': used_kb,
+                'total_kb_used_omap': 0,
+                'total_kb_used_meta': 0,
+                'total_kb_avail': total_kb - used_kb,
+                'average_utilization': average,
+                'min_var': min(utils) / average if average else 0.0,
+                'max_var': max(utils) / average if average else 0.0,
+                'dev': variance ** 0.5,
+            },
+        }
+    _cmd_osd_df.read_only = True
+
+    def _cmd_osd_utilization(self, cmd):
+        counts, _ = self.osd_pg_counts()
+        best = min(range(len(counts)), key = lambda i: counts[i])
+        worst = max(range(len(counts)), key = lambda i: counts[i])
+        average = float(sum(counts)) / len(counts) if counts else 0.0
+        return {'moved_pgs': 0, 'min_osd': best, 'min_pgs': counts[best], 'max_osd': worst, 'max_pgs': counts[worst], 'average_pgs': average}
+    _cmd_osd_utilization.read_only = True
+
+    def _cmd_osd_perf(self, cmd):
+        return {'osd_perf_infos': [{'id': o['id'], 'perf_stats': {'commit_latency_ms': o['commit_latency_ms'], 'apply_latency_ms': o['apply_latency_ms'],
+                                                                    'commit_latency_ns': o['commit_latency_ms'] * 1000000, 'apply_latency_ns': o['apply_latency_ms'] * 1000000}}
+                                   for o in reversed(self.osds) if o['up']]}
+    _cmd_osd_perf.read_only = True
+
+    def _cmd_osd_pool_stats(self, cmd):
+        result = []
+        for _, p in sorted(self.pools.items()):
+            if 'pool_name' in cmd and cmd['pool_name'] != p['pool_name']:
+                continue
+            rng = random.Random(self.seed + p['pool'] + self.epoch)
+            result.append({
+                'pool_name': p['pool_name'],
+                'pool_id': p['pool'],
+                'recovery': {},
+                'recovery_rate': {},
+                'client_io_rate': {
+                    'read_bytes_sec': rng.randint(0, 1 << 24),
+                    'write_bytes_sec': rng.randint(0, 1 << 24),
+                    'read_op_per_sec': rng.randint(0, 1000),
+                    'write_op_per_sec': rng.randint(0, 1000),
+                },
+            })
+        return result
+    _cmd_osd_pool_stats.read_only = True
+
+    def _cmd_osd_find(self, cmd):
+        o = self.osds[int(cmd['id'])]
+        addr = '10.0.1.{}:{}/{}'.format(o['id'] // 250 + 1, 6800 + o['id'] % 250, 1000 + o['id'])
+        return {'osd': o['id'], 'addrs': {'addrvec': [{'type': 'v1', 'addr': addr.split('/')[0], 'nonce': 1000 + o['id']}]}, 'osd_fsid': o['uuid'],
+                'host': o['host'], 'crush_location': {'host': o['host'], 'rack': o['rack'], 'root': 'default'}}
+    _cmd_osd_find.read_only = True
+
+    def _cmd_osd_metadata(self, cmd):
+        def meta(o):
+            return {'id': o['id'], 'arch': 'x86_64', 'ceph_version': VERSION, 'hostname': o['host'], 'osd_objectstore': 'bluestore',
+                    'bluestore_bdev_type': o['device_class'], 'osd_data': '/var/lib/ceph/osd/ceph-{}'.format(o['id'])}
+        if 'id' in cmd:
+            return meta(self.osds[int(cmd['id'])])
+        return [meta(o) for o in self.osds]
+    _cmd_osd_metadata.read_only = True
+
+    def _cmd_osd_blocked_by(self, cmd):
+        return []
+    _cmd_osd_blocked_by.read_only = True
+
+    def _cmd_osd_map(self, cmd):
+        # 对象到PG的映射与Ceph一致 (rjenkins哈希和ceph_stable_mod), PG到OSD的映射取决于placement
+        pool = self.pool_by_name(cmd['pool'])
+        if pool is None:
+            raise KeyError('pool {}'.format(cmd['pool']))
+        p = _osdmap.Pool.from_dump(pool)
+        raw = p.hash_key(cmd['object'], cmd.get('nspace', ''))
+        ps = p.raw_pg_to_pg(raw)
+        up = self._place(pool, ps)
+        primary = up[0] if up else -1
+        return {'epoch': self.epoch, 'pool': pool['pool_name'], 'pool_id': pool['pool'], 'objname': cmd['object'], 'raw_pgid': '{}.{:x}'.format(pool['pool'], raw),
+                'pgid': '{}.{:x}'.format(pool['pool'], ps), 'up': up, 'up_primary': primary, 'acting': up, 'acting_primary': primary}
+    _cmd_osd_map.read_only = True
+
+    def _pg_filter(self, cmd, osd = None, primary = None):
+        pool = cmd.get('pool')
+        if 'poolstr' in cmd:
+            p = self.pool_by_name(cmd['poolstr'])
+            if p is None:
+                raise KeyError('pool {}'.format(cmd['poolstr']))
+            pool = p['pool']
+        states = cmd.get('states')
+        result = []
+        for pg in self.pgs():
+            if pool is not None and pg[0] != pool:
+                continue
+            if states and not any(s in pg[3].split('+') for s in states):
+                continue
+            if osd is not None and osd not in pg[2]:
+                continue
+            if primary is not None and (not pg[2] or pg[2][0] != primary):
+                continue
+            result.append(self.pg_record(pg))
+        return {'pg_ready': True, 'pg_stats': result}
+
+    def _cmd_pg_ls(self, cmd):
+        return self._pg_filter(cmd)
+    _cmd_pg_ls.read_only = True
+
+    def _cmd_pg_ls_by_pool(self, cmd):
+        return self._pg_filter(cmd)
+    _cmd_pg_ls_by_pool.read_only = True
+
+    def _cmd_pg_ls_by_osd(self, cmd):
+        # 与MON一致, 只识别osd, 没有时返回所有PG
+        if 'osd' not in cmd:
+            return self._pg_filter(cmd)
+        return self._pg_filter(cmd, osd = self._osd_ids([cmd['osd']])[0])
+    _cmd_pg_ls_by_osd.read_only = True
+
+    def _cmd_pg_ls_by_primary(self, cmd):
+        if 'osd' not in cmd:
+            return self._pg_filter(cmd)
+        return self._pg_filter(cmd, primary = self._osd_ids([cmd['osd']])[0])
+    _cmd_pg_ls_by_primary.read_only = True
+
+    def _pool_stats(self):
+        sums = {}
+        for pg in self.pgs():
+            o, b, r, w = self._pg_sum(pg[0], pg[1])
+            s = sums.setdefault(pg[0], [0, 0, 0, 0, 0])
+            s[0] += o
+            s[1] += b
+            s[2] += r
+            s[3] += w
+            s[4] += 1
+        return [{'poolid': pid, 'num_pg': s[4], 'stat_sum': {'num_bytes': s[1], 'num_objects': s[0], 'num_read': s[2], 'num_write': s[3]},
+                 'log_size': 0, 'ondisk_log_size': 0, 'up': s[4] * self.pools[pid]['size'], 'acting': s[4] * self.pools[pid]['size']} for pid, s in sorted(sums.items())]
+
+    def _osd_stats(self):
+        counts, primaries = self.osd_pg_counts()
+        return [{'osd': o['id'], 'up_from': 5, 'seq': 0, 'num_pgs': counts[o['id']], 'num_osds': 1, 'num_per_pool_osds': 1,
+                 'kb': o['kb'], 'kb_used': o['kb_used'], 'kb_used_data': o['kb_used'], 'kb_used_omap': 0, 'kb_used_meta': 0,
+                 'kb_avail': o['kb'] - o['kb_used'], 'hb_peers': [], 'snap_trim_queue_len': 0, 'num_snap_trimming': 0,
+                 'num_shards_repaired': 0, 'op_queue_age_hist': {'histogram': [], 'upper_bound': 1},
+                 'perf_stat': {'commit_latency_ms': o['commit_latency_ms'], 'apply_latency_ms': o['apply_latency_ms']}, 'alerts': []} for o in self.osds]
+
+    def _cmd_pg_dump(self, cmd):
+        contents = cmd.get('dumpcontents') or ['all']
+        pgs = self.pgs()
+        if contents == ['pgs_brief']:
+            return {'pg_ready': True, 'pg_stats': [self.pg_record(pg, brief = True) for pg in pgs]}
+        pg_map = {'version': self.epoch * 10, 'stamp': '2022-04-22 00:00:00.000000', 'last_osdmap_epoch': 0, 'last_pg_scan': 0}
+        if 'all' in contents or 'summary' in contents or 'sum' in contents:
+            objects = sum(self._pg_sum(pg[0], pg[1])[0] for pg in pgs)
+            nbytes = sum(self._pg_sum(pg[0], pg[1])[1] for pg in pgs)
+            pg_map['pg_stats_sum'] = {'stat_sum': {'num_bytes': nbytes, 'num_objects': objects}, 'log_size': 0, 'ondisk_log_size': 0, 'up': 0, 'acting': 0}
+            pg_map['osd_stats_sum'] = {'kb': sum(o['kb'] for o in self.osds), 'kb_used': sum(o['kb_used'] for o in self.osds)}
+        if 'all' in contents or 'delta' in contents:
+            pg_map['pg_stats_delta'] = {'stat_sum': {}, 'log_size': 0, 'ondisk_log_size': 0, 'up': 0, 'acting': 0, 'stamp_delta': '5.000000'}
+        if 'all' in contents or 'pgs' in contents:
+            pg_map['pg_stats'] = [self.pg_record(pg) for pg in pgs]
+        if 'all' in contents or 'pools' in contents:
+            pg_map['pool_stats'] = self._pool_stats()
+        if 'all' in contents or 'osds' in contents:
+            pg_map['osd_stats'] = self._osd_stats()
+        if 'all' in contents:
+            pg_map['pool_statfs'] = []
+        return {'pg_ready': True, 'pg_map': pg_map}
+    _cmd_pg_dump.read_only = True
+
+    def _cmd_pg_dump_json(self, cmd):
+        return self._cmd_pg_dump({'prefix': 'pg dump'})
+    _cmd_pg_dump_json.read_only = True
+
+    def _cmd_pg_dump_pools_json(self, cmd):
+        return self._pool_stats()
+    _cmd_pg_dump_pools_json.read_only = True
+
+    def _cmd_pg_dump_stuck(self, cmd):
+        return [self.pg_record(pg, brief = True) for pg in self.pgs() if pg[3] != 'active+clean']
+    _cmd_pg_dump_stuck.read_only = True
+
+    def _cmd_pg_stat(self, cmd):
+        counts = {}
+        for pg in self.pgs():
+            counts[pg[3]] = counts.get(pg[3], 0) + 1
+        total = sum(o['kb'] for o in self.osds) * 1024
+        used = sum(o['kb_used'] for o in self.osds) * 1024
+        nbytes = sum(self._pg_sum(pg[0], pg[1])[1] for pg in self.pgs())
+        return {'num_pg_by_state': [{'name': k, 'num': v} for k, v in sorted(counts.items())], 'num_pgs': len(self.pgs()), 'num_bytes': nbytes,
+                'total_bytes': total, 'total_avail_bytes': total - used, 'total_used_bytes': used, 'total_used_raw_bytes': used,
+                'read_bytes_sec': 1048576, 'write_bytes_sec': 2097152, 'read_op_per_sec': 100, 'write_op_per_sec': 200}
+    _cmd_pg_stat.read_only = True
+
+    def _cmd_pg_map(self, cmd):
+        pool_id, ps = cmd['pgid'].split('.')
+        pool_id, ps = int(pool_id), int(ps, 16)
+        if pool_id not in self.pools or ps >= self.pools[pool_id]['pg_num']:
+            raise KeyError('pg {}'.format(cmd['pgid']))
+        up = self._place(self.pools[pool_id], ps)
+        return {'epoch': self.epoch, 'raw_pgid': cmd['pgid'], 'pgid': cmd['pgid'], 'up': up, 'acting': up}
+    _cmd_pg_map.read_only = True
+
+    def _cmd_node_ls(self, cmd):
+        t = cmd.get('type', 'all')
+        result = {}
+        if t in ('all', 'mon'):
+            result['mon'] = dict((m, [m]) for m in self.mons)
+        if t in ('all', 'osd'):
+            osd = {}
+            for host in self.hosts:
+                osd[host['name']] = list(host['osds'])
+            result['osd'] = osd
+        if t in ('all', 'mgr'):
+            result['mgr'] = dict((m, [m]) for m in self.mons)
+        if t == 'osd':
+            return result['osd']
+        return result
+    _cmd_node_ls.read_only = True
+
+    def _cmd_version(self, cmd):
+        return {'version': VERSION}
+    _cmd_version.read_only = True
+
+    def _cmd_versions(self, cmd):
+        return {'mon': {VERSION: len(self.mons)}, 'mgr': {VERSION: len(self.mons)}, 'osd': {VERSION: sum(1 for o in self.osds if o['up'])},
+                'mds': {}, 'overall': {VERSION: len(self.mons) * 2 + sum(1 for o in self.osds if o['up'])}}
+    _cmd_versions.read_only = True
+
+    def _cmd_osd_erasure_code_profile_ls(self, cmd):
+        return sorted(self.erasure_code_profiles)
+    _cmd_osd_erasure_code_profile_ls.read_only = True
+
+    def _cmd_osd_erasure_code_profile_get(self, cmd):
+        return self.erasure_code_profiles[cmd['name']]
+    _cmd_osd_erasure_code_profile_get.read_only = True
+
+    def _cmd_auth_ls(self, cmd):
+        return {'auth_dump': [{'entity': k, 'key': v['key'], 'caps': v['caps']} for k, v in sorted(self.auth.items())]}
+    _cmd_auth_ls.read_only = True
+    _cmd_auth_list = _cmd_auth_ls
+
+    def _cmd_auth_get(self, cmd):
+        v = self.auth[cmd['entity']]
+        return [{'entity': cmd['entity'], 'key': v['key'], 'caps': v['caps']}]
+    _cmd_auth_get.read_only = True
+
+    def _cmd_crash_ls(self, cmd):
+        return []
+    _cmd_crash_ls.read_only = True
+
+    # 修改集群状态的命令
+
+    def _cmd_osd_out(self, cmd):
+        for i in self._osd_ids(cmd['ids']):
+            self.osds[i]['in'] = 0
+        self._bump_epoch()
+        return (0, b'', 'marked out osd(s)')
+
+    def _cmd_osd_in(self, cmd):
+        for i in self._osd_ids(cmd['ids']):
+            self.osds[i]['in'] = 1
+        self._bump_epoch()
+        return (0, b'', 'marked in osd(s)')
+
+    def _cmd_osd_down(self, cmd):
+        for i in self._osd_ids(cmd['ids']):
+            self.osds[i]['up'] = 0
+        self._bump_epoch()
+        return (0, b'', 'marked down osd(s)')
+
+    def set_osd_up(self, osd_id, up = True):
+        '''
+        模拟OSD重新启动 (up) 或崩溃 (down), 对应的MON命令只能标记down
+        '''
+        with self.lock:
+            self.osds[osd_id]['up'] = 1 if up else 0
+            self._bump_epoch()
+
+    def _cmd_osd_reweight(self, cmd):
+        o = self.osds[int(cmd['id'])]
+        o['reweight'] = float(cmd['weight'])
+        self._bump_epoch()
+        return (0, b'', 'reweighted osd.{} to {}'.format(o['id'], o['reweight']))
+
+    def _cmd_osd_crush_reweight(self, cmd):
+        i = self._osd_ids([cmd['name']])[0]
+        self.osds[i]['crush_weight'] = float(cmd['weight'])
+        self.crush_version += 1
+        self._bump_epoch()
+        return (0, b'', 'reweighted item id {} name \'{}\' to {} in crush map'.format(i, cmd['name'], cmd['weight']))
+
+    def _cmd_osd_primary_affinity(self, cmd):
+        self.osds[int(cmd['id'])]['primary_affinity'] = float(cmd['weight'])
+        self._bump_epoch()
+        return (0, b'', '')
+
+    def _cmd_osd_set(self, cmd):
+        self.flags.add(cmd['key'])
+        self._bump_epoch()
+        return (0, b'', '{} is set'.format(cmd['key']))
+
+    def _cmd_osd_unset(self, cmd):
+        self.flags.discard(cmd['key'])
+        self._bump_epoch()
+        return (0, b'', '{} is unset'.format(cmd['key']))
+
+    def _cmd_osd_pool_create(self, cmd):
+        if self.pool_by_name(cmd['pool']) is not None:
+            return (0, b'', 'pool \'{}\' already exists'.format(cmd['pool']))
+        size = int(cmd.get('size', 3))
+        self._create_pool(cmd['pool'], int(cmd['pg_num']), size)
+        self._bump_epoch()
+        return (0, b'', 'pool \'{}\' created'.format(cmd['pool']))
+
+    def _cmd_osd_pool_delete(self, cmd):
+        pool = self.pool_by_name(cmd['pool'])
+        if pool is None:
+            return (0, b'', 'pool \'{}\' does not exist'.format(cmd['pool']))
+        if not cmd.get('yes_i_really_really_mean_it'):
+            return (-errno.EPERM, b'', 'WARNING: this will *PERMANENTLY DESTROY* all data stored in pool {}'.format(cmd['pool']))
+        del self.pools[pool['pool']]
+        self.rbd.pop(cmd['pool'], None)
+        self.rbd_ids.pop(cmd['pool'], None)
+        self.rbd_directory_cache.pop(cmd['pool'], None)
+        self.objects.pop(cmd['pool'], None)
+        self._bump_epoch()
+        return (0, b'', 'pool \'{}\' removed'.format(cmd['pool']))
+    _cmd_osd_pool_rm = _cmd_osd_pool_delete
+
+    def _cmd_osd_pool_set(self, cmd):
+        pool = self.pool_by_name(cmd['pool'])
+        if pool is None:
+            raise KeyError('pool {}'.format(cmd['pool']))
+        var, val = cmd['var'], cmd['val']
+        if var in ('pg_num', 'pgp_num', 'size', 'min_size', 'crush_rule'):
+            val = int(val)
+            if var == 'pg_num':
+                for k in ('pg_num', 'pg_num_target', 'pg_num_pending'):
+                    pool[k] = val
+            elif var == 'pgp_num':
+                pool['pg_placement_num'] = pool['pg_placement_num_target'] = val
+            else:
+                pool[var] = val
+        pool['last_change'] = str(self.epoch + 1)
+        self._bump_epoch()
+        return (0, b'', 'set pool {} {} to {}'.format(pool['pool'], var, val))
+
+    def _cmd_osd_pool_rename(self, cmd):
+        pool = self.pool_by_name(cmd['srcpool'])
+        if pool is None:
+            raise KeyError('pool {}'.format(cmd['srcpool']))
+        pool['pool_name'] = cmd['destpool']
+        for store in (self.rbd, self.rbd_ids, self.rbd_directory_cache, self.objects):
+            if cmd['srcpool'] in store:
+                store[cmd['destpool']] = store.pop(cmd['srcpool'])
+        self._bump_epoch()
+        return (0, b'', 'pool \'{}\' renamed to \'{}\''.format(cmd['srcpool'], cmd['destpool']))
+
+    def _cmd_osd_pool_application_enable(self, cmd):
+        pool = self.pool_by_name(cmd['pool'])
+        if pool is None:
+            raise KeyError('pool {}'.format(cmd['pool']))
+        pool['application_metadata'][cmd['app']] = {}
+        self._bump_epoch()
+        return (0, b'', 'enabled application \'{}\' on pool \'{}\''.format(cmd['app'], cmd['pool']))
+
+    def _scrub(self, cmd):
+        return (0, b'', 'instructing to {}'.format(cmd['prefix']))
+    _cmd_osd_scrub = _cmd_osd_deep_scrub = _cmd_osd_repair = _scrub
+    _cmd_pg_scrub = _cmd_pg_deep_scrub = _cmd_pg_repair = _cmd_pg_repeer = _scrub
+    _cmd_osd_pool_scrub = _cmd_osd_pool_deep_scrub = _cmd_osd_pool_repair = _scrub
+
+    def _cmd_auth_get_or_create(self, cmd):
+        entity = cmd['entity']
+        if entity not in self.auth:
+            caps = cmd.get('caps', [])
+            self.auth[entity] = {'key': 'AQ' + uuid.UUID(int = self.rng.getrandbits(128)).hex[:36] + '==', 'caps': dict(zip(caps[::2], caps[1::2]))}
+        return [{'entity': entity, 'key': self.auth[entity]['key'], 'caps': self.auth[entity]['caps']}]
+    _cmd_auth_add = _cmd_auth_get_or_create
+
+    def _cmd_auth_del(self, cmd):
+        self.auth.pop(cmd['entity'], None)
+        return (0, b'', 'updated')
+    _cmd_auth_rm = _cmd_auth_del
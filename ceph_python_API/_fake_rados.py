@@ -0,0 +1,349 @@
+# -*- coding: UTF-8 -*-
+'''
+可导入的rados模块替身, 由_fake_cluster.SyntheticCluster提供MON命令的json输出, 用于在没有Ceph集群的环境中运行和压测_ceph、_rbd
+须在导入_ceph、_rbd之前调用install(), 之后 import rados / import rbd 得到的是本模块和_fake_rbd:
+    import _fake_rados
+    cluster = _fake_rados.install(_fake_cluster.SyntheticCluster.scaled(num_osds = 3000, num_pgs = 100000), latency = 0.005)
+    import _ceph
+'''
+import bisect
+import errno
+import json
+import struct
+import random
+import sys
+import threading
+import time
+import _fake_cluster
+
+class Error(Exception):
+    def __init__(self, message, errno = None):
+        Exception.__init__(self, message)
+        self.errno = errno
+
+class OSError(Error):
+    pass
+
+class InvalidArgumentError(OSError):
+    pass
+
+class ObjectNotFound(OSError):
+    pass
+
+class ObjectExists(OSError):
+    pass
+
+class PermissionError(OSError):
+    pass
+
+class IOError(OSError):
+    pass
+
+class TimedOut(OSError):
+    pass
+
+class ConnectionShutdown(OSError):
+    pass
+
+class RadosStateError(Error):
+    pass
+
+class IoctxStateError(Error):
+    pass
+
+class Faults():
+    '''
+    延迟和错误注入配置, 所有属性都可以在运行中修改
+    :param latency: float, 每次调用的固定延迟, 单位为秒
+    :param jitter: float, 在latency基础上增加的随机延迟上限, 单位为秒
+    :param prefix_latency: dict, prefix -> 延迟 (秒), 覆盖指定命令的latency, 如 {'pg dump': 0.5}
+    :param bytes_per_sec: int, 模拟的传输带宽, 按outbuf大小增加延迟, 为None时不计算
+    :param connect_latency: float, connect()的延迟, 单位为秒, 模拟MON握手
+    :param error_rate: float, mon_command返回错误码的概率, 范围为0-1
+    :param error_ret: int, 注入的错误码, 默认为-ETIMEDOUT
+    :param raise_rate: float, mon_command等调用引发TimedOut的概率, 范围为0-1
+    :param connect_error_rate: float, connect()引发TimedOut的概率, 范围为0-1
+    :param seed: int, 随机种子, 为None时不固定
+    '''
+
+    def __init__(self, latency = 0.0, jitter = 0.0, prefix_latency = None, bytes_per_sec = None, connect_latency = 0.0,
+                 error_rate = 0.0, error_ret = -errno.ETIMEDOUT, raise_rate = 0.0, connect_error_rate = 0.0, seed = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.prefix_latency = dict(prefix_latency or {})
+        self.bytes_per_sec = bytes_per_sec
+        self.connect_latency = connect_latency
+        self.error_rate = error_rate
+        self.error_ret = error_ret
+        self.raise_rate = raise_rate
+        self.connect_error_rate = connect_error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _random(self):
+        with self._lock:
+            return self._rng.random()
+
+    def delay(self, name, nbytes = 0):
+        '''
+        按配置阻塞, 模拟一次调用的延迟
+        :param name: str, 命令的prefix或调用名称, 如 'osd tree'、'rbd list'
+        :param nbytes: int, 返回的数据大小, 单位为字节
+        '''
+        seconds = self.prefix_latency.get(name, self.latency)
+        if self.jitter:
+            seconds += self.jitter * self._random()
+        if self.bytes_per_sec:
+            seconds += float(nbytes) / self.bytes_per_sec
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def maybe_raise(self, name):
+        if self.raise_rate and self._random() < self.raise_rate:
+            raise TimedOut('injected timeout: {}'.format(name), errno = errno.ETIMEDOUT)
+
+    def maybe_error(self):
+        return bool(self.error_rate) and self._random() < self.error_rate
+
+# install()设置的默认集群和故障配置, Rados()未指定cluster/faults时使用
+_cluster = None
+_faults = Faults()
+
+def install(cluster = None, faults = None, **kwargs):
+    '''
+    将本模块注册为rados模块、将_fake_rbd注册为rbd模块
+    :param cluster: _fake_cluster.SyntheticCluster, 不指定时默认为一个12个OSD的小集群
+    :param faults: Faults, 不指定时由kwargs构造
+    :param kwargs: 传递给Faults的参数, 如latency、error_rate
+    :return: SyntheticCluster
+    '''
+    global _cluster, _faults
+    import _fake_rbd
+    if cluster is None:
+        cluster = _fake_cluster.SyntheticCluster()
+    _cluster = cluster
+    _faults = faults if faults is not None else Faults(**kwargs)
+    sys.modules['rados'] = sys.modules[__name__]
+    sys.modules['rbd'] = _fake_rbd
+    return cluster
+
+def get_cluster():
+    return _cluster
+
+def get_faults():
+    return _faults
+
+class Rados():
+    '''
+    rados.Rados的替身, 线程安全
+    :param cluster: SyntheticCluster, 不指定时使用install()设置的集群
+    :param faults: Faults, 不指定时使用install()设置的故障配置
+    '''
+
+    def __init__(self, rados_id = None, name = None, clustername = None, conf_defaults = None, conffile = None, conf = None, flags = 0, cluster = None, faults = None):
+        self.cluster = cluster if cluster is not None else _cluster
+        if self.cluster is None:
+            self.cluster = _fake_cluster.SyntheticCluster()
+        self.faults = faults if faults is not None else _faults
+        self.state = 'configuring'
+
+    def _require_connected(self):
+        if self.state != 'connected':
+            raise RadosStateError('You cannot perform that operation on a Rados object in state {}.'.format(self.state))
+
+    def connect(self, timeout = 0):
+        if self.state != 'configuring':
+            raise RadosStateError('You cannot perform that operation on a Rados object in state {}.'.format(self.state))
+        if self.faults.connect_latency > 0:
+            time.sleep(self.faults.connect_latency)
+        if self.faults.connect_error_rate and self.faults._random() < self.faults.connect_error_rate:
+            raise TimedOut('error connecting to the cluster', errno = errno.ETIMEDOUT)
+        self.state = 'connected'
+
+    def shutdown(self):
+        self.state = 'shutdown'
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        self.shutdown()
+        return False
+
+    def get_fsid(self):
+        self._require_connected()
+        return self.cluster.fsid
+
+    def version(self):
+        return (14, 2, 22)
+
+    def list_pools(self):
+        self._require_connected()
+        with self.cluster.lock:
+            return [p['pool_name'] for _, p in sorted(self.cluster.pools.items())]
+
+    def pool_exists(self, pool_name):
+        self._require_connected()
+        return self.cluster.pool_by_name(pool_name) is not None
+
+    def pool_lookup(self, pool_name):
+        self._require_connected()
+        pool = self.cluster.pool_by_name(pool_name)
+        return pool['pool'] if pool is not None else None
+
+    def get_cluster_stats(self):
+        self._require_connected()
+        with self.cluster.lock:
+            kb = sum(o['kb'] for o in self.cluster.osds)
+            kb_used = sum(o['kb_used'] for o in self.cluster.osds)
+            objects = sum(self.cluster._pg_sum(pg[0], pg[1])[0] for pg in self.cluster.pgs())
+        return {'kb': kb, 'kb_used': kb_used, 'kb_avail': kb - kb_used, 'num_objects': objects}
+
+    def mon_command(self, cmd, inbuf, timeout = 0, target = None):
+        '''
+        :param cmd: str, 序列化的json命令
+        :param inbuf: str/bytes, 输入缓冲
+        :return: tuple (int ret, bytes outbuf, str outs)
+        '''
+        self._require_connected()
+        parsed = json.loads(cmd)
+        prefix = parsed.get('prefix', '')
+        self.faults.maybe_raise(prefix)
+        if self.faults.maybe_error():
+            self.faults.delay(prefix)
+            return (self.faults.error_ret, b'', 'injected error: {}'.format(prefix))
+        result = self.cluster.handle(parsed, inbuf)
+        self.faults.delay(prefix, len(result[1]))
+        return result
+
+    def open_ioctx(self, ioctx_name):
+        self._require_connected()
+        if self.cluster.pool_by_name(ioctx_name) is None:
+            raise ObjectNotFound('error opening pool \'{}\''.format(ioctx_name), errno = errno.ENOENT)
+        return Ioctx(self, ioctx_name)
+
+class ReadOpCtx():
+    '''
+    rados.ReadOpCtx的替身, 只支持get_omap_vals()
+    '''
+
+    def __init__(self):
+        self.requests = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        return False
+
+def _encode_string(value):
+    data = value.encode('utf-8')
+    return struct.pack('<I', len(data)) + data
+
+class Ioctx():
+    '''
+    rados.Ioctx的替身, 除普通对象外, 也可以stat由_fake_rbd维护的RBD镜像的数据对象 (rbd_data.<id>.<对象编号>),
+    以及读取rbd_directory对象的omap (name_<镜像名称> -> 镜像ID, id_<镜像ID> -> 镜像名称)
+    '''
+
+    def __init__(self, rados, name):
+        self.rados = rados
+        self.cluster = rados.cluster
+        self.name = name
+        self.state = 'open'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        self.state = 'closed'
+
+    def _require_open(self):
+        if self.state != 'open':
+            raise IoctxStateError('The pool is {}'.format(self.state))
+
+    def get_pool_name(self):
+        return self.name
+
+    def _objects(self):
+        return self.cluster.objects.setdefault(self.name, {})
+
+    def write_full(self, key, data):
+        self._require_open()
+        with self.cluster.lock:
+            self._objects()[key] = (len(data), time.time())
+
+    def remove_object(self, key):
+        self._require_open()
+        with self.cluster.lock:
+            if self._objects().pop(key, None) is None:
+                raise ObjectNotFound('Failed to remove \'{}\''.format(key), errno = errno.ENOENT)
+        return True
+
+    def stat(self, key):
+        '''
+        :return: tuple (int size, time.struct_time mtime)
+        :raise ObjectNotFound: 对象不存在
+        '''
+        self._require_open()
+        self.rados.faults.maybe_raise('stat')
+        self.rados.faults.delay('stat')
+        with self.cluster.lock:
+            found = self._objects().get(key)
+            if found is None and key.startswith('rbd_data.'):
+                found = self._rbd_object(key)
+        if found is None:
+            raise ObjectNotFound('Failed to stat \'{}\''.format(key), errno = errno.ENOENT)
+        return (found[0], time.localtime(found[1]))
+
+    def get_omap_vals(self, read_op, start_after, filter_prefix, max_return):
+        '''
+        :return: tuple (迭代器, int), 迭代器在operate_read_op()之后才有内容, 元素为 (str key, bytes value)
+        '''
+        result = []
+        read_op.requests.append((start_after, filter_prefix, max_return, result))
+        return iter(result), 0
+
+    def operate_read_op(self, read_op, oid, flag = 0):
+        self._require_open()
+        self.rados.faults.maybe_raise('omap')
+        self.rados.faults.delay('omap')
+        if oid != 'rbd_directory':
+            raise ObjectNotFound('Failed to operate read op for oid {}'.format(oid), errno = errno.ENOENT)
+        with self.cluster.lock:
+            images = self.cluster.rbd.get(self.name)
+            if not images:
+                raise ObjectNotFound('Failed to operate read op for oid {}'.format(oid), errno = errno.ENOENT)
+            # 排序后的omap一直缓存到镜像被创建、删除或重命名 (由_fake_rbd失效), 分页读取大量镜像时不必每次重新排序
+            cached = self.cluster.rbd_directory_cache.get(self.name)
+            if cached is None:
+                omap = [('id_' + state.id, _encode_string(name)) for name, state in images.items()]
+                omap.extend(('name_' + name, _encode_string(state.id)) for name, state in images.items())
+                omap.sort()
+                cached = self.cluster.rbd_directory_cache[self.name] = ([key for key, _ in omap], omap)
+            keys, omap = cached
+        for start_after, filter_prefix, max_return, result in read_op.requests:
+            i = max(bisect.bisect_right(keys, start_after), bisect.bisect_left(keys, filter_prefix))
+            while i < len(omap) and len(result) < max_return:
+                if not keys[i].startswith(filter_prefix):
+                    break
+                result.append(omap[i])
+                i += 1
+        read_op.requests = []
+
+    def _rbd_object(self, key):
+        try:
+            _, image_id, number = key.split('.')
+            number = int(number, 16)
+        except ValueError:
+            return None
+        image = self.cluster.rbd_ids.get(self.name, {}).get(image_id)
+        if image is None or number not in image.objects:
+            return None
+        obj_size = 1 << image.order
+        return (min(obj_size, image.size - number * obj_size), image.created)
@@ -0,0 +1,495 @@
+# -*- coding: UTF-8 -*-
+'''
+可导入的rbd模块替身, 镜像、快照和已分配的数据对象保存在_fake_cluster.SyntheticCluster中, 由_fake_rados.install()注册为rbd模块
+镜像以对象为粒度记录写入: objects为 对象编号 -> 版本号, 每次写入增加版本号, 快照保存当时的副本, diff_iterate()据此计算差异
+'''
+import errno
+import random
+import time
+from collections import OrderedDict
+
+RBD_FEATURE_LAYERING = 1
+RBD_FEATURE_STRIPINGV2 = 2
+RBD_FEATURE_EXCLUSIVE_LOCK = 4
+RBD_FEATURE_OBJECT_MAP = 8
+RBD_FEATURE_FAST_DIFF = 16
+RBD_FEATURE_DEEP_FLATTEN = 32
+RBD_FEATURE_JOURNALING = 64
+RBD_FEATURE_DATA_POOL = 128
+RBD_FEATURES_DEFAULT = RBD_FEATURE_LAYERING | RBD_FEATURE_EXCLUSIVE_LOCK | RBD_FEATURE_OBJECT_MAP | RBD_FEATURE_FAST_DIFF | RBD_FEATURE_DEEP_FLATTEN
+
+RBD_FLAG_OBJECT_MAP_INVALID = 1
+RBD_FLAG_FAST_DIFF_INVALID = 2
+
+class Error(Exception):
+    def __init__(self, message, errno = None):
+        Exception.__init__(self, message)
+        self.errno = errno
+
+class OSError(Error):
+    pass
+
+class PermissionError(OSError):
+    pass
+
+class ImageNotFound(OSError):
+    pass
+
+class ObjectNotFound(OSError):
+    pass
+
+class ImageExists(OSError):
+    pass
+
+class ObjectExists(OSError):
+    pass
+
+class IOError(OSError):
+    pass
+
+class NoSpace(OSError):
+    pass
+
+class InvalidArgument(OSError):
+    pass
+
+class ReadOnlyImage(OSError):
+    pass
+
+class ImageBusy(OSError):
+    pass
+
+class ImageHasSnapshots(OSError):
+    pass
+
+class FunctionNotSupported(OSError):
+    pass
+
+class ArgumentOutOfRange(OSError):
+    pass
+
+class Timeout(OSError):
+    pass
+
+class SnapState():
+
+    def __init__(self, snap_id, name, size, objects):
+        self.id = snap_id
+        self.name = name
+        self.size = size
+        self.objects = dict(objects)
+        self.protected = False
+        self.timestamp = time.time()
+        self.children = set() # (存储池名称, 镜像名称)
+
+class ImageState():
+    '''
+    镜像的内部状态
+    '''
+
+    def __init__(self, pool, name, image_id, size, order, features):
+        self.pool = pool
+        self.name = name
+        self.id = image_id
+        self.size = size
+        self.order = order
+        self.features = features
+        self.flags = 0
+        self.objects = {}
+        self.snaps = OrderedDict() # snap_id -> SnapState
+        self.snap_seq = 0
+        self.parent = None # (存储池名称, 镜像名称, 快照名称)
+        self.created = time.time()
+        self.open_count = 0
+        self.version = 0
+
+    def snap_by_name(self, name):
+        for snap in self.snaps.values():
+            if snap.name == name:
+                return snap
+        raise ImageNotFound('error setting image context: snapshot {} not found'.format(name), errno = errno.ENOENT)
+
+def _store(ioctx):
+    return ioctx.cluster.rbd.setdefault(ioctx.name, OrderedDict()), ioctx.cluster.rbd_ids.setdefault(ioctx.name, {})
+
+def _invalidate_directory(cluster, pool):
+    # 调用时须持有cluster.lock, 镜像的创建、删除和重命名后丢弃_fake_rados缓存的rbd_directory omap
+    cluster.rbd_directory_cache.pop(pool, None)
+
+def _call(ioctx, name):
+    # 模拟一次librbd调用的延迟和超时
+    faults = ioctx.rados.faults
+    faults.maybe_raise(name)
+    faults.delay(name)
+
+def _new_id(cluster):
+    return '{:012x}'.format(cluster.rng.getrandbits(48))
+
+class RBD():
+    '''
+    rbd.RBD的替身
+    '''
+
+    def create(self, ioctx, name, size, order = None, old_format = False, features = None, stripe_unit = None, stripe_count = None, data_pool = None):
+        _call(ioctx, 'rbd create')
+        if not isinstance(size, int) or size < 0:
+            raise InvalidArgument('error creating image', errno = errno.EINVAL)
+        with ioctx.cluster.lock:
+            names, ids = _store(ioctx)
+            if name in names:
+                raise ImageExists('error creating image', errno = errno.EEXIST)
+            state = ImageState(ioctx.name, name, _new_id(ioctx.cluster), size, order or 22, RBD_FEATURES_DEFAULT if features is None else features)
+            names[name] = state
+            ids[state.id] = state
+            _invalidate_directory(ioctx.cluster, ioctx.name)
+
+    def list(self, ioctx):
+        _call(ioctx, 'rbd list')
+        with ioctx.cluster.lock:
+            return sorted(_store(ioctx)[0])
+
+    def list2(self, ioctx):
+        _call(ioctx, 'rbd list')
+        with ioctx.cluster.lock:
+            names = _store(ioctx)[0]
+            return iter([{'id': names[n].id, 'name': n} for n in sorted(names)])
+
+    def remove(self, ioctx, name, on_progress = None):
+        _call(ioctx, 'rbd remove')
+        with ioctx.cluster.lock:
+            names, ids = _store(ioctx)
+            state = names.get(name)
+            if state is None:
+                raise ImageNotFound('error removing image', errno = errno.ENOENT)
+            if state.snaps:
+                raise ImageHasSnapshots('error removing image', errno = errno.ENOTEMPTY)
+            if state.open_count:
+                raise ImageBusy('error removing image', errno = errno.EBUSY)
+            if state.parent is not None:
+                parent = ioctx.cluster.rbd.get(state.parent[0], {}).get(state.parent[1])
+                if parent is not None:
+                    parent.snap_by_name(state.parent[2]).children.discard((ioctx.name, name))
+            del names[name]
+            del ids[state.id]
+            _invalidate_directory(ioctx.cluster, ioctx.name)
+
+    def rename(self, ioctx, src, dest):
+        _call(ioctx, 'rbd rename')
+        with ioctx.cluster.lock:
+            names, _ = _store(ioctx)
+            if src not in names:
+                raise ImageNotFound('error renaming image', errno = errno.ENOENT)
+            if dest in names:
+                raise ImageExists('error renaming image', errno = errno.EEXIST)
+            state = names.pop(src)
+            state.name = dest
+            names[dest] = state
+            _invalidate_directory(ioctx.cluster, ioctx.name)
+
+    def clone(self, p_ioctx, p_name, p_snapname, c_ioctx, c_name, features = None, order = None, stripe_unit = None, stripe_count = None, data_pool = None):
+        _call(c_ioctx, 'rbd clone')
+        with c_ioctx.cluster.lock:
+            parent = _store(p_ioctx)[0].get(p_name)
+            if parent is None:
+                raise ImageNotFound('error creating clone', errno = errno.ENOENT)
+            snap = parent.snap_by_name(p_snapname)
+            if not snap.protected:
+                raise InvalidArgument('error creating clone', errno = errno.EINVAL)
+            names, ids = _store(c_ioctx)
+            if c_name in names:
+                raise ImageExists('error creating clone', errno = errno.EEXIST)
+            state = ImageState(c_ioctx.name, c_name, _new_id(c_ioctx.cluster), snap.size, order or parent.order, parent.features if features is None else features)
+            state.parent = (p_ioctx.name, p_name, p_snapname)
+            snap.children.add((c_ioctx.name, c_name))
+            names[c_name] = state
+            ids[state.id] = state
+            _invalidate_directory(c_ioctx.cluster, c_ioctx.name)
+
+class Image():
+    '''
+    rbd.Image的替身
+    '''
+
+    def __init__(self, ioctx, name = None, snapshot = None, read_only = False, image_id = None):
+        _call(ioctx, 'rbd open')
+        self.ioctx = ioctx
+        self.cluster = ioctx.cluster
+        self.read_only = read_only
+        with self.cluster.lock:
+            names, ids = _store(ioctx)
+            state = ids.get(image_id) if image_id is not None else names.get(name)
+            if state is None:
+                raise ImageNotFound('error opening image {} at snapshot {}'.format(name or image_id, snapshot), errno = errno.ENOENT)
+            self.state = state
+            self.snap = state.snap_by_name(snapshot) if snapshot is not None else None
+            state.open_count += 1
+        self.name = state.name
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        if not self.closed:
+            with self.cluster.lock:
+                self.state.open_count -= 1
+            self.closed = True
+
+    def _check(self):
+        if self.closed:
+            raise InvalidArgument('image is closed', errno = errno.EINVAL)
+
+    def _check_writable(self):
+        self._check()
+        if self.read_only or self.snap is not None:
+            raise ReadOnlyImage('image is read-only', errno = errno.EROFS)
+
+    def id(self):
+        self._check()
+        return self.state.id
+
+    def block_name_prefix(self):
+        self._check()
+        return 'rbd_data.{}'.format(self.state.id)
+
+    def size(self):
+        self._check()
+        return self.snap.size if self.snap is not None else self.state.size
+
+    def features(self):
+        self._check()
+        return self.state.features
+
+    def flags(self):
+        self._check()
+        return self.state.flags
+
+    def old_format(self):
+        return False
+
+    def stat(self):
+        self._check()
+        _call(self.ioctx, 'rbd stat')
+        size = self.size()
+        obj_size = 1 << self.state.order
+        parent = self.state.parent
+        return {
+            'size': size,
+            'obj_size': obj_size,
+            'num_objs': (size + obj_size - 1) // obj_size,
+            'order': self.state.order,
+            'block_name_prefix': self.block_name_prefix(),
+            'parent_pool': -1 if parent is None else self.cluster.pool_by_name(parent[0])['pool'],
+            'parent_name': '' if parent is None else parent[1],
+        }
+
+    def parent_info(self):
+        self._check()
+        if self.state.parent is None:
+            raise ImageNotFound('error getting parent info', errno = errno.ENOENT)
+        return self.state.parent
+
+    def get_parent_image_spec(self):
+        self._check()
+        if self.state.parent is None:
+            raise ImageNotFound('error getting parent info', errno = errno.ENOENT)
+        pool, name, snap_name = self.state.parent
+        with self.cluster.lock:
+            parent = self.cluster.rbd[pool][name]
+            snap = parent.snap_by_name(snap_name)
+        return {'pool_name': pool, 'pool_namespace': '', 'image_name': name, 'image_id': parent.id, 'snap_name': snap_name, 'snap_namespace_type': 0, 'snap_id': snap.id}
+
+    def list_snaps(self):
+        self._check()
+        _call(self.ioctx, 'rbd snap list')
+        with self.cluster.lock:
+            return iter([{'id': s.id, 'size': s.size, 'name': s.name, 'namespace': 0} for s in self.state.snaps.values()])
+
+    def create_snap(self, name):
+        self._check_writable()
+        _call(self.ioctx, 'rbd snap create')
+        with self.cluster.lock:
+            if any(s.name == name for s in self.state.snaps.values()):
+                raise ImageExists('error creating snapshot {}'.format(name), errno = errno.EEXIST)
+            self.state.snap_seq += 1
+            snap = SnapState(self.state.snap_seq, name, self.state.size, self.state.objects)
+            self.state.snaps[snap.id] = snap
+
+    def remove_snap(self, name):
+        self._check()
+        _call(self.ioctx, 'rbd snap remove')
+        with self.cluster.lock:
+            snap = self.state.snap_by_name(name)
+            if snap.protected:
+                raise ImageBusy('error removing snapshot {}'.format(name), errno = errno.EBUSY)
+            del self.state.snaps[snap.id]
+
+    def protect_snap(self, name):
+        self._check()
+        _call(self.ioctx, 'rbd snap protect')
+        with self.cluster.lock:
+            snap = self.state.snap_by_name(name)
+            if snap.protected:
+                raise InvalidArgument('error protecting snapshot {}'.format(name), errno = errno.EBUSY)
+            snap.protected = True
+
+    def unprotect_snap(self, name):
+        self._check()
+        _call(self.ioctx, 'rbd snap unprotect')
+        with self.cluster.lock:
+            snap = self.state.snap_by_name(name)
+            if not snap.protected:
+                raise InvalidArgument('error unprotecting snapshot {}'.format(name), errno = errno.EINVAL)
+            if snap.children:
+                raise ImageBusy('error unprotecting snapshot {}'.format(name), errno = errno.EBUSY)
+            snap.protected = False
+
+    def is_protected_snap(self, name):
+        self._check()
+        with self.cluster.lock:
+            return self.state.snap_by_name(name).protected
+
+    def get_snap_timestamp(self, snap_id):
+        self._check()
+        with self.cluster.lock:
+            if snap_id not in self.state.snaps:
+                raise ImageNotFound('error getting snapshot timestamp', errno = errno.ENOENT)
+            return time.localtime(self.state.snaps[snap_id].timestamp)
+
+    def rollback_to_snap(self, name, on_progress = None):
+        self._check_writable()
+        _call(self.ioctx, 'rbd snap rollback')
+        with self.cluster.lock:
+            snap = self.state.snap_by_name(name)
+            self.state.version += 1
+            self.state.objects = dict((n, self.state.version) for n in snap.objects)
+            self.state.size = snap.size
+
+    def set_snap(self, name):
+        self._check()
+        with self.cluster.lock:
+            self.snap = self.state.snap_by_name(name) if name is not None else None
+
+    def resize(self, size, allow_shrink = True):
+        self._check_writable()
+        _call(self.ioctx, 'rbd resize')
+        with self.cluster.lock:
+            if size < self.state.size and not allow_shrink:
+                raise InvalidArgument('error resizing image', errno = errno.EINVAL)
+            limit = (size + (1 << self.state.order) - 1) >> self.state.order
+            self.state.objects = dict((n, v) for n, v in self.state.objects.items() if n < limit)
+            self.state.size = size
+
+    def write(self, data, offset, fadvise_flags = 0):
+        self._check_writable()
+        if offset + len(data) > self.state.size:
+            raise InvalidArgument('error writing to image', errno = errno.EINVAL)
+        with self.cluster.lock:
+            self.state.version += 1
+            if data:
+                for n in range(offset >> self.state.order, ((offset + len(data) - 1) >> self.state.order) + 1):
+                    self.state.objects[n] = self.state.version
+        return len(data)
+
+    def discard(self, offset, length):
+        self._check_writable()
+        with self.cluster.lock:
+            obj_size = 1 << self.state.order
+            for n in range(offset >> self.state.order, (offset + length) >> self.state.order):
+                if n * obj_size >= offset:
+                    self.state.objects.pop(n, None)
+
+    def _view(self, include_parent):
+        # 当前视图 (头或已设置的快照) 下已分配的对象, 包括未被覆盖的父镜像对象
+        objects = dict(self.snap.objects if self.snap is not None else self.state.objects)
+        state = self.state
+        while include_parent and state.parent is not None:
+            pool, name, snap_name = state.parent
+            parent = self.cluster.rbd.get(pool, {}).get(name)
+            if parent is None:
+                break
+            snap = parent.snap_by_name(snap_name)
+            for n, v in snap.objects.items():
+                objects.setdefault(n, ('parent', v))
+            state = parent
+        return objects
+
+    def diff_iterate(self, offset, length, from_snapshot, iterate_cb, include_parent = True, whole_object = False):
+        '''
+        以对象为粒度回调 iterate_cb(offset, length, exists), 粒度与whole_object无关
+        '''
+        self._check()
+        _call(self.ioctx, 'rbd diff')
+        with self.cluster.lock:
+            current = self._view(include_parent and from_snapshot is None)
+            base = self.state.snap_by_name(from_snapshot).objects if from_snapshot is not None else {}
+            size = self.size()
+        obj_size = 1 << self.state.order
+        extents = []
+        for n in set(current) | set(base):
+            start = n * obj_size
+            if n in current and current[n] != base.get(n):
+                exists = True
+            elif n not in current:
+                exists = False
+            else:
+                continue
+            begin, end = max(start, offset), min(start + obj_size, offset + length, size)
+            if begin < end:
+                extents.append((begin, end - begin, exists))
+        for e in sorted(extents):
+            iterate_cb(*e)
+        return 0
+
+    def list_children(self):
+        self._check()
+        if self.snap is None:
+            return []
+        with self.cluster.lock:
+            return sorted(self.snap.children)
+
+def populate(cluster, pool, count, size = 10 * 1024 ** 3, used_ratio = 0.3, snaps = 0, order = 22, features = None, prefix = 'image', seed = 0):
+    '''
+    批量生成镜像, 用于压测镜像列表、信息收集和容量统计
+    :param cluster: SyntheticCluster
+    :param pool: str, 存储池名称, 须已存在
+    :param count: int, 镜像数量
+    :param size: int, 每个镜像的大小, 单位为字节
+    :param used_ratio: float, 已分配对象占全部对象的比例, 范围为0-1, 为0时不分配对象 (生成大量镜像时节省内存)
+    :param snaps: int, 每个镜像的快照数量, 每个快照之后会再写入少量对象
+    :param order: int, 对象大小的2的幂
+    :param features: int, 镜像特性, 不指定时默认为RBD_FEATURES_DEFAULT
+    :param prefix: str, 镜像名称前缀, 镜像名称为 <prefix>-<序号>
+    :param seed: int, 随机种子
+    :return: list, 生成的镜像名称
+    '''
+    if cluster.pool_by_name(pool) is None:
+        raise KeyError('pool {}'.format(pool))
+    rng = random.Random(seed)
+    num_objs = (size + (1 << order) - 1) >> order
+    names = []
+    with cluster.lock:
+        by_name = cluster.rbd.setdefault(pool, OrderedDict())
+        by_id = cluster.rbd_ids.setdefault(pool, {})
+        for i in range(count):
+            name = '{}-{:06d}'.format(prefix, i)
+            state = ImageState(pool, name, '{:012x}'.format(rng.getrandbits(48)), size, order, RBD_FEATURES_DEFAULT if features is None else features)
+            used = int(num_objs * used_ratio)
+            if used:
+                state.version = 1
+                state.objects = dict.fromkeys(rng.sample(range(num_objs), used), 1)
+            for s in range(snaps):
+                state.snap_seq += 1
+                state.snaps[state.snap_seq] = SnapState(state.snap_seq, 'snap{}'.format(s), size, state.objects)
+                state.version += 1
+                for n in rng.sample(range(num_objs), max(1, used // 10)) if used else []:
+                    state.objects[n] = state.version
+            by_name[name] = state
+            by_id[state.id] = state
+            names.append(name)
+        _invalidate_directory(cluster, pool)
+    return names
@@ -0,0 +1,245 @@
+# -*- coding: UTF-8 -*-
+'''
+订阅集群健康检查的变化: 后台轮询health detail (或status), 解析其中的检查项, 只有检查项出现、消失、严重程度或数量变化 (无法得到数量时为消息变化) 时才产生事件
+所有订阅者共用同一次轮询和同一次对比, 订阅者数量不影响MON的负载
+    import _ceph
+    import _health_watch
+    watcher = _health_watch.HealthWatcher(_ceph.Ceph(), interval = 5)
+    watcher.subscribe(lambda event: print(event['type'], event['check'], event['severity']))
+    watcher.start()
+    # asyncio中:
+    async for event in watcher.events():
+        ...
+    watcher.stop()
+事件的格式:
+    {'type': 'appeared' | 'cleared' | 'changed', 'check': str, 'severity': str, 'count': int, 'message': str,
+     'changes': {'severity': [old, new], 'count': [old, new]}, # 只包含变化的字段, appeared和cleared时为{}, 前后count均为None时比较message
+     'status': str, 'time': float} # status为整体健康状态, cleared事件的severity、count、message为消失前的值
+'''
+import asyncio
+import re
+import threading
+import time
+import _poller
+
+SEVERITY_ORDER = {'HEALTH_OK': 0, 'HEALTH_WARN': 1, 'HEALTH_ERR': 2}
+
+# Nautilus的summary中没有count, 多数检查项的message以数量开头, 如 '2 osds down'、'3 pgs not deep-scrubbed in time'
+_LEADING_COUNT = re.compile(r'^(\d+) ')
+
+def parse_checks(data):
+    '''
+    :param data: dict, health或health detail的json, 也可以是status的json (取其中的health)
+    :return: tuple, (str 整体健康状态, dict 检查项名称 -> {'severity': str, 'count': int, 'message': str})
+        count取summary中的count; 没有时 (Nautilus及更旧的版本) 取message开头的数量, 再没有时为detail的条目数, 均没有时为None
+    '''
+    if 'health' in data and isinstance(data['health'], dict):
+        data = data['health']
+    status = data.get('status') or data.get('overall_status') or 'HEALTH_OK'
+    checks = {}
+    for name, check in (data.get('checks') or {}).items():
+        summary = check.get('summary') or {}
+        count = summary.get('count')
+        if count is None:
+            match = _LEADING_COUNT.match(summary.get('message') or '')
+            if match:
+                count = int(match.group(1))
+            elif 'detail' in check:
+                count = len(check['detail'])
+        checks[name] = {'severity': check.get('severity'), 'count': count, 'message': summary.get('message')}
+    return status, checks
+
+def diff_checks(old, new, status = None, now = None):
+    '''
+    :param old: dict, parse_checks()返回的检查项, 为None时new中所有检查项均为appeared
+    :param new: dict, parse_checks()返回的检查项
+    :param status: str, 新的整体健康状态, 写入每个事件
+    :return: list, 事件, 格式见模块说明, 按检查项名称排序
+    '''
+    old = old or {}
+    now = now or time.time()
+    events = []
+    for name in sorted(set(old) | set(new)):
+        if name not in old:
+            kind, check, changes = 'appeared', new[name], {}
+        elif name not in new:
+            kind, check, changes = 'cleared', old[name], {}
+        else:
+            check = new[name]
+            # 无法得到数量的检查项 (如 'Degraded data redundancy: 10/300 objects degraded ...') 以消息的变化代替数量的变化
+            fields = ('severity', 'count') if old[name]['count'] is not None or check['count'] is not None else ('severity', 'message')
+            changes = dict((f, [old[name][f], check[f]]) for f in fields if old[name][f] != check[f])
+            if not changes:
+                continue
+            kind = 'changed'
+        events.append({'type': kind, 'check': name, 'severity': check['severity'], 'count': check['count'], 'message': check['message'],
+                       'changes': changes, 'status': status, 'time': now})
+    return events
+
+class HealthSubscription():
+    '''
+    events()返回的异步迭代器, 事件从轮询线程通过call_soon_threadsafe送入事件循环中的队列
+    队列已满时丢弃最旧的事件, dropped记录丢弃的数量
+    '''
+
+    def __init__(self, watcher, maxsize, loop):
+        self.watcher = watcher
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.closed = False
+
+    def _put(self, event):
+        # 在事件循环线程中执行
+        if self.maxsize and self.queue.qsize() >= self.maxsize:
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    def __call__(self, event):
+        # 在轮询线程中执行
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError: # 事件循环已关闭
+            self.close()
+
+    def close(self):
+        '''
+        取消订阅, 正在等待的迭代结束
+        '''
+        if self.closed:
+            return
+        self.closed = True
+        self.watcher.unsubscribe(self)
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+        except RuntimeError:
+            pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed and self.queue.empty():
+            raise StopAsyncIteration
+        event = await self.queue.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class HealthWatcher():
+    '''
+    在_poller.Poller上注册一个health detail (或status) 命令, 每次发布新结果时解析并与上一次对比, 把事件分发给所有订阅者
+    结果未变化 (同一个对象, 如执行失败时保留的旧结果) 时不解析也不对比
+    :param source: _poller.Poller 或 _ceph.Ceph, 为Ceph时创建一个只包含该命令的Poller, 由start()/stop()控制
+    :param interval: int/float, 轮询间隔, 单位为秒
+    :param use_status: bool, 为True时轮询status而不是health detail, 可与其他需要status的组件共用同一个命令
+    :param name: str, 在Poller中的名称, 不指定时为 'health_detail' 或 'status'
+    '''
+
+    def __init__(self, source, interval = 5, use_status = False, name = None):
+        self.owns_poller = not isinstance(source, _poller.Poller)
+        self.poller = _poller.Poller(source, commands = {}) if self.owns_poller else source
+        self.name = name or ('status' if use_status else 'health_detail')
+        if self.name not in self.poller.commands:
+            if use_status:
+                self.poller.add(self.name, interval, method = 'status')
+            else:
+                self.poller.add(self.name, interval, method = 'health', detail = 'detail')
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.data = None
+        self.status = None
+        self.checks = None
+        self.stats = {'polls': 0, 'changes': 0, 'events': 0}
+        self.poller.subscribe(self._on_publish)
+
+    def _on_publish(self, name, snapshot):
+        if name != self.name:
+            return
+        data = snapshot.data(name)
+        with self.lock:
+            self.stats['polls'] += 1
+            if data is None or data is self.data:
+                return
+            self.data = data
+            status, checks = parse_checks(data)
+            events = diff_checks(self.checks, checks, status)
+            self.status = status
+            self.checks = checks
+            if not events:
+                return
+            self.stats['changes'] += 1
+            self.stats['events'] += len(events)
+            subscribers = self.subscribers
+        for callback in subscribers:
+            for event in events:
+                try:
+                    callback(event)
+                except Exception:
+                    pass
+
+    def current(self):
+        '''
+        :return: tuple, (str 整体健康状态, dict 检查项), 尚未轮询到结果时为 (None, None)
+        '''
+        with self.lock:
+            return self.status, self.checks
+
+    def subscribe(self, callback, replay = True):
+        '''
+        :param callback: callable, 在轮询线程中调用callback(event), 所有订阅者收到的是同一个事件对象, 不要修改; 不应长时间阻塞, 引发的异常会被忽略
+        :param replay: bool, 为True时先对当前已有的检查项各调用一次appeared事件
+        '''
+        with self.lock:
+            self.subscribers = self.subscribers + [callback]
+            events = diff_checks(None, self.checks, self.status) if replay and self.checks else []
+        for event in events:
+            callback(event)
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            self.subscribers = [c for c in self.subscribers if c != callback]
+
+    def events(self, maxsize = 1000, replay = True):
+        '''
+        在事件循环中调用, 返回异步迭代器, 用 async for 读取事件, 结束时调用close()或使用 async with
+        :param maxsize: int, 队列中最多缓存的事件数量, 为0时不限制
+        :param replay: bool, 为True时先收到当前已有的检查项的appeared事件
+        :return: HealthSubscription
+        '''
+        subscription = HealthSubscription(self, maxsize, asyncio.get_event_loop())
+        self.subscribe(subscription, replay = replay)
+        return subscription
+
+    def start(self):
+        '''
+        source为Ceph时启动内部的Poller, 共用外部Poller时由外部控制
+        '''
+        if self.owns_poller:
+            self.poller.start()
+
+    def stop(self, timeout = None):
+        if self.owns_poller:
+            self.poller.stop(timeout)
+
+    def close(self):
+        '''
+        停止接收Poller的结果, 共用外部Poller时不移除已注册的命令
+        '''
+        self.poller.unsubscribe(self._on_publish)
+        self.stop()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
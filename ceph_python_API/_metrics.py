@@ -0,0 +1,217 @@
+# -*- coding: UTF-8 -*-
+import re
+import subprocess
+import threading
+import time
+
+class LatencyHistogram():
+    '''
+    HDR风格的对数-线性延迟直方图: 以2的幂划分区间, 每个区间再等分为2^sub_bucket_bits个子区间, 相对误差不超过2^-sub_bucket_bits
+    数值以微秒为单位记录, 内存占用固定, 记录和查询都不需要保存原始样本
+    :param sub_bucket_bits: int, 每个2的幂区间的子区间位数, 默认为4 (16个子区间, 相对误差约6%)
+    '''
+
+    MAX_SHIFT = 36 # 默认精度下可精确记录约2^40微秒 (约12.7天), 更大的值计入最后一个区间
+
+    def __init__(self, sub_bucket_bits = 4):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_buckets = 1 << sub_bucket_bits
+        self.counts = [0] * ((self.MAX_SHIFT + 2) * self.sub_buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0
+
+    def _index(self, value):
+        # value在[2^(k), 2^(k+1))内时, 右移shift位后的mantissa落在[sub_buckets, 2 * sub_buckets)内
+        shift = value.bit_length() - self.sub_bucket_bits - 1
+        if shift <= 0:
+            return value
+        if shift > self.MAX_SHIFT:
+            return len(self.counts) - 1
+        return (shift + 1) * self.sub_buckets + (value >> shift) - self.sub_buckets
+
+    def _upper_bound(self, index):
+        # 区间内的最大值
+        shift = index // self.sub_buckets - 1
+        if shift <= 0:
+            return index
+        mantissa = index % self.sub_buckets + self.sub_buckets
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, seconds):
+        '''
+        记录一次延迟
+        :param seconds: float, 延迟, 单位为秒
+        '''
+        value = int(seconds * 1000000)
+        if value < 0:
+            value = 0
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.sum += seconds
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        '''
+        获取百分位延迟
+        :param p: float, 百分位, 范围为0-100, 如99表示p99
+        :return: float, 延迟, 单位为秒, 没有记录时返回0.0
+        '''
+        if self.count == 0:
+            return 0.0
+        rank = max(1, int(round(p / 100.0 * self.count)))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            if n:
+                seen += n
+                if seen >= rank:
+                    return min(self._upper_bound(index), self.max) / 1000000.0
+        return self.max / 1000000.0
+
+class _CommandStat():
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.bytes = 0
+        self.latency = LatencyHistogram()
+
+class CommandMetrics():
+    '''
+    按命令prefix统计调用次数、错误次数、outbuf返回字节数以及延迟直方图, 可导出为dict或Prometheus文本格式
+    未启用时observe()直接返回, 调用方也应先判断enabled以免除计时开销
+    :param enabled: bool, 是否启用统计, 默认为False
+    '''
+
+    QUANTILES = (50, 95, 99)
+
+    def __init__(self, enabled = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def observe(self, prefix, seconds, error = False, nbytes = 0):
+        '''
+        记录一次命令执行
+        :param prefix: str, 命令的prefix, 如 'osd tree', 或subprocess命令的前缀, 如 'rbd snap create'
+        :param seconds: float, 执行耗时, 单位为秒
+        :param error: bool, 是否执行出错
+        :param nbytes: int, 返回的outbuf字节数
+        '''
+        if not self.enabled:
+            return
+        with self._lock:
+            stat = self._stats.get(prefix)
+            if stat is None:
+                stat = self._stats[prefix] = _CommandStat()
+            stat.calls += 1
+            if error:
+                stat.errors += 1
+            stat.bytes += nbytes
+            stat.latency.record(seconds)
+
+    def to_dict(self):
+        '''
+        导出统计数据
+        :return: dict, prefix -> {'calls', 'errors', 'bytes', 'latency_sum', 'latency_max', 'p50', 'p95', 'p99'}, 延迟单位为秒
+        '''
+        with self._lock:
+            result = {}
+            for prefix, stat in self._stats.items():
+                item = {
+                    'calls': stat.calls,
+                    'errors': stat.errors,
+                    'bytes': stat.bytes,
+                    'latency_sum': stat.latency.sum,
+                    'latency_max': stat.latency.max / 1000000.0,
+                }
+                for q in self.QUANTILES:
+                    item['p{}'.format(q)] = stat.latency.percentile(q)
+                result[prefix] = item
+            return result
+
+    def to_prometheus(self, namespace = 'ceph_api'):
+        '''
+        导出为Prometheus文本格式
+        :param namespace: str, 指标名称前缀
+        :return: str
+        '''
+        data = self.to_dict()
+        lines = []
+
+        def family(name, kind, help, field):
+            lines.append('# HELP {0}_{1} {2}'.format(namespace, name, help))
+            lines.append('# TYPE {0}_{1} {2}'.format(namespace, name, kind))
+            for prefix in sorted(data):
+                lines.append('{0}_{1}{{prefix="{2}"}} {3}'.format(namespace, name, escape_label(prefix), data[prefix][field]))
+
+        family('command_calls_total', 'counter', 'Number of commands executed.', 'calls')
+        family('command_errors_total', 'counter', 'Number of commands that failed.', 'errors')
+        family('command_bytes_total', 'counter', 'Bytes returned in outbuf.', 'bytes')
+        lines.append('# HELP {0}_command_latency_seconds Command latency.'.format(namespace))
+        lines.append('# TYPE {0}_command_latency_seconds summary'.format(namespace))
+        for prefix in sorted(data):
+            label = escape_label(prefix)
+            for q in self.QUANTILES:
+                lines.append('{0}_command_latency_seconds{{prefix="{1}",quantile="{2}"}} {3}'.format(namespace, label, q / 100.0, data[prefix]['p{}'.format(q)]))
+            lines.append('{0}_command_latency_seconds_sum{{prefix="{1}"}} {2}'.format(namespace, label, data[prefix]['latency_sum']))
+            lines.append('{0}_command_latency_seconds_count{{prefix="{1}"}} {2}'.format(namespace, label, data[prefix]['calls']))
+        return '\n'.join(lines) + '\n'
+
+def escape_label(value):
+    '''
+    转义Prometheus标签值中的反斜杠、双引号和换行
+    '''
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# 进程内共享的统计, 默认不启用, 通过REGISTRY.enable()启用
+REGISTRY = CommandMetrics()
+
+_word = re.compile(r'^[a-z][a-z_-]*$')
+
+def subprocess_prefix(cmd):
+    '''
+    从subprocess命令行中提取统计用的前缀, 去掉ssh部分以及第一个参数值之后的内容, 如 ['rbd', 'snap', 'create', 'p/i@s'] -> 'rbd snap create'
+    :param cmd: list, 命令行参数
+    :return: str
+    '''
+    start = 0
+    if cmd and cmd[0] == 'ssh':
+        for i, s in enumerate(cmd):
+            if s in ('ceph', 'rbd', 'ceph-volume'):
+                start = i
+                break
+    words = [cmd[start]] if len(cmd) > start else []
+    for s in cmd[start + 1:start + 4]:
+        if not _word.match(s):
+            break
+        words.append(s)
+    return ' '.join(words)
+
+def run_subprocess(cmd):
+    '''
+    执行命令行并合并stdout和stderr, 启用统计时按subprocess_prefix()记录耗时、返回值和输出字节数
+    :param cmd: list, 命令行参数
+    :return: list, [返回值, 输出文本], 返回值为0代表执行成功且无报错, 返回值非0代表执行成功但有报错
+    '''
+    enabled = REGISTRY.enabled
+    if enabled:
+        start = time.time()
+    result = ['', '']
+    run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
+    result[1] = run.communicate()[0]
+    result[0] = run.returncode
+    if enabled:
+        REGISTRY.observe(subprocess_prefix(cmd), time.time() - start, error = result[0] != 0, nbytes = len(result[1]))
+    return result
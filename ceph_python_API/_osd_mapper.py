@@ -0,0 +1,539 @@
+# -*- coding: UTF-8 -*-
+'''
+离线批量计算对象 -> PG -> OSD的映射, 不必为每个对象调用一次Ceph.osd_map()
+对象名的rjenkins哈希、pps的计算和straw2的选择均以NumPy数组向量化, 每个PG只计算一次CRUSH; 结果可以通过verify()抽样与Ceph.osd_map()对比
+    import _ceph
+    import _osd_mapper
+    ceph = _ceph.Ceph()
+    mapper = _osd_mapper.OSDMapper.fetch(ceph)
+    result = mapper.map_objects('rbd', ['rbd_data.1234.{:016x}'.format(i) for i in range(100000)])
+    result['acting_primary']
+    mapper.verify(ceph, 'rbd', names, sample = 100)
+依赖NumPy, 只支持straw2类型的bucket, indep规则 (纠删码存储池) 和无法向量化的CRUSH map逐个PG计算
+'''
+import json
+import random
+import numpy as np
+import _crush
+import _osdmap
+import _osdmap_decode
+
+CRUSH_ITEM_NONE = _crush.CRUSH_ITEM_NONE
+_INT64_MIN = np.iinfo(np.int64).min
+_CHUNK_CELLS = 1 << 22 # 每次straw2计算的 (PG数量 x bucket大小) 上限, 控制临时数组的内存
+
+def _u32(values):
+    return (np.asarray(values, dtype = np.int64) & 0xffffffff).astype(np.uint32)
+
+def _mix(a, b, c):
+    a = a - b - c
+    a ^= c >> 13
+    b = b - c - a
+    b ^= a << 8
+    c = c - a - b
+    c ^= b >> 13
+    a = a - b - c
+    a ^= c >> 12
+    b = b - c - a
+    b ^= a << 16
+    c = c - a - b
+    c ^= b >> 5
+    a = a - b - c
+    a ^= c >> 3
+    b = b - c - a
+    b ^= a << 10
+    c = c - a - b
+    c ^= b >> 15
+    return a, b, c
+
+def hash32_2(a, b):
+    '''
+    向量化的crush_hash32_rjenkins1_2
+    :return: numpy.ndarray, uint32
+    '''
+    a = _u32(a)
+    b = _u32(b)
+    a, b = np.broadcast_arrays(a, b)
+    a = a.copy()
+    b = b.copy()
+    h = np.uint32(_crush.CRUSH_HASH_SEED) ^ a ^ b
+    x = np.full(h.shape, 231232, dtype = np.uint32)
+    y = np.full(h.shape, 1232, dtype = np.uint32)
+    a, b, h = _mix(a, b, h)
+    x, a, h = _mix(x, a, h)
+    b, y, h = _mix(b, y, h)
+    return h
+
+def hash32_3(a, b, c):
+    '''
+    向量化的crush_hash32_rjenkins1_3
+    :return: numpy.ndarray, uint32
+    '''
+    a, b, c = np.broadcast_arrays(_u32(a), _u32(b), _u32(c))
+    a = a.copy()
+    b = b.copy()
+    c = c.copy()
+    h = np.uint32(_crush.CRUSH_HASH_SEED) ^ a ^ b ^ c
+    x = np.full(h.shape, 231232, dtype = np.uint32)
+    y = np.full(h.shape, 1232, dtype = np.uint32)
+    a, b, h = _mix(a, b, h)
+    c, x, h = _mix(c, x, h)
+    y, a, h = _mix(y, a, h)
+    b, x, h = _mix(b, x, h)
+    y, c, h = _mix(y, c, h)
+    return h
+
+def _words(block, start, count):
+    # block[:, start:start+count] 按小端序组成uint32, 不足4字节的部分为0
+    word = np.zeros(len(block), dtype = np.uint32)
+    for i in range(count):
+        word |= block[:, start + i].astype(np.uint32) << np.uint32(8 * i)
+    return word
+
+def str_hash_rjenkins(keys):
+    '''
+    向量化的ceph_str_hash_rjenkins, 相同长度的对象名一起计算
+    :param keys: list, 元素为bytes
+    :return: numpy.ndarray, uint32, 与keys一一对应
+    '''
+    result = np.zeros(len(keys), dtype = np.uint32)
+    groups = {}
+    for i, key in enumerate(keys):
+        groups.setdefault(len(key), []).append(i)
+    for length, indexes in groups.items():
+        block = np.frombuffer(b''.join(keys[i] for i in indexes), dtype = np.uint8).reshape(len(indexes), length)
+        a = np.full(len(indexes), 0x9e3779b9, dtype = np.uint32)
+        b = a.copy()
+        c = np.zeros(len(indexes), dtype = np.uint32)
+        k = 0
+        while length - k >= 12:
+            a += _words(block, k, 4)
+            b += _words(block, k + 4, 4)
+            c += _words(block, k + 8, 4)
+            a, b, c = _mix(a, b, c)
+            k += 12
+        c += np.uint32(length)
+        tail = length - k
+        a += _words(block, k, min(tail, 4))
+        b += _words(block, k + 4, max(0, min(tail - 4, 4)))
+        c += _words(block, k + 8, max(0, min(tail - 8, 3))) << np.uint32(8)
+        a, b, c = _mix(a, b, c)
+        result[indexes] = c
+    return result
+
+def stable_mod(x, b, bmask):
+    '''
+    向量化的ceph_stable_mod
+    '''
+    x = np.asarray(x, dtype = np.int64)
+    low = x & bmask
+    return np.where(low < b, low, x & (bmask >> 1))
+
+class _BatchCrush():
+    # CrushMap的数组形式, bucket按 -1-id 编号, 子节点不足的位置填充权重0
+    def __init__(self, crush):
+        self.crush = crush
+        self.vectorized = all(b.alg == 'straw2' and b.hash == 0 for b in crush.buckets.values()) and crush.tunables['choose_local_tries'] == 0 \
+            and crush.tunables['choose_local_fallback_tries'] == 0
+        nb = max([-1 - i for i in crush.buckets] + [-1]) + 1
+        width = max([len(b.items) for b in crush.buckets.values()] + [1])
+        self.width = width
+        self.present = np.zeros(nb, dtype = bool)
+        self.sizes = np.zeros(nb, dtype = np.int64)
+        self.types = np.zeros(nb, dtype = np.int64)
+        self.items = np.zeros((nb, width), dtype = np.int64)
+        self.weights = np.zeros((nb, 1, width), dtype = np.int64)
+        for bid, b in crush.buckets.items():
+            i = -1 - bid
+            self.present[i] = True
+            self.sizes[i] = len(b.items)
+            self.types[i] = b.type_id
+            self.items[i, :len(b.items)] = b.items
+            self.weights[i, 0, :len(b.items)] = b.weights
+        self.ln = np.array(_crush.ln_table(), dtype = np.int64)
+        self._args = {}
+
+    def args(self, index):
+        # choose_args转换为 (ids数组, 权重数组 (bucket, 位置, 子节点)), 没有choose_args时为bucket自身的
+        args = self.crush.get_choose_args(index)
+        if args is None:
+            return self.items, self.weights
+        key = id(args)
+        if key not in self._args:
+            positions = max([len(a[1]) for a in args.values() if a[1]] + [1])
+            ids = self.items.copy()
+            weights = np.repeat(self.weights, positions, axis = 1)
+            for bid, (arg_ids, weight_set) in args.items():
+                i = -1 - bid
+                if i >= len(ids):
+                    continue
+                if arg_ids:
+                    ids[i, :len(arg_ids)] = arg_ids
+                if weight_set:
+                    for p in range(positions):
+                        row = weight_set[min(p, len(weight_set) - 1)]
+                        weights[i, p, :len(row)] = row
+            self._args[key] = (ids, weights)
+        return self._args[key]
+
+    def straw2(self, bidx, x, r, position, args):
+        ids, weights = args
+        result = np.empty(len(bidx), dtype = np.int64)
+        step = max(1, _CHUNK_CELLS // self.width)
+        for start in range(0, len(bidx), step):
+            end = min(len(bidx), start + step)
+            b = bidx[start:end]
+            pos = np.minimum(position[start:end], weights.shape[1] - 1)
+            w = weights[b, pos]
+            u = hash32_3(x[start:end, None], ids[b], r[start:end, None]) & np.uint32(0xffff)
+            ln = self.ln[u]
+            draw = np.where(w > 0, -((-ln) // np.maximum(w, 1)), _INT64_MIN)
+            high = np.argmax(draw, axis = 1)
+            result[start:end] = self.items[b, high]
+        return result
+
+    def is_out(self, weight, item, x):
+        w = np.where(item < len(weight), weight[np.minimum(item, len(weight) - 1)], 0)
+        return (w < 0x10000) & ((w == 0) | ((hash32_2(x, item) & np.uint32(0xffff)).astype(np.int64) >= w))
+
+    def choose_firstn(self, args, weight, bidx0, x, numrep, type_id, out, outpos, count, tries, recurse_tries, recurse_to_leaf, vary_r, stable, out2, parent_r, rep0):
+        # crush_choose_firstn的批量版本, 每个数组的第i个元素对应第i个PG, out/out2原地写入, 返回新的outpos
+        max_devices = self.crush.max_devices
+        rep = rep0.copy()
+        columns = np.arange(out.shape[1])
+        while True:
+            active = np.nonzero((rep < numrep) & (count > 0))[0]
+            if not len(active):
+                return outpos
+            pending = active
+            ftotal = np.zeros(len(out), dtype = np.int64)
+            while len(pending):
+                lanes = pending
+                r = rep[lanes] + parent_r[lanes] + ftotal[lanes]
+                item = np.zeros(len(lanes), dtype = np.int64)
+                state = np.zeros(len(lanes), dtype = np.int8) # 0 下降中, 1 得到目标类型, 2 放弃该副本, 3 拒绝 (空bucket)
+                itemtype = np.zeros(len(lanes), dtype = np.int64)
+                cur = bidx0[lanes].copy()
+                descending = np.arange(len(lanes))
+                while len(descending):
+                    b = cur[descending]
+                    empty = self.sizes[b] == 0
+                    state[descending[empty]] = 3
+                    descending = descending[~empty]
+                    if not len(descending):
+                        break
+                    lane = lanes[descending]
+                    chosen = self.straw2(cur[descending], x[lane], r[descending], outpos[lane], args)
+                    bad = chosen >= max_devices
+                    state[descending[bad]] = 2
+                    descending, chosen = descending[~bad], chosen[~bad]
+                    is_bucket = chosen < 0
+                    bucket_index = np.where(is_bucket, -1 - chosen, 0)
+                    known = ~is_bucket | ((bucket_index < len(self.present)) & self.present[np.minimum(bucket_index, len(self.present) - 1)])
+                    types = np.where(is_bucket, self.types[np.minimum(bucket_index, len(self.types) - 1)], 0)
+                    deeper = types != type_id
+                    invalid = deeper & (~is_bucket | ~known)
+                    state[descending[invalid]] = 2
+                    got = ~deeper
+                    state[descending[got]] = 1
+                    item[descending[got]] = chosen[got]
+                    itemtype[descending[got]] = types[got]
+                    cont = deeper & ~invalid
+                    cur[descending[cont]] = bucket_index[cont]
+                    descending = descending[cont]
+
+                got = state == 1
+                lane_pos = outpos[lanes]
+                collide = got & ((out[lanes] == item[:, None]) & (columns[None, :] < lane_pos[:, None])).any(axis = 1)
+                reject = state == 3
+                if recurse_to_leaf:
+                    leaf = got & ~collide & (item < 0)
+                    if leaf.any():
+                        sel = np.nonzero(leaf)[0]
+                        inner = lanes[sel]
+                        sub_r = r[sel] >> (vary_r - 1) if vary_r else np.zeros(len(sel), dtype = np.int64)
+                        inner_out = out2[inner]
+                        start = outpos[inner]
+                        inner_rep = np.zeros(len(sel), dtype = np.int64) if stable else start.copy()
+                        inner_numrep = np.ones(len(sel), dtype = np.int64) if stable else start + 1
+                        newpos = self.choose_firstn(args, weight, -1 - item[sel], x[inner], inner_numrep, 0, inner_out, start.copy(), count[inner].copy(),
+                                                    recurse_tries, 0, False, vary_r, stable, None, sub_r, inner_rep)
+                        out2[inner] = inner_out
+                        reject[sel] |= newpos <= start
+                    direct = got & ~collide & (item >= 0)
+                    if direct.any():
+                        sel = np.nonzero(direct)[0]
+                        out2[lanes[sel], outpos[lanes[sel]]] = item[sel]
+                check = got & ~reject & ~collide & (itemtype == 0)
+                if check.any():
+                    sel = np.nonzero(check)[0]
+                    reject[sel] = self.is_out(weight, item[sel], x[lanes[sel]])
+
+                success = got & ~reject & ~collide
+                if success.any():
+                    sel = lanes[success]
+                    out[sel, outpos[sel]] = item[success]
+                    outpos[sel] += 1
+                    count[sel] -= 1
+                failed = (got & (reject | collide)) | (state == 3)
+                retry = lanes[failed]
+                ftotal[retry] += 1
+                pending = retry[ftotal[retry] < tries]
+            rep[active] += 1
+
+    def do_rule(self, rule, x, result_max, weight, args):
+        # 只包含take、firstn和set_*步骤的规则; 返回 (结果矩阵, 每行的长度)
+        t = self.crush.tunables
+        choose_tries = t['choose_total_tries'] + 1
+        choose_leaf_tries = 0
+        vary_r = t['chooseleaf_vary_r']
+        stable = t['chooseleaf_stable']
+        m = len(x)
+        result = np.full((m, result_max), CRUSH_ITEM_NONE, dtype = np.int64)
+        rlen = np.zeros(m, dtype = np.int64)
+        w = np.zeros((m, 0), dtype = np.int64)
+        wsize = np.zeros(m, dtype = np.int64)
+        for op, arg1, arg2 in rule.steps:
+            if op == 'take':
+                if (0 <= arg1 < self.crush.max_devices) or arg1 in self.crush.buckets:
+                    w = np.full((m, 1), arg1, dtype = np.int64)
+                    wsize = np.ones(m, dtype = np.int64)
+            elif op == 'set_choose_tries':
+                if arg1 > 0:
+                    choose_tries = arg1
+            elif op == 'set_chooseleaf_tries':
+                if arg1 > 0:
+                    choose_leaf_tries = arg1
+            elif op == 'set_chooseleaf_vary_r':
+                if arg1 >= 0:
+                    vary_r = arg1
+            elif op == 'set_chooseleaf_stable':
+                if arg1 >= 0:
+                    stable = arg1
+            elif op in ('choose_firstn', 'chooseleaf_firstn'):
+                recurse_to_leaf = op == 'chooseleaf_firstn'
+                numrep = arg1 if arg1 > 0 else arg1 + result_max
+                o = np.zeros((m, result_max), dtype = np.int64)
+                c = np.zeros((m, result_max), dtype = np.int64)
+                osize = np.zeros(m, dtype = np.int64)
+                if choose_leaf_tries:
+                    recurse_tries = choose_leaf_tries
+                elif t['chooseleaf_descend_once']:
+                    recurse_tries = 1
+                else:
+                    recurse_tries = choose_tries
+                for i in range(w.shape[1]):
+                    if numrep <= 0:
+                        break
+                    bucket = np.where(i < wsize, w[:, i], 0)
+                    valid = (i < wsize) & (bucket < 0) & (-1 - bucket < len(self.present))
+                    valid &= self.present[np.where(valid, -1 - bucket, 0)]
+                    lanes = np.nonzero(valid)[0]
+                    if not len(lanes):
+                        continue
+                    sub_out = np.zeros((len(lanes), result_max), dtype = np.int64)
+                    sub_out2 = np.zeros((len(lanes), result_max), dtype = np.int64)
+                    zeros = np.zeros(len(lanes), dtype = np.int64)
+                    n = self.choose_firstn(args, weight, -1 - bucket[lanes], x[lanes], np.full(len(lanes), numrep, dtype = np.int64), arg2,
+                                           sub_out, zeros.copy(), result_max - osize[lanes], choose_tries, recurse_tries, recurse_to_leaf,
+                                           vary_r, stable, sub_out2, zeros.copy(), zeros.copy())
+                    for j in range(int(n.max()) if len(n) else 0):
+                        sel = n > j
+                        o[lanes[sel], osize[lanes[sel]] + j] = sub_out[sel, j]
+                        c[lanes[sel], osize[lanes[sel]] + j] = sub_out2[sel, j]
+                    osize[lanes] += n
+                w = c if recurse_to_leaf else o
+                wsize = osize
+            elif op == 'emit':
+                for i in range(w.shape[1]):
+                    sel = (i < wsize) & (rlen < result_max)
+                    result[sel, rlen[sel]] = w[sel, i]
+                    rlen[sel] += 1
+                w = np.zeros((m, 0), dtype = np.int64)
+                wsize = np.zeros(m, dtype = np.int64)
+        return result, rlen
+
+    def supports(self, rule):
+        return self.vectorized and all(op in ('take', 'emit', 'noop', 'choose_firstn', 'chooseleaf_firstn', 'set_choose_tries', 'set_chooseleaf_tries',
+                                              'set_chooseleaf_vary_r', 'set_chooseleaf_stable') for op, _, _ in rule.steps)
+
+class OSDMapper():
+    '''
+    批量映射对象到PG和OSD, 同一个OSDMapper内每个PG的结果只计算一次
+    :param osdmap: _osdmap.OSDMap
+    '''
+
+    def __init__(self, osdmap):
+        self.osdmap = osdmap
+        self.batch = _BatchCrush(osdmap.crush)
+        self.weight = np.array(osdmap.osd_weight, dtype = np.int64)
+        self.exists = np.array(osdmap.osd_exists + [False], dtype = bool) # 最后一个元素对应越界的OSD编号
+        self.up = np.array(osdmap.osd_up + [False], dtype = bool) & self.exists
+        self.affinity = np.array(osdmap.osd_primary_affinity + [_osdmap.CEPH_OSD_DEFAULT_PRIMARY_AFFINITY], dtype = np.int64)
+        self.special = set(osdmap.pg_upmap) | set(osdmap.pg_upmap_items) | set(osdmap.pg_temp) | set(osdmap.primary_temp)
+        self._pgs = {} # 存储池ID -> (up, up_primary, acting, acting_primary, computed), 按PG编号索引的数组
+
+    @classmethod
+    def from_json(cls, osd_dump, crush_dump):
+        '''
+        :param osd_dump: bytes/str/dict, Ceph.osd_dump()的outbuf
+        :param crush_dump: bytes/str/dict, Ceph.osd_crush_dump()的outbuf
+        :return: OSDMapper
+        '''
+        return cls(_osdmap.OSDMap.from_osd_dump(osd_dump, _crush.CrushMap.from_crush_dump(crush_dump)))
+
+    @classmethod
+    def from_binary(cls, osdmap):
+        '''
+        :param osdmap: bytes, Ceph.osd_getmap()的outbuf (其中包含CRUSH map)
+        :return: OSDMapper
+        :raise _encoding.DecodeError: 数据格式错误
+        '''
+        return cls(_osdmap_decode.decode_osdmap(osdmap))
+
+    @classmethod
+    def fetch(cls, ceph, source = 'dump'):
+        '''
+        获取当前的osdmap并构造OSDMapper
+        :param ceph: _ceph.Ceph
+        :param source: str, 'dump' 执行osd dump和osd crush dump并解析json (默认), 'getmap' 执行osd getmap并解码二进制数据 (数据量小, 但二进制解码只以合成集群的编码验证过)
+        :return: OSDMapper
+        :raise CephError: 执行错误时引发CephError
+        :raise rados.Error: RADOS引起的问题描述
+        '''
+        if source == 'getmap':
+            return cls.from_binary(ceph.osd_getmap()[1])
+        if source == 'dump':
+            return cls.from_json(ceph.osd_dump()[1], ceph.osd_crush_dump()[1])
+        raise ValueError('变量source的取值错误, 应为getmap或dump')
+
+    @property
+    def epoch(self):
+        return self.osdmap.epoch
+
+    def hash_objects(self, pool, names, nspace = ''):
+        '''
+        :param pool: int/str, 存储池ID或名称
+        :param names: list, 允许多个, 元素为str/bytes, 对象名称
+        :param nspace: str, 命名空间
+        :return: tuple, (numpy.ndarray uint32 原始PG编号, numpy.ndarray int64 PG编号)
+        '''
+        p = self.osdmap.pool(pool)
+        if p.object_hash != _osdmap.OBJECT_HASH_RJENKINS:
+            raise ValueError('不支持的object_hash: {}'.format(p.object_hash))
+        prefix = (nspace.encode('utf-8') if isinstance(nspace, str) else nspace) + b'\037' if nspace else b''
+        keys = [prefix + (n.encode('utf-8') if isinstance(n, str) else n) for n in names]
+        raw = str_hash_rjenkins(keys)
+        return raw, stable_mod(raw.astype(np.int64), p.pg_num, p.pg_num_mask)
+
+    def _pool_arrays(self, p):
+        arrays = self._pgs.get(p.id)
+        if arrays is None:
+            arrays = (np.full((p.pg_num, p.size), -1, dtype = np.int64), np.full(p.pg_num, -1, dtype = np.int64),
+                      np.full((p.pg_num, p.size), -1, dtype = np.int64), np.full(p.pg_num, -1, dtype = np.int64), np.zeros(p.pg_num, dtype = bool))
+            self._pgs[p.id] = arrays
+        return arrays
+
+    def _compute(self, p, ps):
+        # 计算ps中各PG的映射并写入缓存数组
+        up_arr, up_primary_arr, acting_arr, acting_primary_arr, computed = self._pool_arrays(p)
+        crush = self.osdmap.crush
+        ruleno = crush.find_rule(p.crush_rule, p.type, p.size)
+        rule = crush.rules.get(ruleno)
+        pps = hash32_2(stable_mod(ps, p.pgp_num, p.pgp_num_mask), p.id).astype(np.int64) if p.flags & _osdmap.FLAG_HASHPSPOOL \
+            else stable_mod(ps, p.pgp_num, p.pgp_num_mask) + p.id
+        slow = np.ones(len(ps), dtype = bool)
+        if rule is not None and p.can_shift_osds() and self.batch.supports(rule):
+            raw, rlen = self.batch.do_rule(rule, pps, p.size, self.weight, self.batch.args(p.id))
+            n = len(self.exists) - 1
+            index = np.where((raw >= 0) & (raw < n), raw, n)
+            filled = np.arange(p.size)[None, :] < rlen[:, None]
+            usable = ~filled | self.up[index]
+            slow = ~usable.all(axis = 1)
+            if self.osdmap.has_primary_affinity:
+                slow |= (filled & (self.affinity[index] != _osdmap.CEPH_OSD_DEFAULT_PRIMARY_AFFINITY)).any(axis = 1)
+            if self.special:
+                slow |= np.array([(p.id, int(s)) in self.special for s in ps], dtype = bool)
+            fast = ~slow
+            rows = np.where(filled, raw, -1)[fast]
+            up_arr[ps[fast]] = rows
+            acting_arr[ps[fast]] = rows
+            primary = np.where(rlen[fast] > 0, raw[fast, 0], -1)
+            up_primary_arr[ps[fast]] = primary
+            acting_primary_arr[ps[fast]] = primary
+        # 存在down/不存在的OSD、upmap、pg_temp、primary affinity或无法向量化的PG逐个计算
+        for i in np.nonzero(slow)[0]:
+            s = int(ps[i])
+            up, up_primary, acting, acting_primary = self.osdmap.pg_to_up_acting_osds(p.id, s)
+            up_arr[s] = -1
+            acting_arr[s] = -1
+            up_arr[s, :len(up)] = up[:p.size]
+            acting_arr[s, :len(acting)] = acting[:p.size]
+            up_primary_arr[s] = up_primary
+            acting_primary_arr[s] = acting_primary
+        computed[ps] = True
+
+    def map_pgs(self, pool, ps):
+        '''
+        :param pool: int/str, 存储池ID或名称
+        :param ps: list/numpy.ndarray, PG编号
+        :return: dict, 'up'、'acting' 为 numpy.ndarray (数量, size), 不足size的位置为-1, 纠删码存储池中没有OSD的位置为CRUSH_ITEM_NONE;
+            'up_primary'、'acting_primary' 为 numpy.ndarray (数量,)
+        '''
+        p = self.osdmap.pool(pool)
+        ps = np.asarray(ps, dtype = np.int64)
+        up, up_primary, acting, acting_primary, computed = self._pool_arrays(p)
+        missing = np.unique(ps[~computed[ps]])
+        if len(missing):
+            self._compute(p, missing)
+        return {'up': up[ps], 'up_primary': up_primary[ps], 'acting': acting[ps], 'acting_primary': acting_primary[ps]}
+
+    def map_objects(self, pool, names, nspace = ''):
+        '''
+        :param pool: int/str, 存储池ID或名称
+        :param names: list, 允许多个, 元素为str/bytes, 对象名称
+        :param nspace: str, 命名空间
+        :return: dict, 在map_pgs()的基础上增加 'raw_ps' 和 'ps'
+        '''
+        raw, ps = self.hash_objects(pool, names, nspace)
+        result = self.map_pgs(pool, ps)
+        result['raw_ps'] = raw
+        result['ps'] = ps
+        return result
+
+    def map_object(self, pool, name, nspace = ''):
+        '''
+        :return: dict, 与Ceph.osd_map()输出的json格式一致
+        '''
+        p = self.osdmap.pool(pool)
+        r = self.map_objects(p.id, [name], nspace)
+        return {'epoch': self.epoch, 'pool': p.name, 'pool_id': p.id, 'objname': name, 'raw_pgid': '{}.{:x}'.format(p.id, int(r['raw_ps'][0])),
+                'pgid': '{}.{:x}'.format(p.id, int(r['ps'][0])), 'up': [int(o) for o in r['up'][0] if o != -1], 'up_primary': int(r['up_primary'][0]),
+                'acting': [int(o) for o in r['acting'][0] if o != -1], 'acting_primary': int(r['acting_primary'][0])}
+
+    def verify(self, ceph, pool, names, sample = 100, nspace = None, seed = None):
+        '''
+        随机抽取部分对象, 与Ceph.osd_map()的结果对比
+        :param ceph: _ceph.Ceph
+        :param pool: str, 存储池名称
+        :param names: list, 允许多个, 元素为str, 对象名称
+        :param sample: int, 抽取的对象数量
+        :param nspace: str, 命名空间
+        :param seed: int, 抽样的随机种子
+        :return: dict, {'checked': int, 'mismatches': list, 元素为dict {'object', 'expected', 'actual'}}, 两者的epoch不同时结果可能不一致
+        :raise CephError: 执行错误时引发CephError
+        :raise rados.Error: RADOS引起的问题描述
+        '''
+        names = list(names)
+        chosen = random.Random(seed).sample(names, min(sample, len(names)))
+        keys = ('pgid', 'up', 'up_primary', 'acting', 'acting_primary')
+        mismatches = []
+        for name in chosen:
+            result = ceph.osd_map(pool = pool, object = name, nspace = nspace) if nspace else ceph.osd_map(pool = pool, object = name)
+            if isinstance(result, Exception):
+                raise result
+            expected = json.loads(result[1])
+            actual = self.map_object(pool, name, nspace or '')
+            if any(expected.get(k) != actual[k] for k in keys):
+                mismatches.append({'object': name, 'expected': dict((k, expected.get(k)) for k in keys), 'actual': dict((k, actual[k]) for k in keys)})
+        return {'checked': len(chosen), 'mismatches': mismatches}
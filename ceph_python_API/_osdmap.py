@@ -0,0 +1,300 @@
+# -*- coding: UTF-8 -*-
+'''
+OSDMap中对象到PG、PG到OSD的映射逻辑的纯Python实现, 与Ceph 14.2.22的OSDMap::_pg_to_up_acting_osds()一致
+(CRUSH计算、pg_upmap/pg_upmap_items、down/不存在的OSD、primary affinity、pg_temp/primary_temp)
+    import _crush
+    import _osdmap
+    crush = _crush.CrushMap.from_crush_dump(ceph.osd_crush_dump()[1])
+    osdmap = _osdmap.OSDMap.from_osd_dump(ceph.osd_dump()[1], crush)
+    osdmap.map_object('rbd', 'rbd_data.1234.0000000000000000') # 与Ceph.osd_map()的输出格式一致
+'''
+import json
+import _crush
+
+CEPH_OSD_DEFAULT_PRIMARY_AFFINITY = 0x10000
+CEPH_OSD_MAX_PRIMARY_AFFINITY = 0x10000
+FLAG_HASHPSPOOL = 1
+TYPE_REPLICATED = 1
+TYPE_ERASURE = 3
+OBJECT_HASH_RJENKINS = 2
+
+def parse_pgid(pgid):
+    '''
+    :param pgid: str, 如 '1.1f'
+    :return: tuple, (int 存储池ID, int PG编号)
+    '''
+    pool, ps = pgid.split('.', 1)
+    return int(pool), int(ps, 16)
+
+def _load(outbuf):
+    if isinstance(outbuf, (bytes, bytearray)):
+        outbuf = outbuf.decode('utf-8')
+    if isinstance(outbuf, str):
+        return json.loads(outbuf)
+    return outbuf
+
+class Pool():
+    '''
+    存储池中与映射有关的属性
+    :param type: int, 1为replicated, 3为erasure
+    :param flags: int, 标志位, FLAG_HASHPSPOOL为1
+    :param object_hash: int, 对象名哈希算法, 2为rjenkins
+    '''
+
+    def __init__(self, id, name, type, size, crush_rule, pg_num, pgp_num, flags = FLAG_HASHPSPOOL, object_hash = OBJECT_HASH_RJENKINS, min_size = None):
+        self.id = id
+        self.name = name
+        self.type = type
+        self.size = size
+        self.min_size = min_size
+        self.crush_rule = crush_rule
+        self.pg_num = pg_num
+        self.pgp_num = pgp_num
+        self.flags = flags
+        self.object_hash = object_hash
+        self.pg_num_mask = _crush.pg_mask(pg_num)
+        self.pgp_num_mask = _crush.pg_mask(pgp_num)
+
+    @classmethod
+    def from_dump(cls, p):
+        '''
+        :param p: dict, osd dump输出中pools的元素
+        :return: Pool
+        '''
+        return cls(p['pool'], p['pool_name'], p['type'], p['size'], p['crush_rule'], p['pg_num'], p.get('pg_placement_num', p['pg_num']),
+                   p.get('flags', FLAG_HASHPSPOOL), p.get('object_hash', OBJECT_HASH_RJENKINS), p.get('min_size'))
+
+    def can_shift_osds(self):
+        return self.type == TYPE_REPLICATED
+
+    def hash_key(self, key, nspace = ''):
+        '''
+        :param key: str/bytes, 对象名称
+        :param nspace: str/bytes, 命名空间
+        :return: int, 原始PG编号 (raw ps)
+        '''
+        if self.object_hash != OBJECT_HASH_RJENKINS:
+            raise ValueError('不支持的object_hash: {}'.format(self.object_hash))
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        if nspace:
+            if isinstance(nspace, str):
+                nspace = nspace.encode('utf-8')
+            key = nspace + b'\037' + key
+        return _crush.str_hash_rjenkins(key)
+
+    def raw_pg_to_pg(self, ps):
+        return _crush.stable_mod(ps, self.pg_num, self.pg_num_mask)
+
+    def raw_pg_to_pps(self, ps):
+        '''
+        :return: int, CRUSH的输入 (placement seed)
+        '''
+        if self.flags & FLAG_HASHPSPOOL:
+            return _crush.hash32_2(_crush.stable_mod(ps, self.pgp_num, self.pgp_num_mask), self.id)
+        return _crush.stable_mod(ps, self.pgp_num, self.pgp_num_mask) + self.id
+
+class OSDMap():
+    '''
+    用于计算映射的OSDMap, 可由osd dump的json或osd getmap的二进制数据 (_osdmap_decode) 构造
+    :param epoch: int
+    :param max_osd: int
+    :param osds: dict, OSD编号 -> (bool up, int weight, int primary_affinity), weight和primary_affinity为16.16定点数, 只包含存在的OSD
+    :param pools: dict, 存储池ID -> Pool
+    :param crush: _crush.CrushMap
+    :param pg_upmap: dict, (存储池ID, PG编号) -> list OSD编号
+    :param pg_upmap_items: dict, (存储池ID, PG编号) -> list (from, to)
+    :param pg_temp: dict, (存储池ID, PG编号) -> list OSD编号
+    :param primary_temp: dict, (存储池ID, PG编号) -> OSD编号
+    :param fsid: str, 集群ID
+    :param flags: int, osdmap标志位 (flags_num)
+    :param crush_version: int, CRUSH map的版本号
+    '''
+
+    def __init__(self, epoch, max_osd, osds, pools, crush, pg_upmap = None, pg_upmap_items = None, pg_temp = None, primary_temp = None,
+                 fsid = None, flags = 0, crush_version = None):
+        self.epoch = epoch
+        self.fsid = fsid
+        self.flags = flags
+        self.crush_version = crush_version
+        self.max_osd = max_osd
+        self.pools = pools
+        self.pool_names = dict((p.name, i) for i, p in pools.items())
+        self.crush = crush
+        self.pg_upmap = pg_upmap or {}
+        self.pg_upmap_items = pg_upmap_items or {}
+        self.pg_temp = pg_temp or {}
+        self.primary_temp = primary_temp or {}
+        self.osd_exists = [False] * max_osd
+        self.osd_up = [False] * max_osd
+        self.osd_weight = [0] * max_osd
+        self.osd_primary_affinity = [CEPH_OSD_DEFAULT_PRIMARY_AFFINITY] * max_osd
+        for osd, (up, weight, affinity) in osds.items():
+            self.osd_exists[osd] = True
+            self.osd_up[osd] = bool(up)
+            self.osd_weight[osd] = weight
+            self.osd_primary_affinity[osd] = affinity
+        self.has_primary_affinity = any(a != CEPH_OSD_DEFAULT_PRIMARY_AFFINITY for a in self.osd_primary_affinity)
+
+    @classmethod
+    def from_osd_dump(cls, outbuf, crush):
+        '''
+        :param outbuf: bytes/str/dict, Ceph.osd_dump()返回的outbuf或其解码结果
+        :param crush: _crush.CrushMap
+        :return: OSDMap
+        '''
+        data = _load(outbuf)
+        osds = {}
+        for o in data.get('osds', []):
+            osds[o['osd']] = (o['up'], int(round(o['weight'] * 0x10000)), int(round(o.get('primary_affinity', 1.0) * 0x10000)))
+        pools = {}
+        for p in data.get('pools', []):
+            pools[p['pool']] = Pool.from_dump(p)
+        pg_upmap = dict((parse_pgid(e['pgid']), list(e['osds'])) for e in data.get('pg_upmap', []))
+        pg_upmap_items = dict((parse_pgid(e['pgid']), [(m['from'], m['to']) for m in e['mappings']]) for e in data.get('pg_upmap_items', []))
+        pg_temp = dict((parse_pgid(e['pgid']), list(e['osds'])) for e in data.get('pg_temp', []))
+        primary_temp = dict((parse_pgid(e['pgid']), e['osd']) for e in data.get('primary_temp', []))
+        max_osd = data.get('max_osd', max(list(osds) + [-1]) + 1)
+        return cls(data['epoch'], max_osd, osds, pools, crush, pg_upmap = pg_upmap, pg_upmap_items = pg_upmap_items, pg_temp = pg_temp, primary_temp = primary_temp,
+                   fsid = data.get('fsid'), flags = data.get('flags_num', 0), crush_version = data.get('crush_version'))
+
+    def pool(self, pool):
+        '''
+        :param pool: int/str, 存储池ID或名称
+        :return: Pool
+        :raise KeyError: 存储池不存在
+        '''
+        if isinstance(pool, str):
+            pool = self.pool_names[pool]
+        return self.pools[pool]
+
+    def exists(self, osd):
+        return 0 <= osd < self.max_osd and self.osd_exists[osd]
+
+    def is_up(self, osd):
+        return self.exists(osd) and self.osd_up[osd]
+
+    def object_to_pg(self, pool, name, nspace = ''):
+        '''
+        :return: tuple, (int 原始PG编号, int PG编号)
+        '''
+        p = self.pool(pool)
+        raw = p.hash_key(name, nspace)
+        return raw, p.raw_pg_to_pg(raw)
+
+    def pg_to_raw_osds(self, pool, ps):
+        '''
+        :return: tuple, (list CRUSH计算的OSD, int pps)
+        '''
+        p = self.pool(pool)
+        pps = p.raw_pg_to_pps(ps)
+        ruleno = self.crush.find_rule(p.crush_rule, p.type, p.size)
+        raw = self.crush.do_rule(ruleno, pps, p.size, self.osd_weight, choose_args_index = p.id) if ruleno >= 0 else []
+        return self.remove_nonexistent_osds(p, raw), pps
+
+    def remove_nonexistent_osds(self, p, osds):
+        if p.can_shift_osds():
+            return [o for o in osds if self.exists(o)]
+        return [o if self.exists(o) else _crush.CRUSH_ITEM_NONE for o in osds]
+
+    def apply_upmap(self, p, ps, raw):
+        key = (p.id, p.raw_pg_to_pg(ps))
+        target = self.pg_upmap.get(key)
+        if target is not None:
+            for osd in target:
+                if osd != _crush.CRUSH_ITEM_NONE and 0 <= osd < self.max_osd and self.osd_weight[osd] == 0:
+                    return raw # 目标OSD已经out, 忽略pg_upmap和pg_upmap_items
+            raw = list(target)
+        items = self.pg_upmap_items.get(key)
+        if items is not None:
+            raw = list(raw)
+            for src, dst in items:
+                exists = False
+                pos = -1
+                for i, osd in enumerate(raw):
+                    if osd == dst:
+                        exists = True
+                        break
+                    if osd == src and pos < 0 and not (dst != _crush.CRUSH_ITEM_NONE and 0 <= dst < self.max_osd and self.osd_weight[dst] == 0):
+                        pos = i
+                if not exists and pos >= 0:
+                    raw[pos] = dst
+        return raw
+
+    def raw_to_up_osds(self, p, raw):
+        if p.can_shift_osds():
+            return [o for o in raw if self.is_up(o)]
+        return [o if self.is_up(o) else _crush.CRUSH_ITEM_NONE for o in raw]
+
+    @staticmethod
+    def pick_primary(osds):
+        for o in osds:
+            if o != _crush.CRUSH_ITEM_NONE:
+                return o
+        return -1
+
+    def apply_primary_affinity(self, pps, p, osds, primary):
+        if not self.has_primary_affinity:
+            return osds, primary
+        if not any(o != _crush.CRUSH_ITEM_NONE and self.osd_primary_affinity[o] != CEPH_OSD_DEFAULT_PRIMARY_AFFINITY for o in osds):
+            return osds, primary
+        pos = -1
+        for i, o in enumerate(osds):
+            if o == _crush.CRUSH_ITEM_NONE:
+                continue
+            a = self.osd_primary_affinity[o]
+            if a < CEPH_OSD_MAX_PRIMARY_AFFINITY and (_crush.hash32_2(pps, o) >> 16) >= a:
+                if pos < 0:
+                    pos = i # 作为没有其它选择时的后备
+            else:
+                pos = i
+                break
+        if pos < 0:
+            return osds, primary
+        primary = osds[pos]
+        if p.can_shift_osds() and pos > 0:
+            osds = [primary] + osds[:pos] + osds[pos + 1:]
+        return osds, primary
+
+    def get_temp_osds(self, p, ps):
+        key = (p.id, p.raw_pg_to_pg(ps))
+        temp = []
+        for o in self.pg_temp.get(key, ()):
+            if not self.is_up(o):
+                if not p.can_shift_osds():
+                    temp.append(_crush.CRUSH_ITEM_NONE)
+            else:
+                temp.append(o)
+        primary = self.primary_temp.get(key, -1)
+        if key not in self.primary_temp and temp:
+            primary = self.pick_primary(temp)
+        return temp, primary
+
+    def pg_to_up_acting_osds(self, pool, ps):
+        '''
+        :param pool: int/str, 存储池ID或名称
+        :param ps: int, PG编号
+        :return: tuple, (list up, int up_primary, list acting, int acting_primary)
+        '''
+        p = self.pool(pool)
+        raw, pps = self.pg_to_raw_osds(p.id, ps)
+        raw = self.apply_upmap(p, ps, raw)
+        up = self.raw_to_up_osds(p, raw)
+        up_primary = self.pick_primary(up)
+        up, up_primary = self.apply_primary_affinity(pps, p, up, up_primary)
+        acting, acting_primary = self.get_temp_osds(p, ps)
+        if not acting:
+            acting = up
+            if acting_primary == -1:
+                acting_primary = up_primary
+        return up, up_primary, acting, acting_primary
+
+    def map_object(self, pool, name, nspace = ''):
+        '''
+        :return: dict, 与Ceph.osd_map()输出的json格式一致
+        '''
+        p = self.pool(pool)
+        raw, ps = self.object_to_pg(p.id, name, nspace)
+        up, up_primary, acting, acting_primary = self.pg_to_up_acting_osds(p.id, ps)
+        return {'epoch': self.epoch, 'pool': p.name, 'pool_id': p.id, 'objname': name, 'raw_pgid': '{}.{:x}'.format(p.id, raw),
+                'pgid': '{}.{:x}'.format(p.id, ps), 'up': up, 'up_primary': up_primary, 'acting': acting, 'acting_primary': acting_primary}
@@ -0,0 +1,448 @@
+# -*- coding: UTF-8 -*-
+'''
+osd getmap返回的二进制OSD map (OSDMap::encode, Ceph 14.2.22) 的纯Python解码, 结果为_osdmap.OSDMap, 其中的CRUSH map由_crush_decode解码
+只解析映射需要的部分 (存储池、OSD状态和权重、pg_temp/primary_temp、primary affinity、pg_upmap/pg_upmap_items、CRUSH map),
+地址、osd_info、osd_xinfo等按编码中的长度整体跳过; 一次osd getmap即可代替osd dump加osd crush dump, 数据量远小于两者的json
+    import _ceph
+    import _osdmap_decode
+    ret, outbuf, outs = _ceph.Ceph().osd_getmap()
+    osdmap = _osdmap_decode.decode_osdmap(outbuf)
+    osdmap.map_object('rbd', 'rbd_data.1234.0000000000000000')
+encode_osdmap()由osd dump的json和CRUSH map按相同格式编码, 供_fake_cluster生成osd getmap的输出
+'''
+import calendar
+import datetime
+import socket
+import _crush_decode
+import _osdmap
+from _encoding import DecodeError, Reader, Writer, crc32c
+
+CEPH_OSD_EXISTS = 1
+CEPH_OSD_UP = 2
+CEPH_OSD_AUTOOUT = 4
+CEPH_OSD_NEW = 8
+
+ENTITY_ADDR_TYPE_LEGACY = 1
+ENTITY_ADDR_TYPE_MSGR2 = 2
+
+RELEASES = {'jewel': 10, 'kraken': 11, 'luminous': 12, 'mimic': 13, 'nautilus': 14}
+CACHE_MODES = {'none': 0, 'writeback': 1, 'forward': 2, 'readonly': 3, 'readforward': 4, 'readproxy': 5, 'proxy': 6}
+AUTOSCALE_MODES = {'off': 0, 'warn': 1, 'on': 2}
+
+def _pg(r):
+    # pg_t: u8版本 + u64存储池 + u32 PG编号 + s32 (已废弃的preferred)
+    v, pool, ps, preferred = r.unpack('BQIi')
+    return pool, ps
+
+def _skip_addr(r):
+    marker = r.u8()
+    if marker == 0: # legacy entity_addr_t: 3字节 + u32 nonce + sockaddr_storage
+        r.skip(3 + 4 + 128)
+    elif marker == 1:
+        v, end = r.start()
+        r.finish(end)
+    else:
+        raise DecodeError('entity_addr_t的marker错误: {}'.format(marker))
+
+def _skip_addrvec(r):
+    marker = r.u8()
+    if marker == 2:
+        for _ in range(r.u32()):
+            # 常见情况: marker 1 + ENCODE_START头部, 一次解包后按长度跳过
+            marker, v, compat, length = r.unpack('BBBI')
+            if marker != 1:
+                r.pos -= 7
+                _skip_addr(r)
+            else:
+                r.skip(length)
+    elif marker == 0:
+        r.skip(3 + 4 + 128)
+    elif marker == 1:
+        v, end = r.start()
+        r.finish(end)
+    else:
+        raise DecodeError('entity_addrvec_t的marker错误: {}'.format(marker))
+
+def _decode_pool(r):
+    # 只读取到min_size, 其余字段按长度跳过
+    v, end = r.start(compat = 29)
+    pool_type, size, crush_rule, object_hash = r.array('B', 4)
+    pg_num, pgp_num = r.array('I', 2)
+    r.skip(4 + 4 + 4 + 8 + 4) # lpg_num、lpgp_num、last_change、snap_seq、snap_epoch
+    for _ in range(r.u32()): # snaps
+        r.u64()
+        sv, send = r.start()
+        r.finish(send)
+    r.skip(16 * r.u32()) # removed_snaps
+    r.u64() # auid
+    flags = r.u64() if v >= 4 else 0
+    min_size = None
+    if v >= 7:
+        r.u32() # crash_replay_interval
+        min_size = r.u8()
+    r.finish(end)
+    return pool_type, size, crush_rule, object_hash, pg_num, pgp_num, flags, min_size
+
+def decode_osdmap(data, verify_crc = False):
+    '''
+    :param data: bytes/memoryview, osd getmap的outbuf
+    :param verify_crc: bool, 是否校验crc32c, 纯Python实现, 较大的osdmap需要数百毫秒
+    :return: _osdmap.OSDMap
+    :raise DecodeError: 数据格式错误、被截断或校验和不一致
+    '''
+    r = Reader(data)
+    start = r.pos
+    v, end = r.start()
+    if v < 7:
+        raise DecodeError('不支持luminous之前的osdmap编码版本: {}'.format(v))
+
+    cv, cend = r.start()
+    fsid = r.uuid()
+    epoch = r.u32()
+    r.skip(16) # created、modified
+    raw_pools = dict((r.s64(), _decode_pool(r)) for _ in range(r.u32()))
+    pool_names = dict((r.s64(), r.string()) for _ in range(r.u32()))
+    r.s32() # pool_max
+    flags = r.u32()
+    max_osd = r.s32()
+    state = r.vector('I')
+    weight = r.vector('I')
+    for _ in range(r.u32()): # client_addrs
+        _skip_addrvec(r)
+    pg_temp = {}
+    for _ in range(r.u32()):
+        key = _pg(r)
+        pg_temp[key] = list(r.vector('i'))
+    primary_temp = dict((_pg(r), r.s32()) for _ in range(r.u32()))
+    affinity = r.vector('I')
+    blob = r.blob()
+    crush = _crush_decode.decode_crushmap(None, reader = Reader(blob))
+    for _ in range(r.u32()): # erasure_code_profiles
+        r.string()
+        r.string_map()
+    pg_upmap = {}
+    pg_upmap_items = {}
+    if cv >= 4:
+        for _ in range(r.u32()):
+            key = _pg(r)
+            pg_upmap[key] = list(r.vector('i'))
+        for _ in range(r.u32()):
+            key = _pg(r)
+            pairs = r.array('i', 2 * r.u32())
+            pg_upmap_items[key] = list(zip(pairs[::2], pairs[1::2]))
+    crush_version = r.s32() if cv >= 6 else None
+    r.finish(cend)
+
+    ov, oend = r.start() # 只有OSD使用的部分
+    r.finish(oend)
+    if v >= 8:
+        crc_offset = r.pos
+        crc = r.u32()
+        if verify_crc:
+            actual = crc32c(0xffffffff, r.view[start:crc_offset])
+            if r.pos < end:
+                actual = crc32c(actual, r.view[r.pos:end])
+            if actual != crc:
+                raise DecodeError('osdmap的校验和不一致: {:#x} != {:#x}'.format(actual, crc))
+    r.finish(end)
+
+    osds = {}
+    for osd in range(max_osd):
+        s = state[osd] if osd < len(state) else 0
+        if s & CEPH_OSD_EXISTS:
+            osds[osd] = (bool(s & CEPH_OSD_UP), weight[osd] if osd < len(weight) else 0,
+                         affinity[osd] if osd < len(affinity) else _osdmap.CEPH_OSD_DEFAULT_PRIMARY_AFFINITY)
+    pools = {}
+    for pool_id, (pool_type, size, crush_rule, object_hash, pg_num, pgp_num, pool_flags, min_size) in raw_pools.items():
+        pools[pool_id] = _osdmap.Pool(pool_id, pool_names.get(pool_id, str(pool_id)), pool_type, size, crush_rule, pg_num, pgp_num,
+                                      flags = pool_flags, object_hash = object_hash, min_size = min_size)
+    return _osdmap.OSDMap(epoch, max_osd, osds, pools, crush, pg_upmap = pg_upmap, pg_upmap_items = pg_upmap_items, pg_temp = pg_temp,
+                          primary_temp = primary_temp, fsid = fsid, flags = flags, crush_version = crush_version)
+
+def _utime(value):
+    # osd dump中的时间字符串按UTC处理
+    if isinstance(value, (int, float)):
+        return value
+    if not value:
+        return 0
+    t = datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S.%f')
+    return calendar.timegm(t.timetuple()) + t.microsecond / 1e6
+
+def _parse_addr(addr):
+    # 'ip:port/nonce' -> (family, ip, port, nonce), 空地址返回None
+    addr, _, nonce = addr.partition('/')
+    host, _, port = addr.rpartition(':')
+    if not host or host == '-':
+        return None
+    family = socket.AF_INET
+    if host.startswith('['):
+        host = host[1:-1]
+        family = socket.AF_INET6
+    return family, host, int(port), int(nonce or 0)
+
+def _encode_addr(w, addr_type, addr):
+    w.u8(1)
+    o = w.start(1, 1)
+    w.u32(addr_type)
+    if addr is None:
+        w.u32(0)
+        w.u32(0)
+    else:
+        family, host, port, nonce = addr
+        w.u32(nonce)
+        if family == socket.AF_INET6:
+            w.u32(28)
+            w.u16(10) # sa_family按小端序编码, 其余部分与sockaddr_in6一致
+            w.raw(port.to_bytes(2, 'big') + bytes(4) + socket.inet_pton(socket.AF_INET6, host) + bytes(4))
+        else:
+            w.u32(16)
+            w.u16(2)
+            w.raw(port.to_bytes(2, 'big') + socket.inet_pton(socket.AF_INET, host) + bytes(8))
+    w.finish(o)
+
+def _encode_addrvec(w, o, name):
+    # osd dump中的 '<name>_addrs' (nautilus, addrvec) 或 '<name>_addr' (字符串)
+    vec = (o.get(name + '_addrs') or {}).get('addrvec') if o else None
+    w.u8(2)
+    if vec is not None:
+        w.u32(len(vec))
+        for a in vec:
+            parsed = _parse_addr('{}/{}'.format(a['addr'], a.get('nonce', 0)))
+            _encode_addr(w, ENTITY_ADDR_TYPE_MSGR2 if a.get('type') == 'v2' else ENTITY_ADDR_TYPE_LEGACY, parsed)
+        return
+    parsed = _parse_addr(o.get(name + '_addr', '')) if o else None
+    if parsed is None:
+        w.u32(0)
+    else:
+        w.u32(1)
+        _encode_addr(w, ENTITY_ADDR_TYPE_LEGACY, parsed)
+
+def _encode_pg(w, pgid):
+    pool, ps = _osdmap.parse_pgid(pgid)
+    w.pack('BQIi', 1, pool, ps, -1)
+
+def _encode_snap_intervals(w, m):
+    # map<int64_t, interval_set<snapid_t>>, json为 [{'pool': int, 'snaps': [{'begin': int, 'length': int}]}]
+    w.u32(len(m))
+    for entry in sorted(m, key = lambda e: e['pool']):
+        w.s64(entry['pool'])
+        w.u32(len(entry['snaps']))
+        for s in entry['snaps']:
+            w.u64(s['begin'])
+            w.u64(s['length'])
+
+def _removed_snaps(text):
+    # '[1~3,5~2]', 起点和长度均为十六进制
+    text = (text or '').strip('[]')
+    return [tuple(int(x, 16) for x in part.split('~')) for part in text.split(',') if part]
+
+def _encode_pool(w, p):
+    g = lambda key, default = 0: int(p.get(key, default))
+    o = w.start(29, 5)
+    w.array('B', (p['type'], p['size'], p['crush_rule'], g('object_hash', _osdmap.OBJECT_HASH_RJENKINS)))
+    w.array('I', (p['pg_num'], g('pg_placement_num', p['pg_num']), 0, 0, g('last_change')))
+    w.u64(g('snap_seq'))
+    w.u32(g('snap_epoch'))
+    snaps = p.get('pool_snaps', [])
+    w.u32(len(snaps))
+    for s in snaps:
+        w.u64(s['snapid'])
+        so = w.start(2, 2)
+        w.u64(s['snapid'])
+        w.utime(_utime(s.get('stamp')))
+        w.string(s.get('name', ''))
+        w.finish(so)
+    removed = _removed_snaps(p.get('removed_snaps'))
+    w.u32(len(removed))
+    for begin, length in removed:
+        w.u64(begin)
+        w.u64(length)
+    w.u64(g('auid'))
+    w.u64(g('flags'))
+    w.u32(0) # crash_replay_interval
+    w.u8(g('min_size', 1))
+    w.u64(g('quota_max_bytes'))
+    w.u64(g('quota_max_objects'))
+    w.vector('Q', sorted(p.get('tiers', [])))
+    w.s64(g('tier_of', -1))
+    w.u8(CACHE_MODES.get(p.get('cache_mode', 'none'), 0))
+    w.s64(g('read_tier', -1))
+    w.s64(g('write_tier', -1))
+    w.string_map(p.get('properties', {}))
+    ho = w.start(1, 1) # hit_set_params, TYPE_NONE
+    w.u8(0)
+    w.finish(ho)
+    w.u32(g('hit_set_period'))
+    w.u32(g('hit_set_count'))
+    w.u32(g('stripe_width'))
+    w.u64(g('target_max_bytes'))
+    w.u64(g('target_max_objects'))
+    w.u32(g('cache_target_dirty_ratio_micro', 400000))
+    w.u32(g('cache_target_full_ratio_micro', 800000))
+    w.u32(g('cache_min_flush_age'))
+    w.u32(g('cache_min_evict_age'))
+    w.string(p.get('erasure_code_profile', ''))
+    w.u32(g('last_force_op_resend_preluminous'))
+    w.u32(g('min_read_recency_for_promote'))
+    w.u64(g('expected_num_objects'))
+    w.u32(g('cache_target_dirty_high_ratio_micro', 600000))
+    w.u32(g('min_write_recency_for_promote'))
+    w.u8(int(bool(p.get('use_gmt_hitset', True))))
+    w.u8(int(bool(p.get('fast_read', False))))
+    w.u32(g('hit_set_grade_decay_rate'))
+    w.u32(g('hit_set_search_last_n'))
+    oo = w.start(2, 1) # opts, 为空
+    w.u32(0)
+    w.finish(oo)
+    w.u32(g('last_force_op_resend_prenautilus'))
+    apps = p.get('application_metadata', {})
+    w.u32(len(apps))
+    for app in sorted(apps):
+        w.string(app)
+        w.string_map(apps[app])
+    w.utime(_utime(p.get('create_time')))
+    w.u32(g('pg_num_target', p['pg_num']))
+    w.u32(g('pg_placement_num_target', g('pg_placement_num', p['pg_num'])))
+    w.u32(g('pg_num_pending', p['pg_num']))
+    w.u32(0) # pg_num_dec_last_epoch_started
+    w.u32(0)
+    w.u32(g('last_force_op_resend'))
+    w.u8(AUTOSCALE_MODES.get(p.get('pg_autoscale_mode', 'warn'), 1))
+    w.finish(o)
+
+def encode_osdmap(dump, crush):
+    '''
+    按Ceph 14.2.22 (SERVER_NAUTILUS及MSG_ADDR2特性) 的格式编码, 包括crc32c校验和
+    :param dump: dict, osd dump的json解码结果
+    :param crush: _crush.CrushMap
+    :return: bytes
+    '''
+    w = Writer()
+    max_osd = dump['max_osd']
+    osds = dict((o['osd'], o) for o in dump.get('osds', []))
+    xinfo = dict((x['osd'], x) for x in dump.get('osd_xinfo', []))
+    each = lambda: [osds.get(i) for i in range(max_osd)]
+
+    o = w.start(8, 7)
+    c = w.start(8, 1)
+    w.uuid(dump.get('fsid'))
+    w.u32(dump['epoch'])
+    w.utime(_utime(dump.get('created')))
+    w.utime(_utime(dump.get('modified')))
+    pools = sorted(dump.get('pools', []), key = lambda p: p['pool'])
+    w.u32(len(pools))
+    for p in pools:
+        w.s64(p['pool'])
+        _encode_pool(w, p)
+    w.u32(len(pools))
+    for p in pools:
+        w.s64(p['pool'])
+        w.string(p['pool_name'])
+    w.s32(dump.get('pool_max', max([p['pool'] for p in pools] + [0])))
+    w.u32(dump.get('flags_num', 0))
+    w.s32(max_osd)
+    states = []
+    for osd in each():
+        s = 0
+        if osd is not None:
+            names = osd.get('state', ['exists'] + (['up'] if osd.get('up') else []))
+            s = (CEPH_OSD_EXISTS if 'exists' in names else 0) | (CEPH_OSD_UP if 'up' in names else 0) | \
+                (CEPH_OSD_AUTOOUT if 'autoout' in names else 0) | (CEPH_OSD_NEW if 'new' in names else 0)
+        states.append(s)
+    w.vector('I', states)
+    w.vector('I', [int(round(osd['weight'] * 0x10000)) if osd else 0 for osd in each()])
+    w.u32(max_osd)
+    for osd in each():
+        _encode_addrvec(w, osd, 'public')
+    pg_temp = sorted(dump.get('pg_temp', []), key = lambda e: _osdmap.parse_pgid(e['pgid']))
+    w.u32(len(pg_temp))
+    for e in pg_temp:
+        _encode_pg(w, e['pgid'])
+        w.vector('i', e['osds'])
+    primary_temp = sorted(dump.get('primary_temp', []), key = lambda e: _osdmap.parse_pgid(e['pgid']))
+    w.u32(len(primary_temp))
+    for e in primary_temp:
+        _encode_pg(w, e['pgid'])
+        w.s32(e['osd'])
+    affinity = [int(round(osd.get('primary_affinity', 1.0) * 0x10000)) if osd else _osdmap.CEPH_OSD_DEFAULT_PRIMARY_AFFINITY for osd in each()]
+    # 所有OSD均为默认值时Ceph不分配osd_primary_affinity, 编码为空vector
+    w.vector('I', affinity if any(a != _osdmap.CEPH_OSD_DEFAULT_PRIMARY_AFFINITY for a in affinity) else [])
+    w.blob(_crush_decode.encode_crushmap(crush))
+    profiles = dump.get('erasure_code_profiles', {})
+    w.u32(len(profiles))
+    for name in sorted(profiles):
+        w.string(name)
+        w.string_map(profiles[name])
+    pg_upmap = sorted(dump.get('pg_upmap', []), key = lambda e: _osdmap.parse_pgid(e['pgid']))
+    w.u32(len(pg_upmap))
+    for e in pg_upmap:
+        _encode_pg(w, e['pgid'])
+        w.vector('i', e['osds'])
+    pg_upmap_items = sorted(dump.get('pg_upmap_items', []), key = lambda e: _osdmap.parse_pgid(e['pgid']))
+    w.u32(len(pg_upmap_items))
+    for e in pg_upmap_items:
+        _encode_pg(w, e['pgid'])
+        w.u32(len(e['mappings']))
+        for m in e['mappings']:
+            w.s32(m['from'])
+            w.s32(m['to'])
+    w.s32(dump.get('crush_version', 1))
+    _encode_snap_intervals(w, dump.get('new_removed_snaps', []))
+    _encode_snap_intervals(w, dump.get('new_purged_snaps', []))
+    w.utime(_utime(dump.get('last_up_change')))
+    w.utime(_utime(dump.get('last_in_change')))
+    w.finish(c)
+
+    d = w.start(9, 1)
+    w.u32(max_osd)
+    for osd in each():
+        _encode_addrvec(w, osd, 'heartbeat_back')
+    w.u32(max_osd)
+    for osd in each():
+        w.u8(1)
+        w.array('I', [osd.get(k, 0) if osd else 0 for k in ('last_clean_begin', 'last_clean_end', 'up_from', 'up_thru', 'down_at', 'lost_at')])
+    blacklist = dump.get('blacklist', {})
+    w.u32(len(blacklist))
+    for addr in sorted(blacklist):
+        _encode_addr(w, ENTITY_ADDR_TYPE_LEGACY, _parse_addr(addr))
+        w.utime(_utime(blacklist[addr]))
+    w.u32(max_osd)
+    for osd in each():
+        _encode_addrvec(w, osd, 'cluster')
+    w.u32(0) # cluster_snapshot_epoch
+    w.string(dump.get('cluster_snapshot', ''))
+    w.u32(max_osd)
+    for osd in each():
+        w.uuid(osd.get('uuid') if osd else None)
+    w.u32(max_osd)
+    for i in range(max_osd):
+        x = xinfo.get(i, {})
+        xo = w.start(3, 1)
+        w.utime(_utime(x.get('down_stamp')))
+        w.u32(int(x.get('laggy_probability', 0) * 0xffffffff))
+        w.u32(x.get('laggy_interval', 0))
+        w.u64(x.get('features', 0))
+        w.u32(x.get('old_weight', 0))
+        w.finish(xo)
+    w.u32(max_osd)
+    for osd in each():
+        _encode_addrvec(w, osd, 'heartbeat_front')
+    w.f32(dump.get('nearfull_ratio', 0.85))
+    w.f32(dump.get('full_ratio', 0.95))
+    w.f32(dump.get('backfillfull_ratio', 0.9))
+    w.u8(RELEASES.get(dump.get('require_min_compat_client'), 0))
+    w.u8(RELEASES.get(dump.get('require_osd_release'), 0))
+    _encode_snap_intervals(w, dump.get('removed_snaps_queue', []))
+    for key in ('crush_node_flags', 'device_class_flags'):
+        flags = dump.get(key, {})
+        w.u32(len(flags))
+        for k in sorted(flags, key = int):
+            w.s32(int(k))
+            w.u32(flags[k])
+    w.finish(d)
+
+    crc_offset = len(w)
+    w.u32(0)
+    w.finish(o)
+    w.buf[crc_offset:crc_offset + 4] = crc32c(0xffffffff, memoryview(w.buf)[:crc_offset]).to_bytes(4, 'little')
+    return w.getvalue()
@@ -0,0 +1,166 @@
+# -*- coding: UTF-8 -*-
+'''
+两个osdmap版本之间的结构化差异, 以及基于osd stat的增量跟踪: epoch不变时只执行osd stat, 变化时才获取一次osd dump (或osd getmap) 并与上次的map对比
+    import _ceph
+    import _osdmap_delta
+    tracker = _osdmap_delta.OSDMapTracker(_ceph.Ceph())
+    delta = tracker.poll() # 第一次返回全部OSD和存储池 (均为added), 之后epoch不变时返回None
+    delta['osds']['down'] # [3, 7]
+    tracker.stats['bytes_saved']
+差异的格式:
+    {'from_epoch': int, 'to_epoch': int,
+     'osds': {'added': list, 'removed': list, 'up': list, 'down': list, 'in': list, 'out': list,
+              'weight': {osd: [old, new]}, 'primary_affinity': {osd: [old, new]}},
+     'pools': {'added': {pool_id: name}, 'removed': {pool_id: name}, 'changed': {pool_id: {字段: [old, new]}}},
+     'flags': [old, new], 'crush_version': [old, new]} # 未变化的flags、crush_version为None
+weight和primary_affinity为0-1之间的浮点数, 与osd dump一致
+'''
+import json
+import threading
+import _ceph
+import _command_cache
+import _osdmap
+import _osdmap_decode
+
+# 对比的存储池属性
+POOL_FIELDS = ('name', 'type', 'size', 'min_size', 'crush_rule', 'pg_num', 'pgp_num', 'flags', 'object_hash')
+
+def _osd_states(m):
+    # OSD编号 -> (up, weight, primary_affinity), 只包含存在的OSD
+    if m is None:
+        return {}
+    return dict((i, (m.osd_up[i], m.osd_weight[i], m.osd_primary_affinity[i])) for i in range(m.max_osd) if m.osd_exists[i])
+
+def _fraction(value):
+    return round(value / float(0x10000), 5)
+
+def diff(old, new):
+    '''
+    :param old: _osdmap.OSDMap, 旧版本, 为None时new中的所有OSD和存储池均为added
+    :param new: _osdmap.OSDMap, 新版本
+    :return: dict, 差异, 格式见模块说明
+    '''
+    before = _osd_states(old)
+    after = _osd_states(new)
+    osds = {'added': [], 'removed': [], 'up': [], 'down': [], 'in': [], 'out': [], 'weight': {}, 'primary_affinity': {}}
+    for osd in sorted(set(before) | set(after)):
+        if osd not in before:
+            osds['added'].append(osd)
+            continue
+        if osd not in after:
+            osds['removed'].append(osd)
+            continue
+        (up0, w0, a0), (up1, w1, a1) = before[osd], after[osd]
+        if up0 != up1:
+            osds['up' if up1 else 'down'].append(osd)
+        if (w0 > 0) != (w1 > 0):
+            osds['in' if w1 > 0 else 'out'].append(osd)
+        if w0 != w1:
+            osds['weight'][osd] = [_fraction(w0), _fraction(w1)]
+        if a0 != a1:
+            osds['primary_affinity'][osd] = [_fraction(a0), _fraction(a1)]
+
+    old_pools = old.pools if old is not None else {}
+    pools = {'added': {}, 'removed': {}, 'changed': {}}
+    for pool_id in sorted(set(old_pools) | set(new.pools)):
+        if pool_id not in old_pools:
+            pools['added'][pool_id] = new.pools[pool_id].name
+        elif pool_id not in new.pools:
+            pools['removed'][pool_id] = old_pools[pool_id].name
+        else:
+            a, b = old_pools[pool_id], new.pools[pool_id]
+            changed = dict((f, [getattr(a, f), getattr(b, f)]) for f in POOL_FIELDS if getattr(a, f) != getattr(b, f))
+            if changed:
+                pools['changed'][pool_id] = changed
+
+    changed = lambda field: [getattr(old, field), getattr(new, field)] if old is not None and getattr(old, field) != getattr(new, field) else None
+    return {'from_epoch': old.epoch if old is not None else None, 'to_epoch': new.epoch, 'osds': osds, 'pools': pools,
+            'flags': changed('flags'), 'crush_version': changed('crush_version')}
+
+def is_empty(delta):
+    '''
+    :param delta: dict, diff()的返回值
+    :return: bool, 没有任何变化时为True
+    '''
+    return not any(delta['osds'].values()) and not any(delta['pools'].values()) and delta['flags'] is None and delta['crush_version'] is None
+
+class OSDMapTracker():
+    '''
+    记录最近一次获取的osdmap, poll()先执行osd stat比较epoch, 只有变化时才获取完整的map
+    stats中的字节数: bytes_fetched为实际获取的outbuf之和, bytes_full为每次都获取完整map所需的字节数 (epoch不变时按上一次的大小估计),
+    bytes_saved为两者之差, delta_bytes为返回的差异按json编码的大小
+    :param ceph: _ceph.Ceph, 用于执行命令
+    :param source: str, 'dump' 执行osd dump (json), 'getmap' 执行osd getmap (二进制, 数据量更小)
+    '''
+
+    def __init__(self, ceph, source = 'dump'):
+        if source not in ('dump', 'getmap'):
+            raise ValueError('变量source的取值错误, 应为dump或getmap')
+        self.ceph = ceph
+        self.source = source
+        self.lock = threading.Lock()
+        self.osdmap = None
+        self.map_bytes = 0 # 最近一次获取的完整map的大小
+        self.stats = {'polls': 0, 'fetches': 0, 'bytes_fetched': 0, 'bytes_full': 0, 'bytes_saved': 0, 'delta_bytes': 0}
+
+    def epoch(self):
+        '''
+        :return: tuple, (int 当前osdmap版本号, int osd stat的outbuf大小)
+        '''
+        outbuf = self.ceph.osd_stat()[1]
+        return _command_cache.osdmap_epoch(outbuf), len(outbuf)
+
+    def fetch(self, epoch = None):
+        '''
+        获取指定版本的osdmap, 不指定时为最新版本
+        :return: tuple, (_osdmap.OSDMap, int outbuf大小)
+        :raise CephError: 执行错误时引发CephError, 如MON上已经没有该版本
+        :raise rados.Error: RADOS引起的问题描述
+        '''
+        if self.source == 'getmap':
+            outbuf = self.ceph.osd_getmap(epoch = epoch)[1]
+            return _osdmap_decode.decode_osdmap(outbuf), len(outbuf)
+        outbuf = self.ceph.osd_dump(epoch = epoch)[1]
+        return _osdmap.OSDMap.from_osd_dump(outbuf, None), len(outbuf)
+
+    def poll(self):
+        '''
+        :return: dict, 与上一次poll()之间的差异, 格式见模块说明, epoch未变化时返回None
+        :raise CephError: 执行错误时引发CephError
+        :raise rados.Error: RADOS引起的问题描述
+        '''
+        with self.lock:
+            epoch, stat_bytes = self.epoch()
+            self.stats['polls'] += 1
+            self.stats['bytes_fetched'] += stat_bytes
+            if self.osdmap is not None and self.osdmap.epoch == epoch:
+                self.stats['bytes_full'] += self.map_bytes
+                self.stats['bytes_saved'] = self.stats['bytes_full'] - self.stats['bytes_fetched']
+                return None
+            try:
+                new, size = self.fetch(epoch)
+            except _ceph.CephError:
+                # 两次命令之间epoch又发生了变化, 或MON上已经没有该版本, 改为获取最新版本
+                new, size = self.fetch()
+            self.stats['fetches'] += 1
+            self.stats['bytes_fetched'] += size
+            self.stats['bytes_full'] += size
+            self.stats['bytes_saved'] = self.stats['bytes_full'] - self.stats['bytes_fetched']
+            self.map_bytes = size
+            delta = diff(self.osdmap, new)
+            self.osdmap = new
+            self.stats['delta_bytes'] += len(json.dumps(delta))
+            return delta
+
+    def diff_epochs(self, from_epoch, to_epoch = None):
+        '''
+        获取两个版本的osdmap并对比, 不影响poll()记录的map
+        :param from_epoch: int, 旧版本号
+        :param to_epoch: int, 新版本号, 不指定时为最新版本
+        :return: dict, 差异
+        :raise CephError: 执行错误时引发CephError, 如MON上已经没有该版本
+        :raise rados.Error: RADOS引起的问题描述
+        '''
+        old, _ = self.fetch(from_epoch)
+        new, _ = self.fetch(to_epoch)
+        return diff(old, new)
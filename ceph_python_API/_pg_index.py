@@ -0,0 +1,229 @@
+# -*- coding: UTF-8 -*-
+'''
+基于一次pg dump pgs_brief快照的客户端PG索引, 按OSD (acting集合)、primary OSD、存储池和状态查询, 不必每次都向MON发送pg ls-by-osd等命令
+新快照到达时只更新发生变化的PG
+    import _ceph
+    import _pg_index
+    index = _pg_index.PGIndex(max_age = 30)
+    ceph = _ceph.Ceph(pg_index = index)
+    ret, outbuf, outs = ceph.pg_ls_by_osd('osd.3') # 由索引返回, 不再发送pg ls-by-osd
+    index.by_primary(3) # frozenset, 元素为pgid
+'''
+import json
+import threading
+import time
+import _pg_stream
+
+# pgs_brief中每条记录的字段
+BRIEF_FIELDS = ('pgid', 'state', 'up', 'up_primary', 'acting', 'acting_primary')
+
+# 纠删码PG的acting集合中没有OSD的位置, 与 _crush.CRUSH_ITEM_NONE 相同
+CRUSH_ITEM_NONE = 0x7fffffff
+
+def osd_id(osd):
+    '''
+    :param osd: int/str, OSD编号或名称, 如 3、'3'、'osd.3'
+    :return: int, OSD编号
+    :raise ValueError: 格式错误
+    '''
+    if isinstance(osd, int):
+        return osd
+    if osd.startswith('osd.'):
+        osd = osd[4:]
+    return int(osd)
+
+def _pg_key(pgid):
+    # 与Ceph的输出顺序一致: 先按存储池, 再按PG编号
+    pool, ps = pgid.split('.', 1)
+    return int(pool), int(ps, 16)
+
+def _brief(record):
+    return dict((field, record.get(field)) for field in BRIEF_FIELDS)
+
+class PGIndex():
+    '''
+    PG索引, 线程安全, 各by_*()查询为字典查找, 返回值为结果集合的只读副本
+    :param max_age: int/float, 通过Ceph查询时索引的最长有效时间, 单位为秒, 超过后先用pg dump pgs_brief刷新, 不指定时只在为空时刷新
+    '''
+
+    def __init__(self, max_age = None):
+        if max_age is not None and (not isinstance(max_age, (int, float)) or max_age < 0):
+            raise TypeError('变量max_age的类型错误, 应为非负数')
+        self.max_age = max_age
+        self.lock = threading.RLock()
+        self.pgs = {} # pgid -> 记录 (BRIEF_FIELDS)
+        self.osd_index = {} # OSD编号 -> acting集合中包含该OSD的pgid集合
+        self.primary_index = {} # OSD编号 -> acting primary为该OSD的pgid集合
+        self.pool_index = {} # 存储池ID -> pgid集合
+        self.state_index = {} # 单个状态名称 -> pgid集合
+        self.generation = 0 # 已应用的快照数量
+        self.updated = None # 最近一次应用快照的时间
+
+    def __len__(self):
+        return len(self.pgs)
+
+    def stale(self):
+        '''
+        :return: bool, 索引为空或超过max_age时为True
+        '''
+        with self.lock:
+            if self.updated is None:
+                return True
+            return self.max_age is not None and time.time() - self.updated > self.max_age
+
+    def refresh(self, ceph):
+        '''
+        执行pg dump pgs_brief并应用结果
+        :param ceph: _ceph.Ceph, 用于执行命令, 也可以是AsyncCeph (需在线程池中调用)
+        :return: dict, 同update()
+        :raise CephError: 执行错误时引发CephError
+        :raise rados.Error: RADOS引起的问题描述
+        '''
+        import _ceph # _ceph导入了本模块, 延迟导入
+        # 直接调用Ceph的同步实现, AsyncCeph的run_ceph_command返回Future
+        cmd = {'prefix': 'pg dump', 'dumpcontents': ['pgs_brief'], 'format': 'json'}
+        ret, outbuf, outs = _ceph.Ceph.run_ceph_command(ceph, cmd, inbuf = '')
+        return self.update(outbuf)
+
+    def update(self, snapshot):
+        '''
+        应用一次新的快照, 只重建发生变化 (新增、删除、状态或OSD集合变化) 的PG的索引项
+        :param snapshot: bytes/str/iterable, pg dump pgs_brief的outbuf, 或元素为dict的PG记录
+        :return: dict, {'added': int, 'removed': int, 'changed': int, 'total': int}
+        :raise ValueError: outbuf格式错误
+        '''
+        if isinstance(snapshot, (bytes, bytearray, str)):
+            snapshot = _pg_stream.iter_pg_stats(snapshot)
+        added = changed = 0
+        with self.lock:
+            seen = set()
+            for record in snapshot:
+                record = _brief(record)
+                pgid = record['pgid']
+                seen.add(pgid)
+                old = self.pgs.get(pgid)
+                if old == record:
+                    continue
+                if old is None:
+                    added += 1
+                else:
+                    changed += 1
+                    self._unindex(old)
+                self._index(record)
+            removed = [pgid for pgid in self.pgs if pgid not in seen]
+            for pgid in removed:
+                self._unindex(self.pgs[pgid])
+            self.generation += 1
+            self.updated = time.time()
+            return {'added': added, 'removed': len(removed), 'changed': changed, 'total': len(self.pgs)}
+
+    def _index(self, record):
+        pgid = record['pgid']
+        self.pgs[pgid] = record
+        for osd in record['acting'] or ():
+            if osd == CRUSH_ITEM_NONE: # 纠删码PG中缺失的分片
+                continue
+            self.osd_index.setdefault(osd, set()).add(pgid)
+        if record['acting_primary'] is not None and record['acting_primary'] >= 0:
+            self.primary_index.setdefault(record['acting_primary'], set()).add(pgid)
+        self.pool_index.setdefault(_pg_key(pgid)[0], set()).add(pgid)
+        for state in (record['state'] or 'unknown').split('+'):
+            self.state_index.setdefault(state, set()).add(pgid)
+
+    def _unindex(self, record):
+        pgid = record['pgid']
+        del self.pgs[pgid]
+        for osd in record['acting'] or ():
+            if osd == CRUSH_ITEM_NONE: # 纠删码PG中缺失的分片
+                continue
+            _discard(self.osd_index, osd, pgid)
+        if record['acting_primary'] is not None and record['acting_primary'] >= 0:
+            _discard(self.primary_index, record['acting_primary'], pgid)
+        _discard(self.pool_index, _pg_key(pgid)[0], pgid)
+        for state in (record['state'] or 'unknown').split('+'):
+            _discard(self.state_index, state, pgid)
+
+    def _lookup(self, index, key):
+        with self.lock:
+            return frozenset(index.get(key, ()))
+
+    def get(self, pgid):
+        '''
+        :param pgid: str, PG ID, 如 '1.1f'
+        :return: dict, PG记录, 不存在时返回None
+        '''
+        with self.lock:
+            record = self.pgs.get(pgid)
+            return dict(record) if record is not None else None
+
+    def by_osd(self, osd):
+        '''
+        :param osd: int/str, OSD编号或名称
+        :return: frozenset, acting集合中包含该OSD的pgid
+        '''
+        return self._lookup(self.osd_index, osd_id(osd))
+
+    def by_primary(self, osd):
+        '''
+        :param osd: int/str, OSD编号或名称
+        :return: frozenset, acting primary为该OSD的pgid
+        '''
+        return self._lookup(self.primary_index, osd_id(osd))
+
+    def by_pool(self, pool):
+        '''
+        :param pool: int, 存储池ID
+        :return: frozenset, 该存储池的pgid
+        '''
+        return self._lookup(self.pool_index, pool)
+
+    def by_state(self, state):
+        '''
+        :param state: str, 单个状态名称, 如 'degraded'
+        :return: frozenset, 具有该状态的pgid
+        '''
+        return self._lookup(self.state_index, state)
+
+    def query(self, osd = None, primary = None, pool = None, states = None):
+        '''
+        按条件组合查询, 条件之间为与的关系, 与pg ls系列命令一致, states中的多个状态为或的关系
+        :param osd: int/str, acting集合中包含的OSD
+        :param primary: int/str, acting primary OSD
+        :param pool: int, 存储池ID
+        :param states: list, 允许多个, 元素为str, 单个状态名称
+        :return: list, 元素为dict, 按pgid排序的PG记录
+        '''
+        with self.lock:
+            candidates = []
+            if osd is not None:
+                candidates.append(self.osd_index.get(osd_id(osd), set()))
+            if primary is not None:
+                candidates.append(self.primary_index.get(osd_id(primary), set()))
+            if pool is not None:
+                candidates.append(self.pool_index.get(pool, set()))
+            if states:
+                matched = set()
+                for state in states:
+                    matched |= self.state_index.get(state, set())
+                candidates.append(matched)
+            if candidates:
+                candidates.sort(key = len)
+                pgids = set(candidates[0]).intersection(*candidates[1:])
+            else:
+                pgids = self.pgs.keys()
+            return [dict(self.pgs[pgid]) for pgid in sorted(pgids, key = _pg_key)]
+
+    def pg_ls(self, osd = None, primary = None, pool = None, states = None):
+        '''
+        以pg ls系列命令的格式返回查询结果
+        :return: tuple, (int ret, bytes outbuf, str outs), 与mon_command()的返回值一致, json格式, pg_stats中的记录只包含BRIEF_FIELDS中的字段
+        '''
+        pg_stats = self.query(osd = osd, primary = primary, pool = pool, states = states)
+        return 0, json.dumps({'pg_ready': True, 'pg_stats': pg_stats}).encode('utf-8'), ''
+
+def _discard(index, key, pgid):
+    pgids = index.get(key)
+    if pgids is not None:
+        pgids.discard(pgid)
+        if not pgids:
+            del index[key]
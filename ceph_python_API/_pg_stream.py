@@ -0,0 +1,132 @@
+# -*- coding: UTF-8 -*-
+'''
+从pg dump、pg dump_json、pg ls等命令的outbuf中逐条解码PG统计记录, 不构造完整的对象树
+json.loads会一次性把数百MB的outbuf解码为dict/list, 峰值内存为outbuf的数倍; 这里只定位 "pg_stats" 数组, 每次用json.JSONDecoder.raw_decode()解码一个元素,
+bytes类型的outbuf按窗口 (默认1MB) 分段解码为str, 任何时刻只有一个窗口和一条记录在内存中
+    import _pg_stream
+    ret, outbuf, outs = ceph.pg_dump()
+    for pg in _pg_stream.iter_pg_stats(outbuf, fields = ['pgid', 'state', 'stat_sum.num_bytes']):
+        ...
+'''
+import json
+import re
+
+_decoder = json.JSONDecoder()
+_ARRAY_TEXT = re.compile(r'"pg_stats"\s*:\s*\[')
+_ARRAY_BYTES = re.compile(br'"pg_stats"\s*:\s*\[')
+_SKIP = ' \t\n\r,'
+
+def project(record, fields):
+    '''
+    按字段路径提取记录中的字段
+    :param record: dict, 一条PG统计记录
+    :param fields: list, 允许多个, 元素为str, 字段路径, 嵌套字段以 . 分隔, 如 'stat_sum.num_bytes'
+    :return: dict, 字段路径 -> 值, 不存在的字段值为None
+    '''
+    result = {}
+    for path in fields:
+        value = record
+        for key in path.split('.'):
+            if isinstance(value, dict):
+                value = value.get(key)
+            else:
+                value = None
+                break
+        result[path] = value
+    return result
+
+def _array_start(outbuf, pattern):
+    # 返回数组第一个元素之前的位置, 兼容顶层即为数组的旧版本输出
+    i = 0
+    while i < len(outbuf) and outbuf[i:i + 1] in (b' ', b'\t', b'\n', b'\r', ' ', '\t', '\n', '\r'):
+        i += 1
+    if outbuf[i:i + 1] in (b'[', '['):
+        return i + 1
+    match = pattern.search(outbuf)
+    if match is None:
+        return None
+    return match.end()
+
+def _iter_text(text, start):
+    pos = start
+    end = len(text)
+    while True:
+        while pos < end and text[pos] in _SKIP:
+            pos += 1
+        if pos >= end:
+            raise ValueError('pg_stats数组不完整')
+        if text[pos] == ']':
+            return
+        record, pos = _decoder.raw_decode(text, pos)
+        yield record
+
+def _iter_bytes(outbuf, start, chunk_size):
+    view = memoryview(outbuf)
+    total = len(outbuf)
+    offset = start # 当前窗口在outbuf中的起始字节位置
+    size = chunk_size
+    while True:
+        window_end = min(total, offset + size)
+        text = view[offset:window_end].tobytes().decode('utf-8', 'ignore') # 窗口末尾被截断的多字节字符由下一个窗口重新解码
+        pos = 0
+        end = len(text)
+        consumed = 0 # 本窗口中已完整解码的部分 (字符数)
+        while True:
+            while pos < end and text[pos] in _SKIP:
+                pos += 1
+            if pos >= end:
+                break
+            if text[pos] == ']':
+                return
+            try:
+                record, pos = _decoder.raw_decode(text, pos)
+            except ValueError:
+                if window_end >= total:
+                    raise
+                break # 记录跨越窗口末尾, 从该记录开始重新读取窗口
+            consumed = pos
+            yield record
+        if consumed == 0:
+            if window_end >= total:
+                raise ValueError('pg_stats数组不完整')
+            size *= 2 # 单条记录超过窗口大小
+            continue
+        prefix = text[:consumed]
+        offset += len(prefix) if _is_ascii(prefix) else len(prefix.encode('utf-8'))
+        size = chunk_size
+
+def _is_ascii(text):
+    try:
+        text.encode('ascii')
+    except UnicodeError:
+        return False
+    return True
+
+def iter_pg_stats(outbuf, fields = None, limit = None, chunk_size = 1 << 20):
+    '''
+    逐条解码outbuf中的PG统计记录, 适用于pg dump (含dumpcontents为pgs、pgs_brief)、pg dump_json、pg ls、pg ls-by-pool/osd/primary的输出
+    调用方可以随时停止迭代 (如break), 剩余部分不会被解码
+    :param outbuf: bytes/str, Ceph.pg_dump()等函数返回的outbuf
+    :param fields: list, 允许多个, 元素为str, 只保留的字段路径, 嵌套字段以 . 分隔, 如 ['pgid', 'state', 'stat_sum.num_bytes'], 不指定时返回完整记录
+    :param limit: int, 最多返回的记录数量, 不指定时返回全部记录
+    :param chunk_size: int, bytes类型的outbuf每次解码的窗口大小, 单位为字节
+    :return: generator, 元素为dict, 指定fields时为 字段路径 -> 值
+    :raise ValueError: outbuf中没有pg_stats数组或json格式错误
+    '''
+    if isinstance(outbuf, (bytes, bytearray)) and not isinstance(outbuf, str):
+        start = _array_start(outbuf, _ARRAY_BYTES)
+        records = _iter_bytes(outbuf, start, chunk_size) if start is not None else None
+    else:
+        start = _array_start(outbuf, _ARRAY_TEXT)
+        records = _iter_text(outbuf, start) if start is not None else None
+    if records is None:
+        raise ValueError('outbuf中没有pg_stats数组')
+
+    if limit is not None and limit <= 0:
+        return
+    count = 0
+    for record in records:
+        yield project(record, fields) if fields is not None else record
+        count += 1
+        if limit is not None and count >= limit:
+            return
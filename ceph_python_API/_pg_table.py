@@ -0,0 +1,288 @@
+# -*- coding: UTF-8 -*-
+'''
+将pg dump、pg ls等命令的输出转换为以NumPy数组存储的列式表, 按存储池、OSD、状态的汇总均为向量化运算
+    import _pg_table
+    ret, outbuf, outs = ceph.pg_dump(dumpcontents = ['pgs'])
+    table = _pg_table.PGTable.from_outbuf(outbuf)
+    table.sum_by_pool('num_bytes')
+    table.count_by_osd()
+    table.count_by_state_flag()
+依赖NumPy
+'''
+import numpy as np
+import _pg_stream
+
+# 默认从stat_sum中加载的数值列
+DEFAULT_STATS = (
+    'num_bytes', 'num_objects', 'num_object_copies', 'num_objects_degraded', 'num_objects_misplaced',
+    'num_objects_unfound', 'num_read', 'num_read_kb', 'num_write', 'num_write_kb',
+)
+
+# 记录顶层的数值列
+TOP_LEVEL_STATS = ('log_size', 'ondisk_log_size')
+
+# 纠删码存储池中没有选出OSD的位置, 与 _crush.CRUSH_ITEM_NONE 相同
+CRUSH_ITEM_NONE = 0x7fffffff
+
+class PGTable():
+    '''
+    列式PG统计表, 第i行对应第i个PG
+    :param pool: numpy.ndarray, int64, 存储池ID
+    :param ps: numpy.ndarray, int64, PG在存储池内的编号 (pgid中 . 之后的十六进制部分)
+    :param up: numpy.ndarray, int32, 形状为 (PG数量, 最大副本数), 不足的位置为-1
+    :param acting: numpy.ndarray, int32, 形状与up相同
+    :param up_primary: numpy.ndarray, int32
+    :param acting_primary: numpy.ndarray, int32
+    :param state_mask: numpy.ndarray, uint64, 按state_names的位置组成的状态位图, 如 active+clean 为 active 和 clean 两位
+    :param state_code: numpy.ndarray, int32, 完整状态字符串在state_strings中的位置
+    :param state_names: list, 单个状态名称, 第i个对应位图的第i位
+    :param state_strings: list, 完整状态字符串, 如 'active+clean'
+    :param stats: dict, 列名 -> numpy.ndarray (int64), 如 'num_bytes'、'log_size'
+    '''
+
+    def __init__(self, pool, ps, up, acting, up_primary, acting_primary, state_mask, state_code, state_names, state_strings, stats):
+        self.pool = pool
+        self.ps = ps
+        self.up = up
+        self.acting = acting
+        self.up_primary = up_primary
+        self.acting_primary = acting_primary
+        self.state_mask = state_mask
+        self.state_code = state_code
+        self.state_names = state_names
+        self.state_strings = state_strings
+        self.stats = stats
+        self._groups = {}
+
+    @classmethod
+    def from_records(cls, records, stats = DEFAULT_STATS):
+        '''
+        从PG统计记录构造表
+        :param records: iterable, 元素为dict, 与pg dump输出中pg_stats数组的元素格式一致, 可以是_pg_stream.iter_pg_stats()的结果
+        :param stats: list, 允许多个, 元素为str, 加载的stat_sum字段, pgs_brief格式的记录没有stat_sum, 这些列为0
+        :return: PGTable
+        '''
+        stats = tuple(stats)
+        pools, pss, ups, actings, up_primaries, acting_primaries, codes = [], [], [], [], [], [], []
+        columns = dict((name, []) for name in stats + TOP_LEVEL_STATS)
+        names = {}
+        strings = {}
+        width = 0
+        for r in records:
+            pool, ps = r['pgid'].split('.', 1)
+            pools.append(int(pool))
+            pss.append(int(ps, 16))
+            up = r.get('up') or []
+            acting = r.get('acting') or []
+            width = max(width, len(up), len(acting))
+            ups.append(up)
+            actings.append(acting)
+            up_primaries.append(r.get('up_primary', -1))
+            acting_primaries.append(r.get('acting_primary', -1))
+            state = r.get('state', 'unknown')
+            code = strings.get(state)
+            if code is None:
+                code = strings[state] = len(strings)
+                for name in state.split('+'):
+                    names.setdefault(name, len(names))
+            codes.append(code)
+            stat_sum = r.get('stat_sum') or {}
+            for name in stats:
+                columns[name].append(stat_sum.get(name, 0))
+            for name in TOP_LEVEL_STATS:
+                columns[name].append(r.get(name, 0))
+
+        if len(names) > 64:
+            raise ValueError('状态种类超过64个, 无法用uint64位图表示')
+        state_strings = [s for s, _ in sorted(strings.items(), key = lambda item: item[1])]
+        state_names = [s for s, _ in sorted(names.items(), key = lambda item: item[1])]
+        # 每种完整状态字符串对应的位图, 按state_code查表得到每个PG的位图
+        code_masks = np.zeros(len(state_strings), dtype = np.uint64)
+        for code, state in enumerate(state_strings):
+            mask = 0
+            for name in state.split('+'):
+                mask |= 1 << names[name]
+            code_masks[code] = mask
+        state_code = np.array(codes, dtype = np.int32)
+
+        return cls(
+            pool = np.array(pools, dtype = np.int64),
+            ps = np.array(pss, dtype = np.int64),
+            up = _pad(ups, width),
+            acting = _pad(actings, width),
+            up_primary = np.array(up_primaries, dtype = np.int32),
+            acting_primary = np.array(acting_primaries, dtype = np.int32),
+            state_mask = code_masks[state_code] if len(codes) else np.zeros(0, dtype = np.uint64),
+            state_code = state_code,
+            state_names = state_names,
+            state_strings = state_strings,
+            stats = dict((name, np.array(values, dtype = np.int64)) for name, values in columns.items()),
+        )
+
+    @classmethod
+    def from_outbuf(cls, outbuf, stats = DEFAULT_STATS):
+        '''
+        从Ceph.pg_dump()、pg_dump_json()、pg_ls()等函数返回的outbuf构造表, 使用_pg_stream逐条解码
+        :param outbuf: bytes/str
+        :param stats: list, 允许多个, 元素为str, 加载的stat_sum字段
+        :return: PGTable
+        '''
+        return cls.from_records(_pg_stream.iter_pg_stats(outbuf), stats = stats)
+
+    def __len__(self):
+        return len(self.pool)
+
+    def pgid(self, i):
+        '''
+        :return: str, 第i行的PG ID, 如 '1.1f'
+        '''
+        return '{}.{:x}'.format(self.pool[i], self.ps[i])
+
+    def column(self, name):
+        '''
+        :param name: str, stats中的列名
+        :return: numpy.ndarray
+        :raise KeyError: 列不存在
+        '''
+        return self.stats[name]
+
+    def state_bit(self, name):
+        '''
+        :param name: str, 单个状态名称, 如 'degraded'
+        :return: int, 对应的位, 表中没有出现该状态时返回0
+        '''
+        if name not in self.state_names:
+            return 0
+        return 1 << self.state_names.index(name)
+
+    def has_state(self, *names):
+        '''
+        :param names: str, 允许多个, 单个状态名称
+        :return: numpy.ndarray, bool, 同时具有所有指定状态的PG
+        '''
+        bits = 0
+        for name in names:
+            bit = self.state_bit(name)
+            if not bit:
+                return np.zeros(len(self), dtype = bool)
+            bits |= bit
+        bits = np.uint64(bits)
+        return (self.state_mask & bits) == bits
+
+    def on_osd(self, osd, which = 'acting'):
+        '''
+        :param osd: int, OSD编号
+        :param which: str, 'acting' 或 'up'
+        :return: numpy.ndarray, bool, 分布在该OSD上的PG
+        '''
+        return (getattr(self, which) == osd).any(axis = 1)
+
+    def select(self, mask):
+        '''
+        按布尔数组或下标数组筛选行
+        :return: PGTable
+        '''
+        return PGTable(self.pool[mask], self.ps[mask], self.up[mask], self.acting[mask], self.up_primary[mask], self.acting_primary[mask],
+                       self.state_mask[mask], self.state_code[mask], self.state_names, self.state_strings,
+                       dict((name, values[mask]) for name, values in self.stats.items()))
+
+    def _group(self, key):
+        # 按key列排序后的 (顺序, 各组的键, 各组的起始位置), 同一张表只计算一次
+        group = self._groups.get(key)
+        if group is None:
+            values = getattr(self, key)
+            order = np.argsort(values, kind = 'stable')
+            keys, starts = np.unique(values[order], return_index = True)
+            group = self._groups[key] = (order, keys, starts)
+        return group
+
+    def _reduce(self, key, values):
+        order, keys, starts = self._group(key)
+        if not len(keys):
+            return {}
+        sums = np.add.reduceat(values[order], starts)
+        return dict(zip(keys.tolist(), sums.tolist()))
+
+    def count_by_pool(self):
+        '''
+        :return: dict, 存储池ID -> PG数量
+        '''
+        return self._reduce('pool', np.ones(len(self), dtype = np.int64))
+
+    def sum_by_pool(self, column):
+        '''
+        :param column: str, stats中的列名, 如 'num_bytes'
+        :return: dict, 存储池ID -> 合计
+        '''
+        return self._reduce('pool', self.stats[column])
+
+    def count_by_osd(self, which = 'acting'):
+        '''
+        :param which: str, 'acting'、'up' (统计每个OSD承载的PG数量) 或 'primary' (统计每个OSD作为acting primary的PG数量)
+        :return: dict, OSD编号 -> PG数量, 不包括PG数量为0的OSD
+        '''
+        if which == 'primary':
+            osds = self.acting_primary[_valid_osds(self.acting_primary)]
+        else:
+            matrix = getattr(self, which)
+            osds = matrix[_valid_osds(matrix)]
+        counts = np.bincount(osds)
+        nonzero = np.nonzero(counts)[0]
+        return dict(zip(nonzero.tolist(), counts[nonzero].tolist()))
+
+    def sum_by_osd(self, column, which = 'acting'):
+        '''
+        每个PG的数值计入其acting (或up) 集合中的每个OSD, 如 num_bytes 按OSD汇总即为每个OSD上的数据量 (副本计)
+        :param column: str, stats中的列名
+        :param which: str, 'acting' 或 'up'
+        :return: dict, OSD编号 -> 合计
+        '''
+        matrix = getattr(self, which)
+        valid = _valid_osds(matrix)
+        osds = matrix[valid]
+        if not len(osds):
+            return {}
+        values = np.broadcast_to(self.stats[column][:, None], matrix.shape)[valid]
+        sums = np.zeros(osds.max() + 1, dtype = np.int64)
+        np.add.at(sums, osds, values)
+        counts = np.bincount(osds, minlength = len(sums))
+        present = np.nonzero(counts)[0]
+        return dict(zip(present.tolist(), sums[present].tolist()))
+
+    def count_by_state(self):
+        '''
+        :return: dict, 完整状态字符串 (如 'active+clean') -> PG数量
+        '''
+        counts = np.bincount(self.state_code, minlength = len(self.state_strings))
+        return dict((s, int(n)) for s, n in zip(self.state_strings, counts.tolist()) if n)
+
+    def count_by_state_flag(self):
+        '''
+        :return: dict, 单个状态名称 (如 'degraded') -> 具有该状态的PG数量
+        '''
+        result = {}
+        for i, name in enumerate(self.state_names):
+            count = int(np.count_nonzero(self.state_mask & np.uint64(1 << i)))
+            if count:
+                result[name] = count
+        return result
+
+    def sum_by_state(self, column):
+        '''
+        :param column: str, stats中的列名
+        :return: dict, 完整状态字符串 -> 合计
+        '''
+        sums = self._reduce('state_code', self.stats[column])
+        return dict((self.state_strings[code], value) for code, value in sums.items())
+
+def _valid_osds(matrix):
+    # 排除不足副本数的填充位置 (-1) 和纠删码PG中缺失的分片 (CRUSH_ITEM_NONE)
+    return (matrix >= 0) & (matrix != CRUSH_ITEM_NONE)
+
+def _pad(rows, width):
+    # 将长度不一的OSD列表转换为以-1填充的二维数组
+    matrix = np.full((len(rows), width), -1, dtype = np.int32)
+    for i, row in enumerate(rows):
+        if row:
+            matrix[i, :len(row)] = row
+    return matrix
@@ -0,0 +1,313 @@
+# -*- coding: UTF-8 -*-
+'''
+后台轮询一组只读命令, 每个命令有独立的刷新间隔, 结果发布为不可变的快照; 每次刷新生成新的快照并整体替换引用, 读取方无需加锁, 也不会等待MON
+    import _ceph
+    import _poller
+    poller = _poller.Poller(_ceph.Ceph(), {'status': 5, 'health': (5, {'detail': 'detail'}), 'osd_df': 30})
+    poller.start()
+    poller.wait(timeout = 10) # 等待每个命令第一次完成
+    snapshot = poller.snapshot
+    snapshot.data('status')['health']['status']
+    snapshot.age('osd_df') # 距离最近一次成功刷新的秒数
+    poller.stop()
+'''
+import json
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+# 不指定commands时默认轮询的命令及间隔 (秒)
+DEFAULT_COMMANDS = {'status': 5, 'health': 5, 'osd_df': 30}
+
+class SnapshotItem():
+    '''
+    一个命令最近一次的结果, 创建后不再修改
+    :param name: str, 名称
+    :param result: tuple, 最近一次成功的 (int ret, bytes outbuf, str outs), 从未成功时为None
+    :param data: 解码后的json, 不解码或从未成功时为None, 多个读取方共享同一个对象, 不要修改
+    :param updated: float, 最近一次成功的时间, 从未成功时为None
+    :param duration: float, 最近一次成功执行的耗时, 单位为秒
+    :param error: Exception, 最近一次执行失败的异常, 之后成功时为None
+    :param failed: float, 最近一次执行失败的时间
+    '''
+
+    def __init__(self, name, result = None, data = None, updated = None, duration = None, error = None, failed = None):
+        self.name = name
+        self.result = result
+        self.data = data
+        self.updated = updated
+        self.duration = duration
+        self.error = error
+        self.failed = failed
+
+    def age(self, now = None):
+        '''
+        :return: float, 距离最近一次成功刷新的秒数, 从未成功时为None
+        '''
+        if self.updated is None:
+            return None
+        return (now or time.time()) - self.updated
+
+class Snapshot():
+    '''
+    某一时刻所有命令的结果, 只读
+    :param items: dict, 名称 -> SnapshotItem
+    :param generation: int, 快照的序号, 每次发布加1
+    '''
+
+    def __init__(self, items, generation):
+        self.items = types.MappingProxyType(dict(items))
+        self.generation = generation
+        self.created = time.time()
+
+    def __contains__(self, name):
+        return name in self.items
+
+    def get(self, name):
+        '''
+        :return: SnapshotItem, 不存在时返回None
+        '''
+        return self.items.get(name)
+
+    def result(self, name):
+        '''
+        :return: tuple, (int ret, bytes outbuf, str outs), 从未成功时为None
+        '''
+        item = self.items.get(name)
+        return item.result if item is not None else None
+
+    def data(self, name):
+        '''
+        :return: 解码后的json, 从未成功时为None
+        '''
+        item = self.items.get(name)
+        return item.data if item is not None else None
+
+    def age(self, name, now = None):
+        '''
+        :return: float, 该命令结果的陈旧程度 (距离最近一次成功刷新的秒数), 从未成功时为None
+        '''
+        item = self.items.get(name)
+        return item.age(now) if item is not None else None
+
+    def ages(self):
+        '''
+        :return: dict, 名称 -> 陈旧程度 (秒)
+        '''
+        now = time.time()
+        return dict((name, item.age(now)) for name, item in self.items.items())
+
+class _Command():
+
+    def __init__(self, name, interval, method, kwargs, parse):
+        self.name = name
+        self.interval = interval
+        self.method = method
+        self.kwargs = kwargs
+        self.parse = parse
+        self.due = 0.0
+        self.running = False
+
+class Poller():
+    '''
+    后台轮询器, 一个调度线程按各命令的间隔把到期的命令提交到线程池执行, 同一命令不会重叠执行
+    执行失败时保留上一次成功的结果, 记录异常, 陈旧程度继续增长
+    :param ceph: _ceph.Ceph, 用于执行命令
+    :param commands: dict, 名称 -> 间隔 (秒), 或 名称 -> (间隔, dict 参数), 名称为Ceph的方法名, 如 'status'、'osd_df', 不指定时为DEFAULT_COMMANDS
+    :param max_workers: int, 同时执行的命令数量上限
+    '''
+
+    def __init__(self, ceph, commands = None, max_workers = 4):
+        if not isinstance(max_workers, int) or max_workers < 1:
+            raise TypeError('变量max_workers的类型错误, 应为正整数')
+        self.ceph = ceph
+        self.max_workers = max_workers
+        self.commands = {}
+        self.cond = threading.Condition()
+        self.publish_lock = threading.Lock()
+        self.snapshot = Snapshot({}, 0)
+        self.listeners = []
+        self.thread = None
+        self.executor = None
+        self.stopped = True
+        for name, spec in (DEFAULT_COMMANDS if commands is None else commands).items():
+            interval, kwargs = spec if isinstance(spec, tuple) else (spec, None)
+            self.add(name, interval, **(kwargs or {}))
+
+    def add(self, name, interval, method = None, parse = True, **kwargs):
+        '''
+        增加或替换一个轮询的命令, 可在运行期间调用
+        :param name: str, 快照中的名称
+        :param interval: int/float, 刷新间隔, 单位为秒
+        :param method: str/callable, Ceph的方法名, 或以Ceph对象为参数、返回 (ret, outbuf, outs) 的可调用对象, 不指定时与name相同
+        :param parse: bool, 是否把outbuf按json解码
+        :param kwargs: 传递给Ceph方法的参数, 如 detail = 'detail'
+        '''
+        if not isinstance(interval, (int, float)) or interval <= 0:
+            raise TypeError('变量interval的类型错误, 应为正数')
+        method = name if method is None else method
+        if isinstance(method, str) and not callable(getattr(self.ceph, method, None)):
+            raise ValueError('Ceph没有方法: {}'.format(method))
+        command = _Command(name, interval, method, kwargs, parse)
+        with self.cond:
+            old = self.commands.get(name)
+            if old is not None: # 替换正在执行的命令时继承其状态, 旧的执行完成前不会再次调度
+                command.running = old.running
+                command.due = old.due
+            self.commands[name] = command
+            self.cond.notify()
+
+    def remove(self, name):
+        '''
+        停止轮询一个命令, 并从之后的快照中移除
+        '''
+        with self.cond:
+            self.commands.pop(name, None)
+        with self.publish_lock:
+            items = dict(self.snapshot.items)
+            if items.pop(name, None) is not None:
+                self.snapshot = Snapshot(items, self.snapshot.generation + 1)
+
+    def subscribe(self, callback):
+        '''
+        每次有命令刷新 (成功或失败) 并发布新快照后, 在执行该命令的线程中调用callback(name, snapshot)
+        :param callback: callable, 不应长时间阻塞, 引发的异常会被忽略
+        '''
+        with self.publish_lock:
+            self.listeners = self.listeners + [callback]
+
+    def unsubscribe(self, callback):
+        # 每次取绑定方法都会得到新对象, 用 != 比较 (绑定方法按对象和函数比较相等)
+        with self.publish_lock:
+            self.listeners = [c for c in self.listeners if c != callback]
+
+    def _execute(self, command):
+        method = command.method
+        if isinstance(method, str):
+            result = getattr(self.ceph, method)(**command.kwargs)
+        else:
+            result = method(self.ceph)
+        if isinstance(result, Exception): # 参数错误时Ceph的方法返回而不是引发异常
+            raise result
+        return result
+
+    def _run(self, command, scheduled = True):
+        start = time.time()
+        try:
+            result = self._execute(command)
+            data = json.loads(result[1]) if command.parse and result[1] else None
+            error = None
+        except Exception as e:
+            error = e
+        end = time.time()
+        with self.publish_lock:
+            old = self.snapshot.items.get(command.name)
+            if error is None:
+                item = SnapshotItem(command.name, result, data, updated = end, duration = end - start)
+            else:
+                item = SnapshotItem(command.name, old.result if old else None, old.data if old else None, old.updated if old else None,
+                                    old.duration if old else None, error = error, failed = end)
+            if command.name in self.commands:
+                items = dict(self.snapshot.items)
+                items[command.name] = item
+                self.snapshot = Snapshot(items, self.snapshot.generation + 1) # 引用的替换是原子的, 读取方拿到的总是完整的快照
+            snapshot = self.snapshot
+            listeners = self.listeners
+        with self.cond:
+            if scheduled:
+                command.running = False
+                command.due = start + command.interval
+                current = self.commands.get(command.name)
+                if current is not None and current is not command and current.running:
+                    # 执行期间该命令被add()替换, 新命令继承的运行状态随本次执行结束
+                    current.running = False
+                    current.due = start + current.interval
+            self.cond.notify_all()
+        for callback in listeners:
+            try:
+                callback(command.name, snapshot)
+            except Exception:
+                pass
+        return item
+
+    def refresh(self, name = None):
+        '''
+        在当前线程中立即执行并发布, 不影响后台的调度
+        :param name: str, 命令名称, 不指定时依次刷新所有命令
+        :return: Snapshot, 刷新后的快照
+        '''
+        with self.cond:
+            commands = [self.commands[name]] if name is not None else list(self.commands.values())
+        for command in commands:
+            self._run(command, scheduled = False)
+        return self.snapshot
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                if self.stopped:
+                    return
+                now = time.time()
+                due = [c for c in self.commands.values() if not c.running and c.due <= now]
+                for c in due:
+                    c.running = True
+                if not due:
+                    waiting = [c.due for c in self.commands.values() if not c.running]
+                    self.cond.wait(max(0.0, min(waiting) - now) if waiting else None)
+                    continue
+            for c in due:
+                self.executor.submit(self._run, c)
+
+    def start(self):
+        '''
+        启动后台调度线程, 所有命令立即执行一次
+        '''
+        with self.cond:
+            if not self.stopped:
+                return
+            self.stopped = False
+            for c in self.commands.values():
+                c.due = 0.0
+            self.executor = ThreadPoolExecutor(max_workers = self.max_workers)
+            self.thread = threading.Thread(target = self._loop, name = 'ceph-poller')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def stop(self, timeout = None):
+        '''
+        停止调度, 等待正在执行的命令完成, 最近一次的快照仍然可读
+        '''
+        with self.cond:
+            if self.stopped:
+                return
+            self.stopped = True
+            self.cond.notify_all()
+        self.thread.join(timeout)
+        self.executor.shutdown(wait = True)
+
+    def wait(self, names = None, timeout = None):
+        '''
+        等待指定的命令至少完成一次 (成功或失败)
+        :param names: list, 允许多个, 元素为str, 不指定时为所有命令
+        :param timeout: int/float, 最长等待时间, 单位为秒
+        :return: bool, 超时返回False
+        '''
+        deadline = None if timeout is None else time.time() + timeout
+        with self.cond:
+            while True:
+                items = self.snapshot.items
+                pending = [n for n in (names or list(self.commands)) if n not in items]
+                if not pending:
+                    return True
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,234 @@
+# -*- coding: UTF-8 -*-
+import rados
+import threading
+import time
+from contextlib import contextmanager
+
+class RadosPoolError(Exception):
+    '''
+    连接池无法借出集群句柄时产生的异常
+    :param msg: 错误的解释
+    '''
+
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return self.msg
+
+class RadosPool():
+    '''
+    rados.Rados集群句柄连接池: 借出已连接的句柄, 命令执行完成后归还句柄而不是shutdown, 避免每次调用都重复进行MON握手和cephx认证
+    :param size: int, 连接池最多持有的句柄数量 (包括已借出和空闲的句柄), 默认为4
+    :param idle_timeout: float, 空闲句柄的最长保留时间, 单位为秒, 超时的空闲句柄会被关闭, 为None时不回收空闲句柄, 默认为300
+    :param health_check_interval: float, 同一个句柄两次健康检查的最短间隔, 单位为秒, 为0时每次借出前都检查, 默认为30
+    :param health_check: 回调函数, 以rados.Rados为参数, 返回bool表示句柄是否健康, 不指定时默认检查句柄状态并调用get_fsid()
+    :param conffile: str, 创建rados.Rados时使用的配置文件, 默认为 '' (使用默认搜索路径)
+    :param kwargs: 其他传递给rados.Rados的参数, 如name、clustername、conf
+    '''
+
+    def __init__(self, size = 4, idle_timeout = 300, health_check_interval = 30, health_check = None, conffile = '', **kwargs):
+        if not isinstance(size, int) or size < 1:
+            raise TypeError('变量size的类型错误, 应为正整数')
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.health_check = health_check if health_check is not None else self._default_health_check
+        self.conffile = conffile
+        self.rados_kwargs = kwargs
+
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = [] # 空闲句柄, 元素为[rados.Rados, 归还时间, 上次健康检查时间], 末尾为最近归还的句柄
+        self._total = 0 # 已创建且未关闭的句柄数量
+        self._lent = {} # 已借出的句柄, id(rados.Rados) -> 上次健康检查时间
+        self._closed = False
+        self.stats = {'created': 0, 'reused': 0, 'evicted': 0, 'unhealthy': 0, 'discarded': 0}
+
+    def _connect(self):
+        try:
+            cluster = rados.Rados(conffile = self.conffile, **self.rados_kwargs)
+        except TypeError as e:
+            print('参数验证错误: {}'.format(e))
+            raise e
+        print('创建了集群句柄')
+
+        try:
+            cluster.connect()
+        except Exception as e:
+            print('集群连接错误: {}'.format(e))
+            cluster.shutdown()
+            raise e
+        print('成功连接集群')
+        return cluster
+
+    @staticmethod
+    def _default_health_check(cluster):
+        if getattr(cluster, 'state', 'connected') != 'connected':
+            return False
+        cluster.get_fsid()
+        return True
+
+    def _is_healthy(self, cluster):
+        try:
+            return bool(self.health_check(cluster))
+        except Exception:
+            return False
+
+    def _shutdown(self, cluster):
+        try:
+            cluster.shutdown()
+        except Exception as e:
+            print('关闭集群句柄错误: {}'.format(e))
+
+    def _evict_idle(self, now):
+        # 调用时须持有self._cond, 返回需要在锁外关闭的句柄
+        if self.idle_timeout is None:
+            return []
+        expired = [entry for entry in self._idle if now - entry[1] > self.idle_timeout]
+        if expired:
+            self._idle = [entry for entry in self._idle if now - entry[1] <= self.idle_timeout]
+            self._total -= len(expired)
+            self.stats['evicted'] += len(expired)
+            self._cond.notify(len(expired))
+        return [entry[0] for entry in expired]
+
+    def acquire(self, timeout = None):
+        '''
+        从连接池借出一个已连接的集群句柄, 用完后必须调用release()归还
+        :param timeout: float, 连接池已满时等待其他句柄归还的最长时间, 单位为秒, 为None时一直等待
+        :return: rados.Rados, 已连接的集群句柄
+        :raise RadosPoolError: 连接池已关闭或等待超时时引发RadosPoolError
+        :raise rados.Error: 新建句柄连接集群失败时引发
+        '''
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            entry = None
+            with self._cond:
+                if self._closed:
+                    raise RadosPoolError('连接池已关闭')
+                now = time.time()
+                stale = self._evict_idle(now)
+                if self._idle:
+                    entry = self._idle.pop()
+                elif self._total < self.size:
+                    self._total += 1
+                else:
+                    remaining = None if deadline is None else deadline - now
+                    if remaining is not None and remaining <= 0:
+                        raise RadosPoolError('等待连接池中的集群句柄超时')
+                    self._cond.wait(remaining)
+                    continue
+            for s in stale:
+                self._shutdown(s)
+
+            if entry is None:
+                try:
+                    cluster = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._lent[id(cluster)] = time.time()
+                    self.stats['created'] += 1
+                return cluster
+
+            # 健康检查可能访问网络, 在锁外进行
+            cluster, checked = entry[0], entry[2]
+            if now - checked >= self.health_check_interval:
+                if not self._is_healthy(cluster):
+                    self._shutdown(cluster)
+                    with self._cond:
+                        self._total -= 1
+                        self.stats['unhealthy'] += 1
+                        self._cond.notify()
+                    continue
+                checked = time.time()
+            with self._cond:
+                self._lent[id(cluster)] = checked
+                self.stats['reused'] += 1
+            return cluster
+
+    def release(self, cluster, discard = False):
+        '''
+        归还借出的集群句柄
+        :param cluster: rados.Rados, 由acquire()借出的集群句柄
+        :param discard: bool, 为True时关闭该句柄而不放回连接池, 用于执行中出现rados.Error等连接可能已损坏的情况
+        '''
+        with self._cond:
+            checked = self._lent.pop(id(cluster), 0)
+            close = discard or self._closed
+            if close:
+                self._total -= 1
+                if discard:
+                    self.stats['discarded'] += 1
+            else:
+                self._idle.append([cluster, time.time(), checked])
+            self._cond.notify()
+        if close:
+            self._shutdown(cluster)
+
+    @contextmanager
+    def connection(self, timeout = None):
+        '''
+        以上下文管理器的方式借出集群句柄, 退出时自动归还, 出现rados.Error时关闭该句柄
+        :param timeout: float, 同acquire()
+        '''
+        cluster = self.acquire(timeout = timeout)
+        discard = False
+        try:
+            yield cluster
+        except rados.Error:
+            discard = True
+            raise
+        finally:
+            self.release(cluster, discard = discard)
+
+    def close(self):
+        '''
+        关闭连接池以及所有空闲句柄, 已借出的句柄在归还时关闭
+        '''
+        with self._cond:
+            self._closed = True
+            idle = [entry[0] for entry in self._idle]
+            self._idle = []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for cluster in idle:
+            self._shutdown(cluster)
+
+    def __len__(self):
+        with self._cond:
+            return self._total
+
+    def idle_count(self):
+        with self._cond:
+            return len(self._idle)
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+def get_default_pool():
+    '''
+    获取进程内共享的默认连接池, 首次调用时创建
+    :return: RadosPool
+    '''
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None or _default_pool._closed:
+            _default_pool = RadosPool()
+        return _default_pool
+
+def set_default_pool(pool):
+    '''
+    替换进程内共享的默认连接池, 原有连接池会被关闭
+    :param pool: RadosPool, 新的默认连接池
+    '''
+    global _default_pool
+    if not isinstance(pool, RadosPool):
+        raise TypeError('变量pool的类型错误, 应为RadosPool')
+    with _default_pool_lock:
+        old, _default_pool = _default_pool, pool
+    if old is not None and old is not pool:
+        old.close()
@@ -1,8 +1,16 @@
 # -*- coding: UTF-8 -*-
+import struct
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 import rados
 import rbd
-import ceph_argparse
-import subprocess
+import _metrics
+import _rados_pool
+import _validators
 
 class RBD():
 
@@ -30,7 +38,7 @@ class RBD():
                 raise e
             print('成功绑定存储池: {}'.format(p))
 
-        print self.ioctx[0]
+        print(self.ioctx[0])
 
         try:
             self.rbd_inst = rbd.RBD()
@@ -87,7 +95,7 @@ class RBD():
 
             if not isinstance(size, int):
                 return TypeError('变量size的类型错误, 应为int')
-            size_validator = ceph_argparse.CephInt(range = '0')
+            size_validator = _validators.INT_NON_NEGATIVE
             size_validator.valid(str(size))
 
             result = self.rbd_inst.create(self.ioctx[0], name, size)
@@ -118,14 +126,11 @@ class RBD():
             if not isinstance(features, list):
                 return TypeError('变量features的类型错误, 应为list')
             for s in features:
-                features_validator = ceph_argparse.CephChoices(strings = 'layering|striping|exclusive-lock|object-map|fast-diff|deep-flatten|journaling')
+                features_validator = _validators.RBD_FEATURES
                 features_validator.valid(s)
                 cmd.append(s)
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -153,14 +158,11 @@ class RBD():
             if not isinstance(features, list):
                 return TypeError('变量features的类型错误, 应为list')
             for s in features:
-                features_validator = ceph_argparse.CephChoices(strings = 'layering|striping|exclusive-lock|object-map|fast-diff|deep-flatten|journaling')
+                features_validator = _validators.RBD_FEATURES
                 features_validator.valid(s)
                 cmd.append(s)
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -184,10 +186,7 @@ class RBD():
                 return TypeError('变量image的类型错误, 应为str')
             cmd.append(pool+'/'+image)
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -211,10 +210,7 @@ class RBD():
                 return TypeError('变量image的类型错误, 应为str')
             cmd.append(pool+'/'+image)
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -240,11 +236,11 @@ class RBD():
         '''
         遍历RADOS存储池中的RBD镜像
         :param ioctx (rados.Ioctx) -- 用于执行RBD镜像操作的上下文, 指定了本函数执行所在的RADOS存储池, 该参数已经在_RBD类初始化时创建, 并已本函数中调用, 无相关报错时无需手动干预
-        :return: 执行成功时返回列表[0, ImageIterator]
+        :return: 执行成功时返回列表[0, 镜像列表], 元素为dict {'id': str, 'name': str}; ioctx在返回前关闭, 因此在关闭前取出所有条目, 大存储池请使用RBDSession.iter_images()
         :raise rados.Error: Rados引起的问题描述
         '''
         try:
-            result = self.rbd_inst.list2(self.ioctx[0])
+            result = list(self.rbd_inst.list2(self.ioctx[0]))
             return [0, result]
         except rados.Error as e:
             raise e
@@ -288,10 +284,7 @@ class RBD():
                 return TypeError('变量image的类型错误, 应为str')
             cmd.append(pool+'/'+image)
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -366,24 +359,21 @@ class RBD():
 
             if not isinstance(size, int):
                 return TypeError('变量size的类型错误, 应为int')
-            size_validator = ceph_argparse.CephInt(range = '0')
+            size_validator = _validators.INT_NON_NEGATIVE
             size_validator.valid(str(size))
             if not isinstance(unit, str):
                 return TypeError('变量unit的类型错误, 应为str')
-            unit_validator = ceph_argparse.CephChoices(strings = 'B|K|M|G|T|P|E')
+            unit_validator = _validators.SIZE_UNITS
             unit_validator.valid(unit)
             cmd.append('--size')
             cmd.append(str(size) + unit)
 
             if allow_shrink is not None:
-                allow_shrink_validator = ceph_argparse.CephChoices(strings = '--allow-shrink')
+                allow_shrink_validator = _validators.ALLOW_SHRINK
                 allow_shrink_validator.valid(allow_shrink)
                 cmd.append(allow_shrink)
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -419,10 +409,7 @@ class RBD():
             cmd.append('rbd')
             cmd.append('showmapped')
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -449,10 +436,7 @@ class RBD():
                 return TypeError('变量snap的类型错误, 应为str')
             cmd.append(pool+'/'+image+'@'+snap)
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -476,10 +460,7 @@ class RBD():
                 return TypeError('变量image的类型错误, 应为str')
             cmd.append(pool+'/'+image)
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -506,10 +487,7 @@ class RBD():
                 return TypeError('变量snap的类型错误, 应为str')
             cmd.append(pool+'/'+image+'@'+snap)
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -533,10 +511,7 @@ class RBD():
                 return TypeError('变量image的类型错误, 应为str')
             cmd.append(pool+'/'+image)
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -563,10 +538,7 @@ class RBD():
                 return TypeError('变量snap的类型错误, 应为str')
             cmd.append(pool+'/'+image+'@'+snap)
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -593,10 +565,7 @@ class RBD():
                 return TypeError('变量snap的类型错误, 应为str')
             cmd.append(pool+'/'+image+'@'+snap)
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -623,10 +592,7 @@ class RBD():
                 return TypeError('变量snap的类型错误, 应为str')
             cmd.append(pool+'/'+image+'@'+snap)
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -650,10 +616,7 @@ class RBD():
                 return TypeError('变量image的类型错误, 应为str')
             cmd.append(pool+'/'+image)
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
@@ -697,16 +660,763 @@ class RBD():
                 return TypeError('变量image的类型错误, 应为str')
             cmd.append(pool+'/'+image)
 
-            result = ['','']
-            run = subprocess.Popen(cmd, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
-            result[1] = run.communicate()[0]
-            result[0] = run.returncode
+            result = _metrics.run_subprocess(cmd)
             return result
         except Exception as e:
             raise e
         finally:
             self._close()
 
+def _to_struct_time(value):
+    # get_snap_timestamp()在不同版本中返回datetime或time.struct_time
+    if isinstance(value, time.struct_time):
+        return value
+    return value.timetuple()
+
+class RBDSession():
+    '''
+    长期使用的RBD会话: 从连接池借出一个集群句柄并在会话期间一直持有, 方法执行后不关闭连接, 同一会话可执行任意多次镜像操作, 可在多个线程中共用
+    每次调用指定存储池名称, 存储池的ioctx在第一次使用时打开并缓存, 超过max_ioctx个时关闭最久未使用的ioctx; 正在使用的ioctx不会被关闭, 而是在最后一个使用者归还后关闭
+    :param pool: _rados_pool.RadosPool, 借出集群句柄的连接池, 不指定时会话创建只有一个句柄的连接池并在close()时关闭;
+        不使用进程内共享的默认连接池, 否则多个会话长期占满其中的句柄后, Ceph的命令将无法借到句柄
+    :param max_ioctx: int, 最多缓存的ioctx数量, 默认为16
+    :param timeout: float, 连接池已满时等待的最长时间, 单位为秒, 为None时一直等待
+    :param usage_cache: UsageCache, du()/iter_du()使用的缓存, 可在多个会话间共用, 不指定时每个会话各自创建
+    :raise RadosPoolError: 连接池已关闭或等待超时时引发RadosPoolError
+    :raise rados.Error: 连接集群失败时引发
+    '''
+
+    def __init__(self, pool = None, max_ioctx = 16, timeout = None, usage_cache = None):
+        if pool is not None and not isinstance(pool, _rados_pool.RadosPool):
+            raise TypeError('变量pool的类型错误, 应为RadosPool')
+        if not isinstance(max_ioctx, int) or max_ioctx < 1:
+            raise TypeError('变量max_ioctx的类型错误, 应为正整数')
+        self.owns_pool = pool is None
+        if self.owns_pool:
+            pool = _rados_pool.RadosPool(size = 1)
+        self.pool = pool
+        self.max_ioctx = max_ioctx
+        try:
+            self.cluster = pool.acquire(timeout = timeout)
+        except Exception:
+            if self.owns_pool:
+                pool.close()
+            raise
+        self.rbd_inst = rbd.RBD()
+        self._lock = threading.Lock()
+        self._ioctx = OrderedDict() # 存储池名称 -> [rados.Ioctx, 使用者数量, 是否已移出缓存], 末尾为最近使用的
+        self._closed = False
+        self.stats = {'opened': 0, 'hits': 0, 'evicted': 0}
+        self.usage_cache = usage_cache if usage_cache is not None else UsageCache()
+
+    def _acquire_ioctx(self, pool_name):
+        with self._lock:
+            if self._closed:
+                raise rados.Error('RBD会话已关闭')
+            entry = self._ioctx.get(pool_name)
+            if entry is not None:
+                self._ioctx.move_to_end(pool_name)
+                entry[1] += 1
+                self.stats['hits'] += 1
+                return entry
+        # 打开ioctx需要访问MON, 在锁外进行
+        ioctx = self.cluster.open_ioctx(pool_name)
+        close = []
+        with self._lock:
+            closed = self._closed
+            entry = None if closed else self._ioctx.get(pool_name)
+            if closed: # 打开期间会话被关闭, 不再放入缓存
+                close.append(ioctx)
+            elif entry is not None: # 其他线程已经打开了同一个存储池
+                close.append(ioctx)
+                self._ioctx.move_to_end(pool_name)
+                entry[1] += 1
+            else:
+                entry = self._ioctx[pool_name] = [ioctx, 1, False]
+                self.stats['opened'] += 1
+                close.extend(self._evict())
+        for i in close:
+            i.close()
+        if closed:
+            raise rados.Error('RBD会话已关闭')
+        return entry
+
+    def _evict(self):
+        # 调用时须持有self._lock, 返回需要在锁外关闭的ioctx
+        close = []
+        while len(self._ioctx) > self.max_ioctx:
+            name, entry = next(iter(self._ioctx.items()))
+            del self._ioctx[name]
+            entry[2] = True
+            self.stats['evicted'] += 1
+            if entry[1] == 0:
+                close.append(entry[0])
+        return close
+
+    def _release_ioctx(self, entry):
+        with self._lock:
+            entry[1] -= 1
+            close = entry[2] and entry[1] == 0
+        if close:
+            entry[0].close()
+
+    @contextmanager
+    def ioctx(self, pool_name):
+        '''
+        借用指定存储池的ioctx, 退出时归还而不关闭
+        :param pool_name: str, RADOS存储池名称
+        :raise rados.Error: 存储池不存在 (ObjectNotFound) 或会话已关闭时引发
+        '''
+        entry = self._acquire_ioctx(pool_name)
+        try:
+            yield entry[0]
+        finally:
+            self._release_ioctx(entry)
+
+    def evict(self, pool_name = None):
+        '''
+        从缓存中移除指定存储池的ioctx, 不指定时移除全部, 如存储池被删除或重建后
+        '''
+        close = []
+        with self._lock:
+            for name in [pool_name] if pool_name is not None else list(self._ioctx):
+                entry = self._ioctx.pop(name, None)
+                if entry is not None:
+                    entry[2] = True
+                    if entry[1] == 0:
+                        close.append(entry[0])
+        for i in close:
+            i.close()
+
+    def close(self):
+        '''
+        关闭所有未被使用的ioctx并把集群句柄归还连接池 (会话自己创建的连接池随之关闭), 之后不能再使用该会话
+        '''
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self.evict()
+        self.pool.release(self.cluster)
+        if self.owns_pool:
+            self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def clone(self, p_pool, p_name, p_snapname, c_pool, c_name, features = None):
+        '''
+        克隆RBD镜像
+        :param p_pool (str) -- 父RBD镜像所在的RADOS存储池名称
+        :param p_name (str) -- 父RBD镜像名称
+        :param p_snapname (str) -- 父RBD镜像快照名称, 须已保护
+        :param c_pool (str) -- 子RBD镜像所在的RADOS存储池名称
+        :param c_name (str) -- 子RBD镜像名称
+        :param features (int) -- 子RBD镜像的特性位, 不指定时与父RBD镜像相同
+        :return: 执行成功时返回列表[0, None]
+        :raise rados.Error: Rados引起的问题描述, 包含TypeError, InvalidArgument, ImageExists, FunctionNotSupported, ArgumentOutOfRange
+        '''
+        for key, value in (('p_pool', p_pool), ('p_name', p_name), ('p_snapname', p_snapname), ('c_pool', c_pool), ('c_name', c_name)):
+            if not isinstance(value, str):
+                return TypeError('变量{}的类型错误, 应为str'.format(key))
+
+        with self.ioctx(p_pool) as p_ioctx, self.ioctx(c_pool) as c_ioctx:
+            result = self.rbd_inst.clone(p_ioctx, p_name, p_snapname, c_ioctx, c_name, features = features)
+        return [0, result]
+
+    def create(self, pool, name, size, features = None):
+        '''
+        创建RBD镜像
+        :param pool (str) -- RADOS存储池名称
+        :param name (str) -- 创建的RBD镜像名称
+        :param size (int) -- 创建的RBD镜像容量, 单位为字节
+        :param features (int) -- 特性位, 不指定时使用集群的默认值
+        :return: 执行成功时返回列表[0, None]
+        :raise rados.Error: Rados引起的问题描述, 包含ImageExists, TypeError, InvalidArgument, FunctionNotSupported
+        '''
+        if not isinstance(pool, str):
+            return TypeError('变量pool的类型错误, 应为str')
+
+        if not isinstance(name, str):
+            return TypeError('变量name的类型错误, 应为str')
+
+        if not isinstance(size, int):
+            return TypeError('变量size的类型错误, 应为int')
+        size_validator = _validators.INT_NON_NEGATIVE
+        size_validator.valid(str(size))
+
+        with self.ioctx(pool) as ioctx:
+            result = self.rbd_inst.create(ioctx, name, size, features = features)
+        return [0, result]
+
+    def list(self, pool):
+        '''
+        列出RBD镜像名称
+        :param pool (str) -- RADOS存储池名称
+        :return: 执行成功时返回列表[0, RBD镜像列表]
+        :raise rados.Error: Rados引起的问题描述
+        '''
+        if not isinstance(pool, str):
+            return TypeError('变量pool的类型错误, 应为str')
+
+        with self.ioctx(pool) as ioctx:
+            result = self.rbd_inst.list(ioctx)
+        return [0, result]
+
+    def _read_directory(self, ioctx, start_after, max_return):
+        # rbd_directory的omap中 name_<镜像名称> -> 镜像ID (按Ceph的string编码), 按键排序, 即按镜像名称排序
+        with rados.ReadOpCtx() as read_op:
+            entries, _ = ioctx.get_omap_vals(read_op, 'name_' + start_after if start_after is not None else '', 'name_', max_return)
+            try:
+                ioctx.operate_read_op(read_op, 'rbd_directory')
+            except rados.ObjectNotFound: # 存储池中还没有创建过镜像
+                return []
+            images = []
+            for key, value in entries:
+                length = struct.unpack_from('<I', value)[0]
+                images.append({'id': value[4:4 + length].decode('utf-8'), 'name': key[5:]})
+            return images
+
+    def list_page(self, pool, page_size = 1000, start_after = None):
+        '''
+        分页列出RBD镜像, 直接读取存储池中rbd_directory对象的omap, 每页只读取page_size个条目, 不需要先列出整个存储池; 只包含format 2的镜像, 按名称排序
+        :param pool (str) -- RADOS存储池名称
+        :param page_size (int) -- 每页的镜像数量, 默认为1000
+        :param start_after (str) -- 续取标记, 从该镜像名称之后开始, 即上一页返回的next, 不指定时从头开始
+        :return: 执行成功时返回列表[0, {'images': 镜像列表, 'next': 续取标记}], 镜像列表的元素为dict {'id': str, 'name': str}, 没有更多镜像时next为None
+        :raise rados.Error: Rados引起的问题描述
+        '''
+        if not isinstance(pool, str):
+            return TypeError('变量pool的类型错误, 应为str')
+
+        if not isinstance(page_size, int) or page_size < 1:
+            return TypeError('变量page_size的类型错误, 应为正整数')
+
+        if start_after is not None and not isinstance(start_after, str):
+            return TypeError('变量start_after的类型错误, 应为str')
+
+        with self.ioctx(pool) as ioctx:
+            images = self._read_directory(ioctx, start_after, page_size + 1) # 多读一个条目以判断是否还有下一页
+        more = len(images) > page_size
+        images = images[:page_size]
+        return [0, {'images': images, 'next': images[-1]['name'] if more else None}]
+
+    def iter_pages(self, pool, page_size = 1000, start_after = None):
+        '''
+        逐页遍历RBD镜像的生成器, 在遍历期间持有该存储池的ioctx, 遍历结束或生成器被关闭时归还; 每次只在内存中保留一页
+        参数与list_page()相同, 类型错误时引发TypeError
+        :return: generator, 元素为dict {'images': 镜像列表, 'next': 续取标记}, 中断后可用最后一页的next继续
+        :raise rados.Error: Rados引起的问题描述
+        '''
+        if not isinstance(pool, str):
+            raise TypeError('变量pool的类型错误, 应为str')
+
+        if not isinstance(page_size, int) or page_size < 1:
+            raise TypeError('变量page_size的类型错误, 应为正整数')
+
+        if start_after is not None and not isinstance(start_after, str):
+            raise TypeError('变量start_after的类型错误, 应为str')
+
+        with self.ioctx(pool) as ioctx:
+            while True:
+                images = self._read_directory(ioctx, start_after, page_size + 1)
+                more = len(images) > page_size
+                images = images[:page_size]
+                start_after = images[-1]['name'] if more else None
+                yield {'images': images, 'next': start_after}
+                if not more:
+                    return
+
+    def iter_images(self, pool, page_size = 1000, start_after = None):
+        '''
+        逐个遍历RBD镜像的生成器, 按page_size分批读取, 在遍历期间持有该存储池的ioctx
+        :param start_after (str) -- 从该镜像名称之后开始, 中断后可用最后一个取得的镜像名称继续
+        :return: generator, 元素为dict {'id': str, 'name': str}
+        :raise rados.Error: Rados引起的问题描述
+        '''
+        for page in self.iter_pages(pool, page_size = page_size, start_after = start_after):
+            for image in page['images']:
+                yield image
+
+    def remove(self, pool, name, on_progress = None):
+        '''
+        删除RBD镜像
+        :param pool (str) -- RADOS存储池名称
+        :param name (str) -- 删除的RBD镜像名称
+        :param on_progress (回调函数) -- 可选的进度回调函数, 以 (已完成数量, 总数量) 为参数
+        :return: 执行成功时返回列表[0, None]
+        :raise rados.Error: Rados引起的问题描述, 包含ImageNotFound, ImageBusy, ImageHasSnapshots
+        '''
+        if not isinstance(pool, str):
+            return TypeError('变量pool的类型错误, 应为str')
+
+        if not isinstance(name, str):
+            return TypeError('变量name的类型错误, 应为str')
+
+        with self.ioctx(pool) as ioctx:
+            result = self.rbd_inst.remove(ioctx, name, on_progress)
+        return [0, result]
+
+    def rename(self, pool, src, dest):
+        '''
+        修改RBD镜像名称
+        :param pool (str) -- RADOS存储池名称
+        :param src (str) -- RBD镜像当前名称
+        :param dest (str) -- RBD镜像新名称
+        :return: 执行成功时返回列表[0, None]
+        :raise rados.Error: Rados引起的问题描述, 包含ImageNotFound, ImageExists
+        '''
+        if not isinstance(pool, str):
+            return TypeError('变量pool的类型错误, 应为str')
+
+        if not isinstance(src, str):
+            return TypeError('变量src的类型错误, 应为str')
+
+        if not isinstance(dest, str):
+            return TypeError('变量dest的类型错误, 应为str')
+
+        with self.ioctx(pool) as ioctx:
+            result = self.rbd_inst.rename(ioctx, src, dest)
+        return [0, result]
+
+    @contextmanager
+    def image(self, pool, name = None, snapshot = None, read_only = False, image_id = None):
+        '''
+        在会话的连接上打开RBD镜像, 退出时关闭镜像, ioctx保留在缓存中
+        :param pool (str) -- RADOS存储池名称
+        :param name (str) -- RBD镜像名称
+        :param snapshot (str) -- 打开的快照名称, 不指定时打开镜像本身
+        :param read_only (bool) -- 是否以只读方式打开
+        :param image_id (str) -- 镜像ID, 指定时按ID打开 (省去按名称查找ID), 忽略name
+        :raise rados.Error: Rados引起的问题描述, 包含ImageNotFound
+        '''
+        with self.ioctx(pool) as ioctx:
+            if image_id is not None:
+                image = rbd.Image(ioctx, image_id = image_id, snapshot = snapshot, read_only = read_only)
+            else:
+                image = rbd.Image(ioctx, name, snapshot = snapshot, read_only = read_only)
+            try:
+                yield image
+            finally:
+                image.close()
+
+    def snap_create(self, pool, image, snap):
+        '''
+        创建RBD镜像快照, 与snap_create_subprocess()相同, 但在会话的连接上通过librbd执行
+        :param pool (str) -- RADOS存储池名称
+        :param image (str) -- RBD镜像名称
+        :param snap (str) -- 快照名称
+        :return: 执行成功时返回列表[0, None]
+        :raise rados.Error: Rados引起的问题描述, 包含ImageNotFound, ImageExists (快照已存在), ReadOnlyImage
+        '''
+        if not isinstance(pool, str):
+            return TypeError('变量pool的类型错误, 应为str')
+
+        if not isinstance(image, str):
+            return TypeError('变量image的类型错误, 应为str')
+
+        if not isinstance(snap, str):
+            return TypeError('变量snap的类型错误, 应为str')
+
+        with self.image(pool, image) as i:
+            result = i.create_snap(snap)
+        return [0, result]
+
+    def snap_ls(self, pool, image):
+        '''
+        列出RBD镜像的快照
+        :param pool (str) -- RADOS存储池名称
+        :param image (str) -- RBD镜像名称
+        :return: 执行成功时返回列表[0, 快照列表], 元素为dict {'id': int, 'name': str, 'size': int, 'protected': bool, 'timestamp': str}, 按快照ID排序
+        :raise rados.Error: Rados引起的问题描述, 包含ImageNotFound
+        '''
+        if not isinstance(pool, str):
+            return TypeError('变量pool的类型错误, 应为str')
+
+        if not isinstance(image, str):
+            return TypeError('变量image的类型错误, 应为str')
+
+        snaps = []
+        with self.image(pool, image, read_only = True) as i:
+            for snap in i.list_snaps():
+                snaps.append({
+                    'id': snap['id'],
+                    'name': snap['name'],
+                    'size': snap['size'],
+                    'protected': i.is_protected_snap(snap['name']),
+                    'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', _to_struct_time(i.get_snap_timestamp(snap['id']))),
+                })
+        snaps.sort(key = lambda snap: snap['id'])
+        return [0, snaps]
+
+    def snap_protect(self, pool, image, snap):
+        '''
+        保护RBD镜像快照, 受保护的快照才能被克隆, 且不能被删除
+        :param pool (str) -- RADOS存储池名称
+        :param image (str) -- RBD镜像名称
+        :param snap (str) -- 快照名称
+        :return: 执行成功时返回列表[0, None]
+        :raise rados.Error: Rados引起的问题描述, 包含ImageNotFound, InvalidArgument (已受保护)
+        '''
+        if not isinstance(pool, str):
+            return TypeError('变量pool的类型错误, 应为str')
+
+        if not isinstance(image, str):
+            return TypeError('变量image的类型错误, 应为str')
+
+        if not isinstance(snap, str):
+            return TypeError('变量snap的类型错误, 应为str')
+
+        with self.image(pool, image) as i:
+            result = i.protect_snap(snap)
+        return [0, result]
+
+    def snap_unprotect(self, pool, image, snap):
+        '''
+        取消保护RBD镜像快照
+        :param pool (str) -- RADOS存储池名称
+        :param image (str) -- RBD镜像名称
+        :param snap (str) -- 快照名称
+        :return: 执行成功时返回列表[0, None]
+        :raise rados.Error: Rados引起的问题描述, 包含ImageNotFound, InvalidArgument (未受保护), ImageBusy (存在克隆的子镜像)
+        '''
+        if not isinstance(pool, str):
+            return TypeError('变量pool的类型错误, 应为str')
+
+        if not isinstance(image, str):
+            return TypeError('变量image的类型错误, 应为str')
+
+        if not isinstance(snap, str):
+            return TypeError('变量snap的类型错误, 应为str')
+
+        with self.image(pool, image) as i:
+            result = i.unprotect_snap(snap)
+        return [0, result]
+
+    def snap_rm(self, pool, image, snap):
+        '''
+        删除RBD镜像快照
+        :param pool (str) -- RADOS存储池名称
+        :param image (str) -- RBD镜像名称
+        :param snap (str) -- 快照名称
+        :return: 执行成功时返回列表[0, None]
+        :raise rados.Error: Rados引起的问题描述, 包含ImageNotFound, ImageBusy (快照受保护)
+        '''
+        if not isinstance(pool, str):
+            return TypeError('变量pool的类型错误, 应为str')
+
+        if not isinstance(image, str):
+            return TypeError('变量image的类型错误, 应为str')
+
+        if not isinstance(snap, str):
+            return TypeError('变量snap的类型错误, 应为str')
+
+        with self.image(pool, image) as i:
+            result = i.remove_snap(snap)
+        return [0, result]
+
+    def snap_rollback(self, pool, image, snap):
+        '''
+        回滚RBD镜像到指定快照, 完成时间随镜像的数据量而变化
+        :param pool (str) -- RADOS存储池名称
+        :param image (str) -- RBD镜像名称
+        :param snap (str) -- 快照名称
+        :return: 执行成功时返回列表[0, None]
+        :raise rados.Error: Rados引起的问题描述, 包含ImageNotFound, ReadOnlyImage
+        '''
+        if not isinstance(pool, str):
+            return TypeError('变量pool的类型错误, 应为str')
+
+        if not isinstance(image, str):
+            return TypeError('变量image的类型错误, 应为str')
+
+        if not isinstance(snap, str):
+            return TypeError('变量snap的类型错误, 应为str')
+
+        with self.image(pool, image) as i:
+            result = i.rollback_to_snap(snap)
+        return [0, result]
+
+    def snap_purge(self, pool, image):
+        '''
+        删除RBD镜像所有未受保护的快照, 受保护的快照保留并在结果中列出
+        :param pool (str) -- RADOS存储池名称
+        :param image (str) -- RBD镜像名称
+        :return: 执行成功时返回列表[0, {'removed': list, 'protected': list}], 元素为快照名称
+        :raise rados.Error: Rados引起的问题描述, 包含ImageNotFound
+        '''
+        if not isinstance(pool, str):
+            return TypeError('变量pool的类型错误, 应为str')
+
+        if not isinstance(image, str):
+            return TypeError('变量image的类型错误, 应为str')
+
+        removed = []
+        protected = []
+        with self.image(pool, image) as i:
+            for snap in list(i.list_snaps()):
+                if i.is_protected_snap(snap['name']):
+                    protected.append(snap['name'])
+                    continue
+                i.remove_snap(snap['name'])
+                removed.append(snap['name'])
+        return [0, {'removed': removed, 'protected': protected}]
+
+    def _image_info(self, pool, name, image_id = None):
+        with self.image(pool, name, read_only = True, image_id = image_id) as image:
+            stat = image.stat()
+            try:
+                spec = image.get_parent_image_spec()
+                parent = {'pool': spec['pool_name'], 'image': spec['image_name'], 'snap': spec['snap_name']}
+            except rbd.ImageNotFound: # 没有父镜像
+                parent = None
+            except AttributeError: # Nautilus之前的版本没有get_parent_image_spec()
+                try:
+                    parent_pool, parent_image, parent_snap = image.parent_info()
+                    parent = {'pool': parent_pool, 'image': parent_image, 'snap': parent_snap}
+                except rbd.ImageNotFound:
+                    parent = None
+            return {
+                'id': image.id(),
+                'size': stat['size'],
+                'obj_size': stat['obj_size'],
+                'num_objs': stat['num_objs'],
+                'order': stat['order'],
+                'block_name_prefix': stat['block_name_prefix'],
+                'features': image.features(),
+                'flags': image.flags(),
+                'parent': parent,
+                'snap_count': sum(1 for _ in image.list_snaps()),
+            }
+
+    def image_info(self, pool, name):
+        '''
+        获取RBD镜像的信息, 以只读方式打开镜像
+        :param pool (str) -- RADOS存储池名称
+        :param name (str) -- RBD镜像名称
+        :return: 执行成功时返回列表[0, dict], dict包含id、size、obj_size、num_objs、order、block_name_prefix、features (特性位)、flags (标志位)、
+            parent (dict {'pool', 'image', 'snap'}, 没有父镜像时为None)、snap_count
+        :raise rados.Error: Rados引起的问题描述, 包含ImageNotFound
+        '''
+        if not isinstance(pool, str):
+            return TypeError('变量pool的类型错误, 应为str')
+
+        if not isinstance(name, str):
+            return TypeError('变量name的类型错误, 应为str')
+
+        return [0, self._image_info(pool, name)]
+
+    def iter_info(self, pool, names = None, max_workers = 8, page_size = 1000):
+        '''
+        并发获取多个RBD镜像的信息, 按完成的顺序逐个返回, 所有镜像共用会话的连接和ioctx
+        线程池大小为max_workers, 同时提交的镜像数量不超过2 * max_workers, 镜像名称可以是生成器, 不会一次性展开; 单个镜像出错不影响其他镜像
+        :param pool (str) -- RADOS存储池名称
+        :param names (iterable) -- 镜像名称, 不指定时为存储池中的所有镜像 (由iter_images()分页读取, 并按ID打开镜像)
+        :param max_workers (int) -- 并发数量, 默认为8
+        :param page_size (int) -- names不指定时分页读取镜像列表的页大小
+        :return: generator, 元素为dict {'pool': str, 'name': str, 'info': dict, 'error': Exception}, 成功时error为None, 失败时info为None, info的格式与image_info()相同
+        :raise rados.Error: 存储池不存在等无法开始执行的问题
+        '''
+        if not isinstance(pool, str):
+            raise TypeError('变量pool的类型错误, 应为str')
+
+        if not isinstance(max_workers, int) or max_workers < 1:
+            raise TypeError('变量max_workers的类型错误, 应为正整数')
+
+        def collect(name, image_id):
+            return {'info': self._image_info(pool, name, image_id)}
+
+        return self._run_parallel(pool, names, collect, max_workers, page_size, 'info')
+
+    def _run_parallel(self, pool, names, func, max_workers, page_size, field):
+        # 有界并发地对每个镜像执行func(name, image_id), 按完成顺序返回, 同时提交的镜像数量不超过2 * max_workers
+        if names is None:
+            targets = ((image['name'], image['id']) for image in self.iter_images(pool, page_size = page_size))
+        else:
+            targets = ((name, None) for name in names)
+
+        def run(name, image_id):
+            try:
+                result = func(name, image_id)
+                result.update({'pool': pool, 'name': name, 'error': None})
+            except Exception as e:
+                result = {'pool': pool, 'name': name, field: None, 'error': e}
+            return result
+
+        with self.ioctx(pool): # 遍历期间固定该存储池的ioctx, 避免被其他存储池挤出缓存
+            executor = ThreadPoolExecutor(max_workers = max_workers)
+            pending = set()
+            try:
+                for name, image_id in targets:
+                    pending.add(executor.submit(run, name, image_id))
+                    if len(pending) >= 2 * max_workers:
+                        done, pending = wait(pending, return_when = FIRST_COMPLETED)
+                        for future in done:
+                            yield future.result()
+                while pending:
+                    done, pending = wait(pending, return_when = FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            finally:
+                for future in pending: # 调用方提前结束遍历时取消尚未开始的镜像
+                    future.cancel()
+                executor.shutdown(wait = True)
+
+    def _diff_used(self, image, size, from_snapshot, whole_object):
+        # 当前视图 (镜像本身或已设置的快照) 相对from_snapshot新写入的字节数, 不包括父镜像的数据
+        used = [0]
+
+        def count(offset, length, exists):
+            if exists:
+                used[0] += length
+
+        image.diff_iterate(0, size, from_snapshot, count, include_parent = False, whole_object = whole_object)
+        return used[0]
+
+    def _scan_used(self, ioctx, image, size):
+        # 逐个stat镜像的数据对象, 累加存在的对象的大小
+        prefix = image.block_name_prefix()
+        obj_size = 1 << image.stat()['order']
+        used = 0
+        for number in range((size + obj_size - 1) // obj_size):
+            try:
+                used += ioctx.stat('{}.{:016x}'.format(prefix, number))[0]
+            except rados.ObjectNotFound:
+                pass
+        return used
+
+    def _image_usage(self, pool, name, image_id, cache):
+        with self.ioctx(pool) as ioctx, self.image(pool, name, read_only = True, image_id = image_id) as image:
+            image_id = image.id()
+            size = image.size()
+            fast_diff = bool(image.features() & rbd.RBD_FEATURE_FAST_DIFF) and not image.flags() & rbd.RBD_FLAG_FAST_DIFF_INVALID
+            snaps = list(image.list_snaps())
+            if fast_diff:
+                method = 'fast-diff'
+            elif snaps:
+                method = 'diff' # 没有object map时由librbd逐个对象比较快照
+            else:
+                method = 'scan'
+            snapshots = []
+            previous = previous_id = None
+            for snap in snaps:
+                # used是相对上一个快照的增量, 上一个快照被删除后结果随之变化, 键中包含上一个快照的ID
+                key = (pool, image_id, previous_id, snap['id'])
+                used = cache.get(key)
+                if used is None:
+                    image.set_snap(snap['name'])
+                    used = self._diff_used(image, snap['size'], previous, fast_diff)
+                    cache.put(key, used)
+                snapshots.append({'name': snap['name'], 'id': snap['id'], 'provisioned': snap['size'], 'used': used})
+                previous = snap['name']
+                previous_id = snap['id']
+            key = (pool, image_id, previous_id, None)
+            used = cache.get(key)
+            if used is None:
+                image.set_snap(None)
+                if method == 'scan':
+                    used = self._scan_used(ioctx, image, size)
+                else:
+                    used = self._diff_used(image, size, previous, fast_diff)
+                cache.put(key, used)
+        return {'usage': {'id': image_id, 'provisioned': size, 'used': used, 'method': method, 'snapshots': snapshots}}
+
+    def iter_du(self, pool, names = None, max_workers = 8, page_size = 1000):
+        '''
+        并发计算多个RBD镜像的空间占用, 与 rbd du 相同: 快照的used为该快照相对上一个快照新写入的数据, 镜像本身的used为相对最后一个快照新写入的数据, 不包括父镜像的数据
+        启用fast-diff且未失效的镜像使用diff_iterate (按对象粒度, 读取object map); 否则没有快照时逐个stat数据对象, 有快照时由diff_iterate逐个对象比较
+        结果按 (存储池, 镜像ID, 上一个快照ID, 快照ID) 缓存在usage_cache中, 快照的结果一直有效, 镜像本身的结果在usage_cache.head_ttl秒内有效
+        :param pool (str) -- RADOS存储池名称
+        :param names (iterable) -- 镜像名称, 不指定时为存储池中的所有镜像
+        :param max_workers (int) -- 并发数量, 默认为8
+        :param page_size (int) -- names不指定时分页读取镜像列表的页大小
+        :return: generator, 元素为dict {'pool': str, 'name': str, 'usage': dict, 'error': Exception}, 按完成顺序返回,
+            usage为 {'id': str, 'provisioned': int, 'used': int, 'method': 'fast-diff'|'diff'|'scan', 'snapshots': [{'name', 'id', 'provisioned', 'used'}]}, 单位为字节
+        :raise rados.Error: 存储池不存在等无法开始执行的问题
+        '''
+        if not isinstance(pool, str):
+            raise TypeError('变量pool的类型错误, 应为str')
+
+        if not isinstance(max_workers, int) or max_workers < 1:
+            raise TypeError('变量max_workers的类型错误, 应为正整数')
+
+        cache = self.usage_cache
+
+        def collect(name, image_id):
+            return self._image_usage(pool, name, image_id, cache)
+
+        return self._run_parallel(pool, names, collect, max_workers, page_size, 'usage')
+
+    def du(self, pool, names = None, max_workers = 8, page_size = 1000):
+        '''
+        计算存储池中RBD镜像的空间占用及合计, 参数与iter_du()相同
+        :return: 执行成功时返回列表[0, {'images': list, 'errors': list, 'total': {'provisioned': int, 'used': int}}],
+            images为iter_du()中成功的结果按镜像名称排序, errors为失败的结果; 与 rbd du 相同, 合计的provisioned为各镜像本身的大小之和, used包括快照
+        :raise rados.Error: 存储池不存在等无法开始执行的问题
+        '''
+        if not isinstance(pool, str):
+            return TypeError('变量pool的类型错误, 应为str')
+
+        if not isinstance(max_workers, int) or max_workers < 1:
+            return TypeError('变量max_workers的类型错误, 应为正整数')
+
+        images = []
+        errors = []
+        for result in self.iter_du(pool, names = names, max_workers = max_workers, page_size = page_size):
+            (errors if result['error'] is not None else images).append(result)
+        images.sort(key = lambda r: r['name'])
+        total = {'provisioned': 0, 'used': 0}
+        for result in images:
+            usage = result['usage']
+            total['provisioned'] += usage['provisioned']
+            total['used'] += usage['used'] + sum(snap['used'] for snap in usage['snapshots'])
+        return [0, {'images': images, 'errors': errors, 'total': total}]
+
+class UsageCache():
+    '''
+    RBD镜像空间占用的缓存, 键为 (存储池名称, 镜像ID, 上一个快照ID, 快照ID), 值为字节数
+    快照的used是相对上一个快照的增量, 取决于上一个快照: 删除中间的快照后, 其后一个快照以新的上一个快照ID查询, 不会命中旧结果;
+    快照的数据不会变化, 同一个键的结果一直有效; 镜像本身 (快照ID为None) 的结果在head_ttl秒内有效, 为0时不缓存
+    :param head_ttl: float, 镜像本身的结果的有效时间, 单位为秒, 默认为0
+    :param max_entries: int, 最多缓存的条目数, 超出时移除最久未使用的条目
+    '''
+
+    def __init__(self, head_ttl = 0, max_entries = 100000):
+        self.head_ttl = head_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # 键 -> (字节数, 写入时间)
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and key[-1] is None and time.time() - entry[1] >= self.head_ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[0]
+
+    def put(self, key, used):
+        if key[-1] is None and not self.head_ttl:
+            return
+        with self._lock:
+            self._entries[key] = (used, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last = False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
 # 实例化RBD对象
 if __name__ == '__main__':
 
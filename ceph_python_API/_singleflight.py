@@ -0,0 +1,92 @@
+# -*- coding: UTF-8 -*-
+import threading
+
+class _Call():
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight():
+    '''
+    并发请求合并: 同一时刻键相同的多个调用只执行一次, 其余调用等待并共享同一个结果 (或同一个异常)
+    用于合并多个会话同时发出的相同MON命令, 避免MON重复处理
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0 # 调用总数
+        self.executions = 0 # 实际执行次数
+        self.coalesced = 0 # 被合并 (未实际执行) 的调用数
+
+    def do(self, key, func):
+        '''
+        执行func, 如果已有键相同的调用正在执行, 则等待其完成并返回相同的结果
+        :param key: 可哈希的调用键, 如 (序列化的cmd, inbuf)
+        :param func: 无参数的可调用对象
+        :return: func的返回值
+        :raise: func引发的异常, 所有等待的调用都会收到同一个异常
+        '''
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            # 先移除再唤醒, 之后到达的调用会重新执行, 不会拿到已经返回的旧结果
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def in_flight(self):
+        '''
+        获取正在执行的调用数量
+        :return: int
+        '''
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        '''
+        获取合并统计信息
+        :return: dict, 包括调用总数、实际执行次数、被合并的调用数和正在执行的调用数
+        '''
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls),
+            }
+
+_default_group = SingleFlight()
+
+def get_default_group():
+    '''
+    获取进程内共享的默认SingleFlight, 所有未指定singleflight的Ceph对象共用, Ceph以 (连接池, 命令, inbuf) 为键, 只合并同一连接池上的命令
+    :return: SingleFlight
+    '''
+    return _default_group
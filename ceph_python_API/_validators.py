@@ -0,0 +1,97 @@
+# -*- coding: UTF-8 -*-
+'''
+在导入时一次性构造的ceph_argparse验证器, 供_ceph.py、_rbd.py、_ceph_volume.py共用, 避免每次调用都重新构造 (CephChoices每次构造都要拆分选项字符串, CephString每次构造都要编译正则并遍历可打印字符)
+Choices和OsdName分别为CephChoices和CephOsdName的子类, valid()的结果和引发的异常 (类型和内容) 与原类完全一致:
+    Choices以frozenset判断成员, 代替原类对list的线性查找
+    valid_all()对整个列表做一次性的快速检查, 全部合法时返回True; 返回False时不代表有非法元素, 调用方应回退到逐个valid(), 以保证报错的元素和异常与原实现一致
+验证器在多个线程间共享, valid()写入的val、nametype、nameid等属性不应被读取
+'''
+import re
+import ceph_argparse
+
+_STR_TYPES = frozenset([str])
+
+class Choices(ceph_argparse.CephChoices):
+    '''
+    以frozenset判断成员的CephChoices
+    '''
+
+    def __init__(self, strings = '', **kwargs):
+        ceph_argparse.CephChoices.__init__(self, strings = strings, **kwargs)
+        self.choices = frozenset(self.strings)
+
+    def valid(self, s, partial = False):
+        if partial:
+            return ceph_argparse.CephChoices.valid(self, s, partial)
+        try:
+            found = s in self.choices
+        except TypeError: # 不可哈希的值, 由原实现报错
+            return ceph_argparse.CephChoices.valid(self, s, partial)
+        if not found:
+            raise ceph_argparse.ArgumentValid("{0} not in {1}".format(s, self))
+        self.val = s
+
+    def valid_all(self, values):
+        '''
+        快速检查列表中的元素是否都是str且都是合法选项
+        :param values: list
+        :return: bool, True代表全部合法, False代表需要逐个验证
+        '''
+        if not set(map(type, values)) <= _STR_TYPES:
+            return False
+        return self.choices.issuperset(values)
+
+class OsdName(ceph_argparse.CephOsdName):
+    '''
+    支持列表快速检查的CephOsdName
+    '''
+
+    _LIST = re.compile(r'(?:(?:osd\.)?[0-9]+|\*)(?:\n(?:(?:osd\.)?[0-9]+|\*))*\Z')
+
+    def valid_all(self, values):
+        '''
+        快速检查列表中的元素是否都是 '<id>'、'osd.<id>' 或 '*' 格式的str, 以换行连接后用一个正则完成匹配
+        :param values: list
+        :return: bool, True代表全部合法, False代表需要逐个验证
+        '''
+        if not values or not set(map(type, values)) <= _STR_TYPES:
+            return False
+        joined = '\n'.join(values)
+        if joined.count('\n') != len(values) - 1: # 元素本身含有换行
+            return False
+        return self._LIST.match(joined) is not None
+
+# 数值
+INT = ceph_argparse.CephInt(range = '')
+INT_NON_NEGATIVE = ceph_argparse.CephInt(range = '0')
+INT_OLOAD = ceph_argparse.CephInt(range = '100')
+FLOAT_NON_NEGATIVE = ceph_argparse.CephFloat(range = '0.0')
+FLOAT_RATIO = ceph_argparse.CephFloat(range = '0.0|1.0')
+BOOL = ceph_argparse.CephBool(strings = '')
+
+# 名称
+OSD_NAME = OsdName()
+NAME = ceph_argparse.CephName()
+PGID = ceph_argparse.CephPgid()
+NAME_STRING = ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]')
+HEX_STRING = ceph_argparse.CephString(goodchars = '[A-Fa-f0-9-]')
+
+# 选项
+DETAIL = Choices(strings = 'detail')
+PG_STATES = Choices(strings = 'stale|creating|active|activating|clean|recovery_wait|recovery_toofull|recovering|forced_recovery|down|recovery_unfound|backfill_unfound|undersized|degraded|remapped|premerge|scrubbing|deep|inconsistent|peering|repair|backfill_wait|backfilling|forced_backfill|backfill_toofull|incomplete|peered|snaptrim|snaptrim_wait|snaptrim_error')
+PG_STUCK_OPS = Choices(strings = 'inactive|unclean|stale|undersized|degraded')
+PG_DUMP_CONTENTS = Choices(strings = 'all|summary|sum|delta|pools|osds|pgs|pgs_brief')
+PG_DUMP_JSON_CONTENTS = Choices(strings = 'all|summary|sum|pools|osds|pgs')
+OSD_SET_KEYS = Choices(strings = 'full|pause|noup|nodown|noout|noin|nobackfill|norebalance|norecover|noscrub|nodeep-scrub|notieragent|nosnaptrim|pglog_hardlimit')
+OSD_UNSET_KEYS = Choices(strings = 'full|pause|noup|nodown|noout|noin|nobackfill|norebalance|norecover|noscrub|nodeep-scrub|notieragent|nosnaptrim')
+OSD_DF_OUTPUT_METHODS = Choices(strings = 'plain|tree')
+OSD_DF_FILTER_BY = Choices(strings = 'class|name')
+POOL_TYPES = Choices(strings = 'replicated|erasure')
+POOL_GET_VARS = Choices(strings = 'size|min_size|pg_num|pgp_num|crush_rule|hashpspool|nodelete|nopgchange|nosizechange|write_fadvise_dontneed|noscrub|nodeep-scrub|hit_set_type|hit_set_period|hit_set_count|hit_set_fpp|use_gmt_hitset|target_max_objects|target_max_bytes|cache_target_dirty_ratio|cache_target_dirty_high_ratio|cache_target_full_ratio|cache_min_flush_age|cache_min_evict_age|erasure_code_profile|min_read_recency_for_promote|all|min_write_recency_for_promote|fast_read|hit_set_grade_decay_rate|hit_set_search_last_n|scrub_min_interval|scrub_max_interval|deep_scrub_interval|recovery_priority|recovery_op_priority|scrub_priority|compression_mode|compression_algorithm|compression_required_ratio|compression_max_blob_size|compression_min_blob_size|csum_type|csum_min_block|csum_max_block|allow_ec_overwrites|fingerprint_algorithm|pg_autoscale_mode|pg_autoscale_bias|pg_num_min|target_size_bytes|target_size_ratio')
+POOL_SET_VARS = Choices(strings = 'size|min_size|pg_num|pgp_num|pgp_num_actual|crush_rule|hashpspool|nodelete|nopgchange|nosizechange|write_fadvise_dontneed|noscrub|nodeep-scrub|hit_set_type|hit_set_period|hit_set_count|hit_set_fpp|use_gmt_hitset|target_max_bytes|target_max_objects|cache_target_dirty_ratio|cache_target_dirty_high_ratio|cache_target_full_ratio|cache_min_flush_age|cache_min_evict_age|min_read_recency_for_promote|min_write_recency_for_promote|fast_read|hit_set_grade_decay_rate|hit_set_search_last_n|scrub_min_interval|scrub_max_interval|deep_scrub_interval|recovery_priority|recovery_op_priority|scrub_priority|compression_mode|compression_algorithm|compression_required_ratio|compression_max_blob_size|compression_min_blob_size|csum_type|csum_min_block|csum_max_block|allow_ec_overwrites|fingerprint_algorithm|pg_autoscale_mode|pg_autoscale_bias|pg_num_min|target_size_bytes|target_size_ratio')
+CACHE_MODES = Choices(strings = 'none|writeback|forward|readonly|readforward|proxy|readproxy')
+NODE_TYPES = Choices(strings = 'all|osd|mon|mds|mgr')
+RBD_FEATURES = Choices(strings = 'layering|striping|exclusive-lock|object-map|fast-diff|deep-flatten|journaling')
+SIZE_UNITS = Choices(strings = 'B|K|M|G|T|P|E')
+ALLOW_SHRINK = Choices(strings = '--allow-shrink')
+OBJECTSTORES = Choices(strings = '--filestore|--bluestore')
@@ -0,0 +1,74 @@
+# -*- coding: UTF-8 -*-
+'''
+对比串行调用与Ceph.run_ceph_commands()批量并发执行的耗时
+使用_fake_rados替身 (每条命令固定延迟), 无需Ceph集群即可运行:
+    python benchmarks/bench_batch.py --latency 0.02 --rounds 5 --pool-size 8
+'''
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 一次仪表盘页面加载所发出的典型命令
+PAGE_CMDS = [
+    {'prefix': 'status', 'format': 'json'},
+    {'prefix': 'health', 'format': 'json', 'detail': 'detail'},
+    {'prefix': 'osd tree', 'format': 'json'},
+    {'prefix': 'osd df', 'format': 'json'},
+    {'prefix': 'osd dump', 'format': 'json'},
+    {'prefix': 'osd stat', 'format': 'json'},
+    {'prefix': 'osd perf', 'format': 'json'},
+    {'prefix': 'osd lspools', 'format': 'json'},
+    {'prefix': 'osd pool stats', 'format': 'json'},
+    {'prefix': 'pg stat', 'format': 'json'},
+    {'prefix': 'mon stat', 'format': 'json'},
+    {'prefix': 'versions', 'format': 'json'},
+]
+
+def run(latency, rounds, pool_size):
+    import _fake_rados
+    _fake_rados.install(latency = latency, connect_latency = latency)
+    import _ceph
+    import _rados_pool
+
+    pool = _rados_pool.RadosPool(size = pool_size)
+    ceph = _ceph.Ceph(pool = pool)
+    ceph.run_ceph_command(PAGE_CMDS[0], inbuf = '') # 预热, 建立第一个连接
+
+    serial = []
+    for _ in range(rounds):
+        start = time.time()
+        for cmd in PAGE_CMDS:
+            ceph.run_ceph_command(cmd, inbuf = '')
+        serial.append(time.time() - start)
+
+    batch = []
+    for _ in range(rounds):
+        start = time.time()
+        results = ceph.run_ceph_commands(PAGE_CMDS)
+        batch.append(time.time() - start)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            raise errors[0]
+
+    pool.close()
+    return {
+        'commands': len(PAGE_CMDS),
+        'latency_ms': latency * 1000,
+        'pool_size': pool_size,
+        'serial_ms': min(serial) * 1000,
+        'batch_ms': min(batch) * 1000,
+        'speedup': min(serial) / min(batch),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = '批量MON命令执行基准测试')
+    parser.add_argument('--latency', type = float, default = 0.02, help = '每条命令的模拟延迟, 单位为秒')
+    parser.add_argument('--rounds', type = int, default = 5, help = '重复次数, 取最小值')
+    parser.add_argument('--pool-size', type = int, default = 8, help = '连接池大小')
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.latency, args.rounds, args.pool_size), indent = 4))
@@ -0,0 +1,69 @@
+# -*- coding: UTF-8 -*-
+'''
+对比逐个对象调用Ceph.osd_map() (原做法) 与_osd_mapper离线批量映射的耗时, 使用_fake_rados替身和按CRUSH分布PG的合成集群
+逐个调用只执行--sample个对象, 按比例推算全部对象的耗时; 批量映射的结果抽样与osd map对比
+    python benchmarks/bench_osd_mapper.py --osds 240 --pg-num 2048 --objects 1000000
+'''
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def run(osds, pg_num, objects, sample):
+    import _fake_cluster
+    import _fake_rados
+    _fake_rados.install(_fake_cluster.SyntheticCluster(num_osds = osds, osds_per_host = 12, hosts_per_rack = 8, pg_num = pg_num, placement = 'crush'))
+    import _ceph
+    import _osd_mapper
+    ceph = _ceph.Ceph(singleflight = False)
+    names = ['rbd_data.1f2e3d4c5b6a.{:016x}'.format(i) for i in range(objects)]
+
+    start = time.time()
+    for name in names[:sample]:
+        ceph.osd_map(pool = 'rbd', object = name)
+    per_object = (time.time() - start) / sample
+
+    start = time.time()
+    mapper = _osd_mapper.OSDMapper.fetch(ceph)
+    fetch = time.time() - start
+    start = time.time()
+    result = mapper.map_objects('rbd', names)
+    batch = time.time() - start
+    start = time.time()
+    result = mapper.map_objects('rbd', names)
+    cached = time.time() - start
+
+    report = mapper.verify(ceph, 'rbd', names, sample = sample, seed = 0)
+    if report['mismatches']:
+        raise AssertionError('批量映射的结果与osd map不一致: {}'.format(report['mismatches'][:3]))
+    return {
+        'objects': objects,
+        'pgs': pg_num,
+        'verified': report['checked'],
+        'osd_map_per_object_ms': per_object * 1000,
+        'osd_map_estimated_seconds': per_object * objects,
+        'mapper_fetch_seconds': fetch,
+        'mapper_batch_seconds': batch,
+        'mapper_cached_pgs_seconds': cached,
+        'speedup': per_object * objects / (fetch + batch),
+        'distinct_pgs': len(set(result['ps'].tolist())),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = '对象到OSD映射基准测试')
+    parser.add_argument('--osds', type = int, default = 240, help = '合成集群的OSD数量')
+    parser.add_argument('--pg-num', type = int, default = 2048, help = '存储池的PG数量')
+    parser.add_argument('--objects', type = int, default = 1000000, help = '映射的对象数量')
+    parser.add_argument('--sample', type = int, default = 200, help = '逐个调用osd map和抽样校验的对象数量')
+    args = parser.parse_args()
+
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        report = run(args.osds, args.pg_num, args.objects, args.sample)
+    finally:
+        sys.stdout = stdout
+    print(json.dumps(report, indent = 4, sort_keys = True))
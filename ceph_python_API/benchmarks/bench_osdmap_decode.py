@@ -0,0 +1,80 @@
+# -*- coding: UTF-8 -*-
+'''
+对比osd dump加osd crush dump的json (原做法) 与osd getmap的二进制数据 (_osdmap_decode) 构造OSDMap的数据量和耗时, 使用_fake_rados替身和合成集群
+两种方式得到的OSDMap对所有PG的映射结果必须一致
+    python benchmarks/bench_osdmap_decode.py --osds 3000 --pgs 100000
+'''
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def best(func, repeat):
+    elapsed = None
+    for _ in range(repeat):
+        start = time.time()
+        value = func()
+        t = time.time() - start
+        if elapsed is None or t < elapsed:
+            elapsed = t
+    return elapsed, value
+
+def run(osds, pgs, repeat, check):
+    import _fake_cluster
+    import _fake_rados
+    _fake_rados.install(_fake_cluster.SyntheticCluster.scaled(num_osds = osds, num_pgs = pgs))
+    import _ceph
+    import _crush
+    import _osdmap
+    import _osdmap_decode
+    ceph = _ceph.Ceph(singleflight = False)
+    # 合成集群按epoch缓存输出, 先各执行一次, 计时只包括传输和解析
+    dump = ceph.osd_dump()[1]
+    crush_dump = ceph.osd_crush_dump()[1]
+    blob = ceph.osd_getmap()[1]
+
+    def from_json():
+        return _osdmap.OSDMap.from_osd_dump(ceph.osd_dump()[1], _crush.CrushMap.from_crush_dump(ceph.osd_crush_dump()[1]))
+
+    def from_binary():
+        return _osdmap_decode.decode_osdmap(ceph.osd_getmap()[1])
+
+    json_seconds, expected = best(from_json, repeat)
+    binary_seconds, actual = best(from_binary, repeat)
+    decode_seconds, _ = best(lambda: _osdmap_decode.decode_osdmap(blob), repeat)
+    checked = 0
+    for pool in expected.pools.values():
+        for ps in range(0, pool.pg_num, max(1, pool.pg_num // check)):
+            if expected.pg_to_up_acting_osds(pool.id, ps) != actual.pg_to_up_acting_osds(pool.id, ps):
+                raise AssertionError('二进制osdmap的映射结果与json不一致: {}.{:x}'.format(pool.id, ps))
+            checked += 1
+    return {
+        'osds': osds,
+        'json_bytes': len(dump) + len(crush_dump),
+        'binary_bytes': len(blob),
+        'json_seconds': json_seconds,
+        'binary_seconds': binary_seconds,
+        'decode_only_seconds': decode_seconds,
+        'bytes_ratio': (len(dump) + len(crush_dump)) / float(len(blob)),
+        'speedup': json_seconds / binary_seconds,
+        'pgs_checked': checked,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'osdmap解码基准测试')
+    parser.add_argument('--osds', type = int, default = 3000, help = '合成集群的OSD数量')
+    parser.add_argument('--pgs', type = int, default = 100000, help = '合成集群的PG数量')
+    parser.add_argument('--repeat', type = int, default = 5, help = '重复次数, 取最小值')
+    parser.add_argument('--check', type = int, default = 64, help = '每个存储池对比映射结果的PG数量')
+    args = parser.parse_args()
+
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        report = run(args.osds, args.pgs, args.repeat, args.check)
+    finally:
+        sys.stdout = stdout
+    print(json.dumps(report, indent = 4, sort_keys = True))
@@ -0,0 +1,80 @@
+# -*- coding: UTF-8 -*-
+'''
+对比逐条遍历json.loads得到的pg_stats (原做法) 与_pg_table列式表的按存储池、OSD、状态汇总耗时, 使用_fake_rados替身和合成集群
+    python benchmarks/bench_pg_table.py --osds 3000 --pgs 100000
+'''
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def dict_rollups(pg_stats):
+    by_pool = {}
+    by_osd = {}
+    by_state = {}
+    bytes_by_osd = {}
+    for pg in pg_stats:
+        pool = int(pg['pgid'].split('.', 1)[0])
+        num_bytes = pg['stat_sum']['num_bytes']
+        by_pool[pool] = by_pool.get(pool, 0) + num_bytes
+        for osd in pg['acting']:
+            by_osd[osd] = by_osd.get(osd, 0) + 1
+            bytes_by_osd[osd] = bytes_by_osd.get(osd, 0) + num_bytes
+        for state in pg['state'].split('+'):
+            by_state[state] = by_state.get(state, 0) + 1
+    return by_pool, by_osd, by_state, bytes_by_osd
+
+def table_rollups(table):
+    return table.sum_by_pool('num_bytes'), table.count_by_osd(), table.count_by_state_flag(), table.sum_by_osd('num_bytes')
+
+def best(func, repeat):
+    elapsed = None
+    for _ in range(repeat):
+        start = time.time()
+        value = func()
+        t = time.time() - start
+        if elapsed is None or t < elapsed:
+            elapsed = t
+    return elapsed, value
+
+def run(osds, pgs, repeat):
+    import _fake_cluster
+    import _fake_rados
+    _fake_rados.install(_fake_cluster.SyntheticCluster.scaled(num_osds = osds, num_pgs = pgs))
+    import _ceph
+    import _pg_table
+    ret, outbuf, outs = _ceph.Ceph(singleflight = False).pg_dump(dumpcontents = ['pgs'])
+
+    load_dict, pg_stats = best(lambda: json.loads(outbuf)['pg_map']['pg_stats'], 1)
+    load_table, table = best(lambda: _pg_table.PGTable.from_outbuf(outbuf), 1)
+    before, expected = best(lambda: dict_rollups(pg_stats), repeat)
+    after, actual = best(lambda: table_rollups(table), repeat)
+    if actual != expected:
+        raise AssertionError('列式表的汇总结果与逐条遍历不一致')
+    return {
+        'pgs': len(table),
+        'outbuf_bytes': len(outbuf),
+        'load_json_seconds': load_dict,
+        'load_table_seconds': load_table,
+        'rollup_dict_ms': before * 1000,
+        'rollup_table_ms': after * 1000,
+        'speedup': before / after,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'PG统计汇总基准测试')
+    parser.add_argument('--osds', type = int, default = 3000, help = '合成集群的OSD数量')
+    parser.add_argument('--pgs', type = int, default = 100000, help = '合成集群的PG数量')
+    parser.add_argument('--repeat', type = int, default = 5, help = '汇总的重复次数, 取最小值')
+    args = parser.parse_args()
+
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        report = run(args.osds, args.pgs, args.repeat)
+    finally:
+        sys.stdout = stdout
+    print(json.dumps(report, indent = 4, sort_keys = True))
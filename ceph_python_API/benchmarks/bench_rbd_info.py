@@ -0,0 +1,80 @@
+# -*- coding: UTF-8 -*-
+'''
+对比逐个镜像获取信息与RBDSession.iter_info()并发获取的耗时, 使用_fake_rados替身 (每次librbd调用和connect()有固定延迟)
+逐个获取分为两种: 每个镜像新建连接 (与info_subprocess()每次启动rbd命令、重新连接集群的开销相当, 不包括进程启动本身) 和共用会话串行执行
+    python benchmarks/bench_rbd_info.py --images 2000 --latency 0.002 --connect-latency 0.05 --workers 16
+'''
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def run(images, latency, connect_latency, workers, sample):
+    import _fake_cluster
+    import _fake_rados
+    import _fake_rbd
+    cluster = _fake_cluster.SyntheticCluster(pools = [{'name': 'rbd', 'pg_num': 64}])
+    _fake_rados.install(cluster, latency = latency, connect_latency = connect_latency)
+    names = _fake_rbd.populate(cluster, 'rbd', images, used_ratio = 0, snaps = 2)
+    import _rados_pool
+    import _rbd
+
+    pool = _rados_pool.RadosPool(size = 1)
+    session = _rbd.RBDSession(pool)
+
+    # 每个镜像新建连接, 只测sample个镜像后按比例估算
+    start = time.time()
+    for name in names[:sample]:
+        fresh = _rados_pool.RadosPool(size = 1)
+        with _rbd.RBDSession(fresh) as s:
+            s.image_info('rbd', name)
+        fresh.close()
+    per_connection = (time.time() - start) / sample * images
+
+    start = time.time()
+    serial = [session.image_info('rbd', name)[1] for name in names[:sample]]
+    session_serial = (time.time() - start) / sample * images
+
+    start = time.time()
+    results = list(session.iter_info('rbd', max_workers = workers))
+    parallel = time.time() - start
+    errors = [r for r in results if r['error'] is not None]
+    if errors:
+        raise errors[0]['error']
+    by_name = dict((r['name'], r['info']) for r in results)
+    if len(by_name) != images or any(by_name[name] != info for name, info in zip(names, serial)):
+        raise AssertionError('并发获取的镜像信息与串行结果不一致')
+
+    session.close()
+    pool.close()
+    return {
+        'images': images,
+        'latency_ms': latency * 1000,
+        'connect_latency_ms': connect_latency * 1000,
+        'workers': workers,
+        'per_connection_seconds_estimated': per_connection,
+        'session_serial_seconds_estimated': session_serial,
+        'parallel_seconds': parallel,
+        'speedup_vs_per_connection': per_connection / parallel,
+        'speedup_vs_session_serial': session_serial / parallel,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'RBD镜像信息批量获取基准测试')
+    parser.add_argument('--images', type = int, default = 2000, help = '镜像数量')
+    parser.add_argument('--latency', type = float, default = 0.002, help = '每次librbd调用的模拟延迟, 单位为秒')
+    parser.add_argument('--connect-latency', type = float, default = 0.05, help = '连接集群的模拟延迟, 单位为秒')
+    parser.add_argument('--workers', type = int, default = 16, help = '并发数量')
+    parser.add_argument('--sample', type = int, default = 50, help = '逐个获取时实际测量的镜像数量')
+    args = parser.parse_args()
+
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        report = run(args.images, args.latency, args.connect_latency, args.workers, args.sample)
+    finally:
+        sys.stdout = stdout
+    print(json.dumps(report, indent = 4, sort_keys = True))
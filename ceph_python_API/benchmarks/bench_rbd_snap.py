@@ -0,0 +1,101 @@
+# -*- coding: UTF-8 -*-
+'''
+对比RBDSession.snap_*() (librbd, 共用连接) 与RBD.snap_*_subprocess() (每次启动rbd命令) 每个操作的延迟
+默认使用_fake_rados替身执行librbd操作; 替身无法被rbd命令访问, 此时subprocess一侧只测量启动一个空的Python进程的耗时, 作为每次调用的下限 (不包括rbd命令连接集群的时间)
+在有Ceph集群和rbd命令的环境中使用--real, 两种方式对同一个镜像执行:
+    python benchmarks/bench_rbd_snap.py --rounds 20 --latency 0.001
+    python benchmarks/bench_rbd_snap.py --real --pool rbd --image bench-image --rounds 20
+'''
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 一轮操作的顺序, 每轮结束后镜像恢复为没有快照的状态
+OPS = ['snap_create', 'snap_ls', 'snap_protect', 'snap_unprotect', 'snap_rollback', 'snap_rm', 'snap_purge']
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {'min_ms': samples[0] * 1000, 'median_ms': samples[len(samples) // 2] * 1000, 'count': len(samples)}
+
+def args_for(op, pool, image, snap):
+    return (pool, image) if op in ('snap_ls', 'snap_purge') else (pool, image, snap)
+
+def measure(call, rounds, pool, image):
+    samples = dict((op, []) for op in OPS)
+    for r in range(rounds):
+        snap = 'bench-{}'.format(r)
+        for op in OPS:
+            start = time.time()
+            result = call(op, args_for(op, pool, image, snap))
+            samples[op].append(time.time() - start)
+            if isinstance(result, Exception):
+                raise result
+            # 两种方式执行成功时都返回列表[0, ...], subprocess版本的rbd命令失败时返回值非0
+            if isinstance(result, list) and result[0] != 0:
+                raise RuntimeError('{} 执行失败: {}'.format(op, result[1]))
+    return dict((op, summarize(s)) for op, s in samples.items())
+
+def run(rounds, latency, real, pool, image):
+    if not real:
+        import _fake_cluster
+        import _fake_rados
+        import _fake_rbd
+        cluster = _fake_cluster.SyntheticCluster(pools = [{'name': pool, 'pg_num': 64}])
+        _fake_rados.install(cluster, latency = latency)
+        _fake_rbd.populate(cluster, pool, 1, size = 1 << 30, used_ratio = 0.1, prefix = 'bench')
+        image = 'bench-000000'
+    import _metrics
+    import _rados_pool
+    import _rbd
+
+    rados_pool = _rados_pool.RadosPool(size = 1)
+    session = _rbd.RBDSession(rados_pool)
+    session.snap_ls(pool, image) # 预热, 打开ioctx
+    native = measure(lambda op, args: getattr(session, op)(*args), rounds, pool, image)
+    session.close()
+    rados_pool.close()
+
+    report = {'rounds': rounds, 'native': native}
+    if real:
+        if shutil.which('rbd') is None:
+            raise RuntimeError('没有找到rbd命令')
+
+        def subprocess_call(op, args):
+            # RBD的每个方法执行后都会关闭连接, 因此每次调用新建一个对象, 与现有用法一致
+            return getattr(_rbd.RBD([pool]), op + '_subprocess')(*args)
+
+        subprocess = measure(subprocess_call, rounds, pool, image)
+        report['subprocess'] = subprocess
+        report['speedup_median'] = dict((op, subprocess[op]['median_ms'] / native[op]['median_ms']) for op in OPS)
+    else:
+        floor = []
+        for _ in range(rounds):
+            start = time.time()
+            _metrics.run_subprocess([sys.executable, '-c', ''])
+            floor.append(time.time() - start)
+        report['latency_ms'] = latency * 1000
+        report['subprocess_spawn_floor'] = summarize(floor)
+        report['speedup_median_lower_bound'] = dict((op, report['subprocess_spawn_floor']['median_ms'] / native[op]['median_ms']) for op in OPS)
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'RBD快照操作基准测试')
+    parser.add_argument('--rounds', type = int, default = 20, help = '每个操作的执行次数')
+    parser.add_argument('--latency', type = float, default = 0.001, help = '替身中每次librbd调用的模拟延迟, 单位为秒')
+    parser.add_argument('--real', action = 'store_true', help = '连接真实的Ceph集群, 同时测量subprocess版本')
+    parser.add_argument('--pool', default = 'rbd', help = '存储池名称')
+    parser.add_argument('--image', default = 'bench-image', help = '--real时使用的镜像名称, 须已存在且没有快照')
+    args = parser.parse_args()
+
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        report = run(args.rounds, args.latency, args.real, args.pool, args.image)
+    finally:
+        sys.stdout = stdout
+    print(json.dumps(report, indent = 4, sort_keys = True))
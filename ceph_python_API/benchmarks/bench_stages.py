@@ -0,0 +1,238 @@
+# -*- coding: UTF-8 -*-
+'''
+分阶段测量Ceph.*调用的耗时: 参数类型检查、ceph_argparse验证器构造和valid()、cmd的json.dumps、分发 (run_ceph_command各层) 延迟, 以及大输出 (pg dump、osd dump等) 的json解码 (含_pg_stream的逐条解码)
+使用_fake_rados替身和合成集群, 无需Ceph集群即可运行, 结果为json, 可保存后与其他版本的结果对比:
+    python benchmarks/bench_stages.py --osds 10000 --pgs 100000 --output stages.json
+    python benchmarks/bench_stages.py --compare stages.json
+'''
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STATES = 'stale|creating|active|activating|clean|recovery_wait|recovery_toofull|recovering|forced_recovery|down|recovery_unfound|backfill_unfound|undersized|degraded|remapped|premerge|scrubbing|deep|inconsistent|peering|repair|backfill_wait|backfilling|forced_backfill|backfill_toofull|incomplete|peered|snaptrim|snaptrim_wait|snaptrim_error'
+
+def measure(func, number, repeat = 5):
+    '''
+    :return: float, 单次调用的耗时, 单位为微秒, 取repeat次中的最小值
+    '''
+    return min(timeit.repeat(func, number = number, repeat = repeat)) / number * 1000000
+
+def measure_once(func, repeat = 3):
+    '''
+    :return: tuple, (float 单次耗时 (秒, 取最小值), 返回值)
+    '''
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        value = func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, value
+
+def bench_type_checks(ids, number):
+    def check():
+        if not isinstance(ids, list):
+            return TypeError('变量ids的类型错误, 应为list')
+        for s in ids:
+            if not isinstance(s, str):
+                return TypeError('变量ids的元素类型错误, 应为str')
+    return {'ids_{}'.format(len(ids)): measure(check, number)}
+
+def bench_validators(ids, number):
+    import ceph_argparse
+    construct = {
+        'CephChoices_pg_states': measure(lambda: ceph_argparse.CephChoices(strings = STATES), number),
+        'CephInt': measure(lambda: ceph_argparse.CephInt(range = '0'), number),
+        'CephOsdName': measure(lambda: ceph_argparse.CephOsdName(), number),
+        'CephBool': measure(lambda: ceph_argparse.CephBool(), number),
+    }
+    choices = ceph_argparse.CephChoices(strings = STATES)
+    integer = ceph_argparse.CephInt(range = '0')
+    osdname = ceph_argparse.CephOsdName()
+    boolean = ceph_argparse.CephBool()
+
+    def valid_ids():
+        for s in ids:
+            osdname.valid(s)
+
+    valid = {
+        'CephChoices_last_state': measure(lambda: choices.valid('snaptrim_error'), number),
+        'CephInt': measure(lambda: integer.valid('12345'), number),
+        'CephOsdName': measure(lambda: osdname.valid('osd.12345'), number),
+        'CephBool': measure(lambda: boolean.valid('true'), number),
+        'CephOsdName_ids_{}'.format(len(ids)): measure(valid_ids, max(1, number // len(ids))),
+    }
+    return construct, valid
+
+def bench_json_dumps(ids, number):
+    small = {'prefix': 'osd tree', 'format': 'json', 'epoch': 12345}
+    large = {'prefix': 'osd out', 'format': 'json', 'ids': ids}
+    return {
+        'osd_tree': measure(lambda: json.dumps(small, sort_keys = True), number),
+        'osd_out_ids_{}'.format(len(ids)): measure(lambda: json.dumps(large, sort_keys = True), max(1, number // 100)),
+    }
+
+def bench_prepare(ids, number):
+    # run_ceph_command直接返回cmd, 只测量方法内的类型检查、验证和cmd构建
+    import _ceph
+
+    class NoDispatch(_ceph.Ceph):
+        def run_ceph_command(self, cmd, inbuf):
+            return cmd
+
+    ceph = NoDispatch(singleflight = False)
+    return {
+        'osd_tree': measure(lambda: ceph.osd_tree(epoch = 12345), number),
+        'pg_ls_states_3': measure(lambda: ceph.pg_ls(pool = 1, states = ['active', 'clean', 'snaptrim_error']), number),
+        'pg_dump_dumpcontents_2': measure(lambda: ceph.pg_dump(dumpcontents = ['pgs', 'osds']), number),
+        'osd_out_ids_{}'.format(len(ids)): measure(lambda: ceph.osd_out(ids = ids), max(1, number // len(ids))),
+    }
+
+def bench_dispatch(number):
+    # 固定延迟为0时, run_ceph_command相对于直接调用mon_command的额外开销
+    import rados
+    import _ceph
+    import _rados_pool
+    cmd = {'prefix': 'osd stat', 'format': 'json'}
+    cmd_json = json.dumps(cmd, sort_keys = True)
+    cluster = rados.Rados(conffile = '')
+    cluster.connect()
+    pool = _rados_pool.RadosPool(size = 1)
+    plain = _ceph.Ceph(pool = pool, singleflight = False)
+    coalescing = _ceph.Ceph(pool = pool)
+    plain.run_ceph_command(cmd, inbuf = '')
+    result = {
+        'mon_command': measure(lambda: cluster.mon_command(cmd_json, inbuf = ''), number),
+        'run_ceph_command': measure(lambda: plain.run_ceph_command(cmd, inbuf = ''), number),
+        'run_ceph_command_singleflight': measure(lambda: coalescing.run_ceph_command(cmd, inbuf = ''), number),
+    }
+    pool.close()
+    cluster.shutdown()
+    return result
+
+def bench_decode(repeat):
+    import _ceph
+    ceph = _ceph.Ceph(singleflight = False)
+    calls = [
+        ('osd_dump', lambda: ceph.osd_dump()),
+        ('osd_tree', lambda: ceph.osd_tree()),
+        ('osd_df', lambda: ceph.osd_df()),
+        ('pg_dump', lambda: ceph.pg_dump()),
+        ('pg_dump_pgs_brief', lambda: ceph.pg_dump(dumpcontents = ['pgs_brief'])),
+    ]
+    result = {}
+    for name, call in calls:
+        fetch, outbuf = measure_once(lambda: call()[1], repeat = 1)
+        decode, _ = measure_once(lambda: json.loads(outbuf), repeat = repeat)
+        result[name] = {
+            'bytes': len(outbuf),
+            'fetch_seconds': fetch,
+            'decode_seconds': decode,
+            'decode_mb_per_sec': len(outbuf) / 1048576.0 / decode if decode else 0.0,
+        }
+        if name == 'pg_dump':
+            import _pg_stream
+            stream, _ = measure_once(lambda: sum(1 for _ in _pg_stream.iter_pg_stats(outbuf, fields = ['pgid', 'state', 'stat_sum.num_bytes'])), repeat = repeat)
+            result['pg_dump_stream'] = {
+                'bytes': len(outbuf),
+                'fetch_seconds': fetch,
+                'decode_seconds': stream,
+                'decode_mb_per_sec': len(outbuf) / 1048576.0 / stream if stream else 0.0,
+            }
+        del outbuf
+    return result
+
+def git_revision():
+    try:
+        out = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd = os.path.dirname(os.path.abspath(__file__)), stderr = subprocess.STDOUT)
+        return out.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current, baseline):
+    '''
+    对比两次结果, 数值为 当前/基准 的比值, 大于1表示变慢
+    :return: dict, 阶段 -> 用例 -> 比值
+    '''
+    ratios = {}
+    for stage, cases in current['results'].items():
+        base_cases = baseline.get('results', {}).get(stage, {})
+        for case, value in cases.items():
+            base = base_cases.get(case)
+            if isinstance(value, dict):
+                value, base = value.get('decode_seconds'), (base or {}).get('decode_seconds')
+            if value and base:
+                ratios.setdefault(stage, {})[case] = value / base
+    return ratios
+
+def run(osds, pgs, num_ids, number, repeat, seed):
+    import _fake_cluster
+    import _fake_rados
+    start = time.time()
+    cluster = _fake_cluster.SyntheticCluster.scaled(num_osds = osds, num_pgs = pgs, seed = seed)
+    _fake_rados.install(cluster)
+    cluster.pgs()
+    generate = time.time() - start
+
+    ids = [str(i) for i in range(num_ids)]
+    construct, valid = bench_validators(ids, number)
+    results = {
+        'type_checks_us': bench_type_checks(ids, number),
+        'validator_construct_us': construct,
+        'validator_valid_us': valid,
+        'json_dumps_us': bench_json_dumps(ids, number),
+        'method_prepare_us': bench_prepare(ids, number),
+        'dispatch_us': bench_dispatch(number),
+        'decode': bench_decode(repeat),
+    }
+    return {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'osds': osds,
+            'pgs': pgs,
+            'ids': num_ids,
+            'number': number,
+            'seed': seed,
+            'generate_seconds': generate,
+        },
+        'results': results,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Ceph.*调用分阶段基准测试')
+    parser.add_argument('--osds', type = int, default = 10000, help = '合成集群的OSD数量')
+    parser.add_argument('--pgs', type = int, default = 100000, help = '合成集群的PG数量')
+    parser.add_argument('--ids', type = int, default = 1000, help = '列表参数 (ids) 的长度')
+    parser.add_argument('--number', type = int, default = 2000, help = '微基准每轮的调用次数')
+    parser.add_argument('--repeat', type = int, default = 3, help = 'json解码的重复次数, 取最小值')
+    parser.add_argument('--seed', type = int, default = 0, help = '合成集群的随机种子')
+    parser.add_argument('--output', help = '结果保存路径')
+    parser.add_argument('--compare', help = '用于对比的历史结果路径')
+    args = parser.parse_args()
+
+    stdout = sys.stdout
+    sys.stdout = sys.stderr # Ceph/连接池的提示信息输出到stderr, stdout只输出json结果
+    try:
+        report = run(args.osds, args.pgs, args.ids, args.number, args.repeat, args.seed)
+    finally:
+        sys.stdout = stdout
+    if args.compare:
+        with open(args.compare) as f:
+            report['comparison'] = {'baseline': args.compare, 'ratios': compare(report, json.load(f))}
+    text = json.dumps(report, indent = 4, sort_keys = True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
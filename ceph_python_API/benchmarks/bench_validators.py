@@ -0,0 +1,72 @@
+# -*- coding: UTF-8 -*-
+'''
+对比每次调用都构造ceph_argparse验证器并逐个valid() (原实现) 与_validators中预先构造的验证器加valid_all()快速检查的耗时
+    python benchmarks/bench_validators.py --ids 10000 --number 20
+'''
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ceph_argparse
+import _validators
+
+def per_call_list(ids, states):
+    # 与原实现一致: 每次调用构造验证器, 逐个检查类型并验证
+    ids_validator = ceph_argparse.CephOsdName()
+    for s in ids:
+        if not isinstance(s, str):
+            return TypeError('变量ids的元素类型错误, 应为str')
+        ids_validator.valid(s)
+    states_validator = ceph_argparse.CephChoices(strings = '|'.join(_validators.PG_STATES.strings))
+    for s in states:
+        states_validator.valid(s)
+
+def registry_list(ids, states):
+    ids_validator = _validators.OSD_NAME
+    if not ids_validator.valid_all(ids):
+        for s in ids:
+            if not isinstance(s, str):
+                return TypeError('变量ids的元素类型错误, 应为str')
+            ids_validator.valid(s)
+    states_validator = _validators.PG_STATES
+    if not states_validator.valid_all(states):
+        for s in states:
+            states_validator.valid(s)
+
+def per_call_scalar():
+    ceph_argparse.CephInt(range = '0').valid('12345')
+    ceph_argparse.CephString(goodchars = '[A-Za-z0-9-_.]').valid('rbd-pool.1')
+    ceph_argparse.CephChoices(strings = '|'.join(_validators.POOL_SET_VARS.strings)).valid('target_size_ratio')
+
+def registry_scalar():
+    _validators.INT_NON_NEGATIVE.valid('12345')
+    _validators.NAME_STRING.valid('rbd-pool.1')
+    _validators.POOL_SET_VARS.valid('target_size_ratio')
+
+def measure(func, number, repeat = 5):
+    return min(timeit.repeat(func, number = number, repeat = repeat)) / number * 1000000
+
+def run(num_ids, number):
+    ids = [('osd.{}' if i % 2 else '{}').format(i) for i in range(num_ids)]
+    states = list(_validators.PG_STATES.strings)
+    results = {}
+    for name, a, b, n in [
+        ('list_ids_{}_states_{}'.format(num_ids, len(states)), lambda: per_call_list(ids, states), lambda: registry_list(ids, states), number),
+        ('scalar_int_string_choices', per_call_scalar, registry_scalar, number * 1000),
+    ]:
+        before = measure(a, n)
+        after = measure(b, n)
+        results[name] = {'per_call_us': before, 'registry_us': after, 'speedup': before / after}
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = '验证器构造与列表验证基准测试')
+    parser.add_argument('--ids', type = int, default = 10000, help = 'ids列表长度')
+    parser.add_argument('--number', type = int, default = 20, help = '每轮调用次数')
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.ids, args.number), indent = 4, sort_keys = True))
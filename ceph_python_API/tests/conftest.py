@@ -0,0 +1,13 @@
+# -*- coding: UTF-8 -*-
+'''
+各模块以顶层模块方式互相导入 (如 import _ceph), 测试时将包目录加入sys.path
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 使用_fake_rados替身和默认的合成集群, 须在导入_ceph、_rbd之前安装
+import _fake_rados
+
+_fake_rados.install()
@@ -0,0 +1,78 @@
+# -*- coding: UTF-8 -*-
+import json
+import time
+
+import pytest
+
+import _ceph
+import _command_cache
+import _fake_cluster
+import _rados_pool
+
+RESULT = (0, '{"epoch": 5}', '')
+
+def key(prefix):
+    return _command_cache.CommandCache.key(json.dumps({'prefix': prefix, 'format': 'json'}, sort_keys = True), '')
+
+def test_ttl_expiry():
+    cache = _command_cache.CommandCache(ttls = {'osd stat': 0.05})
+    cache.put('osd stat', key('osd stat'), RESULT)
+    assert cache.get(key('osd stat')) == RESULT
+    time.sleep(0.1)
+    assert cache.get(key('osd stat')) is None
+    assert cache.stats()['expirations'] == 1 and cache.stats()['entries'] == 0
+
+def test_epoch_invalidation():
+    cache = _command_cache.CommandCache(ttls = {'osd dump': 0.05})
+    cache.put('osd dump', key('osd dump'), RESULT, epoch = 5)
+    time.sleep(0.1) # 按epoch失效的命令不受TTL限制
+    assert cache.get(key('osd dump'), epoch = 5) == RESULT
+    assert cache.get(key('osd dump'), epoch = 6) is None
+    assert cache.stats()['epoch_invalidations'] == 1
+
+def test_only_successful_read_only_results_are_cached():
+    cache = _command_cache.CommandCache()
+    cache.put('osd out', key('osd out'), RESULT)
+    cache.put('status', key('status'), (-110, '', 'timed out'))
+    assert cache.stats()['entries'] == 0
+    with pytest.raises(ValueError):
+        cache.set_ttl('osd out', 10)
+
+def test_lru_eviction():
+    cache = _command_cache.CommandCache(max_bytes = 2 * (_command_cache.CommandCache.ENTRY_OVERHEAD + 60))
+    for prefix in ('status', 'health', 'pg stat'):
+        cache.put(prefix, key(prefix), RESULT)
+        cache.get(key('status')) # status一直是最近使用的
+    assert cache.get(key('status')) == RESULT
+    assert cache.get(key('health')) is None
+    assert cache.get(key('pg stat')) == RESULT
+    assert cache.stats()['evictions'] == 1
+
+def test_invalidate_for_write():
+    cache = _command_cache.CommandCache()
+    for prefix in ('osd tree', 'status', 'mon stat'):
+        cache.put(prefix, key(prefix), RESULT)
+    assert cache.invalidate_for('osd out') == 2
+    assert cache.get(key('mon stat')) == RESULT
+    assert cache.invalidate_for('osd tree') == 0
+
+@pytest.fixture
+def cluster():
+    return _fake_cluster.SyntheticCluster(num_osds = 4, osds_per_host = 1)
+
+def test_ceph_osd_dump_follows_epoch(cluster):
+    cache = _command_cache.CommandCache(ttls = {'osd stat': 0}) # 不缓存osd stat, 每次都探测epoch
+    pool = _rados_pool.RadosPool(size = 1, cluster = cluster)
+    try:
+        ceph = _ceph.Ceph(pool = pool, cache = cache, singleflight = False)
+        first = ceph.osd_dump()
+        assert ceph.osd_dump() is first
+        cluster.set_osd_up(1, False) # 由其它客户端引起的变化, 不经过invalidate_for()
+        second = ceph.osd_dump()
+        assert json.loads(second[1])['epoch'] == cluster.epoch > json.loads(first[1])['epoch']
+        assert cache.stats()['epoch_invalidations'] == 1
+
+        ceph.osd_out(['osd.2']) # 本客户端执行的修改命令使osd类的缓存失效
+        assert json.loads(ceph.osd_dump()[1])['epoch'] == cluster.epoch
+    finally:
+        pool.close()
@@ -0,0 +1,27 @@
+# -*- coding: UTF-8 -*-
+import _crush
+
+# 摘自Ceph src/crush/crush_ln_table.h
+RH_LH_ENTRIES = {
+    0: 0x0001000000000000, 2: 0x0000fe03f80fe040, 3: 0x000002dfca16dde1, 8: 0x0000f83e0f83e0f9,
+    10: 0x0000f6603d980f67, 11: 0x00000e26fd5c8555, 35: 0x00002e0e85a9de04, 256: 0x0000800000000000, 257: 0x0001000000000000,
+}
+LL_ENTRIES = {
+    0: 0x0000000000000000, 1: 0x00000002e2a60a00, 2: 0x000000070cb64ec5, 7: 0x0000001579811b58,
+    8: 0x000000185bfec2a1, 19: 0x0000003815e8571a,
+}
+
+def test_tables_match_ceph():
+    assert len(_crush._RH_LH_TBL) == 128 * 2 + 2
+    assert len(_crush._LL_TBL) == 256
+    for index, value in RH_LH_ENTRIES.items():
+        assert _crush._RH_LH_TBL[index] == value, index
+    for index, value in LL_ENTRIES.items():
+        assert _crush._LL_TBL[index] == value, index
+
+def test_crush_ln_range():
+    assert _crush.crush_ln(0xffff) == 0x1000000000000
+    ln = _crush.ln_table()
+    assert len(ln) == 0x10000
+    assert max(ln) == 0
+    assert all(a <= b for a, b in zip(ln, ln[1:]))
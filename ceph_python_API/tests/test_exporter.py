@@ -0,0 +1,29 @@
+# -*- coding: UTF-8 -*-
+import _ceph
+import _exporter
+import _poller
+
+def test_osd_perf_wrapper_respects_series_limit():
+    infos = [{'id': i, 'perf_stats': {'commit_latency_ms': i % 7, 'apply_latency_ms': i % 5}} for i in range(300)]
+    item = _poller.SnapshotItem('osd_perf', data = {'osdstats': {'osd_perf_infos': infos}}, updated = 1.0)
+    text = _exporter.render(_poller.Snapshot({'osd_perf': item}, 1), osd_series_limit = 200, osd_top = 3)
+    assert 'ceph_osd_commit_latency_seconds{' not in text
+    assert text.count('ceph_osd_top_commit_latency_seconds{') == 3
+    assert 'ceph_osd_commit_latency_histogram_seconds_count 300' in text
+
+def test_render_error_is_exported():
+    poller = _poller.Poller(_ceph.Ceph(), commands = {})
+    outputs = [b'{"health": {"status": "HEALTH_OK"}}', b'"not a status"']
+    poller.add('status', 60, method = lambda ceph: (0, outputs[0], ''))
+    exporter = _exporter.MetricsExporter(poller, port = None, commands = {'status': (60, 'status')})
+    poller.refresh('status')
+    good = exporter.scrape()
+    assert b'ceph_health_status 0' in good
+    assert b'ceph_exporter_render_failing 0' in good
+
+    outputs[0] = outputs[1]
+    poller.refresh('status')
+    text = exporter.scrape()
+    assert b'ceph_health_status 0' in text # 继续提供上一次的文本
+    assert b'ceph_exporter_render_errors_total 1' in text
+    assert b'ceph_exporter_render_failing 1' in text
@@ -0,0 +1,51 @@
+# -*- coding: UTF-8 -*-
+import _ceph
+import _fake_rados
+import _health_watch
+import _poller
+
+def test_parse_checks_nautilus_summary():
+    status, checks = _health_watch.parse_checks({'health': {'status': 'HEALTH_WARN', 'checks': {
+        'OSD_DOWN': {'severity': 'HEALTH_WARN', 'summary': {'message': '2 osds down'}},
+        'PG_DEGRADED': {'severity': 'HEALTH_WARN', 'summary': {'message': 'Degraded data redundancy: 10/300 objects degraded (3.333%), 2 pgs degraded'}},
+    }}})
+    assert status == 'HEALTH_WARN'
+    assert checks['OSD_DOWN']['count'] == 2
+    assert checks['PG_DEGRADED']['count'] is None
+
+def test_diff_checks_compares_message_without_count():
+    old = {'PG_DEGRADED': {'severity': 'HEALTH_WARN', 'count': None, 'message': '10/300 objects degraded'}}
+    new = {'PG_DEGRADED': {'severity': 'HEALTH_WARN', 'count': None, 'message': '20/300 objects degraded'}}
+    events = _health_watch.diff_checks(old, new, 'HEALTH_WARN')
+    assert [e['changes'] for e in events] == [{'message': ['10/300 objects degraded', '20/300 objects degraded']}]
+
+def test_status_count_change_event():
+    cluster = _fake_rados.get_cluster()
+    watcher = _health_watch.HealthWatcher(_ceph.Ceph(), use_status = True)
+    events = []
+    watcher.subscribe(events.append)
+    try:
+        cluster.set_osd_up(0, False)
+        watcher.poller.refresh()
+        cluster.set_osd_up(1, False)
+        watcher.poller.refresh()
+    finally:
+        cluster.set_osd_up(0, True)
+        cluster.set_osd_up(1, True)
+        watcher.close()
+    changed = [e for e in events if e['check'] == 'OSD_DOWN' and e['type'] == 'changed']
+    assert [e['changes']['count'] for e in changed] == [[1, 2]]
+
+def test_close_on_shared_poller():
+    poller = _poller.Poller(_ceph.Ceph(), commands = {})
+    watcher = _health_watch.HealthWatcher(poller)
+    events = []
+    watcher.subscribe(events.append)
+    watcher.unsubscribe(events.append)
+    assert watcher.subscribers == []
+    assert len(poller.listeners) == 1
+    watcher.close()
+    assert poller.listeners == []
+    polls = watcher.stats['polls']
+    poller.refresh()
+    assert watcher.stats['polls'] == polls
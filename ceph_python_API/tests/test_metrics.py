@@ -0,0 +1,40 @@
+# -*- coding: UTF-8 -*-
+import _ceph
+import _metrics
+import _rados_pool
+
+class EnablingPool(_rados_pool.RadosPool):
+    # 在命令执行期间启用统计
+    def acquire(self, timeout = None):
+        cluster = _rados_pool.RadosPool.acquire(self, timeout)
+        _metrics.REGISTRY.enable()
+        return cluster
+
+def test_mon_command_observed_when_enabled():
+    _metrics.REGISTRY.reset()
+    _metrics.REGISTRY.enable()
+    try:
+        ret, outbuf, outs = _ceph.Ceph(singleflight = False).osd_stat()
+        assert ret == 0
+        assert _metrics.REGISTRY.to_dict()['osd stat']['calls'] == 1
+    finally:
+        _metrics.REGISTRY.disable()
+        _metrics.REGISTRY.reset()
+
+def test_mon_command_not_observed_when_disabled():
+    _metrics.REGISTRY.reset()
+    ret, outbuf, outs = _ceph.Ceph(singleflight = False).osd_stat()
+    assert ret == 0
+    assert 'osd stat' not in _metrics.REGISTRY.to_dict()
+
+def test_enable_during_command():
+    _metrics.REGISTRY.reset()
+    pool = EnablingPool(size = 1)
+    try:
+        ret, outbuf, outs = _ceph.Ceph(pool = pool, singleflight = False).osd_stat()
+        assert ret == 0
+        assert 'osd stat' not in _metrics.REGISTRY.to_dict()
+    finally:
+        pool.close()
+        _metrics.REGISTRY.disable()
+        _metrics.REGISTRY.reset()
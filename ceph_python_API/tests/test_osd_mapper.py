@@ -0,0 +1,108 @@
+# -*- coding: UTF-8 -*-
+import glob
+import json
+import os
+import re
+
+import numpy as np
+import pytest
+
+import _crush
+import _osd_mapper
+import _osdmap
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+NONE = _crush.CRUSH_ITEM_NONE
+
+def load(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        data = json.load(f)
+    crush = _crush.CrushMap.from_crush_dump(data['osd_crush_dump'])
+    return _osdmap.OSDMap.from_osd_dump(data['osd_dump'], crush), _osd_mapper.OSDMapper.from_json(data['osd_dump'], data['osd_crush_dump'])
+
+def test_small_map_known_answers():
+    # small_map.json: 4个host各1个OSD, osd.3已out, 副本数为3, 因此CRUSH只能选出osd.0-2的某个排列
+    osdmap, mapper = load('small_map.json')
+    for ps in range(8):
+        up, up_primary, acting, acting_primary = osdmap.pg_to_up_acting_osds('rbd', ps)
+        if ps == 3:
+            assert up == [1, 0, 2] # pg_upmap
+        else:
+            assert sorted(up) == [0, 1, 2], ps # 1.2的pg_upmap和1.4的pg_upmap_items指向out的osd.3, 被忽略
+        assert up_primary == up[0]
+        if ps == 0:
+            assert (acting, acting_primary) == ([2, 1], 2) # pg_temp
+        elif ps == 1:
+            assert (acting, acting_primary) == (up, 1) # primary_temp
+        else:
+            assert (acting, acting_primary) == (up, up_primary)
+    for ps in range(4):
+        up, up_primary, acting, acting_primary = osdmap.pg_to_up_acting_osds('ec', ps)
+        assert sorted(up) == [0, 1, 2] and acting == up
+
+def test_small_map_batch_matches_scalar():
+    osdmap, mapper = load('small_map.json')
+    for pool in ('rbd', 'ec'):
+        p = osdmap.pool(pool)
+        result = mapper.map_pgs(pool, np.arange(p.pg_num))
+        for ps in range(p.pg_num):
+            up, up_primary, acting, acting_primary = osdmap.pg_to_up_acting_osds(pool, ps)
+            assert [int(o) for o in result['up'][ps] if o != -1] == up
+            assert [int(o) for o in result['acting'][ps] if o != -1] == acting
+            assert (int(result['up_primary'][ps]), int(result['acting_primary'][ps])) == (up_primary, acting_primary)
+
+def test_small_map_down_osd_leaves_hole_in_ec_pool():
+    osdmap, mapper = load('small_map.json')
+    osdmap.osd_up[2] = False
+    for ps in range(4):
+        raw, pps = osdmap.pg_to_raw_osds('ec', ps)
+        up = osdmap.pg_to_up_acting_osds('ec', ps)[0]
+        assert up == [NONE if o == 2 else o for o in raw]
+        rbd = osdmap.pg_to_up_acting_osds('rbd', ps + 4)[0]
+        assert 2 not in rbd and len(rbd) == 2
+
+# osdmaptool --test-map-pgs-dump 的输出 (pgid, acting, acting primary) 和 --test-map-pgs-dump-all 的输出
+_DUMP = re.compile(r'^(\d+\.[0-9a-f]+)\t\[([-\d,]*)\]\t(-?\d+)$')
+_DUMP_ALL = re.compile(r'^(\d+\.[0-9a-f]+) raw \(\[[-\d,]*\], p-?\d+\) up \(\[([-\d,]*)\], p(-?\d+)\) acting \(\[([-\d,]*)\], p(-?\d+)\)$')
+
+def _osds(text):
+    return [int(o) for o in text.split(',')] if text else []
+
+def parse_map_pgs(text):
+    '''
+    :return: dict, (存储池ID, PG编号) -> (up或None, up_primary或None, acting, acting_primary)
+    '''
+    result = {}
+    for line in text.splitlines():
+        m = _DUMP_ALL.match(line)
+        if m:
+            result[_osdmap.parse_pgid(m.group(1))] = (_osds(m.group(2)), int(m.group(3)), _osds(m.group(4)), int(m.group(5)))
+            continue
+        m = _DUMP.match(line)
+        if m:
+            result[_osdmap.parse_pgid(m.group(1))] = (None, None, _osds(m.group(2)), int(m.group(3)))
+    return result
+
+def test_parse_map_pgs():
+    text = 'pool 1 pg_num 8\n1.0\t[2,1]\t2\n1.1 raw ([0,2,1], p0) up ([0,2,1], p0) acting ([0,2,1], p1)\n'
+    assert parse_map_pgs(text) == {(1, 0): (None, None, [2, 1], 2), (1, 1): ([0, 2, 1], 0, [0, 2, 1], 1)}
+
+# 从真实集群采集的对照数据: <name>.json 为同一epoch的 {'osd_dump': ..., 'osd_crush_dump': ...},
+# <name>.map_pgs 为 ceph osd getmap -o map && osdmaptool map --test-map-pgs-dump-all 的输出
+CAPTURED = sorted(glob.glob(os.path.join(FIXTURES, '*.map_pgs')))
+
+@pytest.mark.skipif(not CAPTURED, reason = 'tests/fixtures中没有osdmaptool的输出')
+@pytest.mark.parametrize('path', CAPTURED)
+def test_matches_osdmaptool(path):
+    name = os.path.basename(path)[:-len('.map_pgs')]
+    osdmap, mapper = load(name + '.json')
+    with open(path) as f:
+        expected = parse_map_pgs(f.read())
+    assert expected
+    for (pool, ps), (up, up_primary, acting, acting_primary) in sorted(expected.items()):
+        result = osdmap.pg_to_up_acting_osds(pool, ps)
+        if up is not None:
+            assert result[:2] == (up, up_primary), (pool, ps)
+        assert result[2:] == (acting, acting_primary), (pool, ps)
+        batch = mapper.map_pgs(pool, [ps])
+        assert [int(o) for o in batch['acting'][0] if o != -1] == acting, (pool, ps)
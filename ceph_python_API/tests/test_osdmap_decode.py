@@ -0,0 +1,85 @@
+# -*- coding: UTF-8 -*-
+import glob
+import json
+import os
+import struct
+
+import pytest
+
+import _ceph
+import _crush
+import _encoding
+import _fake_cluster
+import _osdmap
+import _osdmap_decode
+import _rados_pool
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def test_crc32c_matches_ceph():
+    # 摘自Ceph src/test/common/test_crc32c.cc
+    assert _encoding.crc32c(0, b'foo bar baz') == 4119623852
+    assert _encoding.crc32c(1234, b'foo bar baz') == 881700046
+    assert _encoding.crc32c(0, b'whiz bang boom') == 2360230088
+    assert _encoding.crc32c(5678, b'whiz bang boom') == 3743019208
+    assert ~_encoding.crc32c(0xffffffff, b'123456789') & 0xffffffff == 0xe3069283 # CRC-32C的标准校验值
+
+def test_decode_pg_t():
+    # pg_t::encode: u8版本1, u64存储池, u32 PG编号, s32 preferred (-1)
+    data = b'\x01' + struct.pack('<QIi', 3, 0x1a, -1)
+    assert _osdmap_decode._pg(_encoding.Reader(data)) == (3, 0x1a)
+
+@pytest.fixture
+def ceph():
+    cluster = _fake_cluster.SyntheticCluster(num_osds = 8, osds_per_host = 2)
+    pool = _rados_pool.RadosPool(size = 1, cluster = cluster)
+    ceph = _ceph.Ceph(pool = pool)
+    ceph.osd_out(['osd.1'])
+    ceph.osd_down(['osd.2'])
+    ceph.osd_reweight(3, 0.5)
+    assert not isinstance(ceph.osd_primary_affinity(4, 0.25), Exception)
+    yield ceph
+    pool.close()
+
+def assert_same_map(decoded, expected):
+    assert decoded.epoch == expected.epoch and decoded.max_osd == expected.max_osd
+    assert decoded.osd_exists == expected.osd_exists and decoded.osd_up == expected.osd_up
+    assert decoded.osd_weight == expected.osd_weight and decoded.osd_primary_affinity == expected.osd_primary_affinity
+    assert (decoded.pg_temp, decoded.primary_temp) == (expected.pg_temp, expected.primary_temp)
+    assert (decoded.pg_upmap, decoded.pg_upmap_items) == (expected.pg_upmap, expected.pg_upmap_items)
+    assert sorted(decoded.pools) == sorted(expected.pools)
+    for pool_id, p in expected.pools.items():
+        q = decoded.pools[pool_id]
+        assert (q.name, q.type, q.size, q.min_size, q.crush_rule, q.pg_num, q.pgp_num, q.flags, q.object_hash) == \
+               (p.name, p.type, p.size, p.min_size, p.crush_rule, p.pg_num, p.pgp_num, p.flags, p.object_hash)
+        for ps in range(p.pg_num):
+            assert decoded.pg_to_up_acting_osds(pool_id, ps) == expected.pg_to_up_acting_osds(pool_id, ps), (pool_id, ps)
+
+def test_getmap_matches_osd_dump(ceph):
+    blob = ceph.osd_getmap()[1]
+    crush = _crush.CrushMap.from_crush_dump(ceph.osd_crush_dump()[1])
+    expected = _osdmap.OSDMap.from_osd_dump(ceph.osd_dump()[1], crush)
+    assert expected.has_primary_affinity and not expected.osd_up[2] and expected.osd_weight[1] == 0
+    assert_same_map(_osdmap_decode.decode_osdmap(blob, verify_crc = True), expected)
+
+def test_decode_rejects_corrupt_map(ceph):
+    blob = bytearray(ceph.osd_getmap()[1])
+    with pytest.raises(_encoding.DecodeError):
+        _osdmap_decode.decode_osdmap(bytes(blob[:len(blob) // 2]))
+    blob[30] ^= 0xff # fsid之后的epoch
+    with pytest.raises(_encoding.DecodeError):
+        _osdmap_decode.decode_osdmap(bytes(blob), verify_crc = True)
+
+# 从真实集群采集的对照数据: <name>.osdmap 为 ceph osd getmap -o <name>.osdmap 的输出,
+# <name>.json 为同一epoch的 {'osd_dump': ceph osd dump -f json, 'osd_crush_dump': ceph osd crush dump -f json}
+CAPTURED = sorted(glob.glob(os.path.join(FIXTURES, '*.osdmap')))
+
+@pytest.mark.skipif(not CAPTURED, reason = 'tests/fixtures中没有osd getmap的输出')
+@pytest.mark.parametrize('path', CAPTURED)
+def test_decode_captured_map(path):
+    with open(path, 'rb') as f:
+        blob = f.read()
+    with open(path[:-len('.osdmap')] + '.json') as f:
+        data = json.load(f)
+    expected = _osdmap.OSDMap.from_osd_dump(data['osd_dump'], _crush.CrushMap.from_crush_dump(data['osd_crush_dump']))
+    assert_same_map(_osdmap_decode.decode_osdmap(blob, verify_crc = True), expected)
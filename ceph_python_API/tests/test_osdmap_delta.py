@@ -0,0 +1,103 @@
+# -*- coding: UTF-8 -*-
+import pytest
+
+import _ceph
+import _fake_cluster
+import _osdmap_delta
+import _rados_pool
+
+@pytest.fixture
+def cluster():
+    return _fake_cluster.SyntheticCluster(num_osds = 8)
+
+@pytest.fixture
+def ceph(cluster):
+    # 独立的集群, 修改OSD和存储池不影响其它测试
+    pool = _rados_pool.RadosPool(size = 1, cluster = cluster)
+    yield _ceph.Ceph(pool = pool)
+    pool.close()
+
+@pytest.mark.parametrize('source', ['dump', 'getmap'])
+def test_poll_reports_changes(ceph, cluster, source):
+    tracker = _osdmap_delta.OSDMapTracker(ceph, source = source)
+    first = tracker.poll()
+    assert first['from_epoch'] is None
+    assert first['osds']['added'] == list(range(8))
+    assert sorted(first['pools']['added'].values()) == sorted(p['pool_name'] for p in cluster.pools.values())
+    assert tracker.poll() is None
+
+    ceph.osd_out(['osd.1'])
+    delta = tracker.poll()
+    assert delta['osds']['out'] == [1]
+    assert delta['osds']['weight'] == {1: [1.0, 0.0]}
+    assert delta['to_epoch'] == cluster.epoch
+
+    ceph.osd_down(['osd.2'])
+    delta = tracker.poll()
+    assert delta['osds']['down'] == [2]
+    assert delta['osds']['out'] == []
+
+    cluster.set_osd_up(2)
+    assert tracker.poll()['osds']['up'] == [2]
+
+    ceph.osd_reweight(3, 0.5)
+    delta = tracker.poll()
+    assert delta['osds']['weight'] == {3: [1.0, 0.5]}
+    assert delta['osds']['in'] == delta['osds']['out'] == []
+
+    ceph.osd_pool_create('delta', 16, 16)
+    delta = tracker.poll()
+    pool_id = cluster.pool_by_name('delta')['pool']
+    assert delta['pools']['added'] == {pool_id: 'delta'}
+    assert not _osdmap_delta.is_empty(delta)
+
+    ceph.osd_pool_set('delta', 'size', '2')
+    delta = tracker.poll()
+    assert delta['pools']['changed'] == {pool_id: {'size': [3, 2]}}
+    assert delta['osds']['weight'] == {}
+    assert tracker.stats['fetches'] == 7
+
+def test_diff_epochs_matches_poll(ceph, cluster):
+    tracker = _osdmap_delta.OSDMapTracker(ceph)
+    old, _ = tracker.fetch()
+    ceph.osd_out(['osd.4'])
+    ceph.osd_reweight(5, 0.25)
+    new, _ = tracker.fetch()
+    delta = _osdmap_delta.diff(old, new)
+    assert delta['from_epoch'] == old.epoch and delta['to_epoch'] == new.epoch
+    assert delta['osds']['out'] == [4]
+    assert delta['osds']['weight'] == {4: [1.0, 0.0], 5: [1.0, 0.25]}
+    assert _osdmap_delta.is_empty(_osdmap_delta.diff(new, new))
+
+class RacingTracker(_osdmap_delta.OSDMapTracker):
+    # osd stat之后、osd dump之前epoch发生变化, MON上已经没有stat返回的版本
+    def __init__(self, ceph, cluster):
+        super().__init__(ceph)
+        self.cluster = cluster
+
+    def epoch(self):
+        result = super().epoch()
+        self.cluster.set_osd_up(0, False)
+        return result
+
+def test_poll_falls_back_to_latest_on_ceph_error(ceph, cluster):
+    tracker = RacingTracker(ceph, cluster)
+    delta = tracker.poll()
+    assert delta['to_epoch'] == cluster.epoch
+    assert tracker.stats['fetches'] == 1
+
+class BrokenTracker(_osdmap_delta.OSDMapTracker):
+    def __init__(self, ceph):
+        super().__init__(ceph)
+        self.calls = 0
+
+    def fetch(self, epoch = None):
+        self.calls += 1
+        raise ValueError('decode error')
+
+def test_poll_propagates_other_errors(ceph):
+    tracker = BrokenTracker(ceph)
+    with pytest.raises(ValueError):
+        tracker.poll()
+    assert tracker.calls == 1
+    assert tracker.stats['fetches'] == 0
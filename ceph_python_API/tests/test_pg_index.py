@@ -0,0 +1,41 @@
+# -*- coding: UTF-8 -*-
+import asyncio
+import json
+
+import _async_ceph
+import _ceph
+import _pg_index
+
+def test_pg_ls_by_osd_with_index():
+    ceph = _ceph.Ceph(pg_index = _pg_index.PGIndex())
+    ret, outbuf, outs = ceph.pg_ls_by_osd('osd.0')
+    pgs = json.loads(outbuf)['pg_stats']
+    assert pgs and all(0 in pg['acting'] for pg in pgs)
+
+def test_async_pg_ls_with_index():
+    async def main():
+        ceph = _async_ceph.AsyncCeph(pg_index = _pg_index.PGIndex(max_age = 0))
+        by_osd = await ceph.pg_ls_by_osd('osd.0')
+        by_primary = await ceph.pg_ls_by_primary('osd.0')
+        return by_osd, by_primary
+
+    (ret, outbuf, outs), (ret2, outbuf2, outs2) = asyncio.run(main())
+    pgs = json.loads(outbuf)['pg_stats']
+    assert pgs and all(0 in pg['acting'] for pg in pgs)
+    primaries = json.loads(outbuf2)['pg_stats']
+    assert primaries and all(pg['acting_primary'] == 0 for pg in primaries)
+
+def test_pg_ls_by_osd_filters_without_index():
+    ceph = _ceph.Ceph()
+    for method, field in ((ceph.pg_ls_by_osd, 'acting'), (ceph.pg_ls_by_primary, 'acting_primary')):
+        pgs = json.loads(method('osd.0')[1])['pg_stats']
+        assert pgs
+        if field == 'acting':
+            assert all(0 in pg['acting'] for pg in pgs)
+        else:
+            assert all(pg['acting_primary'] == 0 for pg in pgs)
+
+def test_pg_ls_by_osd_rejects_wildcard():
+    for ceph in (_ceph.Ceph(), _ceph.Ceph(pg_index = _pg_index.PGIndex())):
+        assert isinstance(ceph.pg_ls_by_osd('*'), ValueError)
+        assert isinstance(ceph.pg_ls_by_primary('*'), ValueError)
@@ -0,0 +1,35 @@
+# -*- coding: UTF-8 -*-
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import _pg_index
+import _pg_table
+
+NONE = 0x7fffffff
+
+# 1.0为三副本PG, 2.0为k=2,m=1的纠删码PG, 第2个分片没有OSD (degraded)
+RECORDS = [
+    {'pgid': '1.0', 'state': 'active+clean', 'up': [0, 1, 2], 'acting': [0, 1, 2], 'up_primary': 0, 'acting_primary': 0,
+     'stat_sum': {'num_bytes': 100}},
+    {'pgid': '2.0', 'state': 'active+undersized+degraded', 'up': [1, NONE, 2], 'acting': [1, NONE, 2], 'up_primary': 1, 'acting_primary': 1,
+     'stat_sum': {'num_bytes': 10}},
+]
+
+def test_count_by_osd_ignores_crush_item_none():
+    table = _pg_table.PGTable.from_records(RECORDS)
+    assert table.count_by_osd() == {0: 1, 1: 2, 2: 2}
+    assert table.count_by_osd('up') == {0: 1, 1: 2, 2: 2}
+
+def test_sum_by_osd_ignores_crush_item_none():
+    table = _pg_table.PGTable.from_records(RECORDS)
+    assert table.sum_by_osd('num_bytes') == {0: 100, 1: 110, 2: 110}
+
+def test_pg_index_ignores_crush_item_none():
+    index = _pg_index.PGIndex()
+    index.update(RECORDS)
+    assert NONE not in index.osd_index
+    assert index.by_osd(1) == frozenset(['1.0', '2.0'])
+    index.update(RECORDS[:1])
+    assert NONE not in index.osd_index
+    assert index.by_osd(1) == frozenset(['1.0'])
@@ -0,0 +1,91 @@
+# -*- coding: UTF-8 -*-
+import threading
+import time
+
+import pytest
+
+import _ceph
+import _poller
+
+class Source():
+    # 以Ceph对象为参数的命令, 按顺序返回results中的结果, 元素为Exception时引发
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = 0
+
+    def __call__(self, ceph):
+        result = self.results[min(self.calls, len(self.results) - 1)]
+        self.calls += 1
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+def make_poller():
+    return _poller.Poller(_ceph.Ceph(), commands = {})
+
+def test_snapshot_swapped_atomically():
+    poller = make_poller()
+    poller.add('value', 60, method = Source([(0, b'{"n": 1}', ''), (0, b'{"n": 2}', '')]))
+    first = poller.refresh()
+    second = poller.refresh()
+    assert first is not second
+    assert second.generation == first.generation + 1
+    assert first.data('value') == {'n': 1}
+    assert second.data('value') == {'n': 2}
+    with pytest.raises(TypeError):
+        first.items['value'] = None
+
+def test_failure_keeps_last_result():
+    poller = make_poller()
+    poller.add('value', 60, method = Source([(0, b'{"n": 1}', ''), RuntimeError('mon down')]))
+    ok = poller.refresh().get('value')
+    failed = poller.refresh().get('value')
+    assert failed.data == {'n': 1}
+    assert failed.updated == ok.updated
+    assert isinstance(failed.error, RuntimeError)
+    assert failed.failed >= ok.updated
+
+def test_age():
+    poller = make_poller()
+    poller.add('never', 60, method = Source([RuntimeError('mon down')]))
+    poller.add('value', 60, method = Source([(0, b'{}', '')]))
+    snapshot = poller.refresh()
+    assert snapshot.age('never') is None
+    assert snapshot.age('missing') is None
+    updated = snapshot.get('value').updated
+    assert snapshot.age('value', now = updated + 5) == 5
+    assert snapshot.ages()['never'] is None
+
+def test_replacing_running_command_does_not_overlap():
+    release = threading.Event()
+    started = threading.Event()
+    lock = threading.Lock()
+    state = {'running': 0, 'max': 0, 'calls': 0}
+
+    def slow(ceph):
+        with lock:
+            state['running'] += 1
+            state['calls'] += 1
+            state['max'] = max(state['max'], state['running'])
+        started.set()
+        release.wait(5)
+        with lock:
+            state['running'] -= 1
+        return (0, b'{}', '')
+
+    poller = make_poller()
+    poller.add('slow', 0.01, method = slow)
+    poller.start()
+    try:
+        assert started.wait(5)
+        poller.add('slow', 0.01, method = slow)
+        time.sleep(0.1)
+        assert state['calls'] == 1
+        release.set()
+        assert poller.wait(['slow'], timeout = 5)
+        time.sleep(0.1)
+    finally:
+        release.set()
+        poller.stop()
+    assert state['max'] == 1
+    assert state['calls'] > 1
@@ -0,0 +1,85 @@
+# -*- coding: UTF-8 -*-
+import threading
+import time
+
+import pytest
+import rados
+
+import _fake_rados
+import _rados_pool
+
+@pytest.fixture
+def pool():
+    pool = _rados_pool.RadosPool(size = 2, idle_timeout = 0.05)
+    yield pool
+    pool.close()
+
+def test_released_handle_is_reused(pool):
+    cluster = pool.acquire()
+    pool.release(cluster)
+    assert pool.acquire() is cluster
+    assert pool.stats['created'] == 1 and pool.stats['reused'] == 1
+
+def test_idle_handle_is_evicted(pool):
+    cluster = pool.acquire()
+    pool.release(cluster)
+    time.sleep(0.1)
+    other = pool.acquire()
+    assert other is not cluster
+    assert cluster.state == 'shutdown'
+    assert pool.stats['evicted'] == 1 and len(pool) == 1
+
+def test_unhealthy_handle_is_replaced():
+    pool = _rados_pool.RadosPool(size = 1, health_check_interval = 0)
+    try:
+        cluster = pool.acquire()
+        pool.release(cluster)
+        cluster.shutdown() # 空闲期间连接断开
+        assert pool.acquire() is not cluster
+        assert pool.stats['unhealthy'] == 1 and len(pool) == 1
+    finally:
+        pool.close()
+
+def test_rados_error_discards_handle(pool):
+    with pytest.raises(rados.Error):
+        with pool.connection() as cluster:
+            raise rados.Error('connection lost')
+    assert cluster.state == 'shutdown'
+    assert pool.stats['discarded'] == 1 and len(pool) == 0
+
+    # 其它异常不影响句柄, 正常归还
+    with pytest.raises(ValueError):
+        with pool.connection() as cluster:
+            raise ValueError()
+    assert cluster.state == 'connected' and pool.idle_count() == 1
+
+def test_failed_connect_frees_slot():
+    faults = _fake_rados.Faults(connect_error_rate = 1.0)
+    pool = _rados_pool.RadosPool(size = 1, faults = faults)
+    try:
+        with pytest.raises(rados.Error):
+            pool.acquire(timeout = 0.05)
+        assert len(pool) == 0
+        faults.connect_error_rate = 0.0
+        pool.release(pool.acquire(timeout = 0.05))
+    finally:
+        pool.close()
+
+def test_acquire_timeout(pool):
+    held = [pool.acquire(), pool.acquire()]
+    start = time.time()
+    with pytest.raises(_rados_pool.RadosPoolError):
+        pool.acquire(timeout = 0.05)
+    assert time.time() - start >= 0.05
+
+    threading.Timer(0.05, pool.release, args = (held[0],)).start()
+    assert pool.acquire(timeout = 5) is held[0]
+
+def test_close_shuts_down_lent_handles_on_release(pool):
+    cluster = pool.acquire()
+    pool.close()
+    with pytest.raises(_rados_pool.RadosPoolError):
+        pool.acquire()
+    assert cluster.state == 'connected'
+    pool.release(cluster)
+    assert cluster.state == 'shutdown' and len(pool) == 0
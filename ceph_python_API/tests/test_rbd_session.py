@@ -0,0 +1,106 @@
+# -*- coding: UTF-8 -*-
+import pytest
+import rados
+
+import _ceph
+import _fake_cluster
+import _rados_pool
+import _rbd
+
+def test_sessions_do_not_hold_default_pool():
+    default = _rados_pool.get_default_pool()
+    sessions = [_rbd.RBDSession() for _ in range(default.size + 1)]
+    try:
+        ret, outbuf, outs = _ceph.Ceph(acquire_timeout = 1).osd_stat()
+        assert ret == 0
+    finally:
+        for session in sessions:
+            session.close()
+
+def test_mon_command_acquire_timeout():
+    pool = _rados_pool.RadosPool(size = 1)
+    cluster = pool.acquire()
+    try:
+        with pytest.raises(_rados_pool.RadosPoolError):
+            _ceph.Ceph(pool = pool, acquire_timeout = 0.05, singleflight = False).osd_stat()
+    finally:
+        pool.release(cluster)
+        pool.close()
+
+def test_ioctx_opened_after_close_is_not_cached():
+    session = _rbd.RBDSession()
+    opened = []
+    open_ioctx = session.cluster.open_ioctx
+
+    def racing_open(name):
+        ioctx = open_ioctx(name)
+        opened.append(ioctx)
+        session.close() # 打开期间会话被关闭
+        return ioctx
+
+    session.cluster.open_ioctx = racing_open
+    with pytest.raises(rados.Error):
+        session._acquire_ioctx('rbd')
+    assert session._ioctx == {}
+    assert opened and opened[0].state == 'closed'
+
+def test_list_pages_follow_image_changes():
+    with _rbd.RBDSession() as session:
+        session.create('rbd', 'page-a', 1 << 20)
+        session.create('rbd', 'page-c', 1 << 20)
+        names = [i['name'] for i in session.iter_images('rbd', page_size = 1) if i['name'].startswith('page-')]
+        assert names == ['page-a', 'page-c']
+        session.create('rbd', 'page-b', 1 << 20)
+        session.rename('rbd', 'page-c', 'page-d')
+        session.remove('rbd', 'page-a')
+        names = [i['name'] for i in session.iter_images('rbd', page_size = 1) if i['name'].startswith('page-')]
+        assert names == ['page-b', 'page-d']
+        for name in names:
+            session.remove('rbd', name)
+
+def test_iter_pages_checks_start_after():
+    with _rbd.RBDSession() as session:
+        assert isinstance(session.list_page('rbd', start_after = 1), TypeError)
+        with pytest.raises(TypeError):
+            next(session.iter_pages('rbd', start_after = 1))
+
+@pytest.fixture
+def lru_session():
+    cluster = _fake_cluster.SyntheticCluster(num_osds = 3, osds_per_host = 1, pools = [{'name': name, 'pg_num': 8, 'size': 3} for name in 'abc'])
+    session = _rbd.RBDSession(pool = _rados_pool.RadosPool(size = 1, cluster = cluster), max_ioctx = 2)
+    yield session
+    session.close()
+    session.pool.close()
+
+def test_ioctx_cache_evicts_least_recently_used(lru_session):
+    session = lru_session
+    handles = {}
+    for name in ('a', 'b', 'a'):
+        with session.ioctx(name) as ioctx:
+            handles[name] = ioctx
+    assert session.stats == {'opened': 2, 'hits': 1, 'evicted': 0}
+    with session.ioctx('c'):
+        pass
+    assert list(session._ioctx) == ['a', 'c']
+    assert session.stats['evicted'] == 1
+    assert handles['b'].state == 'closed' and handles['a'].state == 'open'
+
+def test_ioctx_in_use_is_closed_after_release(lru_session):
+    session = lru_session
+    with session.ioctx('a') as ioctx:
+        with session.ioctx('b'), session.ioctx('c'):
+            pass
+        assert 'a' not in session._ioctx
+        assert ioctx.state == 'open' # 被移出缓存, 但仍在使用
+    assert ioctx.state == 'closed'
+
+def test_evict_and_close_close_idle_ioctx(lru_session):
+    session = lru_session
+    with session.ioctx('a') as a, session.ioctx('b') as b:
+        pass
+    session.evict('a')
+    assert a.state == 'closed' and b.state == 'open'
+    session.close()
+    assert b.state == 'closed'
+    with pytest.raises(rados.Error):
+        session._acquire_ioctx('a')
@@ -0,0 +1,25 @@
+# -*- coding: UTF-8 -*-
+import _rbd
+
+MiB = 1024 ** 2
+
+def test_du_after_removing_middle_snapshot():
+    session = _rbd.RBDSession(usage_cache = _rbd.UsageCache())
+    try:
+        session.create('rbd', 'du-snaps', 64 * MiB)
+        for i, snap in enumerate(['s1', 's2', 's3']):
+            with session.image('rbd', 'du-snaps') as image:
+                image.write(b'x' * 4 * MiB, i * 4 * MiB)
+            session.snap_create('rbd', 'du-snaps', snap)
+
+        ret, du = session.du('rbd', names = ['du-snaps'])
+        used = dict((s['name'], s['used']) for s in du['images'][0]['usage']['snapshots'])
+        assert used == {'s1': 4 * MiB, 's2': 4 * MiB, 's3': 4 * MiB}
+
+        session.snap_rm('rbd', 'du-snaps', 's2')
+        ret, du = session.du('rbd', names = ['du-snaps'])
+        used = dict((s['name'], s['used']) for s in du['images'][0]['usage']['snapshots'])
+        assert used == {'s1': 4 * MiB, 's3': 8 * MiB}
+        assert du['total']['used'] == 12 * MiB
+    finally:
+        session.close()
@@ -0,0 +1,28 @@
+# -*- coding: UTF-8 -*-
+import _ceph
+import _rados_pool
+import _singleflight
+
+class RecordingGroup(_singleflight.SingleFlight):
+
+    def __init__(self):
+        _singleflight.SingleFlight.__init__(self)
+        self.keys = []
+
+    def do(self, key, func):
+        self.keys.append(key)
+        return _singleflight.SingleFlight.do(self, key, func)
+
+def test_key_includes_pool():
+    group = RecordingGroup()
+    pool_a = _rados_pool.RadosPool(size = 1)
+    pool_b = _rados_pool.RadosPool(size = 1)
+    try:
+        _ceph.Ceph(pool = pool_a, singleflight = group).osd_stat()
+        _ceph.Ceph(pool = pool_a, singleflight = group).osd_stat()
+        _ceph.Ceph(pool = pool_b, singleflight = group).osd_stat()
+    finally:
+        pool_a.close()
+        pool_b.close()
+    assert group.keys[0] == group.keys[1]
+    assert group.keys[0] != group.keys[2]